@@ -1517,7 +1517,8 @@ class BackupManager:
             checks = {
                 'manifest': True,
                 'databases': len(list((session_path / 'databases').glob('*.enc'))) > 0 if (session_path / 'databases').exists() else False,
-                'filestore': (session_path / 'filestore' / 'filestore.tar.gz.enc').exists(),
+                'filestore': (session_path / 'filestore' / 'filestore.tar.gz.enc').exists()
+                or (session_path / 'filestore' / 'filestore-manifest.tsv.enc').exists(),
                 'configs': len(list((session_path / 'configs').glob('*.enc'))) > 0 if (session_path / 'configs').exists() else False
             }
             
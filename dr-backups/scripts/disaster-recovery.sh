@@ -357,34 +357,49 @@ restore_databases() {
                 continue
             fi
             
-            # Decrypt backup
-            local key temp_sql
+            # Decrypt backup (custom format dumps, or a tar of a directory format dump)
+            local key temp_sql temp_dir restore_source restore_jobs
             key=$(cat "$DR_ENCRYPTION_KEY")
             temp_sql="/tmp/restore_${db_name}_$$.sql"
-            
+            temp_dir="/tmp/restore_${db_name}_$$.dir"
+            restore_source="$temp_sql"
+            restore_jobs=1
+
             if ! openssl enc -d -aes-256-cbc -in "$db_backup" -out "$temp_sql" -k "$key"; then
                 log_error "Failed to decrypt database backup: $db_name"
                 continue
             fi
-            
+
+            if [ "$(head -c 5 "$temp_sql")" != "PGDMP" ]; then
+                mkdir -p "$temp_dir"
+                if ! tar -xf "$temp_sql" -C "$temp_dir"; then
+                    log_error "Unrecognized backup format for database: $db_name"
+                    rm -rf "$temp_sql" "$temp_dir"
+                    continue
+                fi
+                rm -f "$temp_sql"
+                restore_source="$temp_dir"
+            fi
+            [ "${DR_PARALLEL_RESTORE:-false}" = "true" ] && restore_jobs="${DR_DUMP_JOBS:-2}"
+
             # Drop existing database if it exists
             psql -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$POSTGRES_MASTER_DB" \
                 -c "DROP DATABASE IF EXISTS \"$db_name\";" || true
-            
+
             # Create new database
             psql -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$POSTGRES_MASTER_DB" \
                 -c "CREATE DATABASE \"$db_name\";"
-            
-            # Restore database from custom format
+
+            # Restore database from custom or directory format
             if pg_restore -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" \
-                -d "$db_name" --clean --no-owner --no-privileges "$temp_sql"; then
+                -d "$db_name" -j "$restore_jobs" --clean --if-exists --no-owner --no-privileges "$restore_source"; then
                 log_success "Successfully restored database: $db_name"
             else
                 log_error "Failed to restore database: $db_name"
             fi
-            
-            # Cleanup temporary file
-            rm -f "$temp_sql"
+
+            # Cleanup temporary files
+            rm -rf "$temp_sql" "$temp_dir"
         fi
     done
     
@@ -398,6 +413,12 @@ restore_filestore() {
     
     log "Restoring filestore..."
     
+    if [ -f "$session_dir/filestore/filestore-manifest.tsv.enc" ]; then
+        restore_filestore_incremental "$session_dir"
+        return $?
+    fi
+    
+
     if [ ! -f "$filestore_backup" ]; then
         log_warning "Filestore backup not found: $filestore_backup"
         return 1
@@ -448,6 +469,94 @@ restore_filestore() {
     log_success "Filestore restoration completed"
 }
 
+# Restore an incremental filestore backup
+#
+# The session manifest lists every file with the session whose delta archive
+# holds its content; each referenced delta is extracted once into a staging
+# area and the files are linked into place from there.
+restore_filestore_incremental() {
+    local session_dir="$1"
+    local staging_dir="/tmp/restore_filestore_$$"
+    local manifest="$staging_dir/manifest.tsv"
+    
+    if [ "$TEST_MODE" = "true" ]; then
+        log "TEST MODE: Would restore incremental filestore"
+        return 0
+    fi
+    
+    mkdir -p "$staging_dir/new"
+    
+    if ! openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" \
+        -in "$session_dir/filestore/filestore-manifest.tsv.enc" -out "$manifest"; then
+        log_error "Failed to decrypt filestore manifest"
+        rm -rf "$staging_dir"
+        return 1
+    fi
+    
+    # Extract the delta of every session the manifest depends on
+    local blob_session
+    while IFS= read -r blob_session; do
+        [ -z "$blob_session" ] && continue
+        local delta="$DR_SESSION_DIR/$blob_session/filestore/filestore-delta.tar.gz.enc"
+        if [ ! -f "$delta" ] && [ "$USE_CLOUD" = "true" ]; then
+            download_from_cloud "$blob_session" > /dev/null || true
+        fi
+        if [ ! -f "$delta" ]; then
+            log_error "Filestore delta missing for session $blob_session: $delta"
+            rm -rf "$staging_dir"
+            return 1
+        fi
+        
+        mkdir -p "$staging_dir/blobs/$blob_session"
+        if ! openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$delta" \
+            | tar -xzf - -C "$staging_dir/blobs/$blob_session"; then
+            log_error "Failed to extract filestore delta from session $blob_session"
+            rm -rf "$staging_dir"
+            return 1
+        fi
+    done < <(cut -f4 "$manifest" | sort -u)
+    
+    # Rebuild the filestore tree from the manifest
+    local path sha size source_path missing=0
+    while IFS=$'\t' read -r path sha size blob_session source_path; do
+        [ -z "$path" ] && continue
+        mkdir -p "$staging_dir/new/$(dirname "$path")"
+        if ! cp -l "$staging_dir/blobs/$blob_session/$source_path" "$staging_dir/new/$path" 2>/dev/null && \
+           ! cp "$staging_dir/blobs/$blob_session/$source_path" "$staging_dir/new/$path" 2>/dev/null; then
+            missing=$((missing + 1))
+        fi
+    done < "$manifest"
+    
+    if [ $missing -gt 0 ]; then
+        log_error "Failed to restore filestore: $missing files missing from the backup chain"
+        rm -rf "$staging_dir"
+        return 1
+    fi
+    
+    # Swap the rebuilt filestore in, keeping the current one until it succeeds
+    if [ -d "$ODOO_FILESTORE_PATH" ]; then
+        mv "$ODOO_FILESTORE_PATH" "${ODOO_FILESTORE_PATH}.bak.$$"
+    fi
+    
+    if mv "$staging_dir/new" "$ODOO_FILESTORE_PATH"; then
+        rm -rf "${ODOO_FILESTORE_PATH}.bak.$$" 2>/dev/null || true
+    else
+        log_error "Failed to restore filestore"
+        if [ -d "${ODOO_FILESTORE_PATH}.bak.$$" ]; then
+            rm -rf "$ODOO_FILESTORE_PATH"
+            mv "${ODOO_FILESTORE_PATH}.bak.$$" "$ODOO_FILESTORE_PATH"
+        fi
+        rm -rf "$staging_dir"
+        return 1
+    fi
+    
+    local file_count
+    file_count=$(wc -l < "$manifest")
+    rm -rf "$staging_dir"
+    
+    log_success "Filestore restoration completed ($file_count files)"
+}
+
 # Restore configurations
 restore_configurations() {
     local session_dir="$1"
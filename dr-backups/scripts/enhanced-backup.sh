@@ -195,23 +195,6 @@ EOF
     log "Backup manifest created"
 }
 
-# Update manifest with database info
-update_manifest_database() {
-    local db_name="$1"
-    local backup_file="$2"
-    local size="$3"
-    local checksum="$4"
-    
-    # Use jq to update the manifest
-    if command -v jq &> /dev/null; then
-        local temp_manifest=$(mktemp)
-        jq --arg db "$db_name" --arg file "$backup_file" --arg size "$size" --arg checksum "$checksum" \
-           '.databases += [{"name": $db, "file": $file, "size": $size, "checksum": $checksum}]' \
-           "$BACKUP_MANIFEST" > "$temp_manifest"
-        mv "$temp_manifest" "$BACKUP_MANIFEST"
-    fi
-}
-
 # Add this function after the logging functions
 wait_for_postgres() {
     log "Waiting for PostgreSQL to be ready..."
@@ -241,7 +224,7 @@ get_tenant_databases() {
     # Remove the 'kdoo_' filter and get all non-system databases
     databases=$(psql -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$POSTGRES_MASTER_DB" -t -A -q -c \
         "SELECT datname FROM pg_database WHERE datistemplate = false AND datname NOT IN ('postgres', 'template0', 'template1');" 2>/dev/null | \
-        grep -v "^$" | sed 's/^ *//' | sed 's/ *$//' | grep -E '^[a-zA-Z_][a-zA-Z0-9_-]*$' | grep -v '\[' | grep -v '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' | head -20)
+        grep -v "^$" | sed 's/^ *//' | sed 's/ *$//' | grep -E '^[a-zA-Z_][a-zA-Z0-9_-]*$' | grep -v '\[' | grep -v '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]')
     
     if [ -z "$databases" ]; then
         log_warning "No tenant databases found, trying alternative discovery..."
@@ -253,48 +236,133 @@ get_tenant_databases() {
     echo "$databases"
 }
 
+# Size of a database in MB, used to pick the dump format
+get_database_size_mb() {
+    local db_name="$1"
+    export PGPASSWORD="$POSTGRES_PASSWORD"
+    psql -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$POSTGRES_MASTER_DB" -t -A -q -c \
+        "SELECT pg_database_size('$db_name') / 1048576;" 2>/dev/null || echo "0"
+}
+
+# Encrypt stdin into a file while hashing the ciphertext in the same pass.
+# Writes the SHA-256 of the encrypted file to checksum_file.
+encrypt_stream_to_file() {
+    local output_file="$1"
+    local checksum_file="$2"
+    openssl enc -aes-256-cbc -salt -pass "file:$DR_ENCRYPTION_KEY" | tee "$output_file" | sha256sum | cut -d' ' -f1 > "$checksum_file"
+}
+
 # Backup individual database with encryption
+#
+# Custom format (-Fc) dumps are compressed by pg_dump and streamed straight
+# through openssl and sha256sum, so no plaintext ever touches the disk.
+# Databases above DR_DUMP_DIRECTORY_THRESHOLD_MB use the directory format
+# with -j parallel workers; its compressed files are staged in the session
+# directory, then streamed through tar into the same encrypt/checksum pipeline.
 backup_database() {
     local db_name="$1"
     local backup_file="$SESSION_DIR/databases/${db_name}.sql.enc"
-    local temp_file="$SESSION_DIR/databases/${db_name}.sql"
-    
-    log "Starting backup of database: $db_name"
-    
+    local fragment_file="$SESSION_DIR/metadata/db-${db_name}.json"
+    local dump_format="${DR_DUMP_FORMAT:-auto}"
+    local compression="${DR_COMPRESSION_LEVEL:-6}"
+    local checksum_file="$SESSION_DIR/metadata/db-${db_name}.sha256"
+    local started checksum status
+
     export PGPASSWORD="$POSTGRES_PASSWORD"
-    
-    # Create database dump
-    if ! pg_dump -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$db_name" \
-        --verbose --clean --no-owner --no-privileges > "$temp_file" 2>/dev/null; then
-        log_error "Failed to create dump for database: $db_name"
-        return 1
+    started=$(date +%s)
+
+    if [ "$dump_format" = "auto" ]; then
+        local size_mb
+        size_mb=$(get_database_size_mb "$db_name")
+        if [ "${size_mb:-0}" -ge "${DR_DUMP_DIRECTORY_THRESHOLD_MB:-2048}" ]; then
+            dump_format="directory"
+        else
+            dump_format="custom"
+        fi
     fi
-    
-    # Compress and encrypt the backup
-    local key
-    key=$(cat "$DR_ENCRYPTION_KEY")
-    
-    if ! openssl enc -aes-256-cbc -salt -in "$temp_file" -out "$backup_file" -k "$key"; then
-        log_error "Failed to encrypt backup for database: $db_name"
-        rm -f "$temp_file"
+
+    log "Starting backup of database: $db_name (format: $dump_format)"
+
+    if [ "$dump_format" = "directory" ]; then
+        local dump_dir="$SESSION_DIR/databases/${db_name}.dir"
+
+        if ! pg_dump -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$db_name" \
+            -Fd -j "${DR_DUMP_JOBS:-2}" -Z "$compression" --no-owner --no-privileges \
+            -f "$dump_dir" 2>>"$LOG_FILE"; then
+            log_error "Failed to create dump for database: $db_name"
+            rm -rf "$dump_dir"
+            return 1
+        fi
+
+        tar -C "$dump_dir" -cf - . | encrypt_stream_to_file "$backup_file" "$checksum_file"
+        status=("${PIPESTATUS[@]}")
+        rm -rf "$dump_dir"
+    else
+        pg_dump -h "$POSTGRES_HOST" -p "$POSTGRES_PORT" -U "$POSTGRES_USER" -d "$db_name" \
+            -Fc -Z "$compression" --no-owner --no-privileges 2>>"$LOG_FILE" \
+            | encrypt_stream_to_file "$backup_file" "$checksum_file"
+        status=("${PIPESTATUS[@]}")
+    fi
+
+    checksum=$(cat "$checksum_file" 2>/dev/null)
+    rm -f "$checksum_file"
+
+    if [ "${status[0]}" -ne 0 ] || [ "${status[1]}" -ne 0 ] || [ -z "$checksum" ]; then
+        log_error "Failed to dump/encrypt database: $db_name"
+        rm -f "$backup_file"
         return 1
     fi
-    
-    # Calculate checksum and size
-    local size checksum
+
+    local size elapsed
     size=$(stat -f%z "$backup_file" 2>/dev/null || stat -c%s "$backup_file" 2>/dev/null || echo "0")
-    checksum=$(sha256sum "$backup_file" | cut -d' ' -f1)
-    
-    # Update manifest
-    update_manifest_database "$db_name" "$(basename "$backup_file")" "$size" "$checksum"
-    
-    # Clean up temporary file
-    rm -f "$temp_file"
-    
-    log "Successfully backed up database: $db_name (size: $size bytes)"
+    elapsed=$(( $(date +%s) - started ))
+
+    # Each job writes its own fragment; they are merged into the manifest once all jobs finish
+    printf '{"name": "%s", "file": "%s", "size": "%s", "checksum": "%s", "format": "%s", "seconds": %s}\n' \
+        "$db_name" "$(basename "$backup_file")" "$size" "$checksum" "$dump_format" "$elapsed" > "$fragment_file"
+
+    log "Successfully backed up database: $db_name (size: $size bytes, ${elapsed}s)"
     return 0
 }
 
+# Backup all databases, at most DR_MAX_PARALLEL_BACKUPS at a time
+backup_databases() {
+    local databases="$1"
+    local max_jobs="${DR_MAX_PARALLEL_BACKUPS:-3}"
+    local running=0 failed=0
+
+    log "Backing up databases with up to $max_jobs concurrent jobs"
+
+    while IFS= read -r db_name; do
+        [ -z "$db_name" ] && continue
+
+        if [ "$running" -ge "$max_jobs" ]; then
+            wait -n || failed=$((failed + 1))
+            running=$((running - 1))
+        fi
+
+        backup_database "$db_name" &
+        running=$((running + 1))
+    done <<< "$databases"
+
+    while [ "$running" -gt 0 ]; do
+        wait -n || failed=$((failed + 1))
+        running=$((running - 1))
+    done
+
+    # Merge the per-database fragments into the manifest in one jq call
+    if command -v jq &> /dev/null && compgen -G "$SESSION_DIR/metadata/db-*.json" > /dev/null; then
+        local temp_manifest=$(mktemp)
+        jq --slurpfile dbs <(cat "$SESSION_DIR"/metadata/db-*.json) '.databases += $dbs' \
+           "$BACKUP_MANIFEST" > "$temp_manifest"
+        mv "$temp_manifest" "$BACKUP_MANIFEST"
+    fi
+
+    # Errors logged inside background jobs do not reach this shell's counter
+    BACKUP_ERRORS=$((BACKUP_ERRORS + failed))
+    log "Database backups finished ($failed failed)"
+}
+
 # Backup file storage with compression and encryption
 backup_filestore() {
     log "Starting filestore backup..."
@@ -344,6 +412,125 @@ backup_filestore() {
     return 0
 }
 
+# Find the manifest of the most recent earlier incremental filestore backup
+find_previous_filestore_manifest() {
+    find "$DR_SESSION_DIR" -path "*/backup_*/filestore/filestore-manifest.tsv.enc" 2>/dev/null \
+        | grep -v "/$SESSION_ID/" | sort -r | head -1
+}
+
+# Incremental, content-addressed filestore backup
+#
+# Odoo stores attachments as <db>/<xx>/<sha1-of-content> and never rewrites
+# them, so a blob seen in an earlier session does not need to be stored again.
+# Each session writes:
+#   filestore-manifest.tsv.enc  every file as: path, sha1 (or -), size, blob session, blob path
+#   filestore-delta.tar.gz.enc  only the blobs no earlier session holds
+# Restoring a session replays the deltas of every session its manifest
+# references (see restore_filestore in disaster-recovery.sh). A full backup is
+# forced once the oldest referenced session is DR_FILESTORE_FULL_INTERVAL_DAYS old,
+# which bounds how many sessions a restore depends on.
+backup_filestore_incremental() {
+    log "Starting incremental filestore backup..."
+
+    local fs_dir="$SESSION_DIR/filestore"
+    local work_dir="$SESSION_DIR/metadata/filestore"
+    local manifest_file="$fs_dir/filestore-manifest.tsv.enc"
+    local delta_archive="$fs_dir/filestore-delta.tar.gz.enc"
+
+    if [ ! -d "$ODOO_FILESTORE_PATH" ]; then
+        log_warning "Filestore directory not found: $ODOO_FILESTORE_PATH"
+        return 1
+    fi
+
+    mkdir -p "$work_dir"
+    : > "$work_dir/previous.tsv"
+
+    local previous_manifest base_session=""
+    previous_manifest=$(find_previous_filestore_manifest)
+    if [ -n "$previous_manifest" ]; then
+        if openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$previous_manifest" \
+            -out "$work_dir/previous.tsv" 2>/dev/null; then
+            base_session=$(cut -f4 "$work_dir/previous.tsv" | sort -u | head -1)
+        else
+            log_warning "Could not decrypt previous filestore manifest, taking a full filestore backup"
+            : > "$work_dir/previous.tsv"
+        fi
+    fi
+
+    # Rebase onto a full backup once the chain gets too old
+    if [ -n "$base_session" ]; then
+        local base_date cutoff_date
+        base_date=$(echo "$base_session" | cut -d'_' -f2)
+        cutoff_date=$(date -d "${DR_FILESTORE_FULL_INTERVAL_DAYS:-7} days ago" +%Y%m%d 2>/dev/null || \
+            date -v-"${DR_FILESTORE_FULL_INTERVAL_DAYS:-7}"d +%Y%m%d)
+        if [ "$base_date" \< "$cutoff_date" ]; then
+            log "Filestore chain starts at $base_session, taking a full filestore backup"
+            : > "$work_dir/previous.tsv"
+        fi
+    fi
+
+    # Current listing, then classify every file against the previous manifest
+    find "$ODOO_FILESTORE_PATH" -type f -printf '%P\t%s\n' | LC_ALL=C sort > "$work_dir/current.tsv"
+
+    awk -F'\t' -v OFS='\t' -v session="$SESSION_ID" \
+        -v manifest="$work_dir/manifest.tsv" -v delta="$work_dir/delta.lst" '
+        FILENAME == ARGV[1] { if ($2 != "-") known[$2] = $4 OFS $5; next }
+        {
+            path = $1; size = $2
+            n = split(path, parts, "/"); name = parts[n]
+            sha = (length(name) == 40 && name !~ /[^0-9a-f]/) ? name : "-"
+            if (sha != "-" && (sha in known)) {
+                print path, sha, size, known[sha] > manifest
+                next
+            }
+            # New blob (or a file that is not content-addressed): store it in this session
+            print path > delta
+            print path, sha, size, session, path > manifest
+            if (sha != "-") known[sha] = session OFS path
+        }' "$work_dir/previous.tsv" "$work_dir/current.tsv"
+    touch "$work_dir/manifest.tsv" "$work_dir/delta.lst"
+
+    local blobs_total blobs_new bytes_new
+    blobs_total=$(wc -l < "$work_dir/manifest.tsv")
+    blobs_new=$(wc -l < "$work_dir/delta.lst")
+    bytes_new=$(awk -F'\t' -v s="$SESSION_ID" '$4 == s { total += $3 } END { print total + 0 }' "$work_dir/manifest.tsv")
+
+    local delta_checksum manifest_checksum delta_status
+    tar -C "$ODOO_FILESTORE_PATH" -czf - -T "$work_dir/delta.lst" | encrypt_stream_to_file "$delta_archive" "$work_dir/delta.sha256"
+    delta_status=("${PIPESTATUS[@]}")
+    if [ "${delta_status[0]}" -ne 0 ] || [ "${delta_status[1]}" -ne 0 ]; then
+        log_error "Failed to archive new filestore blobs"
+        rm -f "$delta_archive"
+        return 1
+    fi
+
+    encrypt_stream_to_file "$manifest_file" "$work_dir/manifest.sha256" < "$work_dir/manifest.tsv"
+    delta_checksum=$(cat "$work_dir/delta.sha256")
+    manifest_checksum=$(cat "$work_dir/manifest.sha256")
+
+    local size
+    size=$(stat -f%z "$delta_archive" 2>/dev/null || stat -c%s "$delta_archive" 2>/dev/null || echo "0")
+
+    if command -v jq &> /dev/null; then
+        local temp_manifest=$(mktemp)
+        jq --arg file "$(basename "$delta_archive")" --arg size "$size" --arg checksum "$delta_checksum" \
+           --arg manifest "$(basename "$manifest_file")" --arg manifest_checksum "$manifest_checksum" \
+           --arg previous "$( [ -s "$work_dir/previous.tsv" ] && basename "$(dirname "$(dirname "$previous_manifest")")" )" \
+           --argjson total "$blobs_total" --argjson new "$blobs_new" --argjson bytes_new "$bytes_new" \
+           '.filestore = {"mode": "incremental", "file": $file, "size": $size, "checksum": $checksum,
+                          "manifest": $manifest, "manifest_checksum": $manifest_checksum,
+                          "previous_session": $previous, "blobs_total": $total,
+                          "blobs_new": $new, "bytes_new": $bytes_new}' \
+           "$BACKUP_MANIFEST" > "$temp_manifest"
+        mv "$temp_manifest" "$BACKUP_MANIFEST"
+    fi
+
+    rm -rf "$work_dir"
+
+    log "Successfully backed up filestore: $blobs_new new of $blobs_total files ($bytes_new bytes new, archive $size bytes)"
+    return 0
+}
+
 # Backup configurations
 backup_configurations() {
     log "Starting configuration backup..."
@@ -390,33 +577,47 @@ validate_backup() {
     
     local validation_errors=0
     
-    # Validate databases
+    # Validate databases by streaming the decrypted dump into pg_restore/tar
     for db_backup in "$SESSION_DIR"/databases/*.sql.enc; do
         if [ -f "$db_backup" ]; then
             local db_name
             db_name=$(basename "$db_backup" .sql.enc)
             
-            # Test decryption
-            local key
-            key=$(cat "$DR_ENCRYPTION_KEY")
-            local temp_file="$SESSION_DIR/test_decrypt_$db_name.sql"
+            local dump_format="custom"
+            if [ -f "$SESSION_DIR/metadata/db-${db_name}.json" ] && command -v jq &> /dev/null; then
+                dump_format=$(jq -r '.format // "custom"' "$SESSION_DIR/metadata/db-${db_name}.json")
+            fi
+            
+            local valid=1
+            if [ "$dump_format" = "directory" ]; then
+                openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$db_backup" 2>/dev/null \
+                    | tar -tf - 2>/dev/null | grep -q 'toc.dat$' || valid=0
+            else
+                openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$db_backup" 2>/dev/null \
+                    | pg_restore --list > /dev/null 2>&1 || valid=0
+            fi
             
-            if openssl enc -d -aes-256-cbc -in "$db_backup" -out "$temp_file" -k "$key" 2>/dev/null; then
-                # Test if it's a valid PostgreSQL dump
-                if head -n 10 "$temp_file" | grep -q "PostgreSQL database dump"; then
-                    log "Database backup validation passed: $db_name"
-                else
-                    log_error "Database backup validation failed: $db_name (not a valid PostgreSQL dump)"
-                    ((validation_errors++))
-                fi
-                rm -f "$temp_file"
+            if [ $valid -eq 1 ]; then
+                log "Database backup validation passed: $db_name"
             else
-                log_error "Database backup validation failed: $db_name (decryption failed)"
+                log_error "Database backup validation failed: $db_name (decryption failed or not a valid $dump_format dump)"
                 ((validation_errors++))
             fi
         fi
     done
     
+    # Validate incremental filestore delta and manifest
+    if [ -f "$SESSION_DIR/filestore/filestore-delta.tar.gz.enc" ]; then
+        if openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$SESSION_DIR/filestore/filestore-delta.tar.gz.enc" 2>/dev/null \
+                | tar -tzf - > /dev/null 2>&1 \
+            && openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$SESSION_DIR/filestore/filestore-manifest.tsv.enc" > /dev/null 2>&1; then
+            log "Filestore backup validation passed"
+        else
+            log_error "Filestore backup validation failed (delta archive or manifest unreadable)"
+            ((validation_errors++))
+        fi
+    fi
+    
     # Validate filestore
     if [ -f "$SESSION_DIR/filestore/filestore.tar.gz.enc" ]; then
         local key
@@ -607,10 +808,24 @@ cleanup_old_backups() {
     local cutoff_date
     cutoff_date=$(date -d "$DR_LOCAL_RETENTION_DAYS days ago" +%Y%m%d || date -v-"$DR_LOCAL_RETENTION_DAYS"d +%Y%m%d)
     
-    find "$DR_SESSION_DIR" -type d -name "backup_*" | while read -r session_dir; do
+    # Sessions whose filestore deltas the newest manifest still needs
+    local referenced_sessions=""
+    local latest_manifest
+    latest_manifest=$(find "$DR_SESSION_DIR" -path "*/backup_*/filestore/filestore-manifest.tsv.enc" 2>/dev/null | sort -r | head -1)
+    if [ -n "$latest_manifest" ]; then
+        referenced_sessions=$(openssl enc -d -aes-256-cbc -pass "file:$DR_ENCRYPTION_KEY" -in "$latest_manifest" 2>/dev/null \
+            | cut -f4 | sort -u)
+    fi
+    
+    find "$DR_SESSION_DIR" -maxdepth 1 -type d -name "backup_*" | while read -r session_dir; do
         local session_date
         session_date=$(basename "$session_dir" | cut -d'_' -f2)
         
+        if grep -qxF "$(basename "$session_dir")" <<< "$referenced_sessions"; then
+            log_debug "Keeping $(basename "$session_dir"): referenced by the latest filestore manifest"
+            continue
+        fi
+        
         if [ "$session_date" \< "$cutoff_date" ]; then
             log "Removing old backup session: $(basename "$session_dir")"
             rm -rf "$session_dir"
@@ -723,15 +938,15 @@ main() {
     log "Starting database backups..."
     local databases
     if databases=$(get_tenant_databases); then
-        while IFS= read -r db_name; do
-            if [ -n "$db_name" ]; then
-                backup_database "$db_name"
-            fi
-        done <<< "$databases"
+        backup_databases "$databases"
     fi
     
     # Backup filestore
-    backup_filestore
+    if [ "${DR_FILESTORE_MODE:-incremental}" = "incremental" ]; then
+        backup_filestore_incremental
+    else
+        backup_filestore
+    fi
     
     # Backup configurations
     backup_configurations
@@ -0,0 +1,244 @@
+# log_transfer_api/models/log_tail_reader.py
+
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+import re
+from bisect import bisect_left, insort
+from datetime import datetime
+
+_logger = logging.getLogger(__name__)
+
+# "2024-05-01 10:00:00,123 7 INFO kdoo_acme odoo.http: message"
+RECORD_HEAD = re.compile(
+    rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) '  # timestamp
+    rb'(\d+) '  # process id
+    rb'(\w+) '  # log level
+    rb'(\S+) '  # database ("?" when none)
+    rb'([^\s:]+):? ?'  # logger name
+    rb'(.*)'  # message
+)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class LogTailReader:
+    """
+    Newest-first reader for a (possibly multi-GB) Odoo log file.
+
+    Reads fixed-size blocks backwards from the end, so a page costs what it
+    returns rather than the file size. Date ranges are resolved with a binary
+    search over byte offsets; every probe is remembered as a (offset, timestamp)
+    checkpoint in a small JSON index next to the Odoo data dir, keyed on the
+    file's inode and first bytes so a rotated or truncated file starts over.
+    """
+
+    BLOCK_SIZE = 64 * 1024
+    HEAD_BYTES = 256
+    MAX_CHECKPOINTS = 1024
+
+    def __init__(self, path, index_dir=None):
+        self.path = path
+        self.index_dir = index_dir
+        self._checkpoints = None
+        self._dirty = False
+
+    # ================= CHECKPOINT INDEX =================
+
+    def _index_path(self):
+        digest = hashlib.sha1(os.path.realpath(self.path).encode()).hexdigest()
+        return os.path.join(self.index_dir, f'{digest}.json')
+
+    def _signature(self, f):
+        stat = os.fstat(f.fileno())
+        f.seek(0)
+        head = hashlib.sha1(f.read(self.HEAD_BYTES)).hexdigest()
+        return {'dev': stat.st_dev, 'ino': stat.st_ino, 'head': head}, stat.st_size
+
+    def _load_index(self, f):
+        signature, size = self._signature(f)
+        self._signature_data = signature
+        self._checkpoints = []
+        if not self.index_dir:
+            return size
+        try:
+            with open(self._index_path()) as index_file:
+                data = json.load(index_file)
+            if data.get('signature') == signature:
+                self._checkpoints = [
+                    tuple(point) for point in data.get('checkpoints', []) if point[0] < size
+                ]
+        except (OSError, ValueError):
+            pass
+        return size
+
+    def _save_index(self):
+        if not self.index_dir or not self._dirty:
+            return
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_path = f'{self._index_path()}.tmp'
+            with open(tmp_path, 'w') as index_file:
+                json.dump({'signature': self._signature_data, 'checkpoints': self._checkpoints}, index_file)
+            os.replace(tmp_path, self._index_path())
+            self._dirty = False
+        except OSError as e:
+            _logger.warning(f"Could not save log offset index for {self.path}: {e}")
+
+    def _remember(self, offset, timestamp):
+        point = (offset, timestamp)
+        index = bisect_left(self._checkpoints, point)
+        if index < len(self._checkpoints) and self._checkpoints[index][0] == offset:
+            return
+        insort(self._checkpoints, point)
+        if len(self._checkpoints) > self.MAX_CHECKPOINTS:
+            # Thin out evenly rather than forgetting a whole region of the file
+            self._checkpoints = self._checkpoints[::2]
+        self._dirty = True
+
+    # ================= FORWARD PROBES =================
+
+    def _record_at_or_after(self, f, offset, size):
+        """(offset, timestamp) of the first record head starting at or after ``offset``"""
+        if offset >= size:
+            return None, None
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+        else:
+            f.seek(0)
+        while True:
+            position = f.tell()
+            if position >= size:
+                return None, None
+            line = f.readline()
+            if not line:
+                return None, None
+            match = RECORD_HEAD.match(line)
+            if match:
+                timestamp = match.group(1).decode()
+                self._remember(position, timestamp)
+                return position, timestamp
+
+    def find_offset(self, f, size, target, after=False):
+        """
+        Byte offset of the first record with timestamp >= ``target``
+        (> ``target`` when ``after``), or ``size`` if there is none.
+        """
+        def before_target(timestamp):
+            return timestamp <= target if after else timestamp < target
+
+        lo, hi = 0, size
+        # Narrow the window with what earlier searches learnt
+        for offset, timestamp in self._checkpoints:
+            if before_target(timestamp):
+                lo = max(lo, offset + 1)
+            else:
+                hi = min(hi, offset)
+                break
+
+        while hi - lo > self.BLOCK_SIZE:
+            mid = (lo + hi) // 2
+            offset, timestamp = self._record_at_or_after(f, mid, size)
+            if offset is None or offset >= hi or not before_target(timestamp):
+                hi = mid
+            else:
+                lo = offset + 1
+
+        offset, timestamp = self._record_at_or_after(f, lo, size)
+        while offset is not None and before_target(timestamp):
+            offset, timestamp = self._record_at_or_after(f, offset + 1, size)
+        return size if offset is None else offset
+
+    # ================= REVERSE ITERATION =================
+
+    def _iter_lines_reverse(self, f, start, end):
+        """Yield (offset, line) from ``end`` back to ``start``, reading whole blocks"""
+        position = end
+        remainder = b''
+        while position > start:
+            read_size = min(self.BLOCK_SIZE, position - start)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+            lines = block.split(b'\n')
+            # The first piece may continue in the previous block
+            remainder = lines.pop(0)
+            line_end = position + len(block)
+            for line in reversed(lines):
+                line_end -= len(line)
+                yield line_end, line
+                line_end -= 1
+        if remainder:
+            yield start, remainder
+
+    def iter_records(self, f, start, end):
+        """Yield (offset, head match, full text) newest first; continuation lines stay with their record"""
+        continuation = []
+        for offset, line in self._iter_lines_reverse(f, start, end):
+            match = RECORD_HEAD.match(line)
+            if not match:
+                if line.strip():
+                    continuation.append(line)
+                continue
+            text = line
+            if continuation:
+                text = b'\n'.join([line] + continuation[::-1])
+                continuation = []
+            yield offset, match, text
+
+    # ================= QUERIES =================
+
+    def read(self, accept, limit=100, offset=0, start_date=None, end_date=None, before=None,
+             max_scan_bytes=256 * 1024 * 1024):
+        """
+        Newest-first page of records accepted by ``accept(match, text)``.
+
+        Args:
+            accept: Filter called with the record head match and its full text
+            limit: Records to return
+            offset: Accepted records to skip first
+            start_date / end_date: 'YYYY-MM-DD HH:MM:SS' bounds (inclusive)
+            before: Only read records starting before this byte offset (page cursor)
+            max_scan_bytes: Stop after scanning this much, returning a cursor to continue
+
+        Returns:
+            tuple: (list of (offset, match, text), byte offset the next page ends at
+                    or None when the range is exhausted, number of records skipped)
+        """
+        results = []
+        with open(self.path, 'rb') as f:
+            size = self._load_index(f)
+            start = self.find_offset(f, size, start_date) if start_date else 0
+            end = self.find_offset(f, size, end_date, after=True) if end_date else size
+            if before is not None:
+                end = min(end, before)
+
+            skipped = 0
+            next_offset = None
+            # Start of the last record handled: everything from here on is done
+            boundary = end
+            for record_offset, match, text in self.iter_records(f, start, end):
+                if end - record_offset > max_scan_bytes:
+                    next_offset = boundary
+                    break
+                boundary = record_offset
+                if not accept(match, text):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                results.append((record_offset, match, text))
+                if len(results) >= limit:
+                    next_offset = record_offset if record_offset > start else None
+                    break
+            self._save_index()
+        return results, next_offset, skipped
+
+
+def parse_timestamp(match):
+    """Datetime of a record head match"""
+    timestamp = datetime.strptime(match.group(1).decode(), TIMESTAMP_FORMAT)
+    return timestamp.replace(microsecond=int(match.group(2)) * 1000)
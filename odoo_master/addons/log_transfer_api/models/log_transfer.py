@@ -7,18 +7,165 @@ import os
 import re
 import threading
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 # Third-party imports
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 
 # Odoo imports
 from odoo import models, fields, api, http
 from odoo.http import request
 
+# Local imports
+from .log_tail_reader import LogTailReader, parse_timestamp
+
 _logger = logging.getLogger(__name__)
 
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+LOG_INDEX_NAME = 'ir_logging_create_date_level_index'
+
+# Per-database connection pools, shared by the threads of this server process
+_POOL_MAX_DATABASES = 32
+_POOL_MAX_CONNECTIONS = 4
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+# Connections each pool has lent out; an evicted pool is only closed once
+# its last connection comes back
+_borrowed = {}
+_retired_pools = set()
+# Databases whose ir_logging index was checked (or is being built) by this process
+_indexed_databases = set()
+_index_lock = threading.Lock()
+
+
+def _get_pool(database_name):
+    """Pool of a tenant database; call with _pools_lock held"""
+    import odoo.tools.config as config
+    
+    pool = _pools.get(database_name)
+    if pool is not None:
+        _pools.move_to_end(database_name)
+        return pool
+    
+    pool = ThreadedConnectionPool(
+        0, _POOL_MAX_CONNECTIONS,
+        host=config.get('db_host', 'localhost'),
+        port=config.get('db_port', 5432),
+        user=config.get('db_user', 'odoo'),
+        password=config.get('db_password', ''),
+        database=database_name
+    )
+    _pools[database_name] = pool
+    # Keep the least recently used tenants from holding connections forever
+    while len(_pools) > _POOL_MAX_DATABASES:
+        _, stale_pool = _pools.popitem(last=False)
+        if _borrowed.get(stale_pool):
+            _retired_pools.add(stale_pool)
+        else:
+            stale_pool.closeall()
+    return pool
+
+
+def _release(pool):
+    """Count a returned connection; closes a retired pool once nothing is borrowed"""
+    with _pools_lock:
+        _borrowed[pool] -= 1
+        if _borrowed[pool]:
+            return
+        del _borrowed[pool]
+        if pool in _retired_pools:
+            _retired_pools.discard(pool)
+            pool.closeall()
+
+
+@contextmanager
+def tenant_connection(database_name):
+    """Borrow a pooled autocommit connection to a tenant database"""
+    with _pools_lock:
+        pool = _get_pool(database_name)
+        _borrowed[pool] = _borrowed.get(pool, 0) + 1
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _release(pool)
+        raise
+    broken = False
+    try:
+        conn.autocommit = True
+        yield conn
+    except psycopg2.Error:
+        broken = conn.closed != 0 or conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+        raise
+    finally:
+        try:
+            pool.putconn(conn, close=broken)
+        finally:
+            _release(pool)
+
+
+def ensure_log_index(cr, concurrently=False):
+    """
+    Composite index serving the create_date range/ordering and level filter.
+    
+    A CONCURRENTLY build that failed or was interrupted leaves an INVALID
+    index behind, which is dropped and built again. ``concurrently`` needs
+    an autocommit connection and only one builder at a time.
+    """
+    cr.execute(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (LOG_INDEX_NAME,)
+    )
+    row = cr.fetchone()
+    if row and row[0]:
+        return
+    keyword = ' CONCURRENTLY' if concurrently else ''
+    if row:
+        _logger.warning(f"Rebuilding invalid index {LOG_INDEX_NAME}")
+        cr.execute(f"DROP INDEX{keyword} IF EXISTS {LOG_INDEX_NAME}")
+    cr.execute(f"CREATE INDEX{keyword} IF NOT EXISTS {LOG_INDEX_NAME} ON ir_logging (create_date, level)")
+
+
+def _build_log_index(database_name):
+    """Background build of the ir_logging index in a tenant without this module"""
+    try:
+        with tenant_connection(database_name) as conn, conn.cursor() as cur:
+            # One builder per database across server processes: an index another
+            # process is still building concurrently also shows as invalid
+            cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (LOG_INDEX_NAME,))
+            if not cur.fetchone()[0]:
+                return
+            try:
+                ensure_log_index(cur, concurrently=True)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (LOG_INDEX_NAME,))
+    except Exception as e:
+        _logger.warning(f"Could not build ir_logging index in {database_name}: {e}")
+        # Let a later request try again
+        with _index_lock:
+            _indexed_databases.discard(database_name)
+
+
+def schedule_log_index(database_name):
+    """Make sure the ir_logging index of a tenant exists, off the request path"""
+    with _index_lock:
+        if database_name in _indexed_databases:
+            return
+        _indexed_databases.add(database_name)
+    threading.Thread(
+        target=_build_log_index, args=(database_name,), name=f'log-index-{database_name}', daemon=True
+    ).start()
+
+
+class IrLogging(models.Model):
+    _inherit = 'ir.logging'
+
+    def init(self):
+        ensure_log_index(self.env.cr)
+
+
 class LogTransfer(models.Model):
     _name = 'log.transfer'
     _description = 'Log Transfer Configuration'
@@ -177,8 +324,8 @@ class LogTransfer(models.Model):
             _logger.error(f"Admin privilege check error: {str(e)}")
             return False
 
-    def _get_available_log_sources(self, database_name):
-        sources = []
+    def _log_file_paths(self, database_name):
+        import odoo.tools.config as config
         
         log_paths = [
             f'/var/log/odoo/odoo-{database_name}.log',
@@ -186,8 +333,16 @@ class LogTransfer(models.Model):
             f'/opt/odoo/logs/{database_name}.log',
             '/var/log/odoo/odoo.log'
         ]
+        # The file this server actually writes to (--logfile)
+        logfile = config.get('logfile')
+        if logfile and logfile not in log_paths:
+            log_paths.append(logfile)
+        return log_paths
+
+    def _get_available_log_sources(self, database_name):
+        sources = []
         
-        for path in log_paths:
+        for path in self._log_file_paths(database_name):
             if os.path.exists(path):
                 sources.append({
                     'type': 'file',
@@ -245,7 +400,7 @@ class LogTransfer(models.Model):
             return False
 
     @api.model
-    def get_logs(self, token, limit=100, offset=0, level='INFO', start_date=None, end_date=None):
+    def get_logs(self, token, limit=100, offset=0, level='INFO', start_date=None, end_date=None, cursor=None):
         log_config = self.search([('auth_token', '=', token)], limit=1)
         if not log_config:
             return {'error': 'Invalid token'}
@@ -253,15 +408,27 @@ class LogTransfer(models.Model):
         try:
             all_logs = []
             
-            db_logs = self._fetch_database_logs(
-                log_config.database_name, limit, offset, level, start_date, end_date
-            )
-            all_logs.extend(db_logs)
-            
-            file_logs = self._fetch_file_logs(
-                log_config.database_name, limit, offset, level, start_date, end_date
-            )
-            all_logs.extend(file_logs)
+            # Cursor: {"database": "<create_date>|<id>", "<log path>": "<path>@<offset>", ...}
+            # per source; "" starts a source from the newest record, null marks it exhausted
+            cursors = {}
+            if cursor:
+                try:
+                    cursors = json.loads(cursor)
+                except ValueError:
+                    return {'error': 'Invalid cursor'}
+            
+            # Source -> (logs in read order, cursor after that whole page)
+            pages = {}
+            if not self._source_exhausted(cursors, 'database'):
+                pages['database'] = self._fetch_database_logs(
+                    log_config.database_name, limit, offset, level, start_date, end_date,
+                    cursor=cursors.get('database')
+                )
+            pages.update(self._fetch_file_logs(
+                log_config.database_name, limit, offset, level, start_date, end_date, cursors=cursors
+            ))
+            for source_logs, _ in pages.values():
+                all_logs.extend(source_logs)
             
             if log_config.include_system_logs:
                 system_logs = self._fetch_system_logs(
@@ -274,12 +441,17 @@ class LogTransfer(models.Model):
             if limit:
                 all_logs = all_logs[:limit]
             
+            next_cursors = self._next_cursors(pages, all_logs, cursors)
+            for log in all_logs:
+                log.pop('_cursor', None)
+            
             return {
                 'success': True,
                 'logs': all_logs,
                 'total': len(all_logs),
                 'tenant': log_config.tenant_name,
                 'database': log_config.database_name,
+                'next_cursor': json.dumps(next_cursors) if any(value is not None for value in next_cursors.values()) else None,
                 'sources_checked': ['database', 'files', 'system']
             }
             
@@ -287,167 +459,213 @@ class LogTransfer(models.Model):
             _logger.error(f"Error fetching logs: {str(e)}")
             return {'error': str(e)}
 
-    def _fetch_database_logs(self, database_name, limit=100, offset=0, level='INFO', start_date=None, end_date=None):
+    @staticmethod
+    def _source_exhausted(cursors, source):
+        """True if an earlier page already read everything of this source"""
+        return source in cursors and cursors[source] is None
+    
+    @staticmethod
+    def _next_cursors(pages, page_logs, cursors):
+        """
+        Cursor of every source after the merged, truncated page.
+        
+        Each source continues after the last of its records the page actually
+        returned; records cut by the truncation come again on the next page.
+        A source with nothing on this page keeps its incoming cursor.
+        """
+        returned = {id(log) for log in page_logs}
+        next_cursors = {source: None for source, value in cursors.items() if value is None}
+        for source, (source_logs, page_cursor) in pages.items():
+            kept = 0
+            while kept < len(source_logs) and id(source_logs[kept]) in returned:
+                kept += 1
+            if kept == len(source_logs):
+                next_cursors[source] = page_cursor
+            elif kept == 0:
+                next_cursors[source] = cursors.get(source) or ''
+            else:
+                next_cursors[source] = source_logs[kept - 1]['_cursor']
+        return next_cursors
+    
+    def _fetch_database_logs(self, database_name, limit=100, offset=0, level='INFO', start_date=None, end_date=None,
+                             cursor=None):
+        """
+        Newest-first page of ir_logging rows.
+        
+        ``cursor`` is the "<create_date>|<id>" of the last row of the previous page;
+        with it the page is a keyset range scan instead of an OFFSET.
+        
+        Returns:
+            tuple: (logs, cursor for the next page or None when exhausted)
+        """
         logs = []
+        next_cursor = None
+        # Tenants without this module installed get the index built in the background
+        schedule_log_index(database_name)
         try:
-            import odoo.tools.config as config
-            
-            db_host = config.get('db_host', 'localhost')
-            db_port = config.get('db_port', 5432)
-            db_user = config.get('db_user', 'odoo')
-            db_password = config.get('db_password', '')
-            
-            conn = psycopg2.connect(
-                host=db_host,
-                port=db_port,
-                user=db_user,
-                password=db_password,
-                database=database_name
-            )
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                query = """
-                    SELECT id, create_date, name, level, message, path, func, line, dbname
-                    FROM ir_logging 
-                    WHERE 1=1
-                """
-                params = []
-                
-                if level and level != 'ALL':
-                    level_order = {'DEBUG': 0, 'INFO': 1, 'WARNING': 2, 'ERROR': 3, 'CRITICAL': 4}
-                    min_level = level_order.get(level, 1)
-                    query += " AND CASE "
-                    query += " WHEN level = 'DEBUG' THEN 0"
-                    query += " WHEN level = 'INFO' THEN 1"
-                    query += " WHEN level = 'WARNING' THEN 2"
-                    query += " WHEN level = 'ERROR' THEN 3"
-                    query += " WHEN level = 'CRITICAL' THEN 4"
-                    query += " ELSE 1 END >= %s"
-                    params.append(min_level)
-                
-                if start_date:
-                    query += " AND create_date >= %s"
-                    params.append(start_date)
+            with tenant_connection(database_name) as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    query = """
+                        SELECT id, create_date, name, level, message, path, func, line, dbname
+                        FROM ir_logging 
+                        WHERE 1=1
+                    """
+                    params = []
                     
-                if end_date:
-                    query += " AND create_date <= %s"
-                    params.append(end_date)
-                
-                query += " ORDER BY create_date DESC"
-                
-                if limit:
-                    query += " LIMIT %s"
-                    params.append(limit)
+                    if level and level != 'ALL':
+                        # Unknown levels used to rank as INFO
+                        min_index = LOG_LEVELS.index(level) if level in LOG_LEVELS else 1
+                        query += " AND level IN %s"
+                        params.append(tuple(LOG_LEVELS[min_index:]))
                     
-                if offset:
-                    query += " OFFSET %s"
-                    params.append(offset)
-                
-                cur.execute(query, params)
-                records = cur.fetchall()
-                
-                for record in records:
-                    logs.append({
-                        'id': record['id'],
-                        'timestamp': record['create_date'].isoformat() if record['create_date'] else None,
-                        'level': record['level'],
-                        'message': record['message'],
-                        'logger_name': record['name'],
-                        'function': record['func'],
-                        'line': record['line'],
-                        'path': record['path'],
-                        'database': record['dbname'] or database_name,
-                        'source': 'database'
-                    })
-            
-            conn.close()
+                    if start_date:
+                        query += " AND create_date >= %s"
+                        params.append(start_date)
+                        
+                    if end_date:
+                        query += " AND create_date <= %s"
+                        params.append(end_date)
+                    
+                    if cursor:
+                        cursor_date, _, cursor_id = cursor.rpartition('|')
+                        query += " AND (create_date, id) < (%s, %s)"
+                        params.extend([cursor_date, int(cursor_id)])
+                    
+                    query += " ORDER BY create_date DESC, id DESC"
+                    
+                    if limit:
+                        query += " LIMIT %s"
+                        params.append(limit)
+                        
+                    if offset and not cursor:
+                        query += " OFFSET %s"
+                        params.append(offset)
+                    
+                    cur.execute(query, params)
+                    records = cur.fetchall()
+                    
+                    for record in records:
+                        logs.append({
+                            '_cursor': f"{record['create_date'].isoformat()}|{record['id']}",
+                            'id': record['id'],
+                            'timestamp': record['create_date'].isoformat() if record['create_date'] else None,
+                            'level': record['level'],
+                            'message': record['message'],
+                            'logger_name': record['name'],
+                            'function': record['func'],
+                            'line': record['line'],
+                            'path': record['path'],
+                            'database': record['dbname'] or database_name,
+                            'source': 'database'
+                        })
+                    
+                    if limit and len(records) == limit:
+                        last = records[-1]
+                        next_cursor = f"{last['create_date'].isoformat()}|{last['id']}"
             
         except Exception as e:
             _logger.error(f"Database log fetch error: {str(e)}")
             
-        return logs
+        return logs, next_cursor
 
-    def _fetch_file_logs(self, database_name, limit=100, offset=0, level='INFO', start_date=None, end_date=None):
-        logs = []
-        
-        log_paths = [
-            f'/var/log/odoo/odoo-{database_name}.log',
-            f'/var/log/odoo/{database_name}.log',
-            f'/opt/odoo/logs/{database_name}.log',
-            '/var/log/odoo/odoo.log'
-        ]
+    def _fetch_file_logs(self, database_name, limit=100, offset=0, level='INFO', start_date=None, end_date=None,
+                         cursors=None):
+        """Log path -> (newest-first page of that file, byte cursor to continue it or None)"""
+        pages = {}
+        cursors = cursors or {}
         
-        for log_path in log_paths:
-            if os.path.exists(log_path):
+        for log_path in self._log_file_paths(database_name):
+            if os.path.exists(log_path) and not self._source_exhausted(cursors, log_path):
                 try:
-                    logs.extend(self._parse_log_file(
-                        log_path, database_name, limit, level, start_date, end_date
-                    ))
+                    pages[log_path] = self._parse_log_file(
+                        log_path, database_name, limit, level, start_date, end_date,
+                        offset=offset, cursor=cursors.get(log_path)
+                    )
                 except Exception as e:
                     _logger.error(f"Error parsing log file {log_path}: {str(e)}")
         
-        return logs
+        return pages
 
-    def _parse_log_file(self, log_path, database_name, limit=100, level='INFO', start_date=None, end_date=None):
+    def _log_index_dir(self):
+        import odoo.tools.config as config
+        return os.path.join(config.get('data_dir') or '/tmp', 'log_transfer_index')
+
+    @staticmethod
+    def _log_bound(value):
+        """ISO date(time) -> the 'YYYY-MM-DD HH:MM:SS' form Odoo log lines start with"""
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+    def _parse_log_file(self, log_path, database_name, limit=100, level='INFO', start_date=None, end_date=None,
+                        offset=0, cursor=None):
+        """
+        Read one page of a tenant's records from an Odoo log file, newest first.
+        
+        The file is read backwards in blocks from the end (or from ``cursor``) and
+        date bounds are found by binary search, so the cost follows the page size,
+        not the file size. When the current file runs out, the page continues in its
+        rotated predecessor (``<log>.1``).
+        
+        Returns:
+            tuple: (logs, cursor for the next page or None)
+        """
         logs = []
+        level_order = {'DEBUG': 0, 'INFO': 1, 'WARNING': 2, 'ERROR': 3, 'CRITICAL': 4}
+        min_level = level_order.get(level, 1)
+        database_lower = database_name.lower()
         
-        log_pattern = re.compile(
-            r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) '  # timestamp
-            r'(\d+) '  # process id
-            r'(\w+) '  # log level
-            r'([^\s]+) '  # logger name
-            r'(.+)'  # message
-        )
+        def accept(match, text):
+            if level != 'ALL' and level_order.get(match.group(4).decode(), 1) < min_level:
+                return False
+            return match.group(5).decode() == database_name or database_lower in text.decode('utf-8', 'ignore').lower()
         
-        try:
-            with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-                
-                for line in reversed(lines[-10000:]):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    match = log_pattern.match(line)
-                    if match:
-                        timestamp_str, pid, log_level, logger_name, message = match.groups()
-                        
-                        try:
-                            timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-                        except:
-                            timestamp = datetime.now()
-                        
-                        level_order = {'DEBUG': 0, 'INFO': 1, 'WARNING': 2, 'ERROR': 3, 'CRITICAL': 4}
-                        if level != 'ALL':
-                            min_level = level_order.get(level, 1)
-                            current_level = level_order.get(log_level, 1)
-                            if current_level < min_level:
-                                continue
-                        
-                        if start_date and timestamp < datetime.fromisoformat(start_date):
-                            continue
-                        if end_date and timestamp > datetime.fromisoformat(end_date):
-                            continue
-                        
-                        if database_name.lower() in message.lower() or database_name in logger_name:
-                            logs.append({
-                                'timestamp': timestamp.isoformat(),
-                                'level': log_level,
-                                'message': message,
-                                'logger_name': logger_name,
-                                'pid': pid,
-                                'database': database_name,
-                                'source': 'file',
-                                'file_path': log_path
-                            })
-                            
-                            if len(logs) >= limit:
-                                break
-                    
-        except Exception as e:
-            _logger.error(f"Log file parsing error: {str(e)}")
+        # Cursor: "<path>@<byte offset>" of the record the previous page ended at
+        paths = [log_path, f'{log_path}.1']
+        before = None
+        if cursor:
+            cursor_path, _, cursor_offset = cursor.rpartition('@')
+            if cursor_path in paths:
+                paths = paths[paths.index(cursor_path):]
+                before = int(cursor_offset) if cursor_offset else None
+            offset = 0
         
-        return logs
+        start, end = self._log_bound(start_date), self._log_bound(end_date)
+        remaining, to_skip = limit, offset
+        next_cursor = None
+        for path in paths:
+            if not os.path.exists(path):
+                break
+            if remaining <= 0:
+                # Page filled exactly at the start of the newer file
+                next_cursor = f'{path}@'
+                break
+            reader = LogTailReader(path, index_dir=self._log_index_dir())
+            records, next_offset, skipped = reader.read(
+                accept, limit=remaining, offset=to_skip, start_date=start, end_date=end, before=before
+            )
+            before = None
+            to_skip -= skipped
+            remaining -= len(records)
+            
+            for record_offset, match, text in records:
+                lines = text.decode('utf-8', 'ignore').split('\n')
+                message = match.group(7).decode('utf-8', 'ignore')
+                logs.append({
+                    '_cursor': f'{path}@{record_offset}',
+                    'timestamp': parse_timestamp(match).isoformat(),
+                    'level': match.group(4).decode(),
+                    'message': '\n'.join([message] + lines[1:]),
+                    'logger_name': match.group(6).decode(),
+                    'pid': match.group(3).decode(),
+                    'database': database_name,
+                    'source': 'file',
+                    'file_path': path
+                })
+            
+            if next_offset is not None:
+                next_cursor = f'{path}@{next_offset}'
+                break
+        
+        return logs, next_cursor
 
     def _fetch_system_logs(self, database_name, limit=50, offset=0, level='INFO'):
         logs = []
@@ -531,22 +749,7 @@ class LogTransfer(models.Model):
         }
         
         try:
-            import odoo.tools.config as config
-            
-            db_host = config.get('db_host', 'localhost')
-            db_port = config.get('db_port', 5432)
-            db_user = config.get('db_user', 'odoo')
-            db_password = config.get('db_password', '')
-            
-            conn = psycopg2.connect(
-                host=db_host,
-                port=db_port,
-                user=db_user,
-                password=db_password,
-                database=database_name
-            )
-            
-            with conn.cursor() as cur:
+            with tenant_connection(database_name) as conn, conn.cursor() as cur:
                 cur.execute("SELECT COUNT(*) FROM ir_logging")
                 stats['total_logs'] = cur.fetchone()[0]
                 
@@ -566,8 +769,6 @@ class LogTransfer(models.Model):
                 """)
                 stats['last_week'] = cur.fetchone()[0]
             
-            conn.close()
-            
         except Exception as e:
             _logger.error(f"Database stats error: {str(e)}")
         
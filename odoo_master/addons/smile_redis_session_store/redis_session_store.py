@@ -5,19 +5,31 @@
 # Inspired by aek's Gist (<https://gist.github.com/aek/efb0f9dd8935471f9070>).
 
 # Standard library imports
-import sys
+import hashlib
+import logging
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
 
 # Odoo imports
 from odoo import http, tools
 from odoo.tools import lazy_property
 
-if sys.version_info > (3,):
-    import _pickle as cPickle
-    unicode = str
-else:
-    import cPickle
+_logger = logging.getLogger(__name__)
 
 SESSION_TIMEOUT = 60 * 60 * 24 * 7  # 1 weeks in seconds
+REFRESH_INTERVAL = 60 * 60  # skip EXPIRE while the TTL is within this of the timeout
+COMPRESS_THRESHOLD = 1024  # payloads from this size (bytes) are zlib-compressed
+COMPRESS_LEVEL = 3
+STATS_FLUSH_INTERVAL = 10  # seconds between pushes of the local counters to Redis
+MAX_TRACKED_SESSIONS = 10000
+
+# One-byte marker in front of the payload. Sessions written before the marker
+# existed are plain pickles, whose first byte is always b'\x80'.
+FORMAT_PICKLE = b'P'
+FORMAT_ZLIB = b'Z'
 
 
 def is_redis_session_store_activated():
@@ -33,42 +45,126 @@ except ImportError:
             'apt install python3-redis')
 
 
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """Connection pool shared by every store of this process (redis-py resets it after fork)"""
+    params = (
+        tools.config.get('redis_host', 'localhost'),
+        int(tools.config.get('redis_port', 6379)),
+        int(tools.config.get('redis_dbindex', 1)),
+        tools.config.get('redis_pass', None),
+    )
+    with _pools_lock:
+        pool = _pools.get(params)
+        if pool is None:
+            host, port, db, password = params
+            pool = redis.BlockingConnectionPool(
+                host=host, port=port, db=db, password=password,
+                max_connections=int(tools.config.get('redis_max_connections', 50)),
+                timeout=int(tools.config.get('redis_pool_timeout', 5)),
+                socket_keepalive=True,
+            )
+            _pools[params] = pool
+        return pool
+
+
+def dumps(data):
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) >= COMPRESS_THRESHOLD:
+        return FORMAT_ZLIB + zlib.compress(payload, COMPRESS_LEVEL)
+    return FORMAT_PICKLE + payload
+
+
+def loads(data):
+    marker, payload = data[:1], data[1:]
+    if marker == FORMAT_ZLIB:
+        return pickle.loads(zlib.decompress(payload))
+    if marker == FORMAT_PICKLE:
+        return pickle.loads(payload)
+    return pickle.loads(data)
+
+
 class RedisSessionStore(http.FilesystemSessionStore):
 
     def __init__(self, *args, **kwargs):
         super(RedisSessionStore, self).__init__(*args, **kwargs)
         self.expire = kwargs.get('expire', SESSION_TIMEOUT)
         self.key_prefix = kwargs.get('key_prefix', '')
-        self.redis = redis.Redis(
-            host=tools.config.get('redis_host', 'localhost'),
-            port=int(tools.config.get('redis_port', 6379)),
-            db=int(tools.config.get('redis_dbindex', 1)),
-            password=tools.config.get('redis_pass', None))
+        self.refresh_interval = min(
+            int(tools.config.get('redis_session_refresh', REFRESH_INTERVAL)), self.expire)
+        self.redis = redis.Redis(connection_pool=get_connection_pool())
         self._is_redis_server_running()
 
+        # Digest of the payload last read or written per session id, so an
+        # unchanged session is not written back
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._last_flush = time.time()
+        self.stats_key = f'{self.key_prefix}session_store:stats'
+
+    # ================= STORE API =================
+
     def save(self, session):
+        started = time.perf_counter()
         key = self._get_session_key(session.sid)
-        data = cPickle.dumps(dict(session))
-        self.redis.setex(name=key, value=data, time=self.expire)
+        data = dumps(dict(session))
+        digest = hashlib.sha1(data).digest()
+        # Nothing changed: keep it alive without resending the payload, unless
+        # the key is gone (expired or deleted by another process) meanwhile
+        if self._get_digest(session.sid) == digest and self.redis.expire(key, self.expire):
+            self._count('writes_skipped')
+        else:
+            self.redis.setex(name=key, value=data, time=self.expire)
+            self._set_digest(session.sid, digest)
+            self._count('writes')
+            self._count('bytes_written', len(data))
+        self._count('save_ms', (time.perf_counter() - started) * 1000)
+        self._flush_stats()
 
     def delete(self, session):
         key = self._get_session_key(session.sid)
         self.redis.delete(key)
+        self._drop_digest(session.sid)
+        self._count('deletes')
 
     def _get_session_key(self, sid):
         key = self.key_prefix + sid
-        if isinstance(key, unicode):
+        if isinstance(key, str):
             key = key.encode('utf-8')
         return key
 
     def get(self, sid):
+        started = time.perf_counter()
         key = self._get_session_key(sid)
-        data = self.redis.get(key)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.ttl(key)
+        data, ttl = pipe.execute()
         if data:
-            self.redis.setex(name=key, value=data, time=self.expire)
-            data = cPickle.loads(data)
+            # Sliding expiry: only touch the key once it has aged past the
+            # refresh interval, and never rewrite the payload for it
+            if ttl < self.expire - self.refresh_interval:
+                self.redis.expire(key, self.expire)
+                self._count('ttl_refreshes')
+            self._set_digest(sid, hashlib.sha1(data).digest())
+            try:
+                data = loads(data)
+                self._count('hits')
+            except Exception as e:
+                _logger.warning("Discarding unreadable session %s: %s", sid, e)
+                data = {}
+                self._count('errors')
         else:
+            # The next save must write the payload, not just refresh a missing key
+            self._drop_digest(sid)
             data = {}
+            self._count('misses')
+        self._count('get_ms', (time.perf_counter() - started) * 1000)
+        self._flush_stats()
         return self.session_class(data, sid, False)
 
     def _is_redis_server_running(self):
@@ -77,11 +173,73 @@ class RedisSessionStore(http.FilesystemSessionStore):
         except redis.ConnectionError:
             raise redis.ConnectionError('Redis server is not responding')
 
-    def vacuum(self):
+    def vacuum(self, *args, **kwargs):
         # Override to ignore file unlink
         # because sessions are not stored in files
         pass
 
+    # ================= WRITE TRACKING =================
+
+    def _get_digest(self, sid):
+        with self._lock:
+            return self._digests.get(sid)
+
+    def _set_digest(self, sid, digest):
+        with self._lock:
+            self._digests[sid] = digest
+            self._digests.move_to_end(sid)
+            while len(self._digests) > MAX_TRACKED_SESSIONS:
+                self._digests.popitem(last=False)
+
+    def _drop_digest(self, sid):
+        with self._lock:
+            self._digests.pop(sid, None)
+
+    # ================= STATS =================
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def _flush_stats(self, force=False):
+        """Push the counters accumulated by this process to a shared Redis hash"""
+        now = time.time()
+        if not force and now - self._last_flush < STATS_FLUSH_INTERVAL:
+            return
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            self._last_flush = now
+        if not counters:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for name, value in counters.items():
+                if isinstance(value, float):
+                    pipe.hincrbyfloat(self.stats_key, name, round(value, 3))
+                else:
+                    pipe.hincrby(self.stats_key, name, value)
+            pipe.hset(self.stats_key, 'updated_at', int(now))
+            pipe.execute()
+        except redis.RedisError as e:
+            _logger.debug("Could not publish session store stats: %s", e)
+
+    def stats(self):
+        """Counters shared by all workers: hits, misses, writes, latency totals..."""
+        self._flush_stats(force=True)
+        raw = self.redis.hgetall(self.stats_key)
+        stats = {
+            name.decode(): float(value) if b'.' in value else int(value)
+            for name, value in raw.items()
+        }
+        reads = stats.get('hits', 0) + stats.get('misses', 0)
+        if reads:
+            stats['hit_ratio'] = round(stats.get('hits', 0) / reads, 4)
+            stats['avg_get_ms'] = round(stats.get('get_ms', 0) / reads, 3)
+        saves = stats.get('writes', 0) + stats.get('writes_skipped', 0)
+        if saves:
+            stats['avg_save_ms'] = round(stats.get('save_ms', 0) / saves, 3)
+        return stats
+
 
 if is_redis_session_store_activated():
 
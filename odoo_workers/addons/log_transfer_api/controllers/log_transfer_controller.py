@@ -4,7 +4,7 @@ from odoo.http import request
 
 class LogTransferController(http.Controller):
     @http.route('/api/logs', type='json', auth='none', methods=['GET'])
-    def get_logs(self, token, limit=100, offset=0, level='INFO', start_date=None, end_date=None):
+    def get_logs(self, token, limit=100, offset=0, level='INFO', start_date=None, end_date=None, cursor=None):
         """Retrieve logs for a tenant via API endpoint.
         
         Args:
@@ -14,6 +14,8 @@ class LogTransferController(http.Controller):
             level (str): Minimum log level to filter by (default: 'INFO').
             start_date (str): ISO format start date for filtering logs (optional).
             end_date (str): ISO format end date for filtering logs (optional).
+            cursor (str): ``next_cursor`` of the previous page; continues file logs
+                where that page stopped instead of skipping ``offset`` entries (optional).
             
         Returns:
             dict: JSON response containing logs or error message.
@@ -35,6 +37,7 @@ class LogTransferController(http.Controller):
             offset=offset,
             level=level,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            cursor=cursor
         )
         return result
\ No newline at end of file
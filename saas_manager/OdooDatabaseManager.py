@@ -2,6 +2,7 @@
 import logging
 import os
 import subprocess
+import uuid
 import xmlrpc.client
 
 # Third-party imports
@@ -9,6 +10,60 @@ import psycopg2
 import requests
 from shared_utils import get_docker_client, safe_execute, log_error_with_context
 
+# Backup/restore transfers move multi-GB archives; 1 MiB chunks keep syscall and
+# Python overhead negligible without holding much in memory
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartFileStream:
+    """
+    Iterable multipart/form-data body for a single file upload.
+
+    requests builds ``files=`` bodies fully in memory; this yields the form
+    fields, then the file in STREAM_CHUNK_SIZE pieces, and reports its exact
+    length so the upload is sent with a Content-Length instead of chunked.
+    """
+
+    def __init__(self, fields: dict, file_field: str, file_path: str,
+                 content_type: str = 'application/octet-stream', progress_callback=None):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.progress_callback = progress_callback
+
+        head = b''.join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{os.path.basename(file_path)}"\r\nContent-Type: {content_type}\r\n\r\n'
+        ).encode()
+        self._head = head
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return len(self._head) + self.file_size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        sent = 0
+        with open(self.file_path, 'rb') as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                yield chunk
+                if self.progress_callback:
+                    self.progress_callback(sent, self.file_size)
+        yield self._tail
+
+
 class OdooDatabaseManager:
     def __init__(
         self,
@@ -71,12 +126,104 @@ class OdooDatabaseManager:
         except Exception as e:
             raise RuntimeError(f"Failed to check database status for {db_name}: {str(e)}")
         
-    def backup(self, db_name: str) -> str:
+    def exists(self, db_name: str) -> bool:
         """
-        Create a ZIP backup of the Odoo database.
-        Returns the local path to the backup file.
+        Check whether a database exists on the PostgreSQL server.
+
+        Args:
+            db_name (str): The name of the database to look up.
+
+        Returns:
+            bool: True if the database exists, False otherwise.
+        """
+        conn = psycopg2.connect(
+            dbname='postgres',
+            user=self.pg_user,
+            password=self.pg_password,
+            host=self.pg_host,
+            port=self.pg_port
+        )
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+            return cur.fetchone() is not None
+        finally:
+            conn.close()
+
+    def create(self, db_name: str, login: str, password: str, demo: bool = False,
+               lang: str = 'en_US', country_code: str = 'US', timeout: int = 300) -> None:
         """
-        logging.info(f"Backing up database: {db_name}")
+        Create a fresh Odoo database via the database manager endpoint.
+        
+        demo is only posted when set: Odoo reads any posted value, even "False", as true.
+        """
+        logging.info(f"Creating database: {db_name}")
+        data = {
+            'master_pwd': self.master_pwd,
+            'name': db_name,
+            'login': login,
+            'password': password,
+            'lang': lang,
+            'country_code': country_code,
+            'phone': ''
+        }
+        if demo:
+            data['demo'] = '1'
+        resp = requests.post(
+            f"{self.odoo_url}/web/database/create",
+            data=data,
+            timeout=timeout
+        )
+        if not resp.ok:
+            raise RuntimeError(f"Create failed: {resp.status_code} {resp.text}")
+        logging.info("Database created.")
+
+    def duplicate(self, source_db: str, new_db: str, timeout: int = 300) -> None:
+        """
+        Clone a database via Odoo's duplicate endpoint.
+
+        Odoo runs CREATE DATABASE ... TEMPLATE on the source, regenerates the
+        database UUID/secret and copies the source filestore. neutralize_database
+        is left out on purpose: Odoo reads any posted value, even "False", as true.
+        """
+        logging.info(f"Duplicating database {source_db} into {new_db}")
+        resp = requests.post(
+            f"{self.odoo_url}/web/database/duplicate",
+            data={
+                'master_pwd': self.master_pwd,
+                'name': source_db,
+                'new_name': new_db
+            },
+            timeout=timeout
+        )
+        if not resp.ok:
+            raise RuntimeError(f"Duplicate failed: {resp.status_code} {resp.text}")
+        logging.info("Database duplicated.")
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """
+        Rename a database via Odoo's db service.
+
+        Odoo terminates open connections, runs ALTER DATABASE ... RENAME and
+        moves the filestore directory to the new name.
+        """
+        logging.info(f"Renaming database {old_name} to {new_name}")
+        db_service = xmlrpc.client.ServerProxy(f"{self.odoo_url}/xmlrpc/2/db")
+        try:
+            db_service.rename(self.master_pwd, old_name, new_name)
+        except xmlrpc.client.Fault as e:
+            raise RuntimeError(f"Rename failed: {e.faultString}")
+        logging.info("Database renamed.")
+
+    def backup_stream(self, db_name: str):
+        """
+        Stream a ZIP backup of the Odoo database straight from Odoo.
+
+        Returns (chunk iterator, total size or None). Nothing touches local
+        disk, so the chunks can be forwarded directly to a client or another
+        destination.
+        """
+        logging.info(f"Streaming backup of database: {db_name}")
         resp = requests.post(
             f"{self.odoo_url}/web/database/backup",
             data={"master_pwd": self.master_pwd, "name": db_name, "backup_format": "zip"},
@@ -85,11 +232,36 @@ class OdooDatabaseManager:
         if not resp.ok:
             raise RuntimeError(f"Backup failed: {resp.status_code} {resp.text}")
 
-        backup_path = os.path.join(self.backup_folder, f"{db_name}.zip")
+        total = resp.headers.get('Content-Length')
+
+        def chunks():
+            try:
+                for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if chunk:
+                        yield chunk
+            finally:
+                resp.close()
+
+        return chunks(), int(total) if total else None
+
+    def backup(self, db_name: str, backup_path: str = None, progress_callback=None) -> str:
+        """
+        Create a ZIP backup of the Odoo database.
+        Returns the local path to the backup file.
+
+        progress_callback(bytes_written, total_or_None) is called after every chunk.
+        """
+        chunks, total = self.backup_stream(db_name)
+
+        backup_path = backup_path or os.path.join(self.backup_folder, f"{db_name}.zip")
+        written = 0
         with open(backup_path, 'wb') as f:
-            for chunk in resp.iter_content(chunk_size=8192):
+            for chunk in chunks:
                 f.write(chunk)
-        logging.info(f"Backup saved at: {backup_path}")
+                written += len(chunk)
+                if progress_callback:
+                    progress_callback(written, total)
+        logging.info(f"Backup saved at: {backup_path} ({written} bytes)")
         return backup_path
 
     def delete_backup(self, db_name: str) -> None:
@@ -112,18 +284,23 @@ class OdooDatabaseManager:
         except OSError as e:
             raise RuntimeError(f"Failed to delete backup file {backup_path}: {str(e)}")
 
-    def restore(self, file_path: str, db_name: str) -> None:
+    def restore(self, file_path: str, db_name: str, progress_callback=None) -> None:
         """
         Restore the database from a local ZIP backup.
+
+        The archive is streamed to Odoo as a multipart body rather than loaded
+        into memory; progress_callback(bytes_sent, total) follows the upload.
         """
         logging.info(f"Restoring database: {db_name} from {file_path}")
-        with open(file_path, 'rb') as f:
-            files = {'backup_file': (os.path.basename(file_path), f, 'application/zip')}
-            resp = requests.post(
-                f"{self.odoo_url}/web/database/restore",
-                data={'master_pwd': self.master_pwd, 'name': db_name, 'copy': False, 'backup_format': 'zip'},
-                files=files
-            )
+        body = MultipartFileStream(
+            {'master_pwd': self.master_pwd, 'name': db_name, 'copy': 'False', 'backup_format': 'zip'},
+            'backup_file', file_path, 'application/zip', progress_callback
+        )
+        resp = requests.post(
+            f"{self.odoo_url}/web/database/restore",
+            data=body,
+            headers={'Content-Type': body.content_type}
+        )
         if not resp.ok:
             raise RuntimeError(f"Restore failed: {resp.status_code} {resp.text}")
         logging.info("Restore successful.")
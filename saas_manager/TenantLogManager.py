@@ -1,57 +1,36 @@
 # Standard library imports
 import logging
-import re
-import threading
-from collections import defaultdict, deque
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Generator
+from typing import List, Dict, Optional, Tuple
 
 # Third-party imports
 import docker
 import psycopg2
 
+# Local application imports
+from services.log_index_service import LogLineParser
+
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class TenantLogManager:
-    def __init__(self, odoo_db_manager, db_name: Optional[str] = None):
+    def __init__(self, odoo_db_manager, db_name: Optional[str] = None, log_index=None, log_fanout=None):
         self.db_manager = odoo_db_manager
         self.db_name = db_name
         self.docker_client = docker.from_env()
         
+        # Background-ingested log index (services.log_index_service); when
+        # present, queries never touch the container logs
+        self.log_index = log_index
+        # Shared per-container tailer fan-out used for live monitoring
+        self.log_fanout = log_fanout
+        
         # Dynamically discover containers
         self.containers = self.discover_containers()
         
-        # Log patterns for tenant identification
-        self.tenant_patterns = [
-            r"database\s+['\"]?(\w+)['\"]?",
-            r"db[:\s]+['\"]?(\w+)['\"]?",
-            r"Database\s+['\"]?(\w+)['\"]?",
-            r"\[(\w+)\]",
-            r"dbname=(\w+)",
-            r"tenant_(\w+)"
-        ]
-        
-        # Log level patterns
-        self.level_patterns = {
-            'ERROR': r'ERROR|CRITICAL|FATAL|Exception|Traceback',
-            'WARNING': r'WARNING|WARN',
-            'INFO': r'INFO|Starting|Stopping|Connected',
-            'DEBUG': r'DEBUG',
-            'SUCCESS': r'SUCCESS|SUCCESSFUL|Login successful'
-        }
-        
-        # Cache for recent logs per tenant
-        self.tenant_log_cache = defaultdict(lambda: deque(maxlen=1000))
-        self.log_stats_cache = defaultdict(lambda: {
-            'total': 0, 'error': 0, 'warning': 0, 
-            'info': 0, 'success': 0, 'debug': 0
-        })
-        
-        # Active monitoring threads
-        self.monitoring_threads = {}
-        self.active_tenants = set()
+        # Cache for tenant log stats when there is no index
+        self.log_stats_cache = {}
 
     def discover_containers(self) -> Dict[str, str]:
         """Dynamically discover running Docker containers"""
@@ -79,71 +58,36 @@ class TenantLogManager:
 
     def extract_database_from_log(self, log_line: str) -> Optional[str]:
         """Extract database name from log line using various patterns"""
-        for pattern in self.tenant_patterns:
-            match = re.search(pattern, log_line, re.IGNORECASE)
-            if match:
-                db_name = match.group(1)
-                logger.debug(f"Extracted database name: {db_name} from log: {log_line[:100]}")
-                return db_name
-        logger.debug(f"No tenant database found in log: {log_line[:100]}")
-        return None
+        return LogLineParser.extract_database(log_line)
     
     def determine_log_level(self, log_line: str) -> str:
         """Determine log level from log content"""
-        log_upper = log_line.upper()
-        for level, pattern in self.level_patterns.items():
-            if re.search(pattern, log_upper):
-                return level.lower()
-        return 'info'
+        return LogLineParser.determine_level(log_line)
     
     def parse_log_entry(self, log_line: str, container_name: str) -> Optional[Dict]:
         """Parse a single log entry into structured format"""
-        if not log_line.strip():
-            logger.debug("Skipping empty log line")
-            return None
-            
-        timestamp_match = re.match(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z)', log_line)
-        timestamp = timestamp_match.group(1) if timestamp_match else datetime.utcnow().isoformat() + 'Z'
-        
-        db_name = self.extract_database_from_log(log_line)
-        if not db_name:
-            logger.debug(f"Skipping log without tenant DB: {log_line[:100]}")
-            return None
-            
-        level = self.determine_log_level(log_line)
-        
-        parsed_log = {
-            'timestamp': timestamp,
-            'tenant_db': db_name,
-            'service': container_name,
-            'level': level,
-            'message': log_line.strip(),
-            'raw_log': log_line
-        }
-        logger.debug(f"Parsed log: {parsed_log}")
+        parsed_log = LogLineParser.parse(log_line, container_name)
+        if parsed_log:
+            parsed_log['raw_log'] = log_line
         return parsed_log
     
-    def get_container_logs_stream(self, container_name: str, since_hours: int = 24) -> Generator[str, None, None]:
-        """Stream logs from Docker container"""
-        try:
-            container = self.docker_client.containers.get(container_name)
-            since_time = datetime.utcnow() - timedelta(hours=since_hours)
-            logger.info(f"Streaming logs from container: {container_name}")
-            
-            for log_line in container.logs(stream=True, follow=True, since=since_time, timestamps=True):
-                yield log_line.decode('utf-8').strip()
-                
-        except docker.errors.NotFound:
-            logger.error(f"Container {container_name} not found")
-        except Exception as e:
-            logger.error(f"Error streaming logs from {container_name}: {e}")
-    
     def get_logs(self, db_name: Optional[str] = None, hours: int = 24, level: str = None, limit: int = 1000) -> List[Dict]:
         """Get historical logs for specific tenant"""
+        logs, _ = self.get_logs_page(db_name=db_name, hours=hours, level=level, limit=limit)
+        return logs
+    
+    def get_logs_page(self, db_name: Optional[str] = None, hours: int = 24, level: str = None,
+                      limit: int = 1000, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get one newest-first page of a tenant's logs and the cursor of the next page"""
         db_name = db_name or self.db_name
         if not db_name:
             logger.warning("No database name provided for get_logs")
-            return []
+            return [], None
+        
+        if self.log_index:
+            logs, next_cursor = self.log_index.query(db_name, hours=hours, level=level, limit=limit, cursor=cursor)
+            logger.info(f"Retrieved {len(logs)} indexed logs for tenant {db_name}")
+            return logs, next_cursor
         
         logs = []
         missing_containers = []
@@ -175,10 +119,15 @@ class TenantLogManager:
         logger.info(f"Retrieved {len(logs)} logs for tenant {db_name}")
         if missing_containers:
             logger.warning(f"Missing containers: {', '.join(missing_containers)}")
-        return logs[:limit]
+        return logs[:limit], None
     
     def get_tenant_stats(self, db_name: str, hours: int = 24) -> Dict:
         """Get log statistics for specific tenant"""
+        if self.log_index:
+            stats = self.log_index.counts(db_name, hours=hours)
+            stats['last_update'] = datetime.utcnow().isoformat() + 'Z'
+            return stats
+        
         if db_name in self.log_stats_cache:
             return self.log_stats_cache[db_name]
             
@@ -343,49 +292,20 @@ class TenantLogManager:
         
         return logs
 
-    def start_tenant_monitoring(self, db_name: str, socketio_instance, room_name: str):
-        """Start real-time monitoring for specific tenant"""
-        if db_name in self.monitoring_threads:
-            logger.info(f"Monitoring already active for tenant {db_name}")
-            return
-        
-        def monitor_tenant():
-            logger.info(f"Starting monitoring for tenant: {db_name}")
-            self.active_tenants.add(db_name)
-            
-            for container_name in self.containers.values():
-                try:
-                    for log_line in self.get_container_logs_stream(container_name):
-                        if db_name not in self.active_tenants:
-                            logger.info(f"Stopping monitoring for tenant {db_name}")
-                            break
-                        
-                        parsed_log = self.parse_log_entry(log_line, container_name)
-                        if parsed_log and parsed_log['tenant_db'] == db_name:
-                            self.tenant_log_cache[db_name].append(parsed_log)
-                            
-                            stats = self.log_stats_cache[db_name]
-                            stats['total'] += 1
-                            stats[parsed_log['level']] += 1
-                            stats['last_update'] = datetime.utcnow().isoformat() + 'Z'
-                            
-                            logger.debug(f"Emitting log for {db_name}: {parsed_log['message'][:50]}...")
-                            socketio_instance.emit('new_log', parsed_log, room=room_name)
-                            socketio_instance.emit('stats_update', stats, room=room_name)
-                            
-                except Exception as e:
-                    logger.error(f"Error in tenant monitoring for {db_name}: {e}")
-        
-        thread = threading.Thread(target=monitor_tenant, daemon=True)
-        thread.start()
-        self.monitoring_threads[db_name] = thread
+    def start_tenant_monitoring(self, db_name: str, session_id: str) -> Optional[str]:
+        """Register a Socket.IO session as live viewer of a tenant; returns the room to join"""
+        if not self.log_fanout:
+            logger.warning("Live tenant log monitoring is not available (log ingestion disabled)")
+            return None
+        self.log_fanout.watch(db_name, session_id)
+        logger.info(f"Started monitoring for tenant {db_name} (session {session_id})")
+        return self.log_fanout.room(db_name)
     
-    def stop_tenant_monitoring(self, db_name: str):
-        """Stop monitoring for specific tenant"""
-        self.active_tenants.discard(db_name)
-        if db_name in self.monitoring_threads:
-            del self.monitoring_threads[db_name]
-        logger.info(f"Stopped monitoring for tenant: {db_name}")
+    def stop_tenant_monitoring(self, session_id: str):
+        """Stop live monitoring for a Socket.IO session"""
+        if self.log_fanout:
+            self.log_fanout.unwatch(session_id)
+        logger.info(f"Stopped monitoring for session: {session_id}")
     
     def get_available_tenants(self, user_id: Optional[int] = None, is_admin: bool = False) -> List[str]:
         """Get list of available tenant databases, restricted to user's tenant unless admin"""
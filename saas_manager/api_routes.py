@@ -6,12 +6,13 @@ that match the frontend expectations and provide consistent interfaces.
 """
 
 import logging
+import re
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 
 from db import db
-from models import WorkerInstance, InfrastructureServer, AuditLog
+from models import WorkerInstance, InfrastructureServer, AuditLog, Tenant
 from services import UnifiedWorkerService
 from services.nginx_service import NginxLoadBalancerService
 from services.remote_worker_service import RemoteWorkerService
@@ -35,6 +36,11 @@ def require_admin():
     return decorator
 
 
+def _tenant_routing_keys():
+    """Subdomains of live tenants, the key nginx hashes tenant traffic on"""
+    return [t.subdomain for t in Tenant.query.filter(Tenant.status != 'deleted').all() if t.subdomain]
+
+
 # ================= WORKER CRUD OPERATIONS =================
 
 @api_bp.route('/api/worker', methods=['GET'])
@@ -190,11 +196,14 @@ def create_worker():
                 nginx_result = nginx_service.add_worker(
                     worker_ip=worker_details.get('name', 'localhost'),  # Use container name for Docker networks
                     worker_port=8069,  # Internal Odoo port
-                    worker_name=worker_details['name']
+                    worker_name=worker_details['name'],
+                    tenant_keys=_tenant_routing_keys(),
+                    gevent_port=worker_details.get('gevent_port')
                 )
                 
                 if nginx_result['success']:
                     result['load_balancer'] = 'added'
+                    result['rebalanced_tenants'] = len(nginx_result.get('moved_tenants', []))
                     logger.info(f"Worker {worker_details['name']} added to load balancer")
                 else:
                     result['load_balancer'] = 'failed'
@@ -495,6 +504,37 @@ def load_balancer_status():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api_bp.route('/api/load-balancer/tenant-assignments', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('api_load_balancer_tenant_assignments')
+def load_balancer_tenant_assignments():
+    """Report which worker serves each tenant; ?preview_add=host:port shows who would move"""
+    try:
+        nginx_service = NginxLoadBalancerService()
+        result = nginx_service.get_tenant_assignments(
+            _tenant_routing_keys(),
+            preview_add=request.args.get('preview_add')
+        )
+        return jsonify(result), 200 if result['success'] else 404
+    except Exception as e:
+        logger.error(f"Failed to get tenant assignments: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api_bp.route('/api/load-balancer/health', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('api_load_balancer_health')
+def load_balancer_health():
+    """Health state, weight and /web/health latency percentiles of the tenant workers"""
+    try:
+        return jsonify({'success': True, **current_app.worker_health.status()})
+    except Exception as e:
+        logger.error(f"Failed to get worker health: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api_bp.route('/api/load-balancer/reload', methods=['POST'])
 @login_required
 @require_admin()
@@ -521,6 +561,92 @@ def reload_load_balancer():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api_bp.route('/api/load-balancer/config-history', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('api_load_balancer_config_history')
+def load_balancer_config_history():
+    """Applied nginx configuration versions, pending changes and the last reload result"""
+    try:
+        nginx_service = NginxLoadBalancerService()
+        result = nginx_service.get_config_history()
+        return jsonify(result), 200 if result['success'] else 500
+    except Exception as e:
+        logger.error(f"Failed to get nginx config history: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api_bp.route('/api/load-balancer/rollback/<int:version>', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('api_load_balancer_rollback')
+def load_balancer_rollback(version):
+    """Restore the generated nginx files of an earlier version and reload nginx"""
+    try:
+        nginx_service = NginxLoadBalancerService()
+        result = nginx_service.rollback_config(version)
+
+        audit_log = AuditLog(
+            user_id=current_user.id,
+            action="NGINX_CONFIG_ROLLBACK",
+            details={'version': version, 'new_version': result.get('version'), 'success': result['success']},
+            ip_address=request.remote_addr
+        )
+        db.session.add(audit_log)
+        db.session.commit()
+
+        return jsonify(result), 200 if result['success'] else 409
+    except Exception as e:
+        logger.error(f"Failed to roll back nginx config: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api_bp.route('/api/load-balancer/asset-cache', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('api_asset_cache_stats')
+def asset_cache_stats():
+    """Hit ratio of the shared Odoo asset cache; ?lines= sets how many recent requests are counted"""
+    try:
+        nginx_service = NginxLoadBalancerService()
+        result = nginx_service.get_asset_cache_stats(lines=request.args.get('lines', 10000, type=int))
+        return jsonify(result), 200 if result['success'] else 503
+    except Exception as e:
+        logger.error(f"Failed to get asset cache stats: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api_bp.route('/api/load-balancer/asset-cache', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('api_configure_asset_cache')
+def configure_asset_cache():
+    """Regenerate the asset cache configuration (max_size, inactive) and reload nginx"""
+    try:
+        data = request.get_json(silent=True) or {}
+        max_size = str(data.get('max_size', '2g'))
+        inactive = str(data.get('inactive', '30d'))
+        if not re.fullmatch(r'\d+[kKmMgG]?', max_size) or not re.fullmatch(r'\d+[smhdwMy]?', inactive):
+            return jsonify({'success': False, 'error': 'Invalid max_size or inactive'}), 400
+
+        nginx_service = NginxLoadBalancerService()
+        result = nginx_service.write_asset_cache_config(max_size=max_size, inactive=inactive)
+
+        audit_log = AuditLog(
+            user_id=current_user.id,
+            action="NGINX_ASSET_CACHE_CONFIGURED",
+            details={'max_size': max_size, 'inactive': inactive, 'success': result['success']},
+            ip_address=request.remote_addr
+        )
+        db.session.add(audit_log)
+        db.session.commit()
+
+        return jsonify(result), 200 if result['success'] else 500
+    except Exception as e:
+        logger.error(f"Failed to configure asset cache: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ================= REMOTE WORKER MANAGEMENT =================
 
 @api_bp.route('/api/worker/<worker_name>/status', methods=['GET'])
@@ -31,7 +31,7 @@ from urllib.parse import urlparse
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, make_response, send_file
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session, make_response, send_file, stream_with_context
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
@@ -55,6 +55,15 @@ from models import SaasUser, Tenant, TenantUser, SubscriptionPlan, WorkerInstanc
 from utils import error_tracker, logger, track_errors
 from websocket_handler import WebSocketManager, setup_websocket_handlers, UpdateTrigger
 from shared_utils import get_redis_client, get_docker_client, safe_execute, database_transaction, log_error_with_context
+from services.tenant_metrics_service import TenantMetricsCollector, TenantProbeTarget
+from services.provisioning_service import PartialProvisionError, TemplateProvisioningService, TenantDeltas
+from services.tenant_pool_service import TenantPoolService
+from services.tenant_backup_service import JobQueueUnavailable, TenantBackupService
+from services.placement_service import TenantPlacementService
+from services.worker_health_service import WorkerHealthChecker
+from services.log_index_service import TenantLogIndex, LogIngestionService, LogFanout
+from services.tenant_limits_service import TenantLimitsPublisher
+from OdooDatabaseManager import STREAM_CHUNK_SIZE
 
 # Local application imports - use relative imports in package context
 try:
@@ -289,11 +298,17 @@ else:
     logger.warning("Docker client not available")
 
 # Initialize SocketIO
-# Initialize SocketIO with proper configuration
+# With several worker processes (see gunicorn.conf.py) emits are relayed
+# through the Redis message queue so every process can reach every client
+SOCKETIO_MESSAGE_QUEUE = os.environ.get(
+    'SOCKETIO_MESSAGE_QUEUE',
+    os.environ.get('REDIS_URL', 'redis://redis:6379/0') if redis_client else ''
+) or None
 socketio = SocketIO(
     app, 
     cors_allowed_origins="*", 
-    async_mode='threading',
+    async_mode=os.environ.get('SOCKETIO_ASYNC_MODE', 'threading'),
+    message_queue=SOCKETIO_MESSAGE_QUEUE,
     logger=False,
     engineio_logger=False,
     ping_timeout=60,
@@ -319,12 +334,68 @@ if os.environ.get('FLASK_ENV') == 'development':
 cache_manager = create_cache_manager(redis_client)
 app.cache_manager = cache_manager
 
+# Initialize tenant metrics collector
+tenant_metrics = TenantMetricsCollector(odoo, redis_client)
+
+# Initialize template-based tenant provisioning
+TEMPLATE_PROVISIONING_ENABLED = os.environ.get('TEMPLATE_PROVISIONING_ENABLED', 'true').lower() == 'true'
+template_provisioner = TemplateProvisioningService(
+    odoo, redis_client, odoo_url=os.environ.get('ODOO_URL', 'http://odoo_master:8069')
+)
+
+# Warm pool of pre-provisioned tenant databases, refilled from the templates
+TENANT_POOL_ENABLED = TEMPLATE_PROVISIONING_ENABLED and os.environ.get('TENANT_POOL_ENABLED', 'true').lower() == 'true'
+tenant_pool = TenantPoolService(template_provisioner, redis_client)
+app.tenant_pool = tenant_pool
+if TENANT_POOL_ENABLED:
+    tenant_pool.start(app)
+
 # Initialize WebSocket manager
-ws_manager = WebSocketManager(socketio, redis_client)
+ws_manager = WebSocketManager(socketio, redis_client, use_message_queue=bool(SOCKETIO_MESSAGE_QUEUE))
 update_trigger = UpdateTrigger(cache_manager, ws_manager)
 
+# Background tenant backup/restore jobs (progress over Socket.IO, resumable)
+tenant_backups = TenantBackupService(odoo, redis_client, ws_manager, on_restored=tenant_metrics.invalidate)
+app.tenant_backups = tenant_backups
+tenant_backups.start(app)
+
+# Load-aware tenant placement; also reconciles worker tenant counters periodically
+placement_scheduler = TenantPlacementService(tenant_metrics, redis_client)
+app.placement_scheduler = placement_scheduler
+placement_scheduler.start(app)
+
+# Active /web/health probes; slow or failing workers lose weight or go down in nginx
+WORKER_HEALTH_CHECK_ENABLED = os.environ.get('WORKER_HEALTH_CHECK_ENABLED', 'true').lower() == 'true'
+worker_health = WorkerHealthChecker(redis_client)
+app.worker_health = worker_health
+if WORKER_HEALTH_CHECK_ENABLED:
+    worker_health.start(app)
+
+# Plan limits are pushed to tenant databases over Redis pub/sub
+tenant_limits = TenantLimitsPublisher(redis_client)
+app.tenant_limits = tenant_limits
+
+# Tenant logs are ingested once in the background and served from an on-disk index
+TENANT_LOG_INDEX_ENABLED = os.environ.get('TENANT_LOG_INDEX_ENABLED', 'true').lower() == 'true'
+tenant_log_index = None
+tenant_log_fanout = None
+if TENANT_LOG_INDEX_ENABLED:
+    try:
+        tenant_log_index = TenantLogIndex(
+            os.environ.get('TENANT_LOG_INDEX_PATH', '/app/logs/tenant_index'),
+            retention_days=int(os.environ.get('TENANT_LOG_RETENTION_DAYS', 7))
+        )
+        # Live viewers share the ingestion tailers (one stream per container)
+        tenant_log_fanout = LogFanout(socketio, redis_client)
+        tenant_log_ingestion = LogIngestionService(tenant_log_index, redis_client, fanout=tenant_log_fanout)
+        tenant_log_ingestion.start(app)
+    except Exception as e:
+        logger.error(f"Tenant log index unavailable, falling back to container log scans: {e}")
+        tenant_log_index = None
+        tenant_log_fanout = None
+
 # Setup WebSocket handlers
-setup_websocket_handlers(socketio, ws_manager)
+setup_websocket_handlers(socketio, ws_manager, log_fanout=tenant_log_fanout)
 
 
 from flask_migrate import Migrate
@@ -471,6 +542,114 @@ def admin_required(f):
 
 
 
+def _activate_tenant_after_creation(db_name, app=None):
+    """Mark the tenant owning db_name active, start its billing cycle and notify its users"""
+    try:
+        from models import Tenant
+        from flask import current_app
+        app_to_use = app if app else current_app
+        
+        # Create application context for background thread
+        with app_to_use.app_context():
+            tenant = Tenant.query.filter_by(database_name=db_name).first()
+            if tenant:
+                tenant.status = 'active'  # Change from 'creating' to 'active'
+                tenant.is_active = True  # Ensure is_active is also set
+                db.session.commit()
+                logger.info(f"Updated tenant {tenant.id} status to active after successful database creation")
+                
+                # Invalidate cache to ensure frontend shows updated status immediately
+                try:
+                    invalidate_tenant_cache(tenant.id)
+                    logger.info(f"Invalidated cache for tenant {tenant.id} after status change")
+                except Exception as cache_error:
+                    logger.warning(f"Failed to invalidate cache for tenant {tenant.id}: {cache_error}")
+                
+                # Create billing cycle immediately for newly activated tenant
+                try:
+                    billing_service = BillingService()
+                    billing_cycle = billing_service.create_billing_cycle(tenant.id)
+                    logger.info(f"Created initial billing cycle for tenant {tenant.id}: {billing_cycle.id}")
+                except Exception as billing_error:
+                    logger.error(f"Failed to create billing cycle for tenant {tenant.id}: {billing_error}")
+                    # Don't fail tenant activation for billing cycle creation error
+                    error_tracker.log_error(billing_error, {'tenant_id': tenant.id, 'function': 'create_initial_billing_cycle'})
+                
+                # Trigger real-time update (also needs app context)
+                try:
+                    tenant_users = TenantUser.query.filter_by(tenant_id=tenant.id).all()
+                    user_ids = [tu.user_id for tu in tenant_users]
+                    
+                    tenant_data = {
+                        'id': tenant.id,
+                        'name': tenant.name,
+                        'subdomain': tenant.subdomain,
+                        'status': 'active'
+                    }
+                    
+                    update_trigger.tenant_status_changed(tenant_data, user_ids)
+                    
+                except Exception as cache_error:
+                    logger.warning(f"Failed to update cache after tenant activation: {cache_error}")
+            else:
+                logger.error(f"Could not find tenant with database_name {db_name} to update status")
+            
+    except Exception as e:
+        logger.error(f"Failed to update tenant status to active: {e}")
+        error_tracker.log_error(e, {'database_name': db_name, 'function': 'update_tenant_status'})
+        # Don't fail the entire process for this error
+
+
+def _provision_from_template(db_name, username, password, modules, app=None):
+    """
+    Provision a tenant database from a warm pool database, or by cloning the golden
+    template for its module set when the pool is empty.
+    Returns False when the caller should fall back to the legacy create-and-install path.
+    """
+    if not TEMPLATE_PROVISIONING_ENABLED:
+        return False
+    
+    try:
+        max_users = None
+        if app and db_name.startswith('kdoo_'):
+            with app.app_context():
+                tenant = Tenant.query.filter_by(subdomain=db_name[5:]).first()
+                if tenant:
+                    plan = SubscriptionPlan.query.filter_by(name=tenant.plan).first()
+                    max_users = plan.max_users if plan else tenant.max_users or 10
+        
+        deltas = TenantDeltas(
+            admin_login=username,
+            admin_password=password,
+            max_users=max_users,
+            logo_path=os.path.join('static', 'img', 'kdoo-logo.png')
+        )
+
+        # Fastest path: rename a warm database from the pool
+        if TENANT_POOL_ENABLED:
+            claimed = tenant_pool.claim(db_name, modules, deltas)
+            if claimed:
+                logger.info(f"Database {db_name} claimed from pool ({claimed['pooled_database']}) in {claimed['timings']['total_seconds']}s")
+                return True
+
+        result = template_provisioner.provision(db_name, modules, deltas)
+        logger.info(f"Database {db_name} provisioned from template {result['template']} in {result['timings']['total_seconds']}s")
+        return True
+    except PartialProvisionError as e:
+        # This call created the database, so it is ours to drop before the fallback recreates it
+        logger.warning(f"Template provisioning failed for {db_name}, falling back to full creation: {e}")
+        error_tracker.log_error(e, {'database_name': db_name, 'function': 'provision_from_template'})
+        try:
+            odoo.delete(db_name)
+        except Exception as cleanup_error:
+            logger.warning(f"Failed to drop partially provisioned database {db_name}: {cleanup_error}")
+        return False
+    except Exception as e:
+        logger.warning(f"Template provisioning failed for {db_name}, falling back to full creation: {e}")
+        error_tracker.log_error(e, {'database_name': db_name, 'function': 'provision_from_template'})
+        return False
+
+
 @track_errors('database_creation')
 async def create_database(db_name, username='admin', password='admin',  modules=None, app=None):
     """Create Odoo database ONLY after successful payment"""
@@ -490,6 +669,17 @@ async def create_database(db_name, username='admin', password='admin',  modules=
     try:
         logger.info(f"Creating database {db_name} after successful payment")
         
+        # Never provision over an existing tenant database (duplicate payment callback, retry)
+        if odoo.exists(db_name):
+            logger.warning(f"Database {db_name} already exists, skipping creation")
+            return False
+        
+        # Fast path: clone the prebuilt template for this module set
+        if _provision_from_template(db_name, username, password, modules, app):
+            _activate_tenant_after_creation(db_name, app)
+            logger.info(f"Database {db_name} created and configured successfully - Tenant is now ACTIVE")
+            return True
+        
         # Create database via Odoo HTTP API
         response = requests.post(
             f"{os.environ.get('ODOO_URL', 'http://odoo_master:8069')}/web/database/create",
@@ -684,79 +874,7 @@ async def create_database(db_name, username='admin', password='admin',  modules=
         
         logger.info("Odoo Database created.")
 
-        # UPDATE TENANT STATUS TO ACTIVE after successful database creation
-        try:
-            from models import Tenant
-            from flask import current_app
-            app_to_use = app if app else current_app
-            
-            # Create application context for background thread
-            with app_to_use.app_context():
-                tenant = Tenant.query.filter_by(database_name=db_name).first()
-                if tenant:
-                    tenant.status = 'active'  # Change from 'creating' to 'active'
-                    tenant.is_active = True  # Ensure is_active is also set
-                    db.session.commit()
-                    logger.info(f"Updated tenant {tenant.id} status to active after successful database creation")
-                    
-                    # Invalidate cache to ensure frontend shows updated status immediately
-                    try:
-                        invalidate_tenant_cache(tenant.id)
-                        logger.info(f"Invalidated cache for tenant {tenant.id} after status change")
-                    except Exception as cache_error:
-                        logger.warning(f"Failed to invalidate cache for tenant {tenant.id}: {cache_error}")
-                    
-                    # Create billing cycle immediately for newly activated tenant
-                    try:
-                        billing_service = BillingService()
-                        billing_cycle = billing_service.create_billing_cycle(tenant.id)
-                        logger.info(f"Created initial billing cycle for tenant {tenant.id}: {billing_cycle.id}")
-                    except Exception as billing_error:
-                        logger.error(f"Failed to create billing cycle for tenant {tenant.id}: {billing_error}")
-                        # Don't fail tenant activation for billing cycle creation error
-                        error_tracker.log_error(billing_error, {'tenant_id': tenant.id, 'function': 'create_initial_billing_cycle'})
-                    
-                    # Trigger real-time update (also needs app context)
-                    try:
-                        tenant_users = TenantUser.query.filter_by(tenant_id=tenant.id).all()
-                        user_ids = [tu.user_id for tu in tenant_users]
-                        
-                        tenant_data = {
-                            'id': tenant.id,
-                            'name': tenant.name,
-                            'subdomain': tenant.subdomain,
-                            'status': 'active'
-                        }
-                        
-                        update_trigger.tenant_status_changed(tenant_data, user_ids)
-                        
-                    except Exception as cache_error:
-                        logger.warning(f"Failed to update cache after tenant activation: {cache_error}")
-                else:
-                    logger.error(f"Could not find tenant with database_name {db_name} to update status")
-                
-                # Trigger real-time update
-                try:
-                    tenant_users = TenantUser.query.filter_by(tenant_id=tenant.id).all()
-                    user_ids = [tu.user_id for tu in tenant_users]
-                    
-                    tenant_data = {
-                        'id': tenant.id,
-                        'name': tenant.name,
-                        'subdomain': tenant.subdomain,
-                        'status': 'active'
-                    }
-                    
-                    update_trigger.tenant_status_changed(tenant_data, user_ids)
-                    
-                except Exception as cache_error:
-                    logger.warning(f"Failed to update cache after tenant activation: {cache_error}")
-                    
-                
-        except Exception as e:
-            logger.error(f"Failed to update tenant status to active: {e}")
-            error_tracker.log_error(e, {'database_name': db_name, 'function': 'update_tenant_status'})
-            # Don't fail the entire process for this error
+        _activate_tenant_after_creation(db_name, app)
         
         logger.info(f"Database {db_name} created and configured successfully - Tenant is now ACTIVE")
         return True
@@ -825,7 +943,7 @@ def update_odoo_user_credentials(database_name, current_username, current_passwo
         return False
 
 @track_errors('worker_selection')
-def get_available_worker():
+def get_available_worker(subdomain=None):
     try:
         if not docker_client:
             logger.warning("Docker client not available - using mock worker")
@@ -837,6 +955,17 @@ def get_available_worker():
             logger.warning("No running workers found")
             return None
         
+        if subdomain:
+            try:
+                decision = placement_scheduler.place(subdomain)
+                if decision['worker']:
+                    return WorkerInstance.query.get(decision['worker']['worker_id'])
+                logger.warning(f"No worker has headroom for {subdomain}: {decision['candidates']}")
+                return None
+            except Exception as e:
+                # Fall back to the tenant counters below
+                error_tracker.log_error(e, {'function': 'get_available_worker', 'subdomain': subdomain})
+        
         available_worker = min(workers, key=lambda w: w.current_tenants)
         if available_worker.current_tenants < available_worker.max_tenants:
             return available_worker
@@ -1136,39 +1265,8 @@ def reset_password(token):
 @track_errors('enhanced_dashboard_route')
 def dashboard():
     try:
-        user_tenants = cache_manager.get_user_tenants(current_user.id)
-        
-        # Enhance tenants with billing information
-        enhanced_tenants = []
-        from billing_service import BillingService
-        billing_service = BillingService()
-        
-        for tenant_data in user_tenants:
-            # Get billing information for each tenant
-            billing_info = billing_service.get_tenant_billing_info(tenant_data['id'])
-            
-            # Add billing information to tenant data
-            if billing_info and billing_info.get('status') != 'no_active_cycle':
-                tenant_data.update({
-                    'billing_info': billing_info,
-                    'is_expired': billing_info.get('is_expired', False),
-                    'days_remaining': billing_info.get('days_remaining', 0),
-                    'hours_remaining': billing_info.get('hours_remaining', 0),
-                    'requires_payment': billing_info.get('requires_payment', False),
-                    'can_renew_early': billing_info.get('can_renew_early', False)
-                })
-            else:
-                # No active billing cycle
-                tenant_data.update({
-                    'billing_info': None,
-                    'is_expired': True,
-                    'days_remaining': 0,
-                    'hours_remaining': 0,
-                    'requires_payment': True,
-                    'can_renew_early': False
-                })
-            
-            enhanced_tenants.append(tenant_data)
+        # Tenant payloads already carry billing status from a single bulk lookup
+        enhanced_tenants = cache_manager.get_user_tenants(current_user.id)
         
         stats = {}
         
@@ -1242,7 +1340,7 @@ def create_tenant():
                 flash('Subdomain already exists.', 'error')
                 return render_template('create_tenant.html', form=form, plans=plans_data)
             
-            worker = get_available_worker()
+            worker = get_available_worker(form.subdomain.data)
             if not worker:
                 flash('No available worker instances. Please try again later.', 'error')
                 return render_template('create_tenant.html', form=form, plans=plans_data)
@@ -1314,34 +1412,32 @@ def manage_tenant(tenant_id):
         
         tenant = Tenant.query.get_or_404(tenant_id)
         
+        probe_target = TenantProbeTarget(
+            db_name=tenant.database_name,
+            admin_username=tenant.admin_username,
+            admin_password=tenant.get_admin_password()
+        )
+        
+        # Handle pending tenants without databases
+        if tenant.status == 'pending':
+            metrics = {'modules': 0, 'storage_usage': '0 B', 'uptime': 'N/A', 'odoo_user': 0}
+            actual_db_status = None
+        else:
+            metrics = tenant_metrics.get_snapshot(probe_target)
+            actual_db_status = metrics.get('is_active')
+        
         # Update database active status
         try:
-            actual_db_status = odoo.is_active(tenant.database_name)
-            if tenant.is_active != actual_db_status:
+            if actual_db_status is not None and tenant.is_active != actual_db_status:
                 tenant.is_active = actual_db_status
                 db.session.add(tenant)
                 db.session.commit()
                 
-                # Invalidate cache for this tenant
-                tenant_users = TenantUser.query.filter_by(tenant_id=tenant.id).all()
-                user_ids = [tu.user_id for tu in tenant_users]
-                cache_manager.invalidate_user_tenants_cache(user_ids)
-                cache_manager.invalidate_admin_stats_cache()
+                # Invalidate cache for this tenant (its members' cached lists are tagged with it)
+                cache_manager.invalidate_tenant_cache(tenant.id)
         except Exception as e:
             logger.warning(f"Could not check database status for {tenant.database_name}: {e}")
         
-        # Handle pending tenants without databases
-        if tenant.status == 'pending':
-            modules = 0
-            storage_usage = '0 B'
-            uptime = 'N/A'
-            odoo_user = 0
-        else:
-            modules = odoo.get_installed_applications_count(tenant.database_name, tenant.admin_username, tenant.get_admin_password())
-            storage_usage = odoo.get_database_storage_usage(tenant.database_name)['total_size_human']
-            uptime = odoo.get_tenant_uptime(tenant.database_name)['uptime_human']
-            odoo_user = odoo.get_users_count(tenant.database_name, tenant.admin_username, tenant.get_admin_password())['total_users']
-        
         # Get available subscription plans for the edit modal
         plans = SubscriptionPlan.query.filter_by(is_active=True).all()
         plans_data = [
@@ -1363,10 +1459,11 @@ def manage_tenant(tenant_id):
         
         return render_template('manage_tenant.html', 
                       tenant=tenant, 
-                      modules=modules, 
-                      storage_usage=storage_usage, 
-                      uptime=uptime, 
-                      odoo_user=odoo_user-1,
+                      modules=metrics['modules'], 
+                      storage_usage=metrics['storage_usage'], 
+                      uptime=metrics['uptime'], 
+                      odoo_user=metrics['odoo_user'],
+                      metrics_pending=metrics.get('pending', []),
                       plans=plans_data,
                       tenant_id=tenant_id,
                       billing_info=billing_info)
@@ -1375,6 +1472,29 @@ def manage_tenant(tenant_id):
         flash('Error accessing tenant. Please try again.', 'error')
         return redirect(url_for('dashboard'))
 
+@app.route('/api/tenant/<int:tenant_id>/metrics')
+@login_required
+@track_errors('tenant_metrics_api')
+def tenant_metrics_api(tenant_id):
+    """Return the cached metric snapshot for a tenant, optionally forcing a refresh"""
+    if not verify_tenant_access(current_user.id, tenant_id):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    tenant = Tenant.query.get_or_404(tenant_id)
+    if tenant.status == 'pending':
+        return jsonify({'success': True, 'metrics': None, 'message': 'Tenant database not created yet'})
+    
+    probe_target = TenantProbeTarget(
+        db_name=tenant.database_name,
+        admin_username=tenant.admin_username,
+        admin_password=tenant.get_admin_password()
+    )
+    if request.args.get('refresh') == '1':
+        tenant_metrics.refresh(probe_target)
+    
+    snapshot = tenant_metrics.get_snapshot(probe_target, wait_timeout=0)
+    return jsonify({'success': True, 'metrics': snapshot})
+
 @app.route('/admin/tenants')
 @admin_required
 @track_errors('admin_tenants_route')
@@ -1932,25 +2052,35 @@ def get_tenant_logs(tenant_id):
         
         tenant = Tenant.query.get_or_404(tenant_id)
         logger.info(f"Retrieving logs for tenant {tenant_id}: {tenant.database_name}")
-        log_manager = TenantLogManager(odoo, tenant.database_name)
+        log_manager = TenantLogManager(odoo, tenant.database_name, log_index=tenant_log_index, log_fanout=tenant_log_fanout)
         include_db_logs = request.args.get('include_db_logs', 'false').lower() == 'true'
-        logs = log_manager.get_logs(db_name=tenant.database_name, hours=24, limit=1000)
+        cursor = request.args.get('cursor')
+        level = request.args.get('level') or None
+        logs, next_cursor = log_manager.get_logs_page(
+            db_name=tenant.database_name, hours=24, level=level, limit=1000, cursor=cursor
+        )
         
-        if include_db_logs:
+        # Query stats are a live snapshot: only attach them to the first page
+        if include_db_logs and not cursor:
             db_logs = log_manager.get_database_query_logs(db_name=tenant.database_name)
             logs.extend(db_logs)
             logs.sort(key=lambda x: x['timestamp'], reverse=True)
             logs = logs[:1000]
         
         formatted_logs = [{'id': idx + 1, 'timestamp': log['timestamp'].isoformat() if isinstance(log['timestamp'], datetime) else log['timestamp'], 'level': log['level'].lower(), 'service': log.get('service', 'odoo'), 'title': log.get('title', 'Log Entry'), 'message': log['message'], 'details': log.get('details', '')} for idx, log in enumerate(logs)]
-        stats = {
-            'total': len(formatted_logs),
-            'error': len([log for log in formatted_logs if log['level'] == 'error']),
-            'warning': len([log for log in formatted_logs if log['level'] == 'warning']),
-            'info': len([log for log in formatted_logs if log['level'] == 'info']),
-            'success': len([log for log in formatted_logs if log['level'] == 'success']),
-            'last_update': datetime.utcnow().isoformat()
-        }
+        if tenant_log_index:
+            # Totals over the whole window, not just this page
+            stats = log_manager.get_tenant_stats(tenant.database_name, hours=24)
+            stats['last_update'] = datetime.utcnow().isoformat()
+        else:
+            stats = {
+                'total': len(formatted_logs),
+                'error': len([log for log in formatted_logs if log['level'] == 'error']),
+                'warning': len([log for log in formatted_logs if log['level'] == 'warning']),
+                'info': len([log for log in formatted_logs if log['level'] == 'info']),
+                'success': len([log for log in formatted_logs if log['level'] == 'success']),
+                'last_update': datetime.utcnow().isoformat()
+            }
         
         container_status = {}
         for key, name in log_manager.containers.items():
@@ -1966,6 +2096,7 @@ def get_tenant_logs(tenant_id):
             'tenant_id': tenant_id,
             'database_name': tenant.database_name,
             'log_count': len(logs),
+            'indexed': bool(tenant_log_index),
             'container_status': container_status
         }
         if current_user.is_admin:
@@ -1974,7 +2105,7 @@ def get_tenant_logs(tenant_id):
             debug_info['available_tenants'] = log_manager.get_available_tenants(user_id=current_user.id, is_admin=False)
         
         logger.info(f"Returning {len(formatted_logs)} logs for tenant {tenant_id}")
-        return jsonify({'logs': formatted_logs, 'stats': stats, 'debug': debug_info})
+        return jsonify({'logs': formatted_logs, 'stats': stats, 'next_cursor': next_cursor, 'debug': debug_info})
     except Exception as e:
         error_tracker.log_error(e, {'tenant_id': tenant_id, 'user_id': current_user.id, 'function': 'get_tenant_logs'})
         logger.error(f"Failed to retrieve tenant logs for {tenant_id}: {e}")
@@ -2030,6 +2161,8 @@ def toggle_tenant(tenant_id):
             db.session.commit()
             flash(f'Tenant {tenant.name} activated successfully.', 'success')
         
+        tenant_metrics.invalidate(tenant.database_name, ['is_active', 'uptime'])
+        
         try:
             tenant_users = TenantUser.query.filter_by(tenant_id=tenant.id).all()
             user_ids = [tu.user_id for tu in tenant_users]
@@ -2067,116 +2200,108 @@ def restart_tenant(tenant_id):
 def backup_tenant(tenant_id):
     tenant = Tenant.query.get_or_404(tenant_id)
     try:
-        backup_path = odoo.backup(tenant.database_name)
-        response = send_file(backup_path, as_attachment=True)
-        flash(f'Backup created at {backup_path}', 'success')
-        odoo.delete_backup(tenant.database_name)
-        return response
+        # Forward Odoo's dump straight to the client, nothing is written to disk
+        chunks, total = odoo.backup_stream(tenant.database_name)
+        headers = {'Content-Disposition': f'attachment; filename="{tenant.database_name}.zip"'}
+        if total:
+            headers['Content-Length'] = str(total)
+        return Response(stream_with_context(chunks), mimetype='application/zip', headers=headers)
     except Exception as e:
         flash(f'Backup failed: {e}', 'danger')
     return redirect(request.referrer)
 
+def _wants_json():
+    return request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest' \
+        or request.accept_mimetypes.best == 'application/json'
+
 @app.route('/tenant/<int:tenant_id>/restore', methods=['POST'])
 @login_required
 @track_errors('restore_tenant_route')
 def restore_tenant(tenant_id):
-    logger.info(f"🔄 RESTORE REQUEST STARTED - Tenant ID: {tenant_id}")
-    logger.info(f"   - User: {current_user.username if current_user else 'Unknown'}")
-    logger.info(f"   - IP: {request.remote_addr}")
-    logger.info(f"   - User Agent: {request.headers.get('User-Agent', 'Unknown')}")
-    logger.info(f"   - Referrer: {request.referrer}")
-    
+    """
+    Stage the uploaded archive and hand the restore to a background job.
+
+    The archive can be sent as the raw request body (application/zip, streamed
+    to disk in large chunks) or as the classic multipart ``backup_file`` field.
+    Progress is pushed to the user as ``tenant_job_progress`` events.
+    """
     tenant = Tenant.query.get_or_404(tenant_id)
-    logger.info(f"   - Tenant Name: {tenant.name}")
-    logger.info(f"   - Database Name: {tenant.database_name}")
-    logger.info(f"   - Tenant Status: {tenant.status}")
-    
+    logger.info(f"Restore requested for tenant {tenant.name} ({tenant.database_name}) by "
+                f"{current_user.username if current_user else 'Unknown'} from {request.remote_addr}")
+
+    job_id = tenant_backups.new_job_id()
+    staging_path = tenant_backups.staging_path(job_id)
+
     try:
-        # Log form data
-        logger.info(f"📝 FORM DATA ANALYSIS:")
-        logger.info(f"   - Form keys: {list(request.form.keys())}")
-        logger.info(f"   - Files keys: {list(request.files.keys())}")
-        logger.info(f"   - CSRF token present: {'csrf_token' in request.form}")
-        
-        # Check if file was uploaded
-        if 'backup_file' not in request.files:
-            logger.error("❌ No backup_file in request.files")
-            flash('No backup file selected', 'danger')
-            return redirect(request.referrer)
-        
-        backup_file = request.files['backup_file']
-        logger.info(f"📁 FILE UPLOAD ANALYSIS:")
-        logger.info(f"   - Filename: {backup_file.filename}")
-        logger.info(f"   - Content Type: {backup_file.content_type}")
-        logger.info(f"   - Content Length: {backup_file.content_length}")
-        
-        if backup_file.filename == '' or not backup_file.filename.lower().endswith('.zip'):
-            logger.error(f"❌ Invalid file: '{backup_file.filename}'")
-            flash('Please select a valid ZIP backup file', 'danger')
-            return redirect(request.referrer)
-        
-        # Create temporary file
-        import tempfile
-        import os
-        
-        logger.info("📦 Creating temporary file for backup...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as temp_file:
-            backup_file.save(temp_file.name)
-            temp_file_path = temp_file.name
-            
-        file_size = os.path.getsize(temp_file_path)
-        logger.info(f"   - Temp file path: {temp_file_path}")
-        logger.info(f"   - File size: {file_size} bytes ({file_size/1024/1024:.2f} MB)")
-        
-        try:
-            logger.info("🔄 Starting database restore process...")
-            
-            # Deactivate database first if active
-            logger.info(f"🔍 Checking if database '{tenant.database_name}' is active...")
-            if odoo.is_active(tenant.database_name):
-                logger.info("   - Database is active, deactivating...")
-                odoo.deactivate(tenant.database_name)
-                logger.info("   ✅ Database deactivated")
-            else:
-                logger.info("   - Database is not active")
-            
-            # Delete existing database
-            logger.info(f"🗑️ Deleting existing database '{tenant.database_name}'...")
-            odoo.delete(tenant.database_name)
-            logger.info("   ✅ Database deleted")
-            
-            # Restore from backup
-            logger.info(f"🔄 Restoring database '{tenant.database_name}' from backup...")
-            odoo.restore(temp_file_path, tenant.database_name)
-            logger.info("   ✅ Database restored successfully")
-            
-            logger.info(f"🎉 RESTORE COMPLETED SUCCESSFULLY for tenant {tenant.name}")
-            flash(f'Database {tenant.database_name} restored successfully', 'success')
-            
-        except Exception as restore_error:
-            logger.error(f"❌ RESTORE PROCESS FAILED: {str(restore_error)}")
-            logger.error(f"   - Error type: {type(restore_error).__name__}")
-            logger.error(f"   - Error details: {restore_error}", exc_info=True)
-            raise
-            
-        finally:
-            # Clean up temporary file
-            logger.info("🧹 Cleaning up temporary file...")
-            try:
-                os.unlink(temp_file_path)
-                logger.info("   ✅ Temporary file deleted")
-            except Exception as cleanup_error:
-                logger.warning(f"   ⚠️ Failed to delete temp file: {cleanup_error}")
-    
+        if request.mimetype in ('application/zip', 'application/octet-stream'):
+            filename = request.headers.get('X-Filename', f'{tenant.database_name}.zip')
+            if not filename.lower().endswith('.zip'):
+                raise ValueError('Please select a valid ZIP backup file')
+            with open(staging_path, 'wb') as f:
+                while True:
+                    chunk = request.stream.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        else:
+            backup_file = request.files.get('backup_file')
+            if backup_file is None or backup_file.filename == '':
+                raise ValueError('No backup file selected')
+            if not backup_file.filename.lower().endswith('.zip'):
+                raise ValueError('Please select a valid ZIP backup file')
+            backup_file.save(staging_path, buffer_size=STREAM_CHUNK_SIZE)
+
+        if os.path.getsize(staging_path) == 0:
+            raise ValueError('The uploaded backup file is empty')
+
+        job = tenant_backups.submit_restore(job_id, tenant.id, tenant.database_name, current_user.id)
+        logger.info(f"Restore job {job_id} queued for {tenant.database_name} "
+                    f"({job['bytes_total'] / 1024 / 1024:.2f} MB)")
+
+        if _wants_json():
+            return jsonify({'success': True, 'job': job}), 202
+        flash(f'Restore of {tenant.database_name} started, you will be notified when it completes', 'info')
+
     except Exception as e:
-        logger.error(f"❌ RESTORE ROUTE FAILED: {str(e)}")
-        logger.error(f"   - Error type: {type(e).__name__}")
-        logger.error(f"   - Full traceback:", exc_info=True)
+        logger.error(f"Restore request failed for tenant {tenant.id}: {e}", exc_info=not isinstance(e, ValueError))
+        try:
+            os.unlink(staging_path)
+        except OSError:
+            pass
+        if _wants_json():
+            status = 400 if isinstance(e, ValueError) else 503 if isinstance(e, JobQueueUnavailable) else 500
+            return jsonify({'success': False, 'message': str(e)}), status
         flash(f'Restore failed: {str(e)}', 'danger')
-    
-    logger.info(f"🔚 RESTORE REQUEST COMPLETED - Redirecting to: {request.referrer}")
+
     return redirect(request.referrer)
 
+@app.route('/tenant/<int:tenant_id>/jobs/<job_id>', methods=['GET'])
+@login_required
+@track_errors('tenant_job_status_route')
+def tenant_job_status(tenant_id, job_id):
+    if not verify_tenant_access(current_user.id, tenant_id):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    job = tenant_backups.get_job(job_id)
+    if not job or job.get('tenant_id') != tenant_id:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/tenant/<int:tenant_id>/jobs/<job_id>/download', methods=['GET'])
+@login_required
+@track_errors('tenant_job_download_route')
+def tenant_job_download(tenant_id, job_id):
+    if not verify_tenant_access(current_user.id, tenant_id):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    tenant = Tenant.query.get_or_404(tenant_id)
+    job = tenant_backups.get_job(job_id)
+    if not job or job.get('tenant_id') != tenant_id or job.get('kind') != 'backup' \
+            or job.get('status') != 'completed' or not os.path.exists(job['file_path']):
+        return jsonify({'success': False, 'message': 'Backup not available'}), 404
+    response = send_file(job['file_path'], as_attachment=True, download_name=f'{tenant.database_name}.zip',
+                         mimetype='application/zip')
+    response.call_on_close(lambda: tenant_backups.remove_backup(job_id))
+    return response
+
 @app.route('/tenant/<int:tenant_id>/delete', methods=['POST'])
 @login_required
 @track_errors('delete_tenant_route')
@@ -2477,7 +2602,7 @@ def unified_register():
             )
             
             # Step 2: Get available worker
-            worker = get_available_worker()
+            worker = get_available_worker(form.subdomain.data)
             if not worker:
                 flash('Service temporarily unavailable. Please try again in a few minutes.', 'error')
                 return render_template('unified_register.html', form=form, plans=plans_data, status=status)
@@ -3002,19 +3127,30 @@ def get_tenant_user_limit_api(subdomain):
         
         # Get subscription plan details
         plan = SubscriptionPlan.query.filter_by(name=tenant.plan).first()
-        max_users = plan.max_users if plan else tenant.max_users
+        max_users = tenant_limits.effective_max_users(tenant, plan)
+        
+        # Tenants poll with If-None-Match: unchanged limits answer 304
+        # without counting users
+        etag = tenant_limits.etag(tenant.database_name, {'max_users': max_users, 'plan': tenant.plan})
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
         
         # Get current user count from TenantUser table
         current_user_count = TenantUser.query.filter_by(tenant_id=tenant.id).count()
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'max_users': max_users,
             'current_users': current_user_count,
             'remaining_users': max(0, max_users - current_user_count),
             'tenant_status': tenant.status,
-            'plan': tenant.plan
+            'plan': tenant.plan,
+            'version': tenant_limits.version_of(tenant.database_name)
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         error_tracker.log_error(e, {'subdomain': subdomain, 'function': 'get_tenant_user_limit_api'})
@@ -3176,6 +3312,7 @@ def update_tenant_user_limit_api(subdomain):
         
         # Invalidate cache
         invalidate_tenant_cache(tenant.id)
+        tenant_limits.publish([tenant])
         
         logger.info(f"Updated user limit for tenant {subdomain} from {old_max_users} to {max_users}")
         
@@ -3265,6 +3402,8 @@ def update_tenant_settings(tenant_id):
                     logger.warning(f"Failed to sync user limits for tenant {tenant_id} after settings update")
             except Exception as sync_error:
                 logger.warning(f"Error syncing user limits for tenant {tenant_id}: {sync_error}")
+        elif 'max_users' in changes:
+            tenant_limits.publish([tenant])
         
         # Create audit log
         try:
@@ -3948,52 +4087,15 @@ def sync_tenant_user_limits(tenant_id):
             db.session.commit()
             logger.info(f"Updated tenant {tenant.subdomain} max_users to {max_users}")
         
-        # Try to notify Odoo instance about the limit change
-        try:
-            import xmlrpc.client
-            
-            # Connect to Odoo and update SaaS config
-            odoo_url = os.environ.get('ODOO_URL', 'http://odoo_master:8069')
-            db_name = f"kdoo_{tenant.subdomain}"
-            
-            # Use admin credentials to update the config
-            common = xmlrpc.client.ServerProxy(f"{odoo_url}/xmlrpc/2/common")
-            uid = common.authenticate(db_name, tenant.admin_username, tenant.get_admin_password(), {})
-            
-            if uid:
-                models = xmlrpc.client.ServerProxy(f"{odoo_url}/xmlrpc/2/object")
-                
-                # Search for existing SaaS controller config
-                config_ids = models.execute_kw(
-                    db_name, uid, tenant.get_admin_password(),
-                    'saas.controller', 'search',
-                    [[('database_name', '=', db_name)]]
-                )
-                
-                if config_ids:
-                    # Update existing config
-                    models.execute_kw(
-                        db_name, uid, tenant.get_admin_password(),
-                        'saas.controller', 'write',
-                        [config_ids, {'max_users': max_users}]
-                    )
-                else:
-                    # Create new config
-                    models.execute_kw(
-                        db_name, uid, tenant.get_admin_password(),
-                        'saas.controller', 'create',
-                        [{'database_name': db_name, 'max_users': max_users}]
-                    )
-                
-                logger.info(f"Successfully synced user limit {max_users} to Odoo for tenant {tenant.subdomain}")
-                return True
-            else:
-                logger.warning(f"Failed to authenticate with Odoo for tenant {tenant.subdomain}")
-                
-        except Exception as odoo_error:
-            logger.warning(f"Failed to sync user limit to Odoo for tenant {tenant.subdomain}: {odoo_error}")
+        # Push the limit to the tenant database (applied by saas_user_limit's
+        # listener; tenants that miss the message catch up on their next poll)
+        version = tenant_limits.publish([tenant])
+        if version is not None:
+            logger.info(f"Published user limit {max_users} (v{version}) for tenant {tenant.subdomain}")
+        else:
+            logger.warning(f"User limit for tenant {tenant.subdomain} will propagate on the tenant's next poll")
         
-        return True  # Return True even if Odoo sync failed, as SaaS Manager was updated
+        return True  # Return True even if the push failed, as SaaS Manager was updated
         
     except Exception as e:
         error_tracker.log_error(e, {'tenant_id': tenant_id, 'function': 'sync_tenant_user_limits'})
@@ -4672,6 +4774,7 @@ def inject_now():
     return {'now': datetime.utcnow()}
 
 if __name__ == '__main__':
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py wsgi:app`
     port = int(os.environ.get('PORT', 8000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     logger.info(f"Starting Flask application with SocketIO on port {port}")
@@ -338,6 +338,7 @@ class BillingService:
                 self._update_billing_tickets(tenant_id, expired_cycle.id)
             
             db.session.commit()
+            self._invalidate_tenant_cache(tenant_id)
             
             logger.info(f"Processed payment and reactivated tenant {tenant.name}")
             return payment
@@ -443,6 +444,7 @@ class BillingService:
                 payment.billing_cycle_id = new_cycle.id
             
             db.session.commit()
+            self._invalidate_tenant_cache(tenant_id)
             
             logger.info(f"Processed renewal payment and extended billing cycle for tenant {tenant.name}")
             return payment
@@ -481,37 +483,93 @@ class BillingService:
                 status='active'
             ).first()
             
-            if not active_cycle:
-                return {
-                    'tenant_name': tenant.name,
-                    'status': 'no_active_cycle',
-                    'requires_payment': True,
-                    'can_renew_early': False
-                }
-            
-            # Check if renewal button should be active (15 days before expiration)
-            can_renew_early = self._can_renew_early(active_cycle)
-
-            return {
-                'tenant_name': tenant.name,
-                'cycle_start': active_cycle.cycle_start,
-                'cycle_end': active_cycle.cycle_end,
-                'hours_used': active_cycle.hours_used,
-                'hours_remaining': active_cycle.hours_remaining,
-                'days_remaining': active_cycle.days_remaining,
-                'total_hours_allowed': active_cycle.total_hours_allowed,
-                'status': active_cycle.status,
-                'is_expired': active_cycle.is_expired,
-                'reminder_sent': active_cycle.reminder_sent,
-                'auto_deactivated': active_cycle.auto_deactivated,
-                'requires_payment': active_cycle.is_expired,
-                'can_renew_early': can_renew_early
-            }
+            return self._build_billing_info(tenant.name, active_cycle)
             
         except Exception as e:
             logger.error(f"Error getting billing info: {str(e)}")
             return None
     
+    def get_billing_info_for_tenants(self, tenant_ids, serializable=False):
+        """
+        Get billing information for many tenants with a single query.
+        
+        Args:
+            tenant_ids: Iterable of tenant IDs
+            serializable: Return cycle dates as ISO strings so the result can be cached as JSON
+            
+        Returns:
+            dict: {tenant_id: billing_info} for every tenant that exists
+        """
+        tenant_ids = list(set(tenant_ids or []))
+        if not tenant_ids:
+            return {}
+        
+        try:
+            rows = db.session.query(Tenant.id, Tenant.name, BillingCycle).outerjoin(
+                BillingCycle,
+                db.and_(BillingCycle.tenant_id == Tenant.id, BillingCycle.status == 'active')
+            ).filter(Tenant.id.in_(tenant_ids)).order_by(Tenant.id, BillingCycle.id).all()
+            
+            billing_info = {}
+            for tenant_id, tenant_name, active_cycle in rows:
+                # Keep the first active cycle per tenant, matching get_tenant_billing_info
+                if tenant_id in billing_info:
+                    continue
+                billing_info[tenant_id] = self._build_billing_info(tenant_name, active_cycle, serializable)
+            
+            return billing_info
+            
+        except Exception as e:
+            logger.error(f"Error getting bulk billing info: {str(e)}")
+            return {}
+    
+    def _build_billing_info(self, tenant_name, active_cycle, serializable=False):
+        """Build the billing info payload for a tenant and its active cycle"""
+        if not active_cycle:
+            return {
+                'tenant_name': tenant_name,
+                'status': 'no_active_cycle',
+                'requires_payment': True,
+                'can_renew_early': False
+            }
+        
+        # Check if renewal button should be active (15 days before expiration)
+        can_renew_early = self._can_renew_early(active_cycle)
+        
+        cycle_start = active_cycle.cycle_start
+        cycle_end = active_cycle.cycle_end
+        if serializable:
+            cycle_start = cycle_start.isoformat() if cycle_start else None
+            cycle_end = cycle_end.isoformat() if cycle_end else None
+
+        return {
+            'tenant_name': tenant_name,
+            'cycle_start': cycle_start,
+            'cycle_end': cycle_end,
+            'hours_used': active_cycle.hours_used,
+            'hours_remaining': active_cycle.hours_remaining,
+            'days_remaining': active_cycle.days_remaining,
+            'total_hours_allowed': active_cycle.total_hours_allowed,
+            'status': active_cycle.status,
+            'is_expired': active_cycle.is_expired,
+            'reminder_sent': active_cycle.reminder_sent,
+            'auto_deactivated': active_cycle.auto_deactivated,
+            'requires_payment': active_cycle.is_expired,
+            'can_renew_early': can_renew_early
+        }
+    
+    @staticmethod
+    def _invalidate_tenant_cache(tenant_id):
+        """Drop cached dashboard data for a tenant after its billing changed"""
+        try:
+            from flask import has_app_context
+            if not has_app_context():
+                return
+            from cache_manager import invalidate_tenant_cache
+            invalidate_tenant_cache(tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not invalidate cache for tenant {tenant_id}: {e}")
+    
     def _can_renew_early(self, billing_cycle):
         """Check if the tenant can renew early (15 days before expiration)"""
         try:
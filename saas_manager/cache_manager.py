@@ -18,6 +18,14 @@ logger = logging.getLogger(__name__)
 class CacheManager:
     """Enhanced cache manager with real-time updates and intelligent invalidation"""
     
+    # Tag index: every cached key is added to the Redis sets of the users and
+    # tenants it depends on, so invalidation deletes exactly those keys instead
+    # of walking the whole keyspace (shared with sessions and the limiter)
+    TAG_PREFIX = "cache_tag"
+    DELETE_BATCH = 500
+    SCAN_COUNT = 1000
+    CACHE_PATTERNS = ("user_tenants:*", "admin_stats*", "tenant_details:*", "tenant_status:*", "cache_tag:*")
+    
     def __init__(self, redis_client: redis.Redis):
         self.redis_client = redis_client
         self.cache_ttl = 300  # 5 minutes default TTL
@@ -39,6 +47,48 @@ class CacheManager:
     def _cache_version_key(self, cache_type: str) -> str:
         return f"cache_version:{cache_type}"
     
+    def _user_tag(self, user_id: int) -> str:
+        return f"{self.TAG_PREFIX}:user:{user_id}"
+    
+    def _tenant_tag(self, tenant_id: int) -> str:
+        return f"{self.TAG_PREFIX}:tenant:{tenant_id}"
+    
+    # Tagged writes and invalidation
+    def _cache_set(self, key: str, ttl: int, value: str, tags: List[str] = ()):
+        """SETEX a key and register it under its tags, in one round trip"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.setex(key, ttl, value)
+        for tag in tags:
+            pipe.sadd(tag, key)
+            # A tag set outlives every key in it, so it never needs pruning
+            pipe.expire(tag, max(ttl, self.cache_ttl))
+        pipe.execute()
+    
+    def _delete_keys(self, keys) -> int:
+        """UNLINK keys in batches (freed in the background, never one huge command)"""
+        keys = list(keys)
+        if not keys:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start in range(0, len(keys), self.DELETE_BATCH):
+            pipe.unlink(*keys[start:start + self.DELETE_BATCH])
+        pipe.execute()
+        return len(keys)
+    
+    def _invalidate_tags(self, tags: List[str]) -> int:
+        """Delete every key registered under the tags; returns the number of keys"""
+        tags = list(tags)
+        if not tags or not self.redis_client:
+            return 0
+        # Members are read and the sets dropped atomically: a write racing with
+        # this lands in a fresh set instead of being lost
+        pipe = self.redis_client.pipeline(transaction=True)
+        for tag in tags:
+            pipe.smembers(tag)
+        pipe.delete(*tags)
+        members = pipe.execute()[:-1]
+        return self._delete_keys(set().union(*members))
+    
     # Cache versioning for invalidation
     def _get_cache_version(self, cache_type: str) -> int:
         """Get current cache version for a given cache type"""
@@ -89,7 +139,8 @@ class CacheManager:
         # Cache the result
         if self.redis_client:
             try:
-                self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(tenant_data))
+                tags = [self._user_tag(user_id)] + [self._tenant_tag(t['id']) for t in tenant_data]
+                self._cache_set(cache_key, self.cache_ttl, json.dumps(tenant_data), tags)
                 logger.debug(f"Cached user tenants for user {user_id}")
             except Exception as e:
                 logger.warning(f"Failed to cache user tenants: {e}")
@@ -104,7 +155,7 @@ class CacheManager:
             Tenant.status != 'deleted'
         ).all()
         
-        return [
+        tenant_data = [
             {
                 'id': t.id,
                 'name': t.name,
@@ -119,6 +170,41 @@ class CacheManager:
             }
             for t in tenants
         ]
+        
+        self._attach_billing_info(tenant_data)
+        return tenant_data
+    
+    def _attach_billing_info(self, tenant_data: List[Dict]) -> None:
+        """Merge billing status into tenant payloads using one bulk billing lookup"""
+        if not tenant_data:
+            return
+        
+        from billing_service import BillingService
+        billing_map = BillingService().get_billing_info_for_tenants(
+            [t['id'] for t in tenant_data], serializable=True
+        )
+        
+        for tenant in tenant_data:
+            billing_info = billing_map.get(tenant['id'])
+            if billing_info and billing_info.get('status') != 'no_active_cycle':
+                tenant.update({
+                    'billing_info': billing_info,
+                    'is_expired': billing_info.get('is_expired', False),
+                    'days_remaining': billing_info.get('days_remaining', 0),
+                    'hours_remaining': billing_info.get('hours_remaining', 0),
+                    'requires_payment': billing_info.get('requires_payment', False),
+                    'can_renew_early': billing_info.get('can_renew_early', False)
+                })
+            else:
+                # No active billing cycle
+                tenant.update({
+                    'billing_info': None,
+                    'is_expired': True,
+                    'days_remaining': 0,
+                    'hours_remaining': 0,
+                    'requires_payment': True,
+                    'can_renew_early': False
+                })
     
     # Admin stats caching
     def get_admin_stats(self, force_refresh: bool = False) -> Dict:
@@ -192,7 +278,7 @@ class CacheManager:
         # Cache the result
         if self.redis_client:
             try:
-                self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(tenant_data))
+                self._cache_set(cache_key, self.cache_ttl, json.dumps(tenant_data), [self._tenant_tag(tenant_id)])
             except Exception as e:
                 logger.warning(f"Failed to cache tenant details: {e}")
         
@@ -203,8 +289,11 @@ class CacheManager:
         """Invalidate user tenants cache for specific users or all users"""
         if user_ids:
             # Invalidate specific users
-            for user_id in user_ids:
-                self._invalidate_user_cache(user_id)
+            if self.redis_client:
+                try:
+                    self._invalidate_tags([self._user_tag(user_id) for user_id in user_ids])
+                except Exception as e:
+                    logger.warning(f"Failed to invalidate user caches for {user_ids}: {e}")
         else:
             # Invalidate all tenant-related caches
             self._increment_cache_version("tenants")
@@ -217,23 +306,19 @@ class CacheManager:
         logger.info("Invalidated admin stats cache")
     
     def invalidate_tenant_cache(self, tenant_id: int):
-        """Invalidate cache for a specific tenant"""
+        """
+        Invalidate cache for a specific tenant: its details and the tenant lists
+        of the users whose cached list contains it. A user added to the tenant
+        has no such list yet, so membership changes must invalidate the user
+        itself (invalidate_user_tenants_cache).
+        """
         if not self.redis_client:
             return
         
         try:
-            # Find all users associated with this tenant
-            from db import db
-            tenant_users = db.session.query(TenantUser.user_id).filter_by(tenant_id=tenant_id).all()
-            user_ids = [tu.user_id for tu in tenant_users]
-            
-            # Invalidate caches
-            self.invalidate_user_tenants_cache(user_ids)
+            count = self._invalidate_tags([self._tenant_tag(tenant_id)])
             self.invalidate_admin_stats_cache()
-            
-            # Invalidate specific tenant details
-            cache_key = self._versioned_key(self._tenant_details_key(tenant_id), "tenants")
-            self.redis_client.delete(cache_key)
+            logger.debug(f"Invalidated {count} cached keys of tenant {tenant_id}")
             
         except Exception as e:
             logger.error(f"Failed to invalidate tenant cache for {tenant_id}: {e}")
@@ -244,11 +329,8 @@ class CacheManager:
             return
         
         try:
-            # Delete all versions of user cache
-            pattern = f"{self._user_tenants_key(user_id)}:*"
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
+            # All versions of the user's cache are in its tag set
+            self._invalidate_tags([self._user_tag(user_id)])
         except Exception as e:
             logger.warning(f"Failed to invalidate user cache for {user_id}: {e}")
     
@@ -294,20 +376,18 @@ class CacheManager:
             self._increment_cache_version("tenants")
             self._increment_cache_version("admin_stats")
             
-            # Clear specific patterns
-            patterns = [
-                "user_tenants:*",
-                "admin_stats*",
-                "tenant_details:*",
-                "tenant_status:*"
-            ]
-            
-            for pattern in patterns:
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    self.redis_client.delete(*keys)
+            # Incremental SCAN in batches: Redis keeps serving other clients in between
+            deleted = 0
+            for pattern in self.CACHE_PATTERNS:
+                batch = []
+                for key in self.redis_client.scan_iter(match=pattern, count=self.SCAN_COUNT):
+                    batch.append(key)
+                    if len(batch) >= self.DELETE_BATCH:
+                        deleted += self._delete_keys(batch)
+                        batch = []
+                deleted += self._delete_keys(batch)
             
-            logger.info("Cleared all application caches")
+            logger.info(f"Cleared all application caches ({deleted} keys)")
             
         except Exception as e:
             logger.error(f"Failed to clear all cache: {e}")
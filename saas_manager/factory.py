@@ -16,6 +16,7 @@ from db import db
 from models import SaasUser
 from utils import error_tracker
 from infra_admin import init_infra_tables
+from list_query import ensure_list_indexes
 
 def create_app():
     app = Flask(__name__)
@@ -50,7 +51,17 @@ def create_app():
     
     return app, csrf
 
+# Arbitrary key for the PostgreSQL advisory lock guarding schema creation
+SCHEMA_INIT_LOCK_ID = 746001
+
 def init_db(app):
     with app.app_context():
-        init_infra_tables()
-        db.create_all()
\ No newline at end of file
+        # Several gunicorn workers start at once; serialize schema creation
+        with db.engine.connect() as lock_conn:
+            lock_conn.execute(db.text("SELECT pg_advisory_lock(:id)"), {'id': SCHEMA_INIT_LOCK_ID})
+            try:
+                init_infra_tables()
+                db.create_all()
+                ensure_list_indexes()
+            finally:
+                lock_conn.execute(db.text("SELECT pg_advisory_unlock(:id)"), {'id': SCHEMA_INIT_LOCK_ID})
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for the SaaS manager
+
+Runs several threaded worker processes. Socket.IO clients connect with the
+websocket transport only, so a connection stays on the worker that accepted
+it and no sticky sessions are needed; cross-worker emits go through the
+Redis message queue (SOCKETIO_MESSAGE_QUEUE / REDIS_URL).
+
+Every setting can be overridden through GUNICORN_* environment variables.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Threaded workers: the app relies on psycopg2, docker and background threads,
+# none of which need (or tolerate well) gevent/eventlet monkey patching
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# An open Socket.IO websocket holds a thread for as long as the page stays open,
+# so websocket threads are budgeted on top of the ones serving requests. The
+# app refuses websockets beyond GUNICORN_WEBSOCKET_THREADS per worker (see
+# WebSocketManager.MAX_LOCAL_CONNECTIONS), keeping the request threads free;
+# workers * GUNICORN_WEBSOCKET_THREADS is the number of open dashboards served.
+request_threads = int(os.environ.get('GUNICORN_THREADS', 16))
+websocket_threads = int(os.environ.get('GUNICORN_WEBSOCKET_THREADS', 64))
+threads = request_threads + websocket_threads
+
+# Restores run as background jobs; this only has to cover streamed transfers
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to contain leaks in long-running processes
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# The app starts background threads at import time (Redis subscriber, pool
+# refill), which would not survive a fork, so every worker loads it itself
+preload_app = False
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
@@ -3702,8 +3702,19 @@ def verify_domain_mapping(mapping):
         mapping.verification_status = 'error'
         return {'status': 'error', 'details': str(e)}
 
+def _domain_config_body(config):
+    """Domain config without its timestamp line, for comparing renders"""
+    return '\n'.join(line for line in config.strip().splitlines()
+                     if not line.startswith('# Last updated:'))
+
 def update_nginx_configuration():
-    """Update Nginx configuration with current domain mappings"""
+    """
+    Update Nginx configuration with current domain mappings.
+    
+    Nothing is written or reloaded when the rendered mappings match the
+    deployed file. The new file replaces the old one with a rename in the same
+    directory, and the previous file is put back if nginx rejects it.
+    """
     try:
         # Get all active domain mappings
         mappings = DomainMapping.query.filter_by(status='active').all()
@@ -3730,13 +3741,22 @@ def update_nginx_configuration():
             client.connect(nginx_server.ip_address, port=nginx_server.port,
                          username=nginx_server.username, password=decrypt_password(nginx_server.password))
         
+        target = '/etc/nginx/conf.d/domains.conf'
+        stdin, stdout, stderr = client.exec_command(f'sudo cat {target} 2>/dev/null')
+        if _domain_config_body(stdout.read().decode()) == _domain_config_body(nginx_config):
+            client.close()
+            return {'success': True, 'reloaded': False, 'message': 'Nginx configuration unchanged'}
+        
         # Write configuration file
         config_path = '/tmp/nginx_domains.conf'
         stdin, stdout, stderr = client.exec_command(f'cat > {config_path} << "EOF"\n{nginx_config}\nEOF')
+        stdout.channel.recv_exit_status()
         
-        # Move to nginx directory and test configuration
+        # Stage next to the live file so the final mv is an atomic rename, keeping the old file
         commands = [
-            f'sudo mv {config_path} /etc/nginx/conf.d/domains.conf',
+            f'sudo install -m 644 {config_path} {target}.new',
+            f'if [ -f {target} ]; then sudo cp -p {target} {target}.prev; fi',
+            f'sudo mv -f {target}.new {target}',
             'sudo nginx -t',
             'sudo systemctl reload nginx'
         ]
@@ -3745,10 +3765,16 @@ def update_nginx_configuration():
             stdin, stdout, stderr = client.exec_command(command)
             error = stderr.read().decode()
             if error and 'successful' not in error and 'warning' not in error.lower():
+                if command == 'sudo nginx -t':
+                    client.exec_command(
+                        f'if [ -f {target}.prev ]; then sudo mv -f {target}.prev {target}; '
+                        f'else sudo rm -f {target}; fi'
+                    )[1].channel.recv_exit_status()
+                client.close()
                 return {'success': False, 'error': f'Command failed: {command} - {error}'}
         
         client.close()
-        return {'success': True}
+        return {'success': True, 'reloaded': True}
         
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -3759,6 +3785,12 @@ def generate_nginx_config(mappings):
 # Auto-generated domain mappings
 # Last updated: {{ timestamp }}
 
+# Odoo web asset cache shared by the mapped domains
+{{ asset_cache_http }}
+
+# Tenant routing: worker upstreams and placement maps of the SaaS manager
+{{ routing_config }}
+
 {% for mapping in mappings %}
 server {
     listen 80;
@@ -3774,26 +3806,47 @@ server {
     ssl_ciphers HIGH:!aNULL:!MD5;
     {% endif %}
     
-    location / {
-        proxy_pass http://{{ mapping.target_subdomain }};
+    # Same routing key as the tenant subdomain: the placement map and the
+    # consistent hash send the custom domain to the tenant's worker
+    set $subdomain {{ mapping.target_subdomain }};
+    
+    # Odoo bus: websocket/longpolling go to the gevent port of the workers
+    location ~ ^/(websocket|longpolling)(/|$) {
+        proxy_pass http://{{ bus_upstream }};
         proxy_set_header Host $host;
         proxy_set_header X-Real-IP $remote_addr;
         proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto $scheme;
         proxy_set_header X-Forwarded-Host $host;
-        proxy_set_header X-Forwarded-Port $server_port;
+        proxy_set_header X-Subdomain $subdomain;
         
-        # WebSocket support
         proxy_http_version 1.1;
         proxy_set_header Upgrade $http_upgrade;
         proxy_set_header Connection "upgrade";
         
+        proxy_buffering off;
+        proxy_read_timeout 3600s;
+        proxy_send_timeout 3600s;
+        proxy_next_upstream off;
+    }
+    
+    location / {
+        proxy_pass http://{{ tenant_upstream }};
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header X-Forwarded-Host $host;
+        proxy_set_header X-Forwarded-Port $server_port;
+        proxy_set_header X-Subdomain $subdomain;
+        
         # Timeouts
         proxy_connect_timeout 60s;
         proxy_send_timeout 60s;
         proxy_read_timeout 60s;
     }
     
+    {{ asset_cache_locations | indent(4) }}
     # Health check endpoint
     location /nginx-health {
         access_log off;
@@ -3813,14 +3866,6 @@ server {
 
 {% endfor %}
 
-# Load balancing upstream for workers
-upstream odoo_workers {
-    least_conn;
-    {% for worker in workers %}
-    server {{ worker.container_name }}:8069;
-    {% endfor %}
-}
-
 # Default server block for undefined domains
 server {
     listen 80 default_server;
@@ -3836,13 +3881,26 @@ server {
     
     template = Template(config_template)
     
-    # Get worker instances for load balancing
-    workers = WorkerInstance.query.filter_by(status='running').all()
+    # Own zone: this file lives on the domains nginx server, next to whatever else it caches
+    from services.nginx_service import NginxLoadBalancerService
+    zone = 'odoo_domain_assets'
     
+    # The domains server does not include the manager's conf.d, so the worker
+    # upstreams and placement maps are rendered into this file under their own
+    # names. Domain and worker changes push it again (auto_reload_nginx_on_worker_change)
+    routing = NginxLoadBalancerService().render_routing_config('domain_')
     return template.render(
         mappings=mappings,
-        workers=workers,
-        timestamp=datetime.utcnow().isoformat()
+        routing_config=routing['config'],
+        tenant_upstream=routing['tenant_upstream'],
+        bus_upstream=routing['bus_upstream'],
+        timestamp=datetime.utcnow().isoformat(),
+        asset_cache_http=NginxLoadBalancerService.render_asset_cache_http(
+            zone=zone, path=f'/var/cache/nginx/{zone}'
+        ),
+        asset_cache_locations=NginxLoadBalancerService.render_asset_cache_locations(
+            upstream=routing['tenant_upstream'], zone=zone
+        )
     )
 
 # ================= CRON JOB MANAGEMENT =================
@@ -4933,24 +4991,41 @@ def backup_saas_manager_database():
 # ================= AUTO-RELOAD NGINX ON WORKER CHANGES =================
 
 def auto_reload_nginx_on_worker_change():
-    """Auto-reload Nginx when workers are added/removed"""
+    """
+    Schedule a Nginx domain configuration update after workers are added/removed.
+    
+    Runs after the load balancer's next debounced reload, so adding several
+    workers in a row updates the domain server once (and not at all if the
+    rendered configuration is unchanged).
+    """
     try:
-        # Update Nginx configuration to include new worker in load balancing
-        result = update_nginx_configuration()
+        from services.nginx_service import NginxLoadBalancerService
+        app = current_app._get_current_object()
         
-        if result['success']:
-            # Log the auto-reload
-            audit_log = AuditLog(
-                action='nginx_auto_reload',
-                details={'reason': 'worker_configuration_changed'},
-                ip_address='system'
-            )
-            db.session.add(audit_log)
-            db.session.commit()
-            
-            return True
-        else:
-            return False
+        def update_domains():
+            with app.app_context():
+                try:
+                    # Update Nginx configuration to include new worker in load balancing
+                    result = update_nginx_configuration()
+                    if result['success'] and result.get('reloaded'):
+                        # Log the auto-reload
+                        audit_log = AuditLog(
+                            action='nginx_auto_reload',
+                            details={'reason': 'worker_configuration_changed'},
+                            ip_address='system'
+                        )
+                        db.session.add(audit_log)
+                        db.session.commit()
+                    elif not result['success']:
+                        logger.error(f"Nginx domain configuration update failed: {result['error']}")
+                except Exception as e:
+                    db.session.rollback()
+                    error_tracker.log_error(e, {'function': 'auto_reload_nginx_on_worker_change'})
+        
+        NginxLoadBalancerService().controller.defer(
+            'domain_configuration', update_domains, reason='worker configuration changed'
+        )
+        return True
             
     except Exception as e:
         error_tracker.log_error(e, {'function': 'auto_reload_nginx_on_worker_change'})
@@ -5010,11 +5085,11 @@ def create_worker_with_nginx_reload():
             'message': f'Worker {worker_name} created successfully',
             'container_id': container.id,
             'worker_id': db_worker.id,
-            'nginx_reloaded': nginx_result
+            'nginx_reload_scheduled': nginx_result
         }
         
         if not nginx_result:
-            response_data['warning'] = 'Worker created but Nginx configuration update failed'
+            response_data['warning'] = 'Worker created but Nginx configuration update could not be scheduled'
         
         return jsonify(response_data)
         
@@ -6546,53 +6621,19 @@ def execute_ssh_command(server, command, timeout=30):
 def update_nginx_load_balancer(worker_ip, worker_port, worker_name):
     """Update Nginx load balancer configuration to include new worker"""
     try:
-        # Get the nginx configuration path
-        nginx_config_path = "/nginx/nginx.conf"
-        
-        if not os.path.exists(nginx_config_path):
-            logger.warning(f"Nginx config file not found at {nginx_config_path}")
-            return False
+        # Tenant traffic goes through the consistent-hash upstream maintained by
+        # NginxLoadBalancerService, so new workers are registered there
+        from services.nginx_service import NginxLoadBalancerService
         
-        # Read current nginx configuration
-        with open(nginx_config_path, 'r') as f:
-            nginx_config = f.read()
+        tenant_keys = [t.subdomain for t in Tenant.query.filter(Tenant.status != 'deleted').all() if t.subdomain]
+        result = NginxLoadBalancerService().add_worker(worker_ip, worker_port, worker_name, tenant_keys=tenant_keys)
         
-        # Define the new upstream server entry
-        new_upstream_entry = f"    server {worker_ip}:{worker_port}; # {worker_name}"
-        
-        # Check if worker already exists in config
-        if worker_name in nginx_config:
-            logger.info(f"Worker {worker_name} already exists in Nginx config")
+        if result['success']:
+            logger.info(f"Added {worker_name} to Nginx load balancer "
+                        f"({len(result.get('moved_tenants', []))} tenants rebalanced to it)")
             return True
-        
-        # Find the upstream block and add the new server
-        import re
-        upstream_pattern = r'(upstream\s+odoo_workers\s*\{[^}]*)'
-        match = re.search(upstream_pattern, nginx_config, re.DOTALL)
-        
-        if match:
-            upstream_block = match.group(1)
-            # Add new server before the closing brace
-            updated_upstream = upstream_block + '\n' + new_upstream_entry
-            nginx_config = nginx_config.replace(upstream_block, updated_upstream)
-            
-            # Write back the updated configuration
-            with open(nginx_config_path, 'w') as f:
-                f.write(nginx_config)
-            
-            # Reload Nginx configuration
-            reload_result = subprocess.run(['docker', 'exec', 'nginx', 'nginx', '-s', 'reload'], 
-                                         capture_output=True, text=True)
-            
-            if reload_result.returncode == 0:
-                logger.info(f"Successfully added {worker_name} to Nginx load balancer and reloaded")
-                return True
-            else:
-                logger.error(f"Failed to reload Nginx: {reload_result.stderr}")
-                return False
-        else:
-            logger.warning("Could not find upstream odoo_workers block in Nginx config")
-            return False
+        logger.error(f"Failed to add {worker_name} to Nginx load balancer: {result.get('error')}")
+        return False
             
     except Exception as e:
         logger.error(f"Error updating Nginx load balancer: {str(e)}")
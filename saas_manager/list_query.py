@@ -0,0 +1,362 @@
+# list_query.py
+"""
+Shared list-query layer for the admin list APIs.
+
+A ``ListQuery`` describes one listing: which columns may be sorted on, which
+request arguments filter it, which relationships are eager-loaded and how a
+free-text ``q`` is matched. ``ListQuery.page(request.args)`` then returns one
+page using keyset (seek) pagination on (sort column, primary key). The cost
+of a page is the same on the first page and the ten-thousandth, unlike
+OFFSET plus a COUNT(*) for every page.
+
+Totals are approximate and cached. An unfiltered listing of a large table
+takes the planner's row estimate (``pg_class.reltuples``). Everything else is
+counted exactly once per ``TOTAL_CACHE_TTL`` and filter combination.
+"""
+
+# Standard library imports
+import base64
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# Third-party imports
+from flask import current_app, has_app_context
+from sqlalchemy import and_, or_, func, text, tuple_
+
+# Local application imports
+from db import db
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidListQuery(ValueError):
+    """Bad cursor, sort or filter value in a list request"""
+
+
+# ================= FILTER BUILDERS =================
+
+def eq(column, cast: Callable = str):
+    """Filter on equality with the argument converted by ``cast``"""
+    def apply(query, value):
+        try:
+            return query.filter(column == cast(value))
+        except (TypeError, ValueError):
+            raise InvalidListQuery(f"Invalid value for {column.key}: {value!r}")
+    return apply
+
+
+def choice(column, mapping: Dict[str, Any]):
+    """Filter on a column through a fixed mapping, e.g. {'active': True, 'inactive': False}"""
+    def apply(query, value):
+        if value not in mapping:
+            raise InvalidListQuery(f"Invalid value for {column.key}: {value!r}")
+        return query.filter(column == mapping[value])
+    return apply
+
+
+def date_bound(column, upper: bool = False):
+    """Filter on an ISO date/datetime lower (or upper) bound, inclusive"""
+    def apply(query, value):
+        try:
+            bound = datetime.fromisoformat(value)
+        except ValueError:
+            raise InvalidListQuery(f"Invalid date: {value!r}")
+        return query.filter(column <= bound if upper else column >= bound)
+    return apply
+
+
+# ================= RESULT =================
+
+@dataclass
+class ListPage:
+    """One page of a listing"""
+    items: List[Any]
+    limit: int
+    sort: str
+    order: str
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+
+    def pagination(self) -> Dict[str, Any]:
+        return {
+            'per_page': self.limit,
+            'sort': self.sort,
+            'order': self.order,
+            'next_cursor': self.next_cursor,
+            'has_more': self.next_cursor is not None,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate,
+        }
+
+
+# ================= LIST QUERY =================
+
+class ListQuery:
+    """Declarative keyset-paginated listing over one model"""
+
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 500
+    TOTAL_CACHE_TTL = 60
+    # Unfiltered tables estimated above this many rows are not counted exactly
+    EXACT_COUNT_LIMIT = 100000
+
+    def __init__(self, name: str, model, sortable: Dict[str, Any], default_sort: str,
+                 default_order: str = 'desc', filters: Optional[Dict[str, Callable]] = None,
+                 search: Sequence = (), eager: Sequence = (), non_null: Sequence[str] = ()):
+        self.name = name
+        self.model = model
+        self.sortable = sortable
+        self.default_sort = default_sort
+        self.default_order = default_order
+        self.filters = filters or {}
+        self.search = list(search)
+        self.eager = list(eager)
+        # Sort keys whose column never holds NULL: plain (col, pk) keyset and
+        # ordering, which a btree index on (col, pk) serves in both directions
+        self.non_null = set(non_null)
+        self.pk = getattr(model, model.__mapper__.primary_key[0].key)
+
+    # ================= CURSORS =================
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, datetime):
+            return {'dt': value.isoformat()}
+        if isinstance(value, date):
+            return {'d': value.isoformat()}
+        return value
+
+    @staticmethod
+    def _decode_value(value):
+        if isinstance(value, dict):
+            if 'dt' in value:
+                return datetime.fromisoformat(value['dt'])
+            if 'd' in value:
+                return date.fromisoformat(value['d'])
+        return value
+
+    def encode_cursor(self, sort: str, order: str, value, pk) -> str:
+        raw = json.dumps([sort, order, self._encode_value(value), pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str, sort: str, order: str):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            cursor_sort, cursor_order, value, pk = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError):
+            raise InvalidListQuery("Invalid cursor")
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise InvalidListQuery("Cursor does not match the requested sort")
+        return self._decode_value(value), pk
+
+    # ================= QUERY BUILDING =================
+
+    def _parse_args(self, args) -> Dict[str, Any]:
+        limit = args.get('limit', type=int) or args.get('per_page', type=int) or self.DEFAULT_LIMIT
+        sort = args.get('sort', self.default_sort)
+        if sort not in self.sortable:
+            raise InvalidListQuery(f"Cannot sort by {sort!r}")
+        order = args.get('order', self.default_order).lower()
+        if order not in ('asc', 'desc'):
+            raise InvalidListQuery(f"Invalid order {order!r}")
+        return {
+            'limit': max(1, min(limit, self.MAX_LIMIT)),
+            'sort': sort,
+            'order': order,
+            'cursor': args.get('cursor') or None,
+            'q': (args.get('q') or '').strip(),
+            'filters': {name: args.get(name) for name in self.filters if args.get(name) not in (None, '')},
+        }
+
+    def filtered(self, params: Dict[str, Any], base_query=None):
+        """Base query with the request's filters and search applied (no ordering/paging)"""
+        query = base_query if base_query is not None else self.model.query
+        for name, value in params['filters'].items():
+            query = self.filters[name](query, value)
+        if params['q'] and self.search:
+            pattern = f"%{params['q']}%"
+            query = query.filter(or_(*[column.ilike(pattern) for column in self.search]))
+        return query
+
+    def page(self, args, base_query=None, redis_client=None, with_total: bool = True) -> ListPage:
+        """
+        One page of the listing for request ``args``.
+
+        Recognised arguments: ``limit`` (or ``per_page``), ``cursor``, ``sort``,
+        ``order``, ``q`` and the names in ``filters``. Raises InvalidListQuery
+        on bad input.
+        """
+        params = self._parse_args(args)
+        sort_column = self.sortable[params['sort']]
+        descending = params['order'] == 'desc'
+
+        query = self.filtered(params, base_query)
+        if params['cursor']:
+            value, pk = self.decode_cursor(params['cursor'], params['sort'], params['order'])
+            if sort_column is self.pk:
+                query = query.filter(self.pk < pk if descending else self.pk > pk)
+            elif params['sort'] in self.non_null:
+                key = tuple_(sort_column, self.pk)
+                query = query.filter(key < tuple_(value, pk) if descending else key > tuple_(value, pk))
+            elif value is None:
+                # NULL sort values come last in both directions
+                query = query.filter(and_(sort_column.is_(None), self.pk < pk if descending else self.pk > pk))
+            else:
+                key = tuple_(sort_column, self.pk)
+                after = key < tuple_(value, pk) if descending else key > tuple_(value, pk)
+                query = query.filter(or_(after, sort_column.is_(None)))
+
+        if sort_column is self.pk:
+            ordering = [self.pk.desc() if descending else self.pk.asc()]
+        elif params['sort'] in self.non_null:
+            ordering = [
+                sort_column.desc() if descending else sort_column.asc(),
+                self.pk.desc() if descending else self.pk.asc(),
+            ]
+        else:
+            ordering = [
+                sort_column.desc().nullslast() if descending else sort_column.asc().nullslast(),
+                self.pk.desc() if descending else self.pk.asc(),
+            ]
+        if self.eager:
+            query = query.options(*self.eager)
+
+        rows = query.order_by(*ordering).limit(params['limit'] + 1).all()
+        next_cursor = None
+        if len(rows) > params['limit']:
+            rows = rows[:params['limit']]
+            last = rows[-1]
+            next_cursor = self.encode_cursor(
+                params['sort'], params['order'],
+                getattr(last, sort_column.key), getattr(last, self.pk.key)
+            )
+
+        result = ListPage(items=rows, limit=params['limit'], sort=params['sort'],
+                          order=params['order'], next_cursor=next_cursor)
+        if with_total:
+            result.total, result.total_is_estimate = self.total(params, base_query, redis_client)
+        return result
+
+    # ================= TOTALS =================
+
+    def _total_key(self, params: Dict[str, Any], scoped: bool) -> str:
+        digest = hashlib.sha1(json.dumps(
+            [params['filters'], params['q'], scoped], sort_keys=True
+        ).encode()).hexdigest()[:16]
+        return f"list_total:{self.name}:{digest}"
+
+    def _estimated_rows(self) -> Optional[int]:
+        if db.engine.dialect.name != 'postgresql':
+            return None
+        try:
+            estimate = db.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+                {'table': self.model.__tablename__}
+            ).scalar()
+            return int(estimate) if estimate and estimate > 0 else None
+        except Exception as e:
+            logger.debug(f"Row estimate unavailable for {self.model.__tablename__}: {e}")
+            return None
+
+    def total(self, params: Dict[str, Any], base_query=None, redis_client=None):
+        """(total, is_estimate) for the filtered listing, cached briefly"""
+        redis_client = redis_client or _default_redis()
+        unfiltered = base_query is None and not params['filters'] and not params['q']
+        key = self._total_key(params, base_query is not None)
+
+        if redis_client:
+            try:
+                cached = redis_client.get(key)
+                if cached:
+                    total, estimate = json.loads(cached)
+                    return total, estimate
+            except Exception as e:
+                logger.debug(f"List total cache read failed for {self.name}: {e}")
+
+        estimate = self._estimated_rows() if unfiltered else None
+        if estimate is not None and estimate > self.EXACT_COUNT_LIMIT:
+            total, is_estimate = estimate, True
+        else:
+            count_query = self.filtered(params, base_query).order_by(None)
+            total = count_query.with_entities(func.count(self.pk)).scalar() or 0
+            is_estimate = False
+
+        if redis_client:
+            try:
+                redis_client.setex(key, self.TOTAL_CACHE_TTL, json.dumps([total, is_estimate]))
+            except Exception as e:
+                logger.debug(f"List total cache write failed for {self.name}: {e}")
+        return total, is_estimate
+
+
+def _default_redis():
+    if not has_app_context():
+        return None
+    cache_manager = getattr(current_app, 'cache_manager', None)
+    return getattr(cache_manager, 'redis_client', None)
+
+
+# ================= AGGREGATES =================
+# Per-row figures for a whole page in one grouped query each, instead of one
+# query per row
+
+def grouped_count(group_column, keys: Iterable, *criteria) -> Dict[Any, int]:
+    """{key: row count} for every key of ``group_column`` in ``keys`` (missing keys count 0)"""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    rows = (db.session.query(group_column, func.count())
+            .filter(group_column.in_(keys), *criteria)
+            .group_by(group_column)
+            .all())
+    return {key: count for key, count in rows}
+
+
+def grouped_max(group_column, value_column, keys: Iterable, *criteria) -> Dict[Any, Any]:
+    """{key: MAX(value_column)} for every key of ``group_column`` in ``keys`` that has rows"""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    rows = (db.session.query(group_column, func.max(value_column))
+            .filter(group_column.in_(keys), *criteria)
+            .group_by(group_column)
+            .all())
+    return {key: value for key, value in rows if value is not None}
+
+
+def index_by(column, keys: Iterable) -> Dict[Any, Any]:
+    """{value: row} of ``column``'s model for the given values, first row per value"""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    index = {}
+    for row in column.class_.query.filter(column.in_(keys)).order_by(column.class_.id).all():
+        index.setdefault(getattr(row, column.key), row)
+    return index
+
+
+# ================= INDEXES =================
+
+# (sort column, primary key) indexes backing the default admin listings;
+# created at startup since db.create_all() leaves existing tables alone
+LIST_INDEXES = (
+    ('ix_audit_logs_created_at_id', 'audit_logs', '(created_at, id)'),
+    ('ix_tenants_created_at_id', 'tenants', '(created_at, id)'),
+    ('ix_saas_users_created_at_id', 'saas_users', '(created_at, id)'),
+)
+
+
+def ensure_list_indexes():
+    """Create the listing indexes if missing (must run inside an application context)"""
+    for name, table, columns in LIST_INDEXES:
+        try:
+            db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {columns}"))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not create index {name}: {e}")
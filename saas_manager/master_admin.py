@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, jsonify, request, redirect, url_for, session, send_file
+from flask import Blueprint, render_template, jsonify, request, redirect, url_for, session, send_file, current_app
 from flask_login import login_required, current_user, login_user
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
@@ -12,6 +12,7 @@ import docker
 import xmlrpc.client
 import requests
 from sqlalchemy import func, desc, text
+from sqlalchemy.orm import joinedload
 
 from models import (
     SaasUser, Tenant, TenantUser, SubscriptionPlan,
@@ -21,6 +22,7 @@ from db import db
 from OdooDatabaseManager import OdooDatabaseManager
 from utils import track_errors, error_tracker, generate_password, logger
 from billing import BillingService
+from list_query import ListQuery, InvalidListQuery, eq, choice, date_bound, grouped_count, grouped_max, index_by
 
 # Import shared utilities
 from shared_utils import get_redis_client, get_docker_client, safe_execute, database_transaction
@@ -56,6 +58,55 @@ def log_admin_action(action, details=None):
     except Exception as e:
         logging.error(f"Failed to log admin action: {e}")
 
+# ================= LIST QUERIES =================
+# Keyset-paginated, server-side filtered listings shared by the admin list APIs
+
+AUDIT_LOG_LIST = ListQuery(
+    'audit_logs', AuditLog,
+    sortable={'created_at': AuditLog.created_at, 'id': AuditLog.id},
+    default_sort='created_at',
+    non_null=('created_at',),
+    filters={
+        'action': eq(AuditLog.action),
+        'user_id': eq(AuditLog.user_id, int),
+        'tenant_id': eq(AuditLog.tenant_id, int),
+        'date_from': date_bound(AuditLog.created_at),
+        'date_to': date_bound(AuditLog.created_at, upper=True),
+    },
+    search=[AuditLog.action, AuditLog.ip_address],
+    eager=[joinedload(AuditLog.user), joinedload(AuditLog.tenant)],
+)
+
+USER_LIST = ListQuery(
+    'saas_users', SaasUser,
+    sortable={
+        'created_at': SaasUser.created_at, 'id': SaasUser.id, 'username': SaasUser.username,
+        'email': SaasUser.email, 'last_login': SaasUser.last_login,
+    },
+    default_sort='created_at',
+    non_null=('created_at',),
+    filters={
+        'status': choice(SaasUser.is_active, {'active': True, 'inactive': False}),
+        'role': choice(SaasUser.is_admin, {'admin': True, 'user': False}),
+    },
+    search=[SaasUser.username, SaasUser.email],
+)
+
+TENANT_LIST = ListQuery(
+    'tenants', Tenant,
+    sortable={
+        'created_at': Tenant.created_at, 'id': Tenant.id, 'name': Tenant.name,
+        'subdomain': Tenant.subdomain, 'status': Tenant.status, 'plan': Tenant.plan,
+    },
+    default_sort='created_at',
+    non_null=('created_at',),
+    filters={
+        'status': eq(Tenant.status),
+        'plan': eq(Tenant.plan),
+    },
+    search=[Tenant.name, Tenant.subdomain],
+)
+
 @master_admin_bp.route('/master-admin/email-settings', methods=['GET', 'POST'])
 @login_required
 @require_admin()
@@ -321,9 +372,18 @@ def update_plan(plan_id):
         plan.features = data.get('features', plan.features)
         plan.modules = data.get('modules', plan.modules)
         plan.is_active = data.get('is_active', plan.is_active)
+        if plan.name != old_values['name']:
+            # Tenants reference their plan by name, keep them on it
+            Tenant.query.filter_by(plan=old_values['name']).update(
+                {'plan': plan.name}, synchronize_session=False
+            )
         
         db.session.commit()
         
+        # Push changed limits to every tenant on the plan in one batch
+        if plan.max_users != old_values['max_users'] or plan.name != old_values['name']:
+            current_app.tenant_limits.publish_plan(plan.name)
+        
         log_admin_action('plan_updated', {
             'plan_id': plan_id,
             'old_values': old_values,
@@ -590,6 +650,261 @@ def install_tenant_modules(tenant_id):
         error_tracker.log_error(e, {'tenant_id': tenant_id})
         return jsonify({'success': False, 'message': 'Failed to install modules'}), 500
 
+# ================= PROVISIONING TEMPLATES =================
+
+def _get_template_provisioner():
+    """Build a template provisioning service bound to the master Odoo instance"""
+    from services.provisioning_service import TemplateProvisioningService
+    odoo = OdooDatabaseManager(
+        odoo_url=os.environ.get('ODOO_URL', 'http://odoo_master:8069'),
+        master_pwd=os.environ.get('ODOO_MASTER_PASSWORD', 'admin123')
+    )
+    return TemplateProvisioningService(odoo, redis_client)
+
+@master_admin_bp.route('/master-admin/api/provisioning/templates', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('get_provisioning_templates')
+def get_provisioning_templates():
+    """List the golden template expected for each active plan and whether it is ready"""
+    try:
+        provisioner = _get_template_provisioner()
+        existing = set(provisioner.list_templates())
+        
+        plans = SubscriptionPlan.query.filter_by(is_active=True).all()
+        templates = []
+        for plan in plans:
+            name = provisioner.template_name(plan.modules)
+            templates.append({
+                'plan': plan.name,
+                'template': name,
+                'modules': provisioner.normalize_modules(plan.modules),
+                'exists': name in existing,
+                'ready': name in existing and provisioner.template_ready(name)
+            })
+        
+        expected = {t['template'] for t in templates}
+        return jsonify({
+            'success': True,
+            'templates': templates,
+            'orphaned_templates': sorted(existing - expected)
+        })
+    except Exception as e:
+        error_tracker.log_error(e, {'function': 'get_provisioning_templates'})
+        return jsonify({'success': False, 'message': 'Failed to load provisioning templates'}), 500
+
+@master_admin_bp.route('/master-admin/provisioning/templates/warm', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('warm_provisioning_templates')
+def warm_provisioning_templates():
+    """Build missing templates for all active plans, or rebuild one plan's template"""
+    try:
+        data = request.json or {}
+        plan_name = data.get('plan')
+        rebuild = bool(data.get('rebuild', False))
+        
+        query = SubscriptionPlan.query.filter_by(is_active=True)
+        if plan_name:
+            query = query.filter_by(name=plan_name)
+        module_sets = [plan.modules for plan in query.all()]
+        if not module_sets:
+            return jsonify({'success': False, 'message': 'No matching plans'}), 404
+        
+        provisioner = _get_template_provisioner()
+        
+        def build_templates():
+            for modules in module_sets:
+                try:
+                    if rebuild:
+                        provisioner.rebuild_template(modules)
+                    else:
+                        provisioner.ensure_template(modules)
+                except Exception as build_error:
+                    logger.error(f"Template build failed for modules {modules}: {build_error}")
+        
+        import threading
+        threading.Thread(target=build_templates, daemon=True).start()
+        
+        log_admin_action('provisioning_templates_warm', {
+            'plan': plan_name or 'all',
+            'rebuild': rebuild,
+            'templates': [provisioner.template_name(modules) for modules in module_sets]
+        })
+        
+        return jsonify({'success': True, 'message': f'Building templates for {len(module_sets)} plan(s) in background'})
+    except Exception as e:
+        error_tracker.log_error(e, {'function': 'warm_provisioning_templates'})
+        return jsonify({'success': False, 'message': 'Failed to start template build'}), 500
+
+# ================= TENANT DATABASE POOL =================
+
+@master_admin_bp.route('/master-admin/api/tenant-pool', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('get_tenant_pool')
+def get_tenant_pool():
+    """Pool depth per plan template, claim/miss counters and refill status"""
+    try:
+        from services.tenant_pool_service import TenantPoolService
+        stats = current_app.tenant_pool.stats()
+
+        setting = SystemSetting.query.filter_by(key=TenantPoolService.SIZE_SETTING).first()
+        stats['default_size'] = setting.get_typed_value() if setting else TenantPoolService.DEFAULT_POOL_SIZE
+        return jsonify({'success': True, **stats})
+    except Exception as e:
+        error_tracker.log_error(e, {'function': 'get_tenant_pool'})
+        return jsonify({'success': False, 'message': 'Failed to load tenant pool status'}), 500
+
+@master_admin_bp.route('/master-admin/tenant-pool/settings', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('update_tenant_pool_settings')
+def update_tenant_pool_settings():
+    """Set the default pool size and/or per-plan overrides, then trigger a refill"""
+    try:
+        from services.tenant_pool_service import TenantPoolService
+        data = request.json or {}
+
+        sizes = {}
+        if 'default_size' in data:
+            sizes[TenantPoolService.SIZE_SETTING] = data['default_size']
+        for plan_name, size in (data.get('plans') or {}).items():
+            if not SubscriptionPlan.query.filter_by(name=plan_name).first():
+                return jsonify({'success': False, 'message': f'Unknown plan: {plan_name}'}), 404
+            sizes[f"{TenantPoolService.SIZE_SETTING}:{plan_name}"] = size
+
+        if not sizes:
+            return jsonify({'success': False, 'message': 'No pool sizes provided'}), 400
+
+        for key, size in sizes.items():
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': f'Invalid size for {key}'}), 400
+            if size < 0:
+                return jsonify({'success': False, 'message': f'Invalid size for {key}'}), 400
+
+            setting = SystemSetting.query.filter_by(key=key).first()
+            if setting:
+                setting.value = str(size)
+                setting.updated_by = current_user.id
+                setting.updated_at = datetime.utcnow()
+            else:
+                setting = SystemSetting(
+                    key=key,
+                    value=str(size),
+                    value_type='int',
+                    description='Ready tenant databases kept in the provisioning pool',
+                    category='provisioning',
+                    updated_by=current_user.id
+                )
+                db.session.add(setting)
+
+        db.session.commit()
+        current_app.tenant_pool.request_refill()
+
+        log_admin_action('tenant_pool_settings_updated', {'sizes': sizes})
+        return jsonify({'success': True, 'message': 'Pool sizes updated, refill scheduled'})
+    except Exception as e:
+        db.session.rollback()
+        error_tracker.log_error(e, {'function': 'update_tenant_pool_settings'})
+        return jsonify({'success': False, 'message': 'Failed to update pool settings'}), 500
+
+@master_admin_bp.route('/master-admin/tenant-pool/refill', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('refill_tenant_pool')
+def refill_tenant_pool():
+    """Wake the background refill loop immediately"""
+    try:
+        current_app.tenant_pool.request_refill()
+        log_admin_action('tenant_pool_refill_requested', {})
+        return jsonify({'success': True, 'message': 'Pool refill scheduled'})
+    except Exception as e:
+        error_tracker.log_error(e, {'function': 'refill_tenant_pool'})
+        return jsonify({'success': False, 'message': 'Failed to schedule pool refill'}), 500
+
+# ================= TENANT PLACEMENT =================
+
+@master_admin_bp.route('/master-admin/api/placement/dry-run', methods=['GET'])
+@login_required
+@require_admin()
+@track_errors('placement_dry_run')
+def placement_dry_run():
+    """Worker scores and the placement a new tenant would get, without changing anything"""
+    try:
+        scheduler = current_app.placement_scheduler
+        policy = request.args.get('policy')
+        if policy and policy not in scheduler.POLICIES:
+            return jsonify({'success': False, 'message': f'Unknown policy: {policy}'}), 400
+
+        subdomain = request.args.get('subdomain') or '__placement_dry_run__'
+        decision = scheduler.place(subdomain, policy=policy, dry_run=True)
+        return jsonify({
+            'success': True,
+            'decision': decision,
+            'counters': scheduler.reconcile(dry_run=True),
+            'stats': scheduler.stats()
+        })
+    except Exception as e:
+        error_tracker.log_error(e, {'function': 'placement_dry_run'})
+        return jsonify({'success': False, 'message': 'Failed to compute placement'}), 500
+
+@master_admin_bp.route('/master-admin/placement/reconcile', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('reconcile_placement')
+def reconcile_placement():
+    """Reset worker tenant counters from the nginx tenant -> worker mapping"""
+    try:
+        result = current_app.placement_scheduler.reconcile()
+        if not result['success']:
+            return jsonify({'success': False, 'message': result['error']}), 409
+
+        log_admin_action('placement_reconciled', {'changes': result['changes'], 'stale_pins': result['stale_pins']})
+        return jsonify({'success': True, 'message': f"{len(result['changes'])} worker counters corrected", **result})
+    except Exception as e:
+        db.session.rollback()
+        error_tracker.log_error(e, {'function': 'reconcile_placement'})
+        return jsonify({'success': False, 'message': 'Failed to reconcile worker counters'}), 500
+
+@master_admin_bp.route('/master-admin/placement/settings', methods=['POST'])
+@login_required
+@require_admin()
+@track_errors('update_placement_settings')
+def update_placement_settings():
+    """Switch the tenant placement policy between spread and binpack"""
+    try:
+        scheduler = current_app.placement_scheduler
+        policy = (request.json or {}).get('policy')
+        if policy not in scheduler.POLICIES:
+            return jsonify({'success': False, 'message': f"Policy must be one of: {', '.join(scheduler.POLICIES)}"}), 400
+
+        setting = SystemSetting.query.filter_by(key=scheduler.POLICY_SETTING).first()
+        if setting:
+            setting.value = policy
+            setting.updated_by = current_user.id
+            setting.updated_at = datetime.utcnow()
+        else:
+            setting = SystemSetting(
+                key=scheduler.POLICY_SETTING,
+                value=policy,
+                value_type='string',
+                description='Tenant placement policy: spread (least loaded) or binpack (fill workers)',
+                category='provisioning',
+                updated_by=current_user.id
+            )
+            db.session.add(setting)
+        db.session.commit()
+
+        log_admin_action('placement_policy_updated', {'policy': policy})
+        return jsonify({'success': True, 'message': f'Placement policy set to {policy}'})
+    except Exception as e:
+        db.session.rollback()
+        error_tracker.log_error(e, {'function': 'update_placement_settings'})
+        return jsonify({'success': False, 'message': 'Failed to update placement policy'}), 500
+
 # ================= WORKER MANAGEMENT =================
 
 @master_admin_bp.route('/master-admin/workers', methods=['GET'])
@@ -788,11 +1103,8 @@ def get_system_stats():
 @track_errors('get_audit_logs')
 def get_audit_logs():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        
-        logs = AuditLog.query.order_by(desc(AuditLog.created_at))\
-                           .paginate(page=page, per_page=per_page, error_out=False)
+        # Keyset pages with user/tenant joined in, not OFFSET + COUNT(*) + a lazy load per row
+        logs = AUDIT_LOG_LIST.page(request.args)
         
         logs_data = []
         for log in logs.items:
@@ -811,13 +1123,10 @@ def get_audit_logs():
         return jsonify({
             'success': True,
             'logs': logs_data,
-            'pagination': {
-                'page': logs.page,
-                'pages': logs.pages,
-                'per_page': logs.per_page,
-                'total': logs.total
-            }
+            'pagination': logs.pagination()
         })
+    except InvalidListQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         error_tracker.log_error(e, {'admin_user': current_user.id})
         return jsonify({'success': False, 'message': 'Failed to fetch audit logs'}), 500
@@ -1387,13 +1696,11 @@ def suspend_tenant(tenant_id):
 def backup_tenant(tenant_id):
     try:
         tenant = Tenant.query.get_or_404(tenant_id)
-        odoo = OdooDatabaseManager(
-            odoo_url=os.environ.get('ODOO_URL', 'http://odoo_master:8069'),
-            master_pwd=os.environ.get('ODOO_MASTER_PASSWORD', 'admin123')
-        )
-        backup_path = odoo.backup(tenant.database_name)
-        log_admin_action('tenant_backup', {'tenant_id': tenant_id})
-        return jsonify({'success': True, 'message': 'Backup initiated successfully'})
+        # Runs in the background; progress is pushed over Socket.IO and the
+        # finished archive is served by /tenant/<id>/jobs/<job_id>/download
+        job = current_app.tenant_backups.submit_backup(tenant.id, tenant.database_name, current_user.id)
+        log_admin_action('tenant_backup', {'tenant_id': tenant_id, 'job_id': job['id']})
+        return jsonify({'success': True, 'message': 'Backup initiated successfully', 'job': job})
     except Exception as e:
         error_tracker.log_error(e, {'tenant_id': tenant_id})
         return jsonify({'success': False, 'message': 'Failed to backup tenant'}), 500
@@ -1440,6 +1747,32 @@ def export_tenants():
         ])
     output.seek(0)
     return send_file(io.BytesIO(output.getvalue().encode()), download_name="tenants.csv", as_attachment=True, mimetype='text/csv')
+
+
+def build_user_rows(users):
+    """Users table rows; tenant counts and last activity come from one GROUP BY each"""
+    user_ids = [user.id for user in users]
+    tenant_counts = grouped_count(TenantUser.user_id, user_ids)
+    last_activity = grouped_max(CredentialAccess.user_id, CredentialAccess.accessed_at, user_ids)
+    
+    users_data = []
+    for user in users:
+        recent_activity = last_activity.get(user.id)
+        users_data.append({
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'is_admin': user.is_admin,
+            'is_active': user.is_active,
+            'tenant_count': tenant_counts.get(user.id, 0),
+            'last_login': user.last_login.isoformat() if user.last_login else 'Never',
+            'last_activity': recent_activity.isoformat() if recent_activity else 'No activity',
+            'created_at': user.created_at.isoformat() if user.created_at else '',
+            'status_badge': 'success' if user.is_active else 'danger',
+            'role_badge': 'primary' if user.is_admin else 'secondary'
+        })
+    return users_data
+
 @master_admin_bp.route('/master-admin/api/admin/users/list', methods=['GET'])
 @login_required
 @require_admin()
@@ -1447,32 +1780,12 @@ def export_tenants():
 def api_users_list():
     """API endpoint for users table"""
     try:
-        users = SaasUser.query.all()
-        users_data = []
-        
-        for user in users:
-            # Get tenant count for this user
-            tenant_count = TenantUser.query.filter_by(user_id=user.id).count()
-            
-            # Get recent activity
-            recent_activity = CredentialAccess.query.filter_by(user_id=user.id)\
-                .order_by(CredentialAccess.accessed_at.desc()).first()
-            
-            users_data.append({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'is_admin': user.is_admin,
-                'is_active': user.is_active,
-                'tenant_count': tenant_count,
-                'last_login': user.last_login.isoformat() if user.last_login else 'Never',
-                'last_activity': recent_activity.accessed_at.isoformat() if recent_activity else 'No activity',
-                'created_at': user.created_at.isoformat() if user.created_at else '',
-                'status_badge': 'success' if user.is_active else 'danger',
-                'role_badge': 'primary' if user.is_admin else 'secondary'
-            })
+        users = USER_LIST.page(request.args)
+        users_data = build_user_rows(users.items)
         
-        return jsonify({'success': True, 'users': users_data})
+        return jsonify({'success': True, 'users': users_data, 'pagination': users.pagination()})
+    except InvalidListQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         error_tracker.log_error(e, {'admin_user': current_user.id})
         return jsonify({'success': False, 'message': 'Failed to fetch users'}), 500
@@ -1639,6 +1952,47 @@ def api_admin_stats():
         error_tracker.log_error(e, {'admin_user': current_user.id})
         return jsonify({'success': False, 'message': 'Failed to fetch stats'}), 500
 
+def build_tenant_rows(tenants):
+    """
+    Tenants table rows. User counts and recent credential accesses come from
+    one GROUP BY each and plans from a single lookup, whatever the page size.
+    """
+    tenant_ids = [tenant.id for tenant in tenants]
+    user_counts = grouped_count(TenantUser.tenant_id, tenant_ids)
+    recent_accesses = grouped_count(
+        CredentialAccess.tenant_id, tenant_ids,
+        CredentialAccess.accessed_at >= datetime.utcnow() - timedelta(days=7)
+    )
+    plans = index_by(SubscriptionPlan.name, [tenant.plan for tenant in tenants])
+    
+    tenants_data = []
+    for tenant in tenants:
+        user_count = user_counts.get(tenant.id, 0)
+        plan = plans.get(tenant.plan)
+        
+        # Calculate storage usage (simplified)
+        storage_used = user_count * 50  # 50MB per user estimate
+        storage_limit = plan.storage_limit if plan else 1000
+        storage_percentage = min((storage_used / storage_limit) * 100, 100) if storage_limit > 0 else 0
+        
+        health_score = calculate_tenant_health_score(
+            tenant, recent_accesses=recent_accesses.get(tenant.id, 0), user_count=user_count, plan=plan
+        )
+        tenants_data.append({
+            'id': tenant.id,
+            'name': tenant.name,
+            'subdomain': tenant.subdomain,
+            'status': tenant.status,
+            'plan': tenant.plan,
+            'health': get_tenant_health_status(health_score),
+            'storage_usage': f"{storage_used}MB / {storage_limit}MB",
+            'storage_percentage': round(storage_percentage, 1),
+            'user_count': user_count,
+            'monthly_revenue': float(plan.price) if plan else 0,
+            'created_at': tenant.created_at.isoformat() if tenant.created_at else ''
+        })
+    return tenants_data
+
 @master_admin_bp.route('/master-admin/api/admin/tenants/list', methods=['GET'])
 @login_required
 @require_admin()
@@ -1646,33 +2000,12 @@ def api_admin_stats():
 def api_tenants_list():
     """API endpoint for tenants table"""
     try:
-        tenants = Tenant.query.all()
-        tenants_data = []
-        
-        for tenant in tenants:
-            user_count = TenantUser.query.filter_by(tenant_id=tenant.id).count()
-            plan = SubscriptionPlan.query.filter_by(name=tenant.plan).first()
-            
-            # Calculate storage usage (simplified)
-            storage_used = user_count * 50  # 50MB per user estimate
-            storage_limit = plan.storage_limit if plan else 1000
-            storage_percentage = min((storage_used / storage_limit) * 100, 100) if storage_limit > 0 else 0
-            
-            tenants_data.append({
-                'id': tenant.id,
-                'name': tenant.name,
-                'subdomain': tenant.subdomain,
-                'status': tenant.status,
-                'plan': tenant.plan,
-                'health': calculate_tenant_health(tenant),
-                'storage_usage': f"{storage_used}MB / {storage_limit}MB",
-                'storage_percentage': round(storage_percentage, 1),
-                'user_count': user_count,
-                'monthly_revenue': float(plan.price) if plan else 0,
-                'created_at': tenant.created_at.isoformat() if tenant.created_at else ''
-            })
+        tenants = TENANT_LIST.page(request.args)
+        tenants_data = build_tenant_rows(tenants.items)
         
-        return jsonify({'success': True, 'tenants': tenants_data})
+        return jsonify({'success': True, 'tenants': tenants_data, 'pagination': tenants.pagination()})
+    except InvalidListQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         error_tracker.log_error(e, {'admin_user': current_user.id})
         return jsonify({'success': False, 'message': 'Failed to fetch tenants'}), 500
@@ -1806,9 +2139,18 @@ def edit_plan(plan_id):
         plan.features = data.get('features', plan.features)
         plan.modules = data.get('modules', plan.modules)
         plan.is_active = data.get('is_active', plan.is_active)
+        if plan.name != old_values['name']:
+            # Tenants reference their plan by name, keep them on it
+            Tenant.query.filter_by(plan=old_values['name']).update(
+                {'plan': plan.name}, synchronize_session=False
+            )
         
         db.session.commit()
         
+        # Push changed limits to every tenant on the plan in one batch
+        if plan.max_users != old_values['max_users'] or plan.name != old_values['name']:
+            current_app.tenant_limits.publish_plan(plan.name)
+        
         log_admin_action('plan_updated', {
             'plan_id': plan_id,
             'old_values': old_values,
@@ -1883,11 +2225,8 @@ def api_get_workers():
 @track_errors('api_get_audit_logs')
 def api_get_audit_logs():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        
-        logs = AuditLog.query.order_by(desc(AuditLog.created_at))\
-                           .paginate(page=page, per_page=per_page, error_out=False)
+        # Keyset pages with user/tenant joined in, not OFFSET + COUNT(*) + a lazy load per row
+        logs = AUDIT_LOG_LIST.page(request.args)
         
         logs_data = []
         for log in logs.items:
@@ -1906,13 +2245,10 @@ def api_get_audit_logs():
         return jsonify({
             'success': True,
             'logs': logs_data,
-            'pagination': {
-                'page': logs.page,
-                'pages': logs.pages,
-                'per_page': logs.per_page,
-                'total': logs.total
-            }
+            'pagination': logs.pagination()
         })
+    except InvalidListQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         error_tracker.log_error(e, {'admin_user': current_user.id})
         return jsonify({'success': False, 'message': 'Failed to fetch audit logs'}), 500
@@ -2302,8 +2638,15 @@ def get_notifications():
 
 # ================= ADDITIONAL HELPER FUNCTIONS =================
 
-def calculate_tenant_health_score(tenant):
-    """Calculate a more detailed tenant health score"""
+_LOOKUP = object()
+
+def calculate_tenant_health_score(tenant, recent_accesses=None, user_count=None, plan=_LOOKUP):
+    """
+    Calculate a more detailed tenant health score.
+    
+    Listings pass the figures they aggregated for a whole page; anything
+    omitted is queried for this tenant.
+    """
     try:
         score = 100
         
@@ -2312,10 +2655,11 @@ def calculate_tenant_health_score(tenant):
             score -= 50
         
         # Check recent activity
-        recent_accesses = CredentialAccess.query.filter(
-            CredentialAccess.tenant_id == tenant.id,
-            CredentialAccess.accessed_at >= datetime.utcnow() - timedelta(days=7)
-        ).count()
+        if recent_accesses is None:
+            recent_accesses = CredentialAccess.query.filter(
+                CredentialAccess.tenant_id == tenant.id,
+                CredentialAccess.accessed_at >= datetime.utcnow() - timedelta(days=7)
+            ).count()
         
         if recent_accesses == 0:
             score -= 30
@@ -2323,12 +2667,14 @@ def calculate_tenant_health_score(tenant):
             score -= 15
         
         # Check user count
-        user_count = TenantUser.query.filter_by(tenant_id=tenant.id).count()
+        if user_count is None:
+            user_count = TenantUser.query.filter_by(tenant_id=tenant.id).count()
         if user_count == 0:
             score -= 20
         
         # Check plan compliance
-        plan = SubscriptionPlan.query.filter_by(name=tenant.plan).first()
+        if plan is _LOOKUP:
+            plan = SubscriptionPlan.query.filter_by(name=tenant.plan).first()
         if plan and user_count > plan.max_users:
             score -= 10
         
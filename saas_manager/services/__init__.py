@@ -13,7 +13,9 @@ from .worker_service import (
     WorkerDatabaseService,
     DockerConfigurationService,
     WorkerLoggingService,
-    NetworkDiscoveryService
+    NetworkDiscoveryService,
+    OdooProcessSizing,
+    size_odoo_processes
 )
 
 from .worker_deployment_service import (
@@ -36,6 +38,8 @@ __all__ = [
     'DockerConfigurationService',
     'WorkerLoggingService',
     'NetworkDiscoveryService',
+    'OdooProcessSizing',
+    'size_odoo_processes',
     'WorkerDeploymentService',
     'WorkerDeploymentConfig'
 ]
\ No newline at end of file
@@ -0,0 +1,685 @@
+"""
+Tenant Log Index Service
+
+Tails the platform containers' logs once, in the background, and indexes every
+tenant line so ``/api/tenant/<id>/logs`` becomes a range scan instead of a
+re-read of 24h of ``container.logs()`` per request.
+
+Lines are parsed once with precompiled patterns (Odoo's own log format gives the
+database and level directly; other lines fall back to the legacy heuristics) and
+written in batches to daily SQLite segments (``logs-YYYYMMDD.sqlite``) indexed on
+``(tenant_db, ts, id)``. Old days are dropped by deleting their segment file.
+Per-container ingestion cursors survive restarts, and a Redis lock makes sure
+only one process ingests when several gunicorn workers share the index.
+
+The same tailers feed live monitoring: LogFanout buffers lines of watched
+tenants per Socket.IO room and emits them in batches, so any number of viewers
+costs one stream per container.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared_utils import get_docker_client
+
+logger = logging.getLogger(__name__)
+
+LOG_LEVELS = ('error', 'warning', 'info', 'success', 'debug')
+
+
+# ================= LINE PARSING =================
+
+class LogLineParser:
+    """Single-pass parser for docker log lines (``timestamps=True``)"""
+
+    DOCKER_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?Z\s?')
+    # "2024-05-01 10:00:00,123 7 INFO kdoo_acme odoo.http: ..."
+    ODOO_LINE = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} \d+ (?P<level>[A-Z]+) (?P<db>\S+) ')
+    ODOO_LEVELS = {'CRITICAL': 'error', 'ERROR': 'error', 'WARNING': 'warning', 'INFO': 'info', 'DEBUG': 'debug'}
+
+    # Heuristics for everything else, tried in order
+    TENANT_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+        r"database\s+['\"]?(\w+)['\"]?",
+        r"db[:\s]+['\"]?(\w+)['\"]?",
+        r"Database\s+['\"]?(\w+)['\"]?",
+        r"\[(\w+)\]",
+        r"dbname=(\w+)",
+        r"tenant_(\w+)",
+    ))
+    LEVEL_PATTERNS = tuple((level, re.compile(pattern)) for level, pattern in (
+        ('error', r'ERROR|CRITICAL|FATAL|EXCEPTION|TRACEBACK'),
+        ('warning', r'WARNING|WARN'),
+        ('info', r'INFO|STARTING|STOPPING|CONNECTED'),
+        ('debug', r'DEBUG'),
+        ('success', r'SUCCESS|SUCCESSFUL|LOGIN SUCCESSFUL'),
+    ))
+
+    @classmethod
+    def normalize_timestamp(cls, match) -> str:
+        """Fixed-width UTC timestamp (microseconds) so segment rows sort as strings"""
+        fraction = (match.group(2) or '')[:6].ljust(6, '0')
+        return f"{match.group(1)}.{fraction}Z"
+
+    @classmethod
+    def extract_database(cls, message: str) -> Optional[str]:
+        for pattern in cls.TENANT_PATTERNS:
+            match = pattern.search(message)
+            if match:
+                return match.group(1)
+        return None
+
+    @classmethod
+    def determine_level(cls, message: str) -> str:
+        upper = message.upper()
+        for level, pattern in cls.LEVEL_PATTERNS:
+            if pattern.search(upper):
+                return level
+        return 'info'
+
+    @classmethod
+    def parse(cls, line: str, service: str) -> Optional[Dict[str, Any]]:
+        """Parse one log line; returns None for blank lines and lines without a tenant"""
+        line = line.strip()
+        if not line:
+            return None
+
+        ts_match = cls.DOCKER_TIMESTAMP.match(line)
+        if ts_match:
+            timestamp = cls.normalize_timestamp(ts_match)
+            message = line[ts_match.end():]
+        else:
+            timestamp = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            message = line
+
+        odoo_match = cls.ODOO_LINE.match(message)
+        if odoo_match:
+            db_name = odoo_match.group('db')
+            if db_name == '?':
+                return None
+            level = cls.ODOO_LEVELS.get(odoo_match.group('level'), 'info')
+        else:
+            db_name = cls.extract_database(message)
+            if not db_name:
+                return None
+            level = cls.determine_level(message)
+
+        return {
+            'timestamp': timestamp,
+            'tenant_db': db_name,
+            'service': service,
+            'level': level,
+            'message': message,
+        }
+
+
+# ================= SEGMENT STORE =================
+
+class TenantLogIndex:
+    """Daily SQLite segments of tenant log lines plus per-container ingestion cursors"""
+
+    SEGMENT_PREFIX = "logs-"
+    SEGMENT_SUFFIX = ".sqlite"
+    CURSOR_FILE = "cursors.sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS logs ("
+        " id INTEGER PRIMARY KEY, ts TEXT NOT NULL, tenant_db TEXT NOT NULL,"
+        " service TEXT NOT NULL, level TEXT NOT NULL, message TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_logs_tenant_ts ON logs (tenant_db, ts, id)",
+        "CREATE INDEX IF NOT EXISTS ix_logs_tenant_level_ts ON logs (tenant_db, level, ts, id)",
+    )
+
+    def __init__(self, path: str, retention_days: int = 7):
+        self.path = path
+        self.retention_days = retention_days
+        os.makedirs(path, exist_ok=True)
+
+        cursors = self._connect(os.path.join(path, self.CURSOR_FILE))
+        try:
+            cursors.execute("CREATE TABLE IF NOT EXISTS cursors (container TEXT PRIMARY KEY, ts TEXT NOT NULL)")
+            cursors.commit()
+        finally:
+            cursors.close()
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _segment_path(self, day: str) -> str:
+        return os.path.join(self.path, f"{self.SEGMENT_PREFIX}{day}{self.SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[str]:
+        """Days (YYYYMMDD) with a segment on disk, newest first"""
+        days = [
+            name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]
+            for name in os.listdir(self.path)
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)
+        ]
+        return sorted(days, reverse=True)
+
+    # ================= WRITES =================
+
+    def add(self, entries: List[Dict[str, Any]], connections: Optional[Dict[str, sqlite3.Connection]] = None) -> None:
+        """Append parsed entries, one transaction per day segment"""
+        by_day = {}
+        for entry in entries:
+            day = entry['timestamp'][:10].replace('-', '')
+            by_day.setdefault(day, []).append((
+                entry['timestamp'], entry['tenant_db'], entry['service'], entry['level'], entry['message']
+            ))
+
+        for day, rows in by_day.items():
+            conn = connections.get(day) if connections is not None else None
+            if conn is None:
+                conn = self._connect(self._segment_path(day))
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+                if connections is not None:
+                    connections[day] = conn
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO logs (ts, tenant_db, service, level, message) VALUES (?, ?, ?, ?, ?)", rows
+                    )
+            finally:
+                if connections is None:
+                    conn.close()
+
+    def get_cursors(self) -> Dict[str, str]:
+        conn = self._connect(os.path.join(self.path, self.CURSOR_FILE))
+        try:
+            return dict(conn.execute("SELECT container, ts FROM cursors").fetchall())
+        finally:
+            conn.close()
+
+    def set_cursors(self, cursors: Dict[str, str]) -> None:
+        conn = self._connect(os.path.join(self.path, self.CURSOR_FILE))
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO cursors (container, ts) VALUES (?, ?) "
+                    "ON CONFLICT(container) DO UPDATE SET ts = excluded.ts WHERE excluded.ts > cursors.ts",
+                    list(cursors.items())
+                )
+        finally:
+            conn.close()
+
+    def prune(self) -> int:
+        """Delete segments older than the retention window; returns how many were removed"""
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        removed = 0
+        for day in self.segments():
+            if day >= cutoff:
+                continue
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self._segment_path(day) + suffix)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} tenant log segments older than {cutoff}")
+        return removed
+
+    # ================= QUERIES =================
+
+    @staticmethod
+    def _since_timestamp(hours: float) -> str:
+        return (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def _segments_since(self, since: str) -> List[str]:
+        first_day = since[:10].replace('-', '')
+        return [day for day in self.segments() if day >= first_day]
+
+    def query(self, db_name: str, hours: float = 24, level: Optional[str] = None, limit: int = 1000,
+              cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Newest-first page of a tenant's log lines.
+
+        Args:
+            db_name: Tenant database
+            hours: How far back to look
+            level: Only return this level
+            limit: Page size
+            cursor: ``next_cursor`` of the previous page
+
+        Returns:
+            tuple: (entries, next_cursor or None when there are no older lines)
+        """
+        since = self._since_timestamp(hours)
+        before_ts, before_id = None, None
+        if cursor:
+            before_ts, _, raw_id = cursor.rpartition('|')
+            before_id = int(raw_id)
+
+        entries = []
+        for day in self._segments_since(since):
+            if before_ts and day > before_ts[:10].replace('-', ''):
+                continue
+
+            sql = "SELECT id, ts, service, level, message FROM logs WHERE tenant_db = ? AND ts >= ?"
+            params: List[Any] = [db_name, since]
+            if level:
+                sql += " AND level = ?"
+                params.append(level)
+            if before_ts and day == before_ts[:10].replace('-', ''):
+                sql += " AND (ts < ? OR (ts = ? AND id < ?))"
+                params.extend([before_ts, before_ts, before_id])
+            sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+            params.append(limit + 1 - len(entries))
+
+            conn = self._connect(self._segment_path(day))
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                # Segment created but schema not written yet
+                rows = []
+            finally:
+                conn.close()
+
+            entries.extend(
+                {'id': row[0], 'timestamp': row[1], 'tenant_db': db_name, 'service': row[2],
+                 'level': row[3], 'message': row[4]}
+                for row in rows
+            )
+            if len(entries) > limit:
+                break
+
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            last = entries[-1]
+            next_cursor = f"{last['timestamp']}|{last['id']}"
+        return entries, next_cursor
+
+    def counts(self, db_name: str, hours: float = 24) -> Dict[str, int]:
+        """Line count per level (plus ``total``) over the window"""
+        since = self._since_timestamp(hours)
+        counts = dict.fromkeys(LOG_LEVELS, 0)
+        for day in self._segments_since(since):
+            conn = self._connect(self._segment_path(day))
+            try:
+                rows = conn.execute(
+                    "SELECT level, COUNT(*) FROM logs WHERE tenant_db = ? AND ts >= ? GROUP BY level",
+                    (db_name, since)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                rows = []
+            finally:
+                conn.close()
+            for level, count in rows:
+                counts[level] = counts.get(level, 0) + count
+        counts['total'] = sum(counts.values())
+        return counts
+
+
+# ================= LIVE FAN-OUT =================
+
+class LogFanout:
+    """
+    Routes live tenant log lines to Socket.IO rooms in batches.
+
+    Watchers are registered per Socket.IO session in Redis, so the ingesting
+    process knows which tenants are watched whichever worker the viewer is
+    connected to; emits reach them through the Socket.IO message queue.
+    """
+
+    WATCHERS_KEY = "tenant_logs:watchers"
+    WATCHER_TTL = 86400
+    STATS_KEY = "tenant_logs:fanout_stats"
+    ROOM_PREFIX = "tenant_logs_"
+
+    def __init__(self, socketio, redis_client=None, flush_interval: float = 0.25,
+                 buffer_size: int = 500, watcher_refresh: float = 2.0):
+        self.socketio = socketio
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.watcher_refresh = watcher_refresh
+
+        # Tenant databases with at least one viewer; swapped wholesale on refresh
+        self.watched: frozenset = frozenset()
+        self._local_watchers: Dict[str, Tuple[str, float]] = {}
+        self._buffers: Dict[str, deque] = {}
+        self._dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def room(cls, db_name: str) -> str:
+        return f"{cls.ROOM_PREFIX}{db_name}"
+
+    # ================= WATCHERS =================
+
+    def watch(self, db_name: str, session_id: str) -> None:
+        """Register a Socket.IO session as viewer of one tenant (replaces its previous one)"""
+        entry = (db_name, time.time())
+        if self.redis_client:
+            try:
+                self.redis_client.hset(self.WATCHERS_KEY, session_id, json.dumps(entry))
+            except Exception as e:
+                logger.warning(f"Failed to register log watcher {session_id}: {e}")
+        else:
+            self._local_watchers[session_id] = entry
+        self.watched = self.watched | {db_name}
+
+    def unwatch(self, session_id: str) -> None:
+        if self.redis_client:
+            try:
+                self.redis_client.hdel(self.WATCHERS_KEY, session_id)
+            except Exception as e:
+                logger.warning(f"Failed to remove log watcher {session_id}: {e}")
+        else:
+            self._local_watchers.pop(session_id, None)
+
+    def _refresh_watched(self) -> None:
+        cutoff = time.time() - self.WATCHER_TTL
+        watchers = dict(self._local_watchers)
+        if self.redis_client:
+            try:
+                watchers = {}
+                for session_id, raw in self.redis_client.hgetall(self.WATCHERS_KEY).items():
+                    watchers[session_id] = tuple(json.loads(raw))
+                expired = [session_id for session_id, (_, since) in watchers.items() if since < cutoff]
+                if expired:
+                    self.redis_client.hdel(self.WATCHERS_KEY, *expired)
+            except Exception as e:
+                logger.debug(f"Failed to refresh log watchers: {e}")
+                return
+        self.watched = frozenset(db_name for db_name, since in watchers.values() if since >= cutoff)
+
+    # ================= BUFFERING =================
+
+    def publish(self, entry: Dict[str, Any]) -> None:
+        """Queue a parsed line for its tenant's room; the oldest line is dropped when full"""
+        db_name = entry['tenant_db']
+        with self._lock:
+            buffer = self._buffers.get(db_name)
+            if buffer is None:
+                buffer = self._buffers[db_name] = deque(maxlen=self.buffer_size)
+            if len(buffer) == self.buffer_size:
+                self._dropped[db_name] = self._dropped.get(db_name, 0) + 1
+            buffer.append(entry)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='tenant-log-fanout', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        last_refresh = 0.0
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                if time.time() - last_refresh >= self.watcher_refresh:
+                    self._refresh_watched()
+                    last_refresh = time.time()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Tenant log fan-out failed: {e}")
+
+    def flush(self) -> None:
+        """Emit one ``log_batch`` per room with everything buffered since the last flush"""
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+            dropped, self._dropped = self._dropped, {}
+
+        lines = 0
+        for db_name, buffer in buffers.items():
+            if not buffer or db_name not in self.watched:
+                continue
+            logs = [
+                {'timestamp': entry['timestamp'], 'level': entry['level'], 'service': entry['service'],
+                 'title': 'Log Entry', 'message': entry['message'], 'details': ''}
+                for entry in reversed(buffer)
+            ]
+            counts = {}
+            for entry in buffer:
+                counts[entry['level']] = counts.get(entry['level'], 0) + 1
+            counts['total'] = len(buffer)
+
+            self.socketio.emit('log_batch', {
+                'tenant_db': db_name,
+                'logs': logs,
+                'counts': counts,
+                'dropped': dropped.get(db_name, 0),
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+            }, room=self.room(db_name))
+            lines += len(logs)
+
+        if lines or dropped:
+            self._record(lines, sum(dropped.values()))
+
+    def _record(self, lines: int, dropped: int) -> None:
+        if not self.redis_client:
+            return
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hincrby(self.STATS_KEY, 'batches', 1)
+            pipe.hincrby(self.STATS_KEY, 'lines', lines)
+            pipe.hincrby(self.STATS_KEY, 'dropped', dropped)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record tenant log fan-out stats: {e}")
+
+
+# ================= INGESTION =================
+
+class LogIngestionService:
+    """Background tailers feeding a TenantLogIndex, run by one elected process"""
+
+    LEADER_KEY = "tenant_logs:ingest_leader"
+    LEADER_TTL = 60
+    STATS_KEY = "tenant_logs:ingest_stats"
+
+    # Containers whose logs carry tenant activity (same set TenantLogManager scans)
+    CONTAINER_MARKERS = ('odoo', 'postgres', 'nginx')
+
+    def __init__(self, index: TenantLogIndex, redis_client=None, fanout: Optional[LogFanout] = None,
+                 discovery_interval: int = 30, batch_size: int = 500, flush_interval: float = 1.0,
+                 backfill_hours: int = 24, queue_size: int = 50000):
+        self.index = index
+        self.redis_client = redis_client
+        self.fanout = fanout
+        self.discovery_interval = discovery_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backfill_hours = backfill_hours
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._tailers: Dict[str, threading.Thread] = {}
+        self._known_databases: Optional[set] = None
+        self._owner = uuid.uuid4().hex
+        self._leader = threading.Event()
+        self._dropped = 0
+        self._thread = None
+        self._app = None
+
+    # ================= LEADERSHIP =================
+
+    def _hold_leadership(self) -> bool:
+        if not self.redis_client:
+            return True
+        try:
+            if self.redis_client.set(self.LEADER_KEY, self._owner, nx=True, ex=self.LEADER_TTL):
+                logger.info("Became tenant log ingestion leader")
+                return True
+            holder = self.redis_client.get(self.LEADER_KEY)
+            holder = holder.decode() if isinstance(holder, bytes) else holder
+            if holder == self._owner:
+                self.redis_client.expire(self.LEADER_KEY, self.LEADER_TTL)
+                return True
+        except Exception as e:
+            logger.warning(f"Tenant log leader election failed: {e}")
+        return False
+
+    # ================= LIFECYCLE =================
+
+    def start(self, app) -> None:
+        """Start discovery, tailers and the batch writer for this process"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        threading.Thread(target=self._write_loop, name='tenant-log-writer', daemon=True).start()
+        if self.fanout:
+            self.fanout.start()
+        self._thread = threading.Thread(target=self._run, name='tenant-log-ingest', daemon=True)
+        self._thread.start()
+        logger.info("Tenant log ingestion started")
+
+    def _run(self) -> None:
+        last_prune = 0.0
+        while True:
+            try:
+                if self._hold_leadership():
+                    self._leader.set()
+                    self._refresh_known_databases()
+                    self._discover()
+                    if time.time() - last_prune > 3600:
+                        self.index.prune()
+                        last_prune = time.time()
+                else:
+                    self._leader.clear()
+            except Exception as e:
+                logger.error(f"Tenant log ingestion cycle failed: {e}")
+            time.sleep(self.discovery_interval)
+
+    def _refresh_known_databases(self) -> None:
+        """Only lines of real tenant databases are indexed"""
+        from models import Tenant
+        try:
+            with self._app.app_context():
+                self._known_databases = {
+                    row[0] for row in Tenant.query.with_entities(Tenant.database_name).all()
+                }
+        except Exception as e:
+            logger.debug(f"Could not refresh tenant databases for log ingestion: {e}")
+
+    def _discover(self) -> None:
+        client = get_docker_client()
+        if not client:
+            return
+        for container in client.containers.list():
+            name = container.name
+            if not any(marker in name.lower() for marker in self.CONTAINER_MARKERS):
+                continue
+            tailer = self._tailers.get(name)
+            if tailer and tailer.is_alive():
+                continue
+            tailer = threading.Thread(target=self._tail, args=(name,), name=f'tenant-log-tail-{name}', daemon=True)
+            self._tailers[name] = tailer
+            tailer.start()
+
+    # ================= TAILING =================
+
+    def _start_position(self, cursor: Optional[str]) -> float:
+        if cursor:
+            return datetime.strptime(cursor, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc).timestamp()
+        return time.time() - self.backfill_hours * 3600
+
+    def _tail(self, container_name: str) -> None:
+        """Follow one container's log stream until it stops or leadership is lost"""
+        client = get_docker_client()
+        if not client:
+            return
+        try:
+            cursor = self.index.get_cursors().get(container_name)
+            # Only lines written from now on are live; the backfill just gets indexed
+            live_from = (datetime.utcnow() - timedelta(seconds=5)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            container = client.containers.get(container_name)
+            stream = container.logs(stream=True, follow=True, timestamps=True,
+                                    since=self._start_position(cursor))
+            logger.info(f"Tailing logs of {container_name}")
+
+            pending = b''
+            for chunk in stream:
+                if not self._leader.is_set():
+                    break
+                pending += chunk
+                *lines, pending = pending.split(b'\n')
+                for raw in lines:
+                    line = raw.decode('utf-8', errors='replace')
+                    ts_match = LogLineParser.DOCKER_TIMESTAMP.match(line)
+                    if not ts_match:
+                        continue
+                    timestamp = LogLineParser.normalize_timestamp(ts_match)
+                    # `since` has second granularity: skip what the cursor already covers
+                    if cursor and timestamp <= cursor:
+                        continue
+                    entry = LogLineParser.parse(line, container_name)
+                    self._enqueue((container_name, timestamp, entry))
+                    if (entry and self.fanout and timestamp >= live_from
+                            and entry['tenant_db'] in self.fanout.watched):
+                        self.fanout.publish(entry)
+        except Exception as e:
+            logger.warning(f"Log tailer for {container_name} stopped: {e}")
+
+    def _enqueue(self, item) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Never block the docker stream; the cursor still moves past dropped lines
+            self._dropped += 1
+
+    # ================= BATCH WRITER =================
+
+    def _write_loop(self) -> None:
+        connections: Dict[str, sqlite3.Connection] = {}
+        while True:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.time(), 0.01)))
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+
+            known = self._known_databases
+            entries, cursors = [], {}
+            for container_name, timestamp, entry in batch:
+                cursors[container_name] = max(timestamp, cursors.get(container_name, ''))
+                if entry and (known is None or entry['tenant_db'] in known):
+                    entries.append(entry)
+
+            try:
+                if entries:
+                    self.index.add(entries, connections)
+                self.index.set_cursors(cursors)
+                self._record(len(batch), len(entries))
+            except Exception as e:
+                logger.error(f"Failed to write {len(entries)} tenant log lines: {e}")
+
+            # Keep only today's and yesterday's segment connections open
+            for day in sorted(connections)[:-2]:
+                connections.pop(day).close()
+
+    # ================= METRICS =================
+
+    def _record(self, lines: int, indexed: int) -> None:
+        if not self.redis_client:
+            return
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hincrby(self.STATS_KEY, 'lines', lines)
+            pipe.hincrby(self.STATS_KEY, 'indexed', indexed)
+            pipe.hset(self.STATS_KEY, 'dropped', self._dropped)
+            pipe.hset(self.STATS_KEY, 'last_batch_at', time.time())
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record tenant log ingestion stats: {e}")
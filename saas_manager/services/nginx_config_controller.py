@@ -0,0 +1,339 @@
+"""
+Nginx Config Controller
+
+Single writer for the nginx files the SaaS manager generates in conf.d
+(worker upstreams, tenant placement pins, asset cache).
+
+Files are written atomically (temp file + rename in the same directory) and
+only when their content changes. Reloads are debounced: changes requested
+within RELOAD_WINDOW seconds of each other share one ``nginx -t`` + reload,
+and a steady stream of changes still reloads at least every
+MAX_RELOAD_DELAY seconds. A reload only happens when the files differ from
+the last applied version, which is also what keeps several SaaS manager
+processes from reloading nginx for the same change.
+
+Every applied version is kept under ``conf.d/.history`` (the last
+HISTORY_LIMIT of them). A configuration nginx rejects is replaced by the
+last applied version again, and ``rollback(version)`` restores an older one.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RELOAD_WINDOW = 2.0  # seconds of quiet before a reload
+MAX_RELOAD_DELAY = 10.0  # upper bound on how long a change waits for its reload
+HISTORY_LIMIT = 20
+HISTORY_DIR = '.history'
+LOCK_FILE = '.nginx_config.lock'
+
+
+def write_atomic(path: str, content: str) -> None:
+    """Replace ``path`` with ``content`` so readers see either the old or the new file"""
+    directory = os.path.dirname(path) or '.'
+    # Leading dot and .tmp suffix: never matched by nginx's conf.d/*.conf include
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _checksum(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class NginxConfigController:
+    """Debounced, atomic, versioned writer of the generated nginx configuration"""
+
+    _controllers = {}
+    _controllers_lock = threading.Lock()
+
+    def __init__(self, conf_dir: str, reloader: Callable[[], bool],
+                 window: float = RELOAD_WINDOW, max_delay: float = MAX_RELOAD_DELAY):
+        """
+        Args:
+            conf_dir: Directory of the generated files (nginx's conf.d)
+            reloader: Tests and reloads nginx, returning False if nginx rejects the config
+            window: Seconds without new changes before reloading
+            max_delay: Longest a requested reload may be postponed
+        """
+        self.conf_dir = conf_dir
+        self.reloader = reloader
+        self.window = window
+        self.max_delay = max_delay
+        self.history_dir = os.path.join(conf_dir, HISTORY_DIR)
+        self.manifest_file = os.path.join(self.history_dir, 'manifest.json')
+        self.lock_file = os.path.join(conf_dir, LOCK_FILE)
+
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_fd = None
+        self._managed = set()
+        self._timer = None
+        self._first_request = None
+        self._reasons = []
+        self._deferred = {}
+        self.last_result = None
+
+    @classmethod
+    def for_directory(cls, conf_dir: str, reloader: Callable[[], bool]) -> 'NginxConfigController':
+        """The controller of a directory, shared by every service instance of this process"""
+        key = os.path.realpath(conf_dir)
+        with cls._controllers_lock:
+            controller = cls._controllers.get(key)
+            if controller is None:
+                controller = cls._controllers[key] = cls(conf_dir, reloader)
+            return controller
+
+    # ================= FILES =================
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive across threads (RLock) and SaaS manager processes (flock)"""
+        with self._lock:
+            if self._lock_depth == 0:
+                self._lock_fd = open(self.lock_file, 'a')
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                    self._lock_fd.close()
+                    self._lock_fd = None
+
+    def locked(self):
+        """Hold the writer lock across a read-modify-write of generated files"""
+        return self._file_lock()
+
+    def _name(self, path: str) -> str:
+        """File name of a path in conf_dir (a bare name is taken as relative to it)"""
+        directory = os.path.dirname(path)
+        if directory and os.path.realpath(directory) != os.path.realpath(self.conf_dir):
+            raise ValueError(f"{path} is not in {self.conf_dir}")
+        return os.path.basename(path)
+
+    def read(self, path: str) -> Optional[str]:
+        """Current content of a generated file, None if it does not exist"""
+        try:
+            with open(os.path.join(self.conf_dir, self._name(path)), 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path: str, content: str) -> bool:
+        """
+        Atomically write a generated file (no reload; see request_reload).
+
+        Returns:
+            True if the content changed
+        """
+        name = self._name(path)
+        with self._file_lock():
+            self._managed.add(name)
+            if self.read(name) == content:
+                return False
+            write_atomic(os.path.join(self.conf_dir, name), content)
+            return True
+
+    def _current_files(self, names) -> Dict[str, str]:
+        files = {}
+        for name in sorted(names):
+            content = self.read(name)
+            if content is not None:
+                files[name] = content
+        return files
+
+    # ================= RELOADS =================
+
+    def request_reload(self, reason: str = 'configuration changed') -> Dict[str, Any]:
+        """Schedule a test + reload, coalesced with the other changes of the window"""
+        with self._lock:
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+            self._reasons.append(reason)
+            delay = max(0.0, min(self.window, self._first_request + self.max_delay - now))
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+            return {'scheduled': True, 'delay': round(delay, 2), 'pending_changes': len(self._reasons)}
+
+    def apply_now(self, reason: str) -> Dict[str, Any]:
+        """Apply this change with everything pending right away and return the result (see flush)"""
+        with self._lock:
+            self._reasons.append(reason)
+        return self.flush()
+
+    def defer(self, key: str, task: Callable[[], Any], reason: str = 'deferred task') -> Dict[str, Any]:
+        """Run ``task`` once after the next reload; a later task with the same key replaces it"""
+        with self._lock:
+            self._deferred[key] = task
+        return self.request_reload(reason)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Debounced nginx reload failed: {e}")
+
+    def flush(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Apply pending changes now.
+
+        Args:
+            force: Reload even if the files match the last applied version
+
+        Returns:
+            Dict with success, whether nginx was reloaded and the applied version
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            reasons, self._reasons = self._reasons, []
+            deferred, self._deferred = self._deferred, {}
+            self._first_request = None
+
+        result = self._apply(reasons or ['manual reload'], force)
+        self.last_result = {**result, 'at': datetime.utcnow().isoformat(), 'changes': len(reasons)}
+
+        for key, task in deferred.items():
+            try:
+                task()
+            except Exception as e:
+                logger.error(f"Deferred nginx task {key} failed: {e}")
+        return result
+
+    def _apply(self, reasons: List[str], force: bool) -> Dict[str, Any]:
+        with self._file_lock():
+            manifest = self._load_manifest()
+            last = manifest['versions'][-1] if manifest['versions'] else None
+            names = set(self._managed) | set(last['files'] if last else [])
+            files = self._current_files(names)
+            checksums = {name: _checksum(content) for name, content in files.items()}
+
+            unchanged = bool(last) and last['checksums'] == checksums
+            if unchanged and not force:
+                logger.info(f"nginx configuration unchanged (v{last['version']}), reload skipped")
+                return {'success': True, 'reloaded': False, 'version': last['version'],
+                        'message': 'Configuration unchanged, reload skipped'}
+
+            started = time.monotonic()
+            if not self.reloader():
+                restored = None
+                if last and not unchanged:
+                    self._restore(last)
+                    restored = last['version']
+                logger.error(f"nginx rejected the configuration ({', '.join(sorted(set(reasons)))}); "
+                             f"restored v{restored}")
+                return {'success': False, 'reloaded': False, 'restored_version': restored,
+                        'error': 'nginx rejected the configuration'}
+
+            version = last['version'] if unchanged else self._snapshot(manifest, files, checksums, reasons)
+            seconds = round(time.monotonic() - started, 3)
+            logger.info(f"nginx reloaded with configuration v{version} "
+                        f"({len(reasons)} change(s) coalesced, {seconds}s)")
+            return {'success': True, 'reloaded': True, 'version': version, 'seconds': seconds}
+
+    # ================= HISTORY =================
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'last_version': 0, 'versions': []}
+
+    def _snapshot(self, manifest: Dict[str, Any], files: Dict[str, str],
+                  checksums: Dict[str, str], reasons: List[str]) -> int:
+        version = manifest['last_version'] + 1
+        version_dir = os.path.join(self.history_dir, f'v{version}')
+        os.makedirs(version_dir, exist_ok=True)
+        for name, content in files.items():
+            write_atomic(os.path.join(version_dir, name), content)
+
+        manifest['last_version'] = version
+        manifest['versions'].append({
+            'version': version,
+            'created_at': datetime.utcnow().isoformat(),
+            'reasons': sorted(set(reasons))[:20],
+            'files': sorted(files),
+            'checksums': checksums
+        })
+        for old in manifest['versions'][:-HISTORY_LIMIT]:
+            shutil.rmtree(os.path.join(self.history_dir, f"v{old['version']}"), ignore_errors=True)
+        manifest['versions'] = manifest['versions'][-HISTORY_LIMIT:]
+        write_atomic(self.manifest_file, json.dumps(manifest, indent=2))
+        return version
+
+    def _restore(self, entry: Dict[str, Any]) -> None:
+        """Write back the files of a version (files it did not have are left alone)"""
+        version_dir = os.path.join(self.history_dir, f"v{entry['version']}")
+        for name in entry['files']:
+            with open(os.path.join(version_dir, name), 'r') as f:
+                content = f.read()
+            if self.read(name) != content:
+                write_atomic(os.path.join(self.conf_dir, name), content)
+
+    def history(self) -> Dict[str, Any]:
+        """Applied versions (newest first), pending changes and the last reload result"""
+        manifest = self._load_manifest()
+        with self._lock:
+            pending = len(self._reasons)
+        return {
+            'current_version': manifest['versions'][-1]['version'] if manifest['versions'] else None,
+            'versions': [
+                {key: value for key, value in entry.items() if key != 'checksums'}
+                for entry in reversed(manifest['versions'])
+            ],
+            'pending_changes': pending,
+            'last_result': self.last_result
+        }
+
+    def rollback(self, version: int) -> Dict[str, Any]:
+        """Restore the files of an applied version and reload nginx (recorded as a new version)"""
+        with self._file_lock():
+            manifest = self._load_manifest()
+            entry = next((v for v in manifest['versions'] if v['version'] == version), None)
+            if not entry:
+                return {'success': False, 'error': f'Version {version} is not in the history'}
+
+            backup = self._current_files(entry['files'])
+            self._restore(entry)
+            if not self.reloader():
+                for name, content in backup.items():
+                    write_atomic(os.path.join(self.conf_dir, name), content)
+                return {'success': False, 'error': f'nginx rejected version {version}, nothing changed'}
+
+            names = set(self._managed) | set(entry['files'])
+            files = self._current_files(names)
+            checksums = {name: _checksum(content) for name, content in files.items()}
+            new_version = self._snapshot(manifest, files, checksums, [f'rollback to v{version}'])
+            logger.info(f"nginx configuration rolled back to v{version} (now v{new_version})")
+            return {'success': True, 'reloaded': True, 'version': new_version, 'restored_from': version}
@@ -7,13 +7,112 @@ of newly created Odoo worker containers.
 
 import logging
 import os
+import re
+import struct
 import time
 import subprocess
+import zlib
+from bisect import bisect_left
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
+from .nginx_config_controller import NginxConfigController
+
 logger = logging.getLogger(__name__)
 
+# Tenant traffic is keyed on the subdomain so a tenant keeps hitting the same
+# worker and its Odoo registry stays loaded there instead of on every worker
+TENANT_UPSTREAM = 'odoo_workers_dynamic'
+TENANT_HASH_METHOD = 'hash $subdomain consistent'
+
+# Tenants placed explicitly (see services/placement_service.py) are pinned to a
+# worker through a map in tenant_placement.conf; everyone else uses the hash.
+# A pin upstream lists the other workers as backups and follows the down flag
+# the health checker sets, so pinned tenants survive the loss of their worker.
+PLACEMENT_VARIABLE = '$odoo_tenant_upstream'
+PIN_UPSTREAM_PREFIX = 'odoo_pin_'
+
+# Weight of a healthy tenant server when the upstream has no servers yet.
+# Above 1 so the health checker (services/worker_health_service.py) can shed
+# part of a slow worker's tenants by lowering its weight; new workers take
+# the weight of their peers so the ring stays balanced.
+DEFAULT_SERVER_WEIGHT = 4
+
+# Websocket/longpolling (Odoo bus) traffic goes to the gevent port of the
+# workers, so long-lived connections never hold one of the prefork HTTP workers.
+# nginx seeds the ring points of a server with its port, so hashing the bus
+# upstream would not pick the tenant's HTTP worker. tenant_placement.conf
+# therefore maps every known tenant to a bus upstream on the gevent port of the
+# worker its HTTP traffic goes to (pin or hash); the hashed bus upstream, kept
+# at the same weights, only serves tenants the map does not know yet.
+BUS_UPSTREAM = 'odoo_workers_bus'
+BUS_PLACEMENT_VARIABLE = '$odoo_tenant_bus_upstream'
+BUS_PIN_UPSTREAM_PREFIX = 'odoo_bus_'
+DEFAULT_GEVENT_PORT = 8072
+
+# Odoo web assets are served from an nginx proxy cache shared by all tenants
+# (see NginxLoadBalancerService.write_asset_cache_config)
+ASSET_CACHE_ZONE = 'odoo_assets'
+ASSET_CACHE_PATH = '/var/cache/nginx/odoo_assets'
+ASSET_CACHE_LOG = '/var/log/nginx/asset_cache.log'
+ASSET_CACHE_MAX_SIZE = '2g'
+ASSET_CACHE_INACTIVE = '30d'
+
+
+class ConsistentHashRing:
+    """
+    Model of nginx's ``hash <key> consistent`` (ketama) peer selection.
+
+    Follows ngx_http_upstream_hash_module: each server contributes
+    weight * 160 points, chained as crc32(host \\0 port prev_hash), and a key is
+    served by the first point at or after crc32(key). Reports built on this
+    therefore show the worker nginx really picks for a tenant.
+    """
+
+    POINTS_PER_WEIGHT = 160
+    MAX_TRIES = 20
+
+    def __init__(self, servers: List[Dict[str, Any]]):
+        points = []
+        for server in servers:
+            base = self._hash_base(server['address'])
+            prev_hash = 0
+            for _ in range(server.get('weight', 1) * self.POINTS_PER_WEIGHT):
+                prev_hash = zlib.crc32(base + struct.pack('<I', prev_hash))
+                points.append((prev_hash, server['address']))
+        points.sort(key=lambda point: point[0])
+
+        # nginx drops points whose hash collides with the previous one
+        self._hashes = []
+        self._servers = []
+        for point_hash, address in points:
+            if self._hashes and self._hashes[-1] == point_hash:
+                continue
+            self._hashes.append(point_hash)
+            self._servers.append(address)
+
+        self._down = {server['address'] for server in servers if server.get('down')}
+
+    @staticmethod
+    def _hash_base(address: str) -> bytes:
+        if address[:5].lower() == 'unix:':
+            return address[5:].encode() + b'\0'
+        host, sep, port = address.rpartition(':')
+        if not sep:
+            return address.encode() + b'\0'
+        return host.encode() + b'\0' + port.encode()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Server address nginx would pick for key, skipping servers marked down"""
+        if not self._hashes:
+            return None
+        index = bisect_left(self._hashes, zlib.crc32(key.encode()))
+        for tries in range(self.MAX_TRIES):
+            address = self._servers[(index + tries) % len(self._servers)]
+            if address not in self._down:
+                return address
+        return None
+
 
 class NginxLoadBalancerService:
     """Service for managing nginx load balancer configuration"""
@@ -50,9 +149,19 @@ class NginxLoadBalancerService:
             os.makedirs(self.nginx_conf_d_path, exist_ok=True)
             
         self.upstream_config_file = os.path.join(self.nginx_conf_d_path, "dynamic_upstreams.conf")
+        self.placement_config_file = os.path.join(self.nginx_conf_d_path, "tenant_placement.conf")
+        # Not *.conf: the zone is included at the top of the http block and the
+        # locations inside the tenant server blocks, not by the conf.d glob
+        self.asset_cache_http_file = os.path.join(self.nginx_conf_d_path, "asset_cache.http")
+        self.asset_cache_locations_file = os.path.join(self.nginx_conf_d_path, "asset_cache.locations")
+        # Atomic writes, debounced reloads and version history of the files above
+        self.controller = NginxConfigController.for_directory(
+            self.nginx_conf_d_path, reloader=self._reload_nginx_container
+        )
         self.logger.info(f"Using nginx config path: {self.nginx_conf_d_path}")
     
-    def add_worker(self, worker_ip: str, worker_port: int, worker_name: str) -> Dict[str, Any]:
+    def add_worker(self, worker_ip: str, worker_port: int, worker_name: str,
+                   tenant_keys: Optional[List[str]] = None, gevent_port: Optional[int] = None) -> Dict[str, Any]:
         """
         Add a new worker to the nginx load balancer upstream
         
@@ -60,6 +169,9 @@ class NginxLoadBalancerService:
             worker_ip: IP address of the worker
             worker_port: Port of the worker
             worker_name: Name of the worker
+            tenant_keys: Tenant subdomains, to report which tenants move to the new worker
+            gevent_port: Gevent (websocket/longpolling) port of the worker, added to the
+                bus upstream; workers deployed without one only serve HTTP
             
         Returns:
             Dict containing operation result
@@ -67,36 +179,70 @@ class NginxLoadBalancerService:
         try:
             self.logger.info(f"Adding worker {worker_name} ({worker_ip}:{worker_port}) to load balancer")
             
-            # Read current upstream configuration
-            current_upstreams = self._read_upstream_config()
-            
-            # Add new worker to odoo_workers upstream
-            worker_entry = f"    server {worker_ip}:{worker_port} max_fails=2 fail_timeout=10s;"
-            
-            if 'odoo_workers' not in current_upstreams:
-                current_upstreams['odoo_workers'] = {
-                    'method': 'least_conn',
-                    'servers': [],
-                    'options': ['keepalive 8']
-                }
-            
-            # Check if worker already exists
-            existing = any(f"{worker_ip}:{worker_port}" in server for server in current_upstreams['odoo_workers']['servers'])
-            if not existing:
-                current_upstreams['odoo_workers']['servers'].append(worker_entry)
+            with self.controller.locked():
+                # Only the dynamic file is rewritten; upstreams from nginx.conf must not be duplicated into it
+                current_upstreams = self._read_upstream_config(include_main_config=False)
                 
-                # Write updated configuration
-                self._write_upstream_config(current_upstreams)
+                if TENANT_UPSTREAM not in current_upstreams:
+                    current_upstreams[TENANT_UPSTREAM] = {
+                        'method': TENANT_HASH_METHOD,
+                        'servers': [],
+                        'options': ['keepalive 8']
+                    }
+                upstream = current_upstreams[TENANT_UPSTREAM]
+                if upstream['method'] != TENANT_HASH_METHOD:
+                    self.logger.info(f"Switching {TENANT_UPSTREAM} from {upstream['method']} to {TENANT_HASH_METHOD}")
+                    upstream['method'] = TENANT_HASH_METHOD
                 
-                # Test and reload nginx
-                if self._test_and_reload_nginx():
-                    self.logger.info(f"Successfully added worker {worker_name} to load balancer")
-                    return {'success': True, 'message': f'Worker {worker_name} added to load balancer'}
-                else:
-                    return {'success': False, 'error': 'Failed to reload nginx configuration'}
+                # Add new worker to the tenant upstream with the weight of its peers
+                weight = self._peer_weight(upstream)
+                worker_entry = "    " + self._format_server_line(
+                    f"{worker_ip}:{worker_port}", weight, False, ['max_fails=2', 'fail_timeout=10s']
+                )
+                
+                bus_added = bool(gevent_port) and self._add_bus_server(current_upstreams, worker_ip, gevent_port, weight)
+                
+                # Check if worker already exists
+                existing = any(server['address'] == f"{worker_ip}:{worker_port}"
+                               for server in self._upstream_servers(upstream))
+                if existing and not bus_added:
+                    self.logger.warning(f"Worker {worker_name} already exists in load balancer")
+                    return {'success': True, 'message': f'Worker {worker_name} already exists in load balancer'}
+                
+                moved_tenants = []
+                if not existing:
+                    # Consistent hashing only moves the tenants whose ring points the new worker takes over
+                    before = self._upstream_servers(upstream)
+                    upstream['servers'].append(worker_entry)
+                    moved_tenants = self._moved_tenants(tenant_keys or [], before, self._upstream_servers(upstream))
+                
+                # Write updated configuration; the new worker also backs up the pinned
+                # tenants and takes the bus of the tenants it now serves
+                self._write_upstream_config(current_upstreams)
+                self._write_placement_config(self.read_tenant_pins())
+            
+            # Wait for the reload: a configuration nginx rejects is rolled back,
+            # and the worker must not be reported as added in that case
+            if existing:
+                # Worker deployed before it had a bus port
+                result = self._apply_and_wait(f'bus port of worker {worker_name}')
             else:
-                self.logger.warning(f"Worker {worker_name} already exists in load balancer")
-                return {'success': True, 'message': f'Worker {worker_name} already exists in load balancer'}
+                result = self._apply_and_wait(f'add worker {worker_name}')
+            if not result.get('success'):
+                return {'success': False, 'error': result.get('error', 'Failed to reload nginx configuration'),
+                        'restored_version': result.get('restored_version')}
+            
+            if existing:
+                return {'success': True, 'message': f'Worker {worker_name} added to {BUS_UPSTREAM}',
+                        'version': result.get('version')}
+            self.logger.info(f"Successfully added worker {worker_name} to load balancer "
+                             f"({len(moved_tenants)} of {len(tenant_keys or [])} tenants move to it)")
+            return {
+                'success': True,
+                'message': f'Worker {worker_name} added to load balancer',
+                'moved_tenants': moved_tenants,
+                'version': result.get('version')
+            }
                 
         except Exception as e:
             self.logger.error(f"Failed to add worker {worker_name} to load balancer: {str(e)}")
@@ -116,34 +262,45 @@ class NginxLoadBalancerService:
         try:
             self.logger.info(f"Removing worker {worker_name} ({worker_ip}) from load balancer")
             
-            # Read current upstream configuration
-            current_upstreams = self._read_upstream_config()
+            def on_worker(address: str) -> bool:
+                return address.rpartition(':')[0] == worker_ip
             
-            if 'odoo_workers' in current_upstreams:
-                # Remove worker from servers list
-                original_count = len(current_upstreams['odoo_workers']['servers'])
-                current_upstreams['odoo_workers']['servers'] = [
-                    server for server in current_upstreams['odoo_workers']['servers']
-                    if worker_ip not in server
-                ]
+            # Held across read and write like add_worker, so concurrent changes are kept
+            with self.controller.locked():
+                current_upstreams = self._read_upstream_config(include_main_config=False)
+                if TENANT_UPSTREAM not in current_upstreams:
+                    return {'success': False, 'error': f'No {TENANT_UPSTREAM} upstream found'}
                 
-                removed_count = original_count - len(current_upstreams['odoo_workers']['servers'])
+                # Remove worker from the tenant and bus servers (exact host, not a prefix)
+                removed_count = 0
+                for name in (TENANT_UPSTREAM, BUS_UPSTREAM):
+                    if name not in current_upstreams:
+                        continue
+                    servers = current_upstreams[name]['servers']
+                    kept = [line for line, server in zip(servers, self._upstream_servers({'servers': servers}))
+                            if not on_worker(server['address'])]
+                    if name == TENANT_UPSTREAM:
+                        removed_count = len(servers) - len(kept)
+                    current_upstreams[name]['servers'] = kept
                 
-                if removed_count > 0:
-                    # Write updated configuration
-                    self._write_upstream_config(current_upstreams)
-                    
-                    # Test and reload nginx
-                    if self._test_and_reload_nginx():
-                        self.logger.info(f"Successfully removed worker {worker_name} from load balancer")
-                        return {'success': True, 'message': f'Worker {worker_name} removed from load balancer'}
-                    else:
-                        return {'success': False, 'error': 'Failed to reload nginx configuration'}
-                else:
+                if removed_count == 0:
                     self.logger.warning(f"Worker {worker_name} not found in load balancer")
                     return {'success': True, 'message': f'Worker {worker_name} not found in load balancer'}
-            else:
-                return {'success': False, 'error': 'No odoo_workers upstream found'}
+                
+                self._write_upstream_config(current_upstreams)
+                # Tenants pinned to the worker fall back to the consistent hash
+                pins = self.read_tenant_pins()
+                self._write_placement_config({tenant: address for tenant, address in pins.items()
+                                              if not on_worker(address)})
+            
+            # Wait for the reload so callers learn whether nginx accepted the change
+            result = self._apply_and_wait(f'remove worker {worker_name}')
+            if not result.get('success'):
+                return {'success': False, 'error': result.get('error', 'Failed to reload nginx configuration'),
+                        'restored_version': result.get('restored_version')}
+            self.logger.info(f"Successfully removed worker {worker_name} from load balancer")
+            return {'success': True, 'message': f'Worker {worker_name} removed from load balancer',
+                    'version': result.get('version')}
                 
         except Exception as e:
             self.logger.error(f"Failed to remove worker {worker_name} from load balancer: {str(e)}")
@@ -180,20 +337,19 @@ class NginxLoadBalancerService:
             self.logger.error(f"Failed to get upstream status: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def _read_upstream_config(self) -> Dict[str, Dict]:
+    def _read_upstream_config(self, include_main_config: bool = True) -> Dict[str, Dict]:
         """Read current upstream configuration from nginx config files"""
         upstreams = {}
         
         try:
-            # Try to read from dynamic upstreams file first
-            if os.path.exists(self.upstream_config_file):
-                with open(self.upstream_config_file, 'r') as f:
+            # Main nginx.conf first, so the dynamic file wins for upstreams defined in both
+            if include_main_config and os.path.exists(self.nginx_config_path):
+                with open(self.nginx_config_path, 'r') as f:
                     content = f.read()
                 upstreams.update(self._parse_upstream_config(content))
             
-            # Also read from main nginx.conf as fallback
-            if os.path.exists(self.nginx_config_path):
-                with open(self.nginx_config_path, 'r') as f:
+            if os.path.exists(self.upstream_config_file):
+                with open(self.upstream_config_file, 'r') as f:
                     content = f.read()
                 upstreams.update(self._parse_upstream_config(content))
             
@@ -221,7 +377,7 @@ class NginxLoadBalancerService:
                 }
             elif current_upstream and line.startswith('server '):
                 upstreams[current_upstream]['servers'].append(line)
-            elif current_upstream and line in ['least_conn;', 'ip_hash;', 'hash;']:
+            elif current_upstream and (line in ['least_conn;', 'ip_hash;'] or line.startswith('hash ')):
                 upstreams[current_upstream]['method'] = line.rstrip(';')
             elif current_upstream and line.startswith('keepalive '):
                 upstreams[current_upstream]['options'].append(line)
@@ -230,11 +386,37 @@ class NginxLoadBalancerService:
         
         return upstreams
     
+    def _add_bus_server(self, upstreams: Dict[str, Dict], worker_ip: str, gevent_port: int,
+                        weight: int = DEFAULT_SERVER_WEIGHT) -> bool:
+        """Add a worker's gevent port to the bus upstream; False if it is already there"""
+        if BUS_UPSTREAM not in upstreams:
+            upstreams[BUS_UPSTREAM] = {
+                'method': TENANT_HASH_METHOD,
+                'servers': [],
+                'options': []
+            }
+        bus = upstreams[BUS_UPSTREAM]
+        address = f"{worker_ip}:{gevent_port}"
+        if any(server['address'] == address for server in self._upstream_servers(bus)):
+            return False
+        # Same weight as the worker's tenant server, so both rings share the proportions
+        bus['servers'].append("    " + self._format_server_line(
+            address, weight, False, ['max_fails=2', 'fail_timeout=10s']
+        ))
+        return True
+    
     def _write_upstream_config(self, upstreams: Dict[str, Dict]):
         """Write upstream configuration to dynamic config file"""
-        config_content = "# Dynamic upstream configuration\n"
-        config_content += f"# Generated at {datetime.now().isoformat()}\n\n"
+        # No timestamp: identical upstreams must render identical files (see NginxConfigController)
+        config_content = "# Dynamic upstream configuration, generated by the SaaS manager\n\n"
+        config_content += self._render_upstreams(upstreams)
         
+        if self.controller.write(self.upstream_config_file, config_content):
+            self.logger.info(f"Updated upstream configuration: {self.upstream_config_file}")
+    
+    @staticmethod
+    def _render_upstreams(upstreams: Dict[str, Dict]) -> str:
+        config_content = ""
         for upstream_name, upstream_config in upstreams.items():
             config_content += f"upstream {upstream_name} {{\n"
             
@@ -254,26 +436,37 @@ class NginxLoadBalancerService:
                 config_content += f"    {option}\n"
             
             config_content += "}\n\n"
-        
-        # Directory already ensured in __init__
-        
-        # Write to file
-        with open(self.upstream_config_file, 'w') as f:
-            f.write(config_content)
-        
-        self.logger.info(f"Updated upstream configuration: {self.upstream_config_file}")
+        return config_content
     
-    def _test_and_reload_nginx(self) -> bool:
-        """Test nginx configuration and reload if valid"""
+    def _test_and_reload_nginx(self, reason: str = 'configuration changed') -> bool:
+        """
+        Schedule a test and reload of nginx.
+        
+        Changes within the controller's window share one reload, and nothing is
+        reloaded if the files end up unchanged. A configuration nginx rejects is
+        replaced by the last applied version (see get_config_history).
+        """
         try:
-            # For containerized deployments, we'll delegate nginx reloading to the nginx container
-            # First, let's try to signal nginx via Docker API or external command
-            return self._reload_nginx_container()
+            self.controller.request_reload(reason)
+            return True
             
         except Exception as e:
-            self.logger.error(f"Failed to test/reload nginx: {str(e)}")
+            self.logger.error(f"Failed to schedule nginx reload: {str(e)}")
             return False
     
+    def _apply_and_wait(self, reason: str) -> Dict[str, Any]:
+        """
+        Apply this change, together with any pending ones, and return the reload result.
+        
+        For callers that report the change as done: unlike _test_and_reload_nginx
+        they learn whether nginx accepted it or the previous version was restored.
+        """
+        try:
+            return self.controller.apply_now(reason)
+        except Exception as e:
+            self.logger.error(f"Failed to apply nginx configuration: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     def _reload_nginx_container(self) -> bool:
         """Reload nginx in the nginx container"""
         try:
@@ -334,14 +527,569 @@ class NginxLoadBalancerService:
         except Exception:
             return {'raw': server_line}
     
+    def _upstream_servers(self, upstream_config: Dict) -> List[Dict[str, Any]]:
+        """Server address, weight and down flag for every server line of an upstream"""
+        servers = []
+        for line in upstream_config.get('servers', []):
+            parts = line.split('#', 1)[0].strip().rstrip(';').split()
+            if len(parts) < 2:
+                continue
+            weight = 1
+            for option in parts[2:]:
+                if option.startswith('weight='):
+                    weight = int(option.split('=', 1)[1])
+            servers.append({'address': parts[1], 'weight': weight, 'down': 'down' in parts[2:]})
+        return servers
+
+    @staticmethod
+    def _format_server_line(address: str, weight: int, down: bool, options: List[str]) -> str:
+        parts = ['server', address]
+        if weight != 1:
+            parts.append(f'weight={weight}')
+        if down:
+            parts.append('down')
+        return ' '.join(parts + options) + ';'
+    
+    def _peer_weight(self, upstream_config: Dict) -> int:
+        """Most common weight of the servers that are up, DEFAULT_SERVER_WEIGHT for an empty upstream"""
+        weights = [server['weight'] for server in self._upstream_servers(upstream_config) if not server['down']]
+        if not weights:
+            return DEFAULT_SERVER_WEIGHT
+        return max(set(weights), key=lambda weight: (weights.count(weight), weight))
+    
+    def _moved_tenants(self, tenant_keys: List[str], before: List[Dict[str, Any]],
+                       after: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        old_ring, new_ring = ConsistentHashRing(before), ConsistentHashRing(after)
+        moved = []
+        for key in tenant_keys:
+            old_server, new_server = old_ring.lookup(key), new_ring.lookup(key)
+            if old_server != new_server:
+                moved.append({'tenant': key, 'from': old_server, 'to': new_server})
+        return moved
+
+    def get_tenant_assignments(self, tenant_keys: List[str], preview_add: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Report which worker serves each tenant under the tenant upstream.
+        
+        Args:
+            tenant_keys: Tenant subdomains (the upstream hash key)
+            preview_add: Optional "host:port" of a worker to be added; the report
+                then also lists the tenants that would move to it
+            
+        Returns:
+            Dict with per-tenant assignment and per-worker tenant lists
+        """
+        try:
+            upstream = self._read_upstream_config().get(TENANT_UPSTREAM)
+            if not upstream:
+                return {'success': False, 'error': f'No {TENANT_UPSTREAM} upstream found'}
+            
+            servers = self._upstream_servers(upstream)
+            ring = ConsistentHashRing(servers)
+            pins = self.read_tenant_pins()
+            assignments = {key: pins.get(key) or ring.lookup(key) for key in tenant_keys}
+            
+            workers = {server['address']: {'weight': server['weight'], 'down': server['down'], 'tenants': []}
+                       for server in servers}
+            for key, address in assignments.items():
+                if address in workers:
+                    workers[address]['tenants'].append(key)
+            for info in workers.values():
+                info['tenant_count'] = len(info['tenants'])
+            
+            report = {
+                'upstream': TENANT_UPSTREAM,
+                'method': upstream.get('method'),
+                'consistent_hash': upstream.get('method') == TENANT_HASH_METHOD,
+                'tenant_count': len(tenant_keys),
+                'assignments': assignments,
+                'pinned': sorted(key for key in tenant_keys if key in pins),
+                'workers': workers
+            }
+            
+            if preview_add:
+                after = servers + [{'address': preview_add, 'weight': self._peer_weight(upstream), 'down': False}]
+                unpinned = [key for key in tenant_keys if key not in pins]
+                report['preview_add'] = {
+                    'worker': preview_add,
+                    'moved_tenants': self._moved_tenants(unpinned, servers, after)
+                }
+            
+            return {'success': True, 'report': report}
+            
+        except Exception as e:
+            self.logger.error(f"Failed to compute tenant assignments: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    # ================= TENANT PLACEMENT PINS =================
+    
+    def tenant_servers(self) -> List[Dict[str, Any]]:
+        """Address, weight and down flag of the servers in the tenant upstream"""
+        upstream = self._read_upstream_config(include_main_config=False).get(TENANT_UPSTREAM, {})
+        return self._upstream_servers(upstream)
+    
+    def tenant_server_addresses(self) -> List[str]:
+        """Addresses of the servers in the tenant upstream"""
+        return [server['address'] for server in self.tenant_servers()]
+    
+    def resolve_tenant_worker(self, tenant_key: str, pins: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """Worker address nginx routes a tenant to: its pin, else the consistent hash"""
+        pins = self.read_tenant_pins() if pins is None else pins
+        if tenant_key in pins:
+            return pins[tenant_key]
+        upstream = self._read_upstream_config(include_main_config=False).get(TENANT_UPSTREAM, {})
+        return ConsistentHashRing(self._upstream_servers(upstream)).lookup(tenant_key)
+    
+    def _read_placement_config(self) -> str:
+        if not os.path.exists(self.placement_config_file):
+            return ''
+        with open(self.placement_config_file, 'r') as f:
+            return f.read()
+    
+    @staticmethod
+    def _map_entries(content: str, variable: str) -> Dict[str, str]:
+        """Key -> value of the $subdomain map that sets variable (default excluded)"""
+        entries = {}
+        map_block = re.search(r'map\s+\$subdomain\s+' + re.escape(variable) + r'\s*\{(.*?)\}', content, re.DOTALL)
+        if map_block:
+            for line in map_block.group(1).split('\n'):
+                parts = line.strip().rstrip(';').split()
+                if len(parts) == 2 and parts[0] != 'default':
+                    entries[parts[0]] = parts[1]
+        return entries
+    
+    def read_tenant_pins(self) -> Dict[str, str]:
+        """Tenant subdomain -> worker address for every pinned tenant"""
+        content = self._read_placement_config()
+        pin_addresses = {
+            name: config['servers'][0].split()[1].rstrip(';')
+            for name, config in self._parse_upstream_config(content).items()
+            if name.startswith(PIN_UPSTREAM_PREFIX) and config['servers']
+        }
+        return {
+            key: pin_addresses[name]
+            for key, name in self._map_entries(content, PLACEMENT_VARIABLE).items()
+            if name in pin_addresses
+        }
+    
+    def routed_tenants(self) -> List[str]:
+        """Tenant subdomains the bus map routes (every tenant placed or synced so far)"""
+        return sorted(self._map_entries(self._read_placement_config(), BUS_PLACEMENT_VARIABLE))
+    
+    def set_tenant_pin(self, tenant_key: str, address: Optional[str]) -> bool:
+        """Pin a tenant to a worker address (None removes the pin) and reload nginx"""
+        # Held across read and write so concurrent placements keep each other's pins
+        with self.controller.locked():
+            pins = self.read_tenant_pins()
+            if address is None:
+                pins.pop(tenant_key, None)
+            else:
+                if address not in self.tenant_server_addresses():
+                    raise ValueError(f"{address} is not a server of {TENANT_UPSTREAM}")
+                pins[tenant_key] = address
+            # Hashed tenants are routed too, so their bus follows their HTTP worker
+            changed = self._write_placement_config(pins, self.routed_tenants() + [tenant_key])
+        if not changed:
+            return True
+        return self._test_and_reload_nginx(f'tenant pin {tenant_key}')
+    
+    def remove_tenant_pins(self, tenant_keys: List[str]) -> bool:
+        """Drop the pins and bus routes of the given tenants and reload nginx"""
+        removed = set(tenant_keys)
+        with self.controller.locked():
+            pins = self.read_tenant_pins()
+            kept = {key: address for key, address in pins.items() if key not in removed}
+            routed = [key for key in self.routed_tenants() if key not in removed]
+            if not self._write_placement_config(kept, routed):
+                return True
+        return self._test_and_reload_nginx(f'removed tenants ({len(removed)})')
+    
+    def sync_tenant_routes(self, tenant_keys: List[str]) -> bool:
+        """Route exactly the given tenants, dropping pins and routes of any other, and reload nginx"""
+        known = set(tenant_keys)
+        with self.controller.locked():
+            pins = {key: address for key, address in self.read_tenant_pins().items() if key in known}
+            if not self._write_placement_config(pins, sorted(known)):
+                return True
+        return self._test_and_reload_nginx(f'tenant routes ({len(known)})')
+    
+    def write_tenant_pins(self, pins: Dict[str, str]) -> bool:
+        """Replace all tenant pins and reload nginx"""
+        with self.controller.locked():
+            self._write_placement_config(pins)
+        return self._test_and_reload_nginx(f'tenant pins ({len(pins)})')
+    
+    @staticmethod
+    def _address_upstream_name(prefix: str, address: str) -> str:
+        return prefix + re.sub(r'[^A-Za-z0-9]', '_', address)
+    
+    def _write_placement_config(self, pins: Dict[str, str], tenant_keys: Optional[List[str]] = None) -> bool:
+        """
+        Write the HTTP and bus subdomain maps with their per-worker upstreams.
+        
+        The pinned worker is the primary server of its pin upstream, marked down
+        while the tenant upstream has it down; the other live workers are backups
+        nginx uses only when the primary is unavailable. Every routed tenant
+        (tenant_keys, default: the ones already routed, plus the pinned ones) gets
+        the bus upstream of the worker nginx sends its HTTP traffic to, built the
+        same way on the gevent ports. Call again whenever servers or pins change.
+        
+        Returns:
+            True if the file changed
+        """
+        config_content = "# Tenant placement pins, generated by the SaaS manager\n\n"
+        upstreams = self._read_upstream_config(include_main_config=False)
+        servers = self._upstream_servers(upstreams.get(TENANT_UPSTREAM, {}))
+        down = {server['address'] for server in servers if server['down']}
+        
+        upstream_names = {}
+        for address in sorted(set(pins.values())):
+            name = self._address_upstream_name(PIN_UPSTREAM_PREFIX, address)
+            upstream_names[address] = name
+            config_content += f"upstream {name} {{\n"
+            config_content += f"    server {address}{' down' if address in down else ''} max_fails=2 fail_timeout=10s;\n"
+            for server in servers:
+                if server['address'] != address and not server['down']:
+                    config_content += f"    server {server['address']} max_fails=2 fail_timeout=10s backup;\n"
+            config_content += "    keepalive 8;\n"
+            config_content += "}\n\n"
+        
+        # Bus: the gevent server on the host of each tenant server
+        bus_servers = self._upstream_servers(upstreams.get(BUS_UPSTREAM, {}))
+        bus_by_host = {server['address'].rpartition(':')[0]: server for server in bus_servers}
+        ring = ConsistentHashRing(servers)
+        routed = set(self.routed_tenants() if tenant_keys is None else tenant_keys) | set(pins)
+        bus_routes, bus_names = {}, {}
+        for tenant_key in sorted(routed):
+            address = pins.get(tenant_key) or ring.lookup(tenant_key)
+            bus = bus_by_host.get(address.rpartition(':')[0]) if address else None
+            if not bus:
+                # Worker without a gevent port (or no live worker): hashed bus upstream
+                bus_routes[tenant_key] = BUS_UPSTREAM
+                continue
+            bus_names[bus['address']] = self._address_upstream_name(BUS_PIN_UPSTREAM_PREFIX, bus['address'])
+            bus_routes[tenant_key] = bus_names[bus['address']]
+        
+        for bus_address in sorted(bus_names):
+            primary = bus_by_host[bus_address.rpartition(':')[0]]
+            config_content += f"upstream {bus_names[bus_address]} {{\n"
+            config_content += (f"    server {primary['address']}{' down' if primary['down'] else ''}"
+                               f" max_fails=2 fail_timeout=10s;\n")
+            for server in bus_servers:
+                if server['address'] != primary['address'] and not server['down']:
+                    config_content += f"    server {server['address']} max_fails=2 fail_timeout=10s backup;\n"
+            config_content += "}\n\n"
+        
+        config_content += f"map $subdomain {PLACEMENT_VARIABLE} {{\n"
+        config_content += f"    default {TENANT_UPSTREAM};\n"
+        for tenant_key in sorted(pins):
+            config_content += f"    {tenant_key} {upstream_names[pins[tenant_key]]};\n"
+        config_content += "}\n\n"
+        
+        config_content += f"map $subdomain {BUS_PLACEMENT_VARIABLE} {{\n"
+        config_content += f"    default {BUS_UPSTREAM};\n"
+        for tenant_key in sorted(bus_routes):
+            config_content += f"    {tenant_key} {bus_routes[tenant_key]};\n"
+        config_content += "}\n"
+        
+        changed = self.controller.write(self.placement_config_file, config_content)
+        if changed:
+            self.logger.info(f"Updated tenant placement configuration: {self.placement_config_file} "
+                             f"({len(pins)} pins, {len(bus_routes)} bus routes)")
+        return changed
+    
+    # ================= SERVER HEALTH =================
+    
+    def set_server_health(self, address: str, down: bool = False, weight: Optional[int] = None,
+                          reason: str = 'worker health changed') -> bool:
+        """
+        Mark a tenant upstream server down (or up again) and set its weight.
+        
+        The bus server on the same host follows the down flag and the weight,
+        and the placement maps are rebuilt so pinned tenants fail over and each
+        tenant's bus keeps following its HTTP worker. With the consistent hash
+        only the tenants of that server move.
+        The reload is scheduled like any other change.
+        
+        Args:
+            address: host:port of the server in the tenant upstream
+            down: Take the server out of rotation
+            weight: New weight, None to keep the current one
+            
+        Returns:
+            True if the configuration changed
+        """
+        with self.controller.locked():
+            changed = self._apply_server_health(address, down, weight)
+        if changed:
+            self._test_and_reload_nginx(reason)
+        return changed
+    
+    def _apply_server_health(self, address: str, down: bool, weight: Optional[int]) -> bool:
+        upstreams = self._read_upstream_config(include_main_config=False)
+        host = address.rpartition(':')[0]
+        changed = False
+        
+        for name in (TENANT_UPSTREAM, BUS_UPSTREAM):
+            if name not in upstreams:
+                continue
+            lines = upstreams[name]['servers']
+            for index, line in enumerate(lines):
+                parts = line.split('#', 1)[0].strip().rstrip(';').split()
+                if len(parts) < 2:
+                    continue
+                server_address = parts[1]
+                if name == TENANT_UPSTREAM:
+                    matches = server_address == address
+                else:
+                    matches = server_address.rpartition(':')[0] == host
+                if not matches:
+                    continue
+                server = self._upstream_servers({'servers': [line]})[0]
+                new_weight = weight if weight is not None else server['weight']
+                options = [option for option in parts[2:] if option != 'down' and not option.startswith('weight=')]
+                new_line = self._format_server_line(server_address, new_weight, down, options)
+                if new_line != line.strip():
+                    lines[index] = f"    {new_line}"
+                    changed = True
+        
+        if changed:
+            self._write_upstream_config(upstreams)
+            # Pinned tenants of a down worker go to the backups of their pin upstream,
+            # and the bus routes follow the tenants the hash moves
+            self._write_placement_config(self.read_tenant_pins())
+        return changed
+    
+    # ================= ROUTING FOR OTHER SERVERS =================
+    
+    def render_routing_config(self, prefix: str) -> Dict[str, str]:
+        """
+        Tenant and bus upstreams plus the placement maps, renamed with a prefix.
+        
+        For an nginx that does not include this service's conf.d, such as the
+        custom-domain server (see infra_admin.generate_nginx_config): the text
+        declares everything its server blocks route through, without clashing
+        with upstreams that server defines itself. It reflects the current
+        workers and pins and must be pushed again when they change.
+        
+        Args:
+            prefix: Prepended to every upstream and map variable name
+            
+        Returns:
+            dict with the config text and the tenant_upstream / bus_upstream
+            variables to proxy_pass to
+        """
+        with self.controller.locked():
+            upstreams = self._read_upstream_config(include_main_config=False)
+            placement = self._read_placement_config()
+        
+        routed = {name: upstreams[name] for name in (TENANT_UPSTREAM, BUS_UPSTREAM) if name in upstreams}
+        names = set(routed) | {
+            name for name in self._parse_upstream_config(placement)
+            if name.startswith((PIN_UPSTREAM_PREFIX, BUS_PIN_UPSTREAM_PREFIX))
+        }
+        variables = {PLACEMENT_VARIABLE.lstrip('$'), BUS_PLACEMENT_VARIABLE.lstrip('$')}
+        # Placement comments describe the local files, drop them
+        placement = '\n'.join(line for line in placement.splitlines() if not line.startswith('#'))
+        content = self._render_upstreams(routed) + placement.strip() + '\n'
+        
+        pattern = r'(?<![\w$])(\$?)(' + '|'.join(re.escape(name) for name in sorted(names | variables, key=len, reverse=True)) + r')(?!\w)'
+        content = re.sub(pattern, lambda match: match.group(1) + prefix + match.group(2), content)
+        return {
+            'config': content,
+            'tenant_upstream': '$' + prefix + PLACEMENT_VARIABLE.lstrip('$'),
+            'bus_upstream': '$' + prefix + BUS_PLACEMENT_VARIABLE.lstrip('$'),
+        }
+    
+    # ================= ASSET CACHE =================
+    
+    @staticmethod
+    def render_asset_cache_http(zone: str = ASSET_CACHE_ZONE, path: str = ASSET_CACHE_PATH,
+                                max_size: str = ASSET_CACHE_MAX_SIZE, inactive: str = ASSET_CACHE_INACTIVE) -> str:
+        """http-level part of the asset cache: the cache zone, its log format and helper maps"""
+        return (
+            f"proxy_cache_path {path} levels=1:2 keys_zone={zone}:50m max_size={max_size} "
+            f"inactive={inactive} use_temp_path=off;\n\n"
+            f"# One line per asset request; the cache status column gives the hit ratio\n"
+            f"log_format {zone} '$time_local | $host | \"$request\" | $status | cache: $upstream_cache_status | '\n"
+            f"                 'upstream_response_time: $upstream_response_time | request_time: $request_time | '\n"
+            f"                 'bytes: $body_bytes_sent';\n\n"
+            f"# Record images are only stored in their immutable (?unique=<checksum>) form\n"
+            f"map $arg_unique ${zone}_image_no_store {{\n"
+            f"    default 0;\n"
+            f"    \"\"      1;\n"
+            f"}}\n"
+        )
+    
+    @staticmethod
+    def _asset_cache_location(match: str, comment: str, zone: str, upstream: str, cache_key: str,
+                              shared: bool, extra: Optional[List[str]] = None, subdomain_header: bool = True) -> str:
+        lines = [f"# {comment}", f"location {match} {{"]
+        lines += [
+            f"    proxy_pass http://{upstream};",
+            "    proxy_set_header Host $host;",
+            "    proxy_set_header X-Real-IP $remote_addr;",
+            "    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;",
+            "    proxy_set_header X-Forwarded-Proto $scheme;",
+            "    proxy_set_header X-Forwarded-Host $host;",
+        ]
+        if subdomain_header:
+            lines.append("    proxy_set_header X-Subdomain $subdomain;")
+        lines += [
+            "    proxy_http_version 1.1;",
+            '    proxy_set_header Connection "";',
+            "",
+            f"    proxy_cache {zone};",
+            f'    proxy_cache_key "{cache_key}";',
+            "    proxy_cache_valid 200 301 302 7d;",
+            "    proxy_cache_valid 404 1m;",
+            "    # One request per missing key goes to Odoo, the others wait for it",
+            "    proxy_cache_lock on;",
+            "    proxy_cache_lock_timeout 10s;",
+            "    # Serve stale copies while refreshing in the background or when workers fail",
+            "    proxy_cache_use_stale error timeout updating http_500 http_502 http_503 http_504;",
+            "    proxy_cache_background_update on;",
+            "    proxy_cache_revalidate on;",
+        ]
+        if shared:
+            lines += [
+                "    # Shared by every tenant: never store or replay a session cookie",
+                "    proxy_ignore_headers Set-Cookie;",
+                "    proxy_hide_header Set-Cookie;",
+            ]
+        lines += [f"    {line}" for line in extra or []]
+        lines += [
+            "",
+            f"    access_log {ASSET_CACHE_LOG} {zone};",
+            "    proxy_intercept_errors on;",
+            "}",
+            "",
+        ]
+        return "\n".join(lines)
+    
+    @classmethod
+    def render_asset_cache_locations(cls, upstream: str = PLACEMENT_VARIABLE, zone: str = ASSET_CACHE_ZONE,
+                                     subdomain_header: bool = True) -> str:
+        """
+        Location blocks caching Odoo's web assets in ``zone``.
+        
+        Compiled bundles (/web/assets/<hash>/...) and module static files are
+        keyed on the URL alone, so one copy serves every tenant. Record images
+        depend on the tenant database and are keyed on the host as well.
+        """
+        return "\n".join([
+            cls._asset_cache_location(
+                r"~ ^/web/assets/(?:\d+-)?(?<asset_unique>[0-9a-f]{7,})/(?<asset_file>[^/]+)$",
+                "Compiled bundles: the content hash in the path identifies them across tenant databases",
+                zone, upstream, "assets/$asset_unique/$asset_file", shared=True,
+                subdomain_header=subdomain_header),
+            cls._asset_cache_location(
+                r"~ ^/[^/]+/static/",
+                "Module static files (/web/static/..., /<module>/static/...), identical on every worker",
+                zone, upstream, "static$uri$is_args$args", shared=True,
+                subdomain_header=subdomain_header),
+            cls._asset_cache_location(
+                "^~ /web/image",
+                "Record images belong to a tenant database: keyed on the host too",
+                zone, upstream, "image$host$uri$is_args$args", shared=False,
+                extra=[f"proxy_no_cache ${zone}_image_no_store;"],
+                subdomain_header=subdomain_header),
+        ])
+    
+    def write_asset_cache_config(self, max_size: str = ASSET_CACHE_MAX_SIZE,
+                                 inactive: str = ASSET_CACHE_INACTIVE) -> Dict[str, Any]:
+        """Write the asset cache zone and locations for the tenant servers and reload nginx"""
+        try:
+            header = "# Odoo web asset cache, generated by the SaaS manager\n\n"
+            changed = self.controller.write(
+                self.asset_cache_http_file,
+                header + self.render_asset_cache_http(max_size=max_size, inactive=inactive)
+            )
+            changed = self.controller.write(
+                self.asset_cache_locations_file, header + self.render_asset_cache_locations()
+            ) or changed
+            if not changed:
+                return {'success': True, 'message': 'Asset cache configuration unchanged'}
+            self.logger.info(f"Updated asset cache configuration (max_size={max_size}, inactive={inactive})")
+            
+            if self._test_and_reload_nginx('asset cache configuration'):
+                return {'success': True, 'message': 'Asset cache configuration applied'}
+            return {'success': False, 'error': 'Failed to reload nginx configuration'}
+        except Exception as e:
+            self.logger.error(f"Failed to write asset cache configuration: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def parse_asset_cache_log(lines: List[str]) -> Dict[str, Any]:
+        """Cache status counts and hit ratio of asset cache log lines"""
+        statuses = {}
+        for line in lines:
+            match = re.search(r'\| cache: (\S+) \|', line)
+            if match:
+                statuses[match.group(1)] = statuses.get(match.group(1), 0) + 1
+        
+        requests_seen = sum(statuses.values())
+        # STALE, UPDATING and REVALIDATED are answered from the cache as well
+        served = sum(statuses.get(status, 0) for status in ('HIT', 'STALE', 'UPDATING', 'REVALIDATED'))
+        return {
+            'requests': requests_seen,
+            'statuses': statuses,
+            'hit_ratio': round(served / requests_seen, 4) if requests_seen else None,
+            'upstream_requests': requests_seen - served
+        }
+    
+    def get_asset_cache_stats(self, lines: int = 10000) -> Dict[str, Any]:
+        """Hit ratio of the last ``lines`` asset requests, read from the nginx container"""
+        try:
+            import docker
+            docker_client = docker.from_env()
+            nginx_containers = [c for c in docker_client.containers.list() if 'nginx' in c.name.lower()]
+            if not nginx_containers:
+                return {'success': False, 'error': 'No nginx container found'}
+            
+            result = nginx_containers[0].exec_run(f'tail -n {int(lines)} {ASSET_CACHE_LOG}')
+            if result.exit_code != 0:
+                return {'success': False, 'error': result.output.decode(errors='replace').strip()}
+            stats = self.parse_asset_cache_log(result.output.decode(errors='replace').splitlines())
+            return {'success': True, 'stats': stats}
+        except Exception as e:
+            self.logger.error(f"Failed to read asset cache stats: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     def reload_nginx(self) -> Dict[str, Any]:
-        """Manually reload nginx configuration"""
+        """Manually reload nginx configuration (applies pending changes immediately)"""
         try:
-            if self._test_and_reload_nginx():
-                return {'success': True, 'message': 'Nginx reloaded successfully'}
+            result = self.controller.flush(force=True)
+            if result['success']:
+                return {'success': True, 'message': 'Nginx reloaded successfully', 'version': result.get('version')}
             else:
-                return {'success': False, 'error': 'Failed to reload nginx'}
+                return {'success': False, 'error': result.get('error', 'Failed to reload nginx'),
+                        'restored_version': result.get('restored_version')}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def apply_pending_changes(self) -> Dict[str, Any]:
+        """Apply scheduled changes now instead of at the end of the debounce window"""
+        try:
+            return self.controller.flush()
+        except Exception as e:
+            self.logger.error(f"Failed to apply nginx changes: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def get_config_history(self) -> Dict[str, Any]:
+        """Applied configuration versions, newest first"""
+        try:
+            return {'success': True, **self.controller.history()}
+        except Exception as e:
+            self.logger.error(f"Failed to read nginx config history: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def rollback_config(self, version: int) -> Dict[str, Any]:
+        """Restore the generated files of an earlier version and reload nginx"""
+        try:
+            return self.controller.rollback(version)
         except Exception as e:
+            self.logger.error(f"Failed to roll back nginx config to v{version}: {str(e)}")
             return {'success': False, 'error': str(e)}
     
     def get_worker_health(self, worker_ip: str, worker_port: int) -> Dict[str, Any]:
@@ -362,4 +1110,4 @@ class NginxLoadBalancerService:
 
 
 # Export the service class
-__all__ = ['NginxLoadBalancerService']
\ No newline at end of file
+__all__ = ['NginxLoadBalancerService', 'ConsistentHashRing', 'DEFAULT_GEVENT_PORT', 'DEFAULT_SERVER_WEIGHT']
\ No newline at end of file
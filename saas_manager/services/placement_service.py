@@ -0,0 +1,521 @@
+"""
+Tenant Placement Service
+
+Chooses the worker a new tenant lands on from live load instead of the
+``current_tenants`` counter alone. Every worker is scored from its container
+CPU/memory (``shared_utils.get_container_stats``), its share of tenant storage
+and active users (the on-demand tenant metrics) and its tenant count against
+``max_tenants``. The ``placement_policy`` setting picks the lowest score
+(spread) or the highest score that still has headroom (binpack).
+
+Sampling those signals is slow (container stats block, metrics probe the
+tenants), so one elected SaaS manager process refreshes them in the background
+into a per-worker load cache in Redis. A placement only combines that cache
+with the live tenant counts and never waits on a probe.
+
+Tenant traffic is routed by the consistent hash of the subdomain, so the worker
+a tenant runs on is whatever nginx resolves it to. A placement that differs from
+the hash is enforced with a pin in ``tenant_placement.conf``; the pins plus the
+hash ring are the tenant -> worker mapping the worker counters are reconciled
+from.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from db import db
+from models import InfrastructureServer, SystemSetting, Tenant, WorkerInstance
+from services.nginx_service import NginxLoadBalancerService
+from services.tenant_metrics_service import TenantProbeTarget
+from shared_utils import get_container_stats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WorkerLoad:
+    """Load figures and placement score of one worker"""
+    worker_id: int
+    name: str
+    status: str
+    address: Optional[str] = None
+    tenants: List[str] = field(default_factory=list)
+    tenant_count: int = 0
+    max_tenants: int = 0
+    cpu_percent: Optional[float] = None
+    memory_percent: Optional[float] = None
+    storage_bytes: int = 0
+    active_users: int = 0
+    score: float = 0.0
+    eligible: bool = True
+    reasons: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['score'] = round(self.score, 4)
+        return data
+
+
+class TenantPlacementService:
+    """Load-aware tenant -> worker placement and counter reconciliation"""
+
+    POLICY_SETTING = "placement_policy"
+    POLICIES = ('spread', 'binpack')
+    DEFAULT_POLICY = 'spread'
+
+    # Workers above either threshold take no new tenants
+    MAX_CPU_PERCENT = 85.0
+    MAX_MEMORY_PERCENT = 85.0
+
+    # Relative weight of each load signal; signals without data are left out
+    # and the remaining weights renormalised
+    SCORE_WEIGHTS = {
+        'tenants': 0.30,
+        'cpu': 0.25,
+        'memory': 0.25,
+        'storage': 0.10,
+        'users': 0.10,
+    }
+
+    # container.stats(stream=False) blocks for ~2s, so samples are shared briefly
+    STATS_CACHE_TTL = 30
+    STATS_KEY = "tenant_placement:stats"
+
+    # Per-worker load signals sampled by the background loop; entries older than
+    # LOADS_MAX_AGE are ignored and the worker is scored on its tenant count
+    LOADS_KEY = "tenant_placement:loads"
+    LOADS_MAX_AGE = 300
+
+    # Only one process samples loads and reconciles counters
+    LEADER_KEY = "tenant_placement:leader"
+
+    def __init__(self, metrics_collector, redis_client=None, nginx_service_factory=NginxLoadBalancerService,
+                 stats_fn=get_container_stats, max_workers: int = 8,
+                 reconcile_interval: int = 600, load_refresh_interval: int = 60, startup_delay: int = 60):
+        self.metrics = metrics_collector
+        self.redis_client = redis_client
+        self.nginx_service_factory = nginx_service_factory
+        self.stats_fn = stats_fn
+        self.max_workers = max_workers
+        self.reconcile_interval = reconcile_interval
+        self.load_refresh_interval = load_refresh_interval
+        self.startup_delay = startup_delay
+        self.leader_ttl = load_refresh_interval * 3
+
+        self._stats_cache: Dict[str, tuple] = {}
+        self._stats_lock = threading.Lock()
+        self._loads_cache: Dict[int, dict] = {}
+        self._owner = uuid.uuid4().hex
+        self._thread = None
+        self._app = None
+
+    # ================= POLICY =================
+
+    def get_policy(self) -> str:
+        """Configured placement policy (must run inside an application context)"""
+        setting = SystemSetting.query.filter_by(key=self.POLICY_SETTING).first()
+        policy = setting.get_typed_value() if setting else None
+        return policy if policy in self.POLICIES else self.DEFAULT_POLICY
+
+    # ================= TENANT -> WORKER MAPPING =================
+
+    @staticmethod
+    def _tenants():
+        return Tenant.query.filter(Tenant.status != 'deleted').all()
+
+    def current_assignments(self, nginx=None, tenants=None) -> Dict[str, Optional[str]]:
+        """Subdomain -> upstream address nginx currently routes each tenant to"""
+        nginx = nginx or self.nginx_service_factory()
+        tenants = self._tenants() if tenants is None else tenants
+        result = nginx.get_tenant_assignments([tenant.subdomain for tenant in tenants])
+        if not result.get('success'):
+            logger.warning(f"Could not resolve tenant assignments: {result.get('error')}")
+            return {}
+        return result['report']['assignments']
+
+    @staticmethod
+    def _worker_hosts(worker: WorkerInstance) -> set:
+        hosts = {worker.name, worker.container_name}
+        if worker.server_id:
+            server = InfrastructureServer.query.get(worker.server_id)
+            if server:
+                hosts.add(server.ip_address)
+        return {host for host in hosts if host}
+
+    @staticmethod
+    def match_worker_addresses(workers: List[WorkerInstance], addresses: List[str]) -> Dict[int, str]:
+        """Worker id -> upstream address, matched on host name/IP and port"""
+        matched = {}
+        for worker in workers:
+            hosts = TenantPlacementService._worker_hosts(worker)
+            for address in addresses:
+                host, _, port = address.rpartition(':')
+                if host in hosts and port == str(worker.port):
+                    matched[worker.id] = address
+                    break
+        return matched
+
+    # ================= LOAD SIGNALS =================
+
+    def _container_stats(self, container_names: List[str]) -> Dict[str, Optional[dict]]:
+        """Live CPU/memory per container, sampled concurrently and cached briefly"""
+        now = time.time()
+        results, stale = {}, []
+        with self._stats_lock:
+            for name in container_names:
+                cached = self._stats_cache.get(name)
+                if cached and now - cached[0] < self.STATS_CACHE_TTL:
+                    results[name] = cached[1]
+                else:
+                    stale.append(name)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(stale))) as executor:
+                sampled = dict(zip(stale, executor.map(self._sample_container, stale)))
+            with self._stats_lock:
+                for name, stats in sampled.items():
+                    self._stats_cache[name] = (now, stats)
+            results.update(sampled)
+        return results
+
+    def _sample_container(self, container_name: str) -> Optional[dict]:
+        try:
+            stats = self.stats_fn(container_name)
+        except Exception as e:
+            logger.warning(f"Failed to sample container {container_name}: {e}")
+            return None
+        if not stats:
+            return None
+        return {'cpu_percent': stats.get('cpu_percent'), 'memory_percent': stats.get('memory_percent')}
+
+    def _tenant_footprint(self, tenant: Tenant) -> Dict[str, int]:
+        """Storage bytes and active users of a tenant from cached metrics, never blocking"""
+        footprint = {'storage_bytes': tenant.total_storage_used or 0, 'active_users': 0}
+        if not self.metrics or tenant.status != 'active':
+            return footprint
+        try:
+            target = TenantProbeTarget(
+                db_name=tenant.database_name,
+                admin_username=tenant.admin_username,
+                admin_password=tenant.get_admin_password()
+            )
+            # Missing values are collected in the background for the next placement
+            snapshot = self.metrics.get_snapshot(target, ['storage_bytes', 'active_users'], wait_timeout=0)
+            if snapshot.get('storage_bytes') is not None:
+                footprint['storage_bytes'] = int(snapshot['storage_bytes'])
+            if snapshot.get('active_users') is not None:
+                footprint['active_users'] = int(snapshot['active_users'])
+        except Exception as e:
+            logger.debug(f"No metrics for tenant {tenant.subdomain}: {e}")
+        return footprint
+
+    # ================= LOAD CACHE =================
+
+    def refresh_loads(self) -> List[WorkerLoad]:
+        """Sample every worker's load signals into the load cache (application context required)"""
+        loads = self.worker_loads(sample=True)
+        now = time.time()
+        entries = {
+            load.worker_id: {
+                'cpu_percent': load.cpu_percent,
+                'memory_percent': load.memory_percent,
+                'storage_bytes': load.storage_bytes,
+                'active_users': load.active_users,
+                'sampled_at': now,
+            }
+            for load in loads
+        }
+        self._loads_cache = entries
+        if self.redis_client and entries:
+            try:
+                pipe = self.redis_client.pipeline()
+                pipe.delete(self.LOADS_KEY)
+                pipe.hset(self.LOADS_KEY, mapping={str(key): json.dumps(value) for key, value in entries.items()})
+                pipe.expire(self.LOADS_KEY, self.LOADS_MAX_AGE)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to store worker loads: {e}")
+        return loads
+
+    def cached_loads(self) -> Dict[int, dict]:
+        """Worker id -> last sampled load signals that are still fresh"""
+        entries = self._loads_cache
+        if self.redis_client:
+            try:
+                raw = self.redis_client.hgetall(self.LOADS_KEY)
+                entries = {int(key): json.loads(value) for key, value in raw.items()}
+            except Exception as e:
+                logger.debug(f"Failed to read cached worker loads: {e}")
+        cutoff = time.time() - self.LOADS_MAX_AGE
+        return {key: value for key, value in entries.items() if value.get('sampled_at', 0) >= cutoff}
+
+    # ================= SCORING =================
+
+    def worker_loads(self, nginx=None, tenants=None, assignments=None, sample: bool = False) -> List[WorkerLoad]:
+        """
+        Score every running worker (must run inside an application context).
+
+        Tenant counts are always live. CPU, memory, storage and active users come
+        from the load cache unless ``sample`` is set, which measures them now.
+        """
+        nginx = nginx or self.nginx_service_factory()
+        tenants = self._tenants() if tenants is None else tenants
+        assignments = self.current_assignments(nginx, tenants) if assignments is None else assignments
+
+        workers = WorkerInstance.query.filter_by(status='running').all()
+        addresses = self.match_worker_addresses(workers, nginx.tenant_server_addresses())
+        if sample:
+            stats = self._container_stats([worker.container_name for worker in workers])
+            cached = {}
+        else:
+            stats = {}
+            cached = self.cached_loads()
+
+        loads = {}
+        by_address = {}
+        for worker in workers:
+            sample_stats = stats.get(worker.container_name) or cached.get(worker.id) or {}
+            load = WorkerLoad(
+                worker_id=worker.id,
+                name=worker.name,
+                status=worker.status,
+                address=addresses.get(worker.id),
+                max_tenants=worker.max_tenants or 0,
+                cpu_percent=sample_stats.get('cpu_percent'),
+                memory_percent=sample_stats.get('memory_percent'),
+                storage_bytes=int(sample_stats.get('storage_bytes') or 0),
+                active_users=int(sample_stats.get('active_users') or 0),
+            )
+            loads[worker.id] = load
+            if load.address:
+                by_address[load.address] = load
+
+        for tenant in tenants:
+            load = by_address.get(assignments.get(tenant.subdomain))
+            if not load:
+                continue
+            load.tenants.append(tenant.subdomain)
+            if sample:
+                footprint = self._tenant_footprint(tenant)
+                load.storage_bytes += footprint['storage_bytes']
+                load.active_users += footprint['active_users']
+
+        for load in loads.values():
+            load.tenant_count = len(load.tenants)
+
+        self._score(list(loads.values()))
+        return list(loads.values())
+
+    def _score(self, loads: List[WorkerLoad]) -> None:
+        total_storage = sum(load.storage_bytes for load in loads)
+        total_users = sum(load.active_users for load in loads)
+
+        for load in loads:
+            signals = {}
+            if load.max_tenants:
+                signals['tenants'] = min(load.tenant_count / load.max_tenants, 1.0)
+            if load.cpu_percent is not None:
+                signals['cpu'] = min(load.cpu_percent / 100.0, 1.0)
+            if load.memory_percent is not None:
+                signals['memory'] = min(load.memory_percent / 100.0, 1.0)
+            if total_storage:
+                signals['storage'] = load.storage_bytes / total_storage
+            if total_users:
+                signals['users'] = load.active_users / total_users
+
+            weight = sum(self.SCORE_WEIGHTS[name] for name in signals)
+            load.score = sum(self.SCORE_WEIGHTS[name] * value for name, value in signals.items()) / weight if weight else 0.0
+
+            if load.max_tenants and load.tenant_count >= load.max_tenants:
+                load.reasons.append('at tenant capacity')
+            if load.cpu_percent is not None and load.cpu_percent >= self.MAX_CPU_PERCENT:
+                load.reasons.append(f'cpu {load.cpu_percent}% >= {self.MAX_CPU_PERCENT}%')
+            if load.memory_percent is not None and load.memory_percent >= self.MAX_MEMORY_PERCENT:
+                load.reasons.append(f'memory {load.memory_percent}% >= {self.MAX_MEMORY_PERCENT}%')
+            load.eligible = not load.reasons
+
+    def choose(self, loads: List[WorkerLoad], policy: str) -> Optional[WorkerLoad]:
+        """Pick a worker: least loaded for spread, most loaded with headroom for binpack"""
+        candidates = [load for load in loads if load.eligible]
+        if not candidates:
+            return None
+        # Prefer workers nginx can actually route to
+        routable = [load for load in candidates if load.address] or candidates
+        if policy == 'binpack':
+            return max(routable, key=lambda load: (load.score, -load.worker_id))
+        return min(routable, key=lambda load: (load.score, load.worker_id))
+
+    # ================= PLACEMENT =================
+
+    def place(self, subdomain: str, policy: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Choose a worker for a tenant and pin it in nginx unless the hash already agrees.
+
+        Scores come from the load cache (see refresh_loads), so this never waits
+        on container stats or tenant probes. Must run inside an application context.
+
+        Args:
+            subdomain: Tenant subdomain (the nginx routing key)
+            policy: 'spread' or 'binpack' (default: the placement_policy setting)
+            dry_run: Only report the decision, do not touch nginx
+
+        Returns:
+            dict: Chosen worker, hash-ring address, whether a pin is needed and all candidates
+        """
+        policy = policy if policy in self.POLICIES else self.get_policy()
+        nginx = self.nginx_service_factory()
+        tenants = self._tenants()
+        assignments = self.current_assignments(nginx, tenants)
+        loads = self.worker_loads(nginx, tenants, assignments)
+        chosen = self.choose(loads, policy)
+
+        decision = {
+            'subdomain': subdomain,
+            'policy': policy,
+            'dry_run': dry_run,
+            'worker': chosen.to_dict() if chosen else None,
+            'hash_address': None,
+            'pin': False,
+            'candidates': [load.to_dict() for load in sorted(loads, key=lambda load: load.score)],
+        }
+        if not chosen:
+            return decision
+
+        decision['hash_address'] = nginx.resolve_tenant_worker(subdomain, pins={})
+        decision['pin'] = bool(chosen.address) and chosen.address != decision['hash_address']
+
+        if not dry_run and chosen.address:
+            try:
+                nginx.set_tenant_pin(subdomain, chosen.address if decision['pin'] else None)
+            except Exception as e:
+                # Routing falls back to the hash; the reconcile loop fixes the counters
+                logger.error(f"Failed to pin tenant {subdomain} to {chosen.address}: {e}")
+            self._record('pinned' if decision['pin'] else 'hashed')
+
+        logger.info(f"Placement ({policy}) for {subdomain}: {chosen.name} "
+                    f"(score {chosen.score:.3f}{', pinned' if decision['pin'] else ''})")
+        return decision
+
+    def reconcile(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Reset worker ``current_tenants`` from the nginx tenant -> worker mapping,
+        route the bus of every tenant and drop pins of tenants that no longer exist.
+
+        Must run inside an application context.
+        """
+        nginx = self.nginx_service_factory()
+        tenants = self._tenants()
+        if not nginx.tenant_server_addresses():
+            return {'success': False, 'error': 'Tenant upstream has no servers; nothing to reconcile against'}
+
+        assignments = self.current_assignments(nginx, tenants)
+        workers = WorkerInstance.query.all()
+        addresses = self.match_worker_addresses(workers, nginx.tenant_server_addresses())
+        counts = {}
+        for address in assignments.values():
+            counts[address] = counts.get(address, 0) + 1
+
+        changes, unrouted = [], []
+        for worker in workers:
+            address = addresses.get(worker.id)
+            if not address:
+                unrouted.append(worker.name)
+                continue
+            actual = counts.get(address, 0)
+            if worker.current_tenants != actual:
+                changes.append({'worker': worker.name, 'from': worker.current_tenants, 'to': actual})
+                if not dry_run:
+                    worker.current_tenants = actual
+
+        known = {tenant.subdomain for tenant in tenants if tenant.subdomain}
+        pins = nginx.read_tenant_pins()
+        stale_pins = sorted(key for key in pins if key not in known)
+
+        if not dry_run:
+            db.session.commit()
+            nginx.sync_tenant_routes(sorted(known))
+            self._record('reconciled')
+
+        if changes:
+            logger.info(f"Reconciled worker tenant counters: {changes}")
+        return {
+            'success': True,
+            'dry_run': dry_run,
+            'changes': changes,
+            'unrouted_workers': unrouted,
+            'stale_pins': stale_pins,
+        }
+
+    # ================= BACKGROUND RECONCILE =================
+
+    def _hold_leadership(self) -> bool:
+        if not self.redis_client:
+            return True
+        try:
+            if self.redis_client.set(self.LEADER_KEY, self._owner, nx=True, ex=self.leader_ttl):
+                logger.info("Became tenant placement leader")
+                return True
+            holder = self.redis_client.get(self.LEADER_KEY)
+            holder = holder.decode() if isinstance(holder, bytes) else holder
+            if holder == self._owner:
+                self.redis_client.expire(self.LEADER_KEY, self.leader_ttl)
+                return True
+        except Exception as e:
+            logger.warning(f"Tenant placement leader election failed: {e}")
+        return False
+
+    def start(self, app) -> None:
+        """Start load sampling and counter reconciliation (only the elected leader runs them)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, name='tenant-placement-reconcile', daemon=True)
+        self._thread.start()
+        logger.info("Tenant placement background loop started")
+
+    def _run(self) -> None:
+        time.sleep(self.startup_delay)
+        last_reconcile = None
+        while True:
+            try:
+                if self._hold_leadership():
+                    with self._app.app_context():
+                        self.refresh_loads()
+                        if last_reconcile is None or time.monotonic() - last_reconcile >= self.reconcile_interval:
+                            last_reconcile = time.monotonic()
+                            self.reconcile()
+                else:
+                    last_reconcile = None
+            except Exception as e:
+                logger.error(f"Tenant placement background run failed: {e}")
+            time.sleep(self.load_refresh_interval)
+
+    # ================= METRICS =================
+
+    def _record(self, counter: str) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.hincrby(self.STATS_KEY, counter, 1)
+        except Exception as e:
+            logger.debug(f"Failed to record placement stat {counter}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Placement counters (pinned / hashed placements, reconcile runs)"""
+        if not self.redis_client:
+            return {}
+        try:
+            raw = self.redis_client.hgetall(self.STATS_KEY)
+        except Exception as e:
+            logger.debug(f"Failed to read placement stats: {e}")
+            return {}
+        return {
+            (key.decode() if isinstance(key, bytes) else key): int(value)
+            for key, value in raw.items()
+        }
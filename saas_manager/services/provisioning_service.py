@@ -0,0 +1,381 @@
+"""
+Template Provisioning Service
+
+Maintains pre-built "golden" template databases, one per subscription plan module
+set, and provisions tenants by cloning them. A clone only pays for the
+CREATE DATABASE ... TEMPLATE copy and filestore copy; the per-tenant deltas
+(admin credentials, company logo, saas.config) are applied afterwards over XML-RPC.
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+import xmlrpc.client
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modules every tenant gets regardless of plan
+DEFAULT_TENANT_MODULES = [
+    'base', 'web', 'auth_signup', 'global_head_injector',
+    'saas_user_limit', 'muk_web_theme', 'sso_auth'
+]
+
+
+class PartialProvisionError(RuntimeError):
+    """The tenant database was created but configuring it failed"""
+
+
+@dataclass
+class TenantDeltas:
+    """Per-tenant settings applied on top of a cloned template"""
+    admin_login: str
+    admin_password: str
+    max_users: Optional[int] = None
+    saas_manager_url: str = 'http://saas_manager:8000'
+    logo_path: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class TemplateProvisioningService:
+    """Builds module-set templates and provisions tenant databases from them"""
+
+    TEMPLATE_PREFIX = "saas_tpl_"
+    TEMPLATE_ADMIN_LOGIN = "admin"
+    BUILD_LOCK_PREFIX = "provisioning:template_lock"
+    BUILD_LOCK_TTL = 1800
+    READY_MARKER = "saas-template:ready"
+
+    def __init__(self, odoo_manager, redis_client=None, odoo_url: Optional[str] = None,
+                 secret_key: Optional[str] = None):
+        self.odoo = odoo_manager
+        self.redis_client = redis_client
+        self.odoo_url = (odoo_url or odoo_manager.odoo_url).rstrip('/')
+        self.secret_key = secret_key or os.environ.get('SECRET_KEY', 'dev-secret-key')
+
+    # ================= TEMPLATE NAMING =================
+
+    @staticmethod
+    def normalize_modules(modules: Optional[Iterable[str]]) -> List[str]:
+        """Merge plan modules with the default tenant modules, sorted for hashing"""
+        return sorted(set(modules or []) | set(DEFAULT_TENANT_MODULES))
+
+    def template_name(self, modules: Optional[Iterable[str]]) -> str:
+        """Deterministic template database name for a module set"""
+        digest = hashlib.sha1(','.join(self.normalize_modules(modules)).encode()).hexdigest()[:12]
+        return f"{self.TEMPLATE_PREFIX}{digest}"
+
+    def _template_password(self, template_name: str) -> str:
+        """Admin password of a template, derived so it never has to be stored"""
+        return hmac.new(self.secret_key.encode(), template_name.encode(), hashlib.sha256).hexdigest()[:32]
+
+    # ================= XML-RPC HELPERS =================
+
+    def _authenticate(self, db_name: str, login: str, password: str):
+        common = xmlrpc.client.ServerProxy(f"{self.odoo_url}/xmlrpc/2/common")
+        uid = common.authenticate(db_name, login, password, {})
+        if not uid:
+            raise RuntimeError(f"Authentication failed for database {db_name}")
+        models = xmlrpc.client.ServerProxy(f"{self.odoo_url}/xmlrpc/2/object")
+        return common, models, uid
+
+    # ================= TEMPLATE LIFECYCLE =================
+
+    def _pg_connect(self):
+        import psycopg2
+        conn = psycopg2.connect(
+            dbname='postgres',
+            user=self.odoo.pg_user,
+            password=self.odoo.pg_password,
+            host=self.odoo.pg_host,
+            port=self.odoo.pg_port
+        )
+        conn.autocommit = True
+        return conn
+
+    def template_ready(self, template_name: str) -> bool:
+        """A template is only cloneable once its build finished and marked it ready"""
+        conn = self._pg_connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = %s",
+                (template_name,)
+            )
+            row = cur.fetchone()
+            return bool(row) and row[0] == self.READY_MARKER
+        finally:
+            conn.close()
+
+    def _mark_ready(self, template_name: str) -> None:
+        conn = self._pg_connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(f'COMMENT ON DATABASE "{template_name}" IS %s', (self.READY_MARKER,))
+        finally:
+            conn.close()
+
+    def template_exists(self, modules: Optional[Iterable[str]]) -> bool:
+        return self.template_ready(self.template_name(modules))
+
+    def ensure_template(self, modules: Optional[Iterable[str]], wait_timeout: int = 1800) -> str:
+        """
+        Return the template for a module set, building it if it is not ready.
+
+        Concurrent callers wait for the process holding the build lock instead of
+        building the same template twice.
+        """
+        name = self.template_name(modules)
+        if self.template_ready(name):
+            return name
+
+        if self._acquire_build_lock(name):
+            try:
+                # Another process may have finished while we were acquiring the lock
+                if not self.template_ready(name):
+                    if self.odoo.exists(name):
+                        logger.warning(f"Dropping unfinished template {name}")
+                        self.odoo.delete(name)
+                    self.build_template(modules)
+            finally:
+                self._release_build_lock(name)
+            return name
+
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(5)
+            if self.template_ready(name):
+                return name
+            if not self._build_in_progress(name):
+                raise RuntimeError(f"Template {name} build finished without producing a usable template")
+        raise RuntimeError(f"Timed out waiting for template {name} to be built")
+
+    def build_template(self, modules: Optional[Iterable[str]]) -> str:
+        """
+        Create a template database with all modules installed in a single batch.
+
+        Installing every module through one button_immediate_install call means a
+        single registry reload instead of one per module.
+        """
+        module_list = self.normalize_modules(modules)
+        name = self.template_name(module_list)
+        password = self._template_password(name)
+        started = time.monotonic()
+
+        logger.info(f"Building template {name} with modules: {', '.join(module_list)}")
+        self.odoo.create(name, self.TEMPLATE_ADMIN_LOGIN, password, demo=True)
+        if not self.odoo.exists(name):
+            raise RuntimeError(f"Template database {name} was not created")
+
+        try:
+            common, models, uid = self._authenticate(name, self.TEMPLATE_ADMIN_LOGIN, password)
+
+            module_ids = models.execute_kw(
+                name, uid, password,
+                'ir.module.module', 'search',
+                [[['name', 'in', module_list], ['state', '!=', 'installed']]]
+            )
+            if module_ids:
+                models.execute_kw(
+                    name, uid, password,
+                    'ir.module.module', 'button_immediate_install',
+                    [module_ids]
+                )
+
+            self._disable_signup(name, uid, password, common, models)
+        except Exception:
+            logger.error(f"Template build failed for {name}, dropping partial template")
+            try:
+                self.odoo.delete(name)
+            except Exception as drop_error:
+                logger.warning(f"Failed to drop partial template {name}: {drop_error}")
+            raise
+
+        self._mark_ready(name)
+        logger.info(f"Template {name} built in {time.monotonic() - started:.1f}s")
+        return name
+
+    def rebuild_template(self, modules: Optional[Iterable[str]]) -> str:
+        """Drop and rebuild a template, e.g. after shared addons were upgraded"""
+        name = self.template_name(modules)
+        if not self._acquire_build_lock(name):
+            raise RuntimeError(f"Template {name} is already being built")
+        try:
+            if self.odoo.exists(name):
+                self.odoo.delete(name)
+            return self.build_template(modules)
+        finally:
+            self._release_build_lock(name)
+
+    def warm_templates(self, module_sets: Iterable[Optional[Iterable[str]]]) -> Dict[str, bool]:
+        """Make sure a template exists for each module set, returning build status per template"""
+        results = {}
+        for modules in module_sets:
+            name = self.template_name(modules)
+            try:
+                self.ensure_template(modules)
+                results[name] = True
+            except Exception as e:
+                logger.error(f"Failed to warm template {name}: {e}")
+                results[name] = False
+        return results
+
+    def list_templates(self) -> List[str]:
+        """Template database names currently present on the server"""
+        conn = self._pg_connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT datname FROM pg_database WHERE datname LIKE %s ORDER BY datname",
+                (f"{self.TEMPLATE_PREFIX}%",)
+            )
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    # ================= PROVISIONING =================
+
+    def provision(self, db_name: str, modules: Optional[Iterable[str]], deltas: TenantDeltas) -> Dict[str, Any]:
+        """
+        Create a tenant database by cloning the template for its module set.
+
+        Args:
+            db_name: Name of the tenant database to create
+            modules: Plan modules (default tenant modules are always added)
+            deltas: Per-tenant settings applied after cloning
+
+        Returns:
+            dict: Timing breakdown and the template used
+        """
+        timings = {}
+        started = time.monotonic()
+
+        template = self.ensure_template(modules)
+        timings['template_seconds'] = round(time.monotonic() - started, 2)
+
+        clone_started = time.monotonic()
+        self.odoo.duplicate(template, db_name)
+        if not self.odoo.exists(db_name):
+            raise RuntimeError(f"Clone of {template} into {db_name} did not produce a database")
+        timings['clone_seconds'] = round(time.monotonic() - clone_started, 2)
+
+        delta_started = time.monotonic()
+        try:
+            self.apply_deltas(db_name, template, deltas)
+        except Exception as e:
+            raise PartialProvisionError(f"Cloned {db_name} but applying tenant settings failed: {e}") from e
+        timings['delta_seconds'] = round(time.monotonic() - delta_started, 2)
+        timings['total_seconds'] = round(time.monotonic() - started, 2)
+
+        logger.info(f"Provisioned {db_name} from {template}: {timings}")
+        return {'template': template, 'timings': timings}
+
+    def apply_deltas(self, db_name: str, template: str, deltas: TenantDeltas) -> None:
+        """Reset the cloned admin account and write tenant-specific configuration"""
+        template_password = self._template_password(template)
+        _, models, uid = self._authenticate(db_name, self.TEMPLATE_ADMIN_LOGIN, template_password)
+
+        models.execute_kw(
+            db_name, uid, template_password,
+            'res.users', 'write',
+            [[uid], {'login': deltas.admin_login, 'password': deltas.admin_password}]
+        )
+
+        # Everything below runs as the tenant admin with the new credentials
+        _, models, uid = self._authenticate(db_name, deltas.admin_login, deltas.admin_password)
+        password = deltas.admin_password
+
+        if deltas.logo_path:
+            try:
+                with open(deltas.logo_path, 'rb') as logo_file:
+                    logo_base64 = base64.b64encode(logo_file.read()).decode('utf-8')
+                models.execute_kw(
+                    db_name, uid, password,
+                    'res.company', 'write',
+                    [[1], {'logo': logo_base64}]
+                )
+            except FileNotFoundError:
+                logger.error(f"Logo file not found at {deltas.logo_path}")
+
+        self._write_saas_config(db_name, uid, password, models, deltas)
+
+    def _write_saas_config(self, db_name, uid, password, models, deltas: TenantDeltas) -> None:
+        """Point the cloned saas.config record at the tenant database"""
+        model_exists = models.execute_kw(
+            db_name, uid, password,
+            'ir.model', 'search',
+            [[['model', '=', 'saas.config']]]
+        )
+        if not model_exists:
+            logger.warning(f"saas.config model not found in {db_name}, user limits may not be enforced")
+            return
+
+        values = {'database_name': db_name, 'saas_manager_url': deltas.saas_manager_url}
+        if deltas.max_users is not None:
+            values['max_users'] = deltas.max_users
+
+        # The template may carry a config record created under its own name
+        config_ids = models.execute_kw(db_name, uid, password, 'saas.config', 'search', [[]])
+        if config_ids:
+            models.execute_kw(db_name, uid, password, 'saas.config', 'write', [config_ids, values])
+        else:
+            models.execute_kw(db_name, uid, password, 'saas.config', 'create', [values])
+
+    def _disable_signup(self, db_name, uid, password, common, models) -> None:
+        """Disable public account creation, mirroring the legacy provisioning path"""
+        try:
+            signup_field = 'auth_signup_uninvited'
+            odoo_version = common.version().get('server_version', '')
+            if odoo_version.startswith('15') or odoo_version.startswith('16'):
+                signup_field = 'auth_signup.allow_uninvited'
+
+            field_ids = models.execute_kw(
+                db_name, uid, password,
+                'ir.model.fields', 'search',
+                [[['model', '=', 'res.config.settings'], ['name', '=', signup_field]]]
+            )
+            if not field_ids:
+                return
+
+            settings_id = models.execute_kw(
+                db_name, uid, password,
+                'res.config.settings', 'create',
+                [{signup_field: 'b2b' if signup_field == 'auth_signup_uninvited' else False}]
+            )
+            models.execute_kw(db_name, uid, password, 'res.config.settings', 'execute', [[settings_id]])
+        except xmlrpc.client.Fault as e:
+            logger.warning(f"Failed to disable signup for template {db_name}: {e}")
+
+    # ================= BUILD LOCK =================
+
+    def _lock_key(self, template_name: str) -> str:
+        return f"{self.BUILD_LOCK_PREFIX}:{template_name}"
+
+    def _acquire_build_lock(self, template_name: str) -> bool:
+        if not self.redis_client:
+            return True
+        try:
+            return bool(self.redis_client.set(self._lock_key(template_name), '1', nx=True, ex=self.BUILD_LOCK_TTL))
+        except Exception as e:
+            logger.warning(f"Template build lock unavailable for {template_name}: {e}")
+            return True
+
+    def _release_build_lock(self, template_name: str) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.delete(self._lock_key(template_name))
+        except Exception:
+            pass
+
+    def _build_in_progress(self, template_name: str) -> bool:
+        if not self.redis_client:
+            return False
+        try:
+            return bool(self.redis_client.exists(self._lock_key(template_name)))
+        except Exception:
+            return False
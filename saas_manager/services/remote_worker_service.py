@@ -16,6 +16,7 @@ from dataclasses import dataclass
 
 from models import db, InfrastructureServer, WorkerInstance, AuditLog
 from services.nginx_service import NginxLoadBalancerService
+from services.worker_service import size_odoo_processes
 from shared_utils import log_action
 from utils import track_errors, error_tracker
 
@@ -40,6 +41,11 @@ class RemoteWorkerConfig:
     data_dir: Optional[str] = '/var/lib/odoo'
     log_level: Optional[str] = 'info'
     environment_vars: Optional[Dict[str, str]] = None
+    gevent_port: Optional[int] = None  # websocket/longpolling port, defaults to port + 3
+    
+    def __post_init__(self):
+        if not self.gevent_port:
+            self.gevent_port = self.port + 3
 
 
 class RemoteWorkerService:
@@ -227,6 +233,7 @@ class RemoteWorkerService:
                 'details': {
                     'server_ip': server.ip_address,
                     'worker_port': config.port,
+                    'gevent_port': config.gevent_port,
                     'container_name': config.name,
                     'health_status': health_check.get('message', 'Unknown')
                 }
@@ -252,6 +259,7 @@ class RemoteWorkerService:
     def _generate_odoo_config(self, config: RemoteWorkerConfig, 
                              server: InfrastructureServer) -> str:
         """Generate Odoo configuration file content"""
+        sizing = size_odoo_processes(config.cpu_cores or 2, (config.memory_gb or 2) * 1024)
         odoo_config = f"""[options]
 ; Database settings
 db_host = {config.postgres_host or 'localhost'}
@@ -261,8 +269,10 @@ db_password = {config.postgres_password or 'odoo'}
 
 ; Server settings
 http_port = {config.port}
-workers = {min(config.cpu_cores or 2, 4)}
-max_cron_threads = 1
+; Websocket/longpolling is served by the gevent process on its own port
+gevent_port = {config.gevent_port}
+workers = {sizing.workers}
+max_cron_threads = {sizing.max_cron_threads}
 
 ; Data directory
 data_dir = {config.data_dir}
@@ -285,9 +295,9 @@ session_redis_db = 1
 proxy_mode = True
 admin_passwd = $pbkdf2-sha512$600000$worker{config.name}admin
 
-; Limits
-limit_memory_hard = {(config.memory_gb or 2) * 1024 * 1024 * 1024}
-limit_memory_soft = {int((config.memory_gb or 2) * 0.8) * 1024 * 1024 * 1024}
+; Limits (per process, sized to the container)
+limit_memory_hard = {sizing.limit_memory_hard}
+limit_memory_soft = {sizing.limit_memory_soft}
 limit_time_cpu = 600
 limit_time_real = 1200
 """
@@ -332,6 +342,7 @@ limit_time_real = 1200
     --name {config.name} \\
     --restart unless-stopped \\
     -p {config.port}:{config.port} \\
+    -p {config.gevent_port}:{config.gevent_port} \\
     {env_string} \\
     -v /opt/odoo-workers/{config.name}/config/odoo.conf:/etc/odoo/odoo.conf:ro \\
     -v /opt/odoo-workers/{config.name}/data:/var/lib/odoo \\
@@ -424,7 +435,8 @@ limit_time_real = 1200
             nginx_result = self.nginx_service.add_worker(
                 worker_ip=server.ip_address,
                 worker_port=config.port,
-                worker_name=config.name
+                worker_name=config.name,
+                gevent_port=config.gevent_port
             )
             
             if nginx_result['success']:
@@ -0,0 +1,380 @@
+"""
+Tenant Backup Service
+
+Runs tenant database backups and restores as background jobs so multi-GB
+archives never tie up a request thread. Archives are streamed end to end in
+large chunks (see OdooDatabaseManager.backup_stream / restore), progress is
+pushed to the requesting user over Socket.IO, and job state lives in Redis.
+
+Each job records the last stage it reached. Every stage is safe to repeat, so
+a job whose process died (deploy, worker recycle, crash) is picked up again by
+the next process that starts and continues from that stage instead of leaving
+the tenant without a database.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueUnavailable(RuntimeError):
+    """Raised when a job cannot be queued because Redis is unreachable"""
+
+
+class TenantBackupService:
+    """Background, resumable tenant backup/restore jobs"""
+
+    JOB_KEY_PREFIX = "tenant_job"
+    ACTIVE_JOBS_KEY = "tenant_job:active"
+    LOCK_KEY_PREFIX = "tenant_job:lock"
+    JOB_TTL = 7 * 24 * 3600
+    # A running job keeps its lock alive with a heartbeat; once the lock
+    # expires the owning process is presumed dead and the job can be resumed
+    LOCK_TTL = 120
+
+    PROGRESS_EVENT = "tenant_job_progress"
+    PROGRESS_INTERVAL = 1.0
+
+    # Claims the lock for execution only while this process still owns it, so a
+    # job taken over by recovery in the meantime is never run twice
+    _START_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('expire', KEYS[1], ARGV[2])
+redis.call('hset', KEYS[2], 'status', 'running', 'owner', ARGV[1], 'updated_at', ARGV[3])
+return 1
+"""
+    # Extends the lock only for its current owner
+    _REFRESH_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('expire', KEYS[1], ARGV[2])
+"""
+
+    # Stages in execution order; a resumed job restarts at its recorded stage
+    RESTORE_STAGES = ('uploaded', 'deactivating', 'dropping', 'restoring', 'finalizing')
+    BACKUP_STAGES = ('queued', 'downloading')
+
+    def __init__(self, odoo, redis_client, ws_manager=None, staging_folder: Optional[str] = None,
+                 max_workers: int = 2, recovery_interval: int = 60, on_restored=None):
+        self.odoo = odoo
+        self.on_restored = on_restored
+        self.redis_client = redis_client
+        self.ws_manager = ws_manager
+        self.staging_folder = staging_folder or os.path.join(odoo.backup_folder, 'jobs')
+        self.recovery_interval = recovery_interval
+        os.makedirs(self.staging_folder, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tenant-job')
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._thread = None
+        self._app = None
+        self._heartbeats: Dict[str, threading.Event] = {}
+        self._heartbeats_lock = threading.Lock()
+
+    # ================= JOB STATE =================
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.JOB_KEY_PREFIX}:{job_id}"
+
+    def _lock_key(self, job_id: str) -> str:
+        return f"{self.LOCK_KEY_PREFIX}:{job_id}"
+
+    def staging_path(self, job_id: str) -> str:
+        return os.path.join(self.staging_folder, f"{job_id}.zip")
+
+    def new_job_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis_client.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        job = {k.decode() if isinstance(k, bytes) else k: v.decode() if isinstance(v, bytes) else v
+               for k, v in raw.items()}
+        job['id'] = job_id
+        for field in ('tenant_id', 'user_id', 'bytes_done', 'bytes_total'):
+            if job.get(field) not in (None, ''):
+                job[field] = int(job[field])
+        return job
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields['updated_at'] = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={k: '' if v is None else v for k, v in fields.items()})
+        pipe.expire(self._job_key(job_id), self.JOB_TTL)
+        pipe.expire(self._lock_key(job_id), self.LOCK_TTL)
+        pipe.execute()
+
+    def list_jobs(self, tenant_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Jobs that are queued or running, optionally for one tenant"""
+        jobs = []
+        for job_id in self.redis_client.smembers(self.ACTIVE_JOBS_KEY):
+            job = self.get_job(job_id.decode() if isinstance(job_id, bytes) else job_id)
+            if job and (tenant_id is None or job.get('tenant_id') == tenant_id):
+                jobs.append(job)
+        return sorted(jobs, key=lambda j: float(j.get('created_at', 0)))
+
+    # ================= SUBMISSION =================
+
+    def submit_restore(self, job_id: str, tenant_id: int, db_name: str, user_id: Optional[int]) -> Dict[str, Any]:
+        """Queue a restore of db_name from the archive already staged at staging_path(job_id)"""
+        file_path = self.staging_path(job_id)
+        if not os.path.exists(file_path):
+            raise RuntimeError(f"Staged backup not found for job {job_id}")
+        return self._submit(job_id, 'restore', tenant_id, db_name, user_id,
+                            stage=self.RESTORE_STAGES[0], file_path=file_path,
+                            bytes_total=os.path.getsize(file_path))
+
+    def submit_backup(self, tenant_id: int, db_name: str, user_id: Optional[int]) -> Dict[str, Any]:
+        """Queue a backup of db_name into the staging folder for later download"""
+        job_id = self.new_job_id()
+        return self._submit(job_id, 'backup', tenant_id, db_name, user_id,
+                            stage=self.BACKUP_STAGES[0], file_path=self.staging_path(job_id), bytes_total=0)
+
+    def _submit(self, job_id: str, kind: str, tenant_id: int, db_name: str, user_id: Optional[int],
+                **fields) -> Dict[str, Any]:
+        if self.redis_client is None:
+            raise JobQueueUnavailable("Background jobs are unavailable: Redis is not connected")
+        now = time.time()
+        try:
+            self.redis_client.set(self._lock_key(job_id), self._owner, ex=self.LOCK_TTL)
+            self._update(job_id, kind=kind, tenant_id=tenant_id, db_name=db_name, user_id=user_id,
+                         status='queued', bytes_done=0, error=None, created_at=now, **fields)
+            self.redis_client.sadd(self.ACTIVE_JOBS_KEY, job_id)
+            job = self.get_job(job_id)
+        except redis.RedisError as e:
+            raise JobQueueUnavailable(f"Background jobs are unavailable: {e}") from e
+        # The lock must outlive the wait in the executor queue, not just the run
+        self._start_heartbeat(job_id)
+        self._executor.submit(self._execute, job_id)
+        logger.info(f"Queued tenant {kind} job {job_id} for {db_name}")
+        return job
+
+    # ================= EXECUTION =================
+
+    def _execute(self, job_id: str) -> None:
+        job = None
+        try:
+            if self._claim_execution(job_id):
+                job = self.get_job(job_id)
+            else:
+                logger.warning(f"Tenant job {job_id} lost its lock while queued, leaving it to its new owner")
+        except Exception as e:
+            # Recovery resumes the job once the lock expires
+            logger.error(f"Failed to start tenant job {job_id}: {e}")
+        if not job:
+            self._stop_heartbeat(job_id)
+            return
+        self._emit(job_id)
+
+        try:
+            if self._app is not None:
+                with self._app.app_context():
+                    self._run_job(job)
+            else:
+                self._run_job(job)
+        except Exception as e:
+            logger.error(f"Tenant {job['kind']} job {job_id} failed at stage {job.get('stage')}: {e}")
+            self._finish(job_id, 'failed', error=str(e))
+            return
+        finally:
+            self._stop_heartbeat(job_id)
+        self._finish(job_id, 'completed')
+
+    def _claim_execution(self, job_id: str) -> bool:
+        """Atomically mark the job running if this process still holds its lock"""
+        return bool(self.redis_client.eval(
+            self._START_SCRIPT, 2, self._lock_key(job_id), self._job_key(job_id),
+            self._owner, self.LOCK_TTL, time.time()
+        ))
+
+    def _start_heartbeat(self, job_id: str) -> None:
+        # Odoo can spend minutes on a restore without sending progress, and a job
+        # can wait in the executor queue, so the lock is kept alive independently
+        stop = threading.Event()
+        with self._heartbeats_lock:
+            previous = self._heartbeats.pop(job_id, None)
+            self._heartbeats[job_id] = stop
+        if previous:
+            previous.set()
+        threading.Thread(target=self._heartbeat, args=(job_id, stop), daemon=True).start()
+
+    def _stop_heartbeat(self, job_id: str) -> None:
+        with self._heartbeats_lock:
+            stop = self._heartbeats.pop(job_id, None)
+        if stop:
+            stop.set()
+
+    def _heartbeat(self, job_id: str, stop: threading.Event) -> None:
+        while not stop.wait(self.LOCK_TTL / 3):
+            try:
+                if not self.redis_client.eval(self._REFRESH_SCRIPT, 1, self._lock_key(job_id),
+                                              self._owner, self.LOCK_TTL):
+                    logger.warning(f"Lock for tenant job {job_id} is no longer held by this process")
+                    return
+            except Exception as e:
+                logger.debug(f"Failed to refresh lock for job {job_id}: {e}")
+
+    def _run_job(self, job: Dict[str, Any]) -> None:
+        if job['kind'] == 'restore':
+            self._run_restore(job)
+        elif job['kind'] == 'backup':
+            self._run_backup(job)
+        else:
+            raise RuntimeError(f"Unknown job kind: {job['kind']}")
+
+    def _enter(self, job: Dict[str, Any], stage: str, stages: tuple) -> bool:
+        """True if the job still has to run `stage`; records it as the current stage"""
+        if stages.index(stage) < stages.index(job['stage']):
+            return False
+        job['stage'] = stage
+        self._update(job['id'], stage=stage)
+        self._emit(job['id'])
+        return True
+
+    def _run_restore(self, job: Dict[str, Any]) -> None:
+        db_name = job['db_name']
+
+        if self._enter(job, 'deactivating', self.RESTORE_STAGES):
+            if self.odoo.exists(db_name) and self.odoo.is_active(db_name):
+                self.odoo.deactivate(db_name)
+
+        if self._enter(job, 'dropping', self.RESTORE_STAGES):
+            if self.odoo.exists(db_name):
+                self.odoo.delete(db_name)
+
+        if self._enter(job, 'restoring', self.RESTORE_STAGES):
+            # An interrupted restore may have left a partial database behind
+            if self.odoo.exists(db_name):
+                self.odoo.delete(db_name)
+            self.odoo.restore(job['file_path'], db_name, progress_callback=self._progress_callback(job['id']))
+
+        if self._enter(job, 'finalizing', self.RESTORE_STAGES):
+            if self.on_restored:
+                self.on_restored(db_name)
+            self._remove_staged(job['file_path'])
+
+    def _run_backup(self, job: Dict[str, Any]) -> None:
+        # Odoo cannot resume a dump mid-stream, so a resumed backup starts over
+        if self._enter(job, 'downloading', self.BACKUP_STAGES):
+            self.odoo.backup(job['db_name'], backup_path=job['file_path'],
+                             progress_callback=self._progress_callback(job['id']))
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        self._update(job_id, status=status, error=error, finished_at=time.time())
+        self.redis_client.srem(self.ACTIVE_JOBS_KEY, job_id)
+        self.redis_client.delete(self._lock_key(job_id))
+        self._emit(job_id)
+
+    @staticmethod
+    def _remove_staged(file_path: str) -> None:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+    def remove_backup(self, job_id: str) -> None:
+        """Delete a finished backup's archive once it has been downloaded"""
+        self._remove_staged(self.staging_path(job_id))
+
+    # ================= PROGRESS =================
+
+    def _progress_callback(self, job_id: str):
+        last = {'at': 0.0}
+
+        def callback(done: int, total: Optional[int]) -> None:
+            now = time.monotonic()
+            if now - last['at'] < self.PROGRESS_INTERVAL:
+                return
+            last['at'] = now
+            fields = {'bytes_done': done}
+            if total:
+                fields['bytes_total'] = total
+            self._update(job_id, **fields)
+            self._emit(job_id)
+
+        return callback
+
+    def _emit(self, job_id: str) -> None:
+        if not self.ws_manager:
+            return
+        job = self.get_job(job_id)
+        if not job or not job.get('user_id'):
+            return
+        total = job.get('bytes_total') or 0
+        payload = {
+            'job_id': job_id,
+            'kind': job.get('kind'),
+            'tenant_id': job.get('tenant_id'),
+            'status': job.get('status'),
+            'stage': job.get('stage'),
+            'bytes_done': job.get('bytes_done', 0),
+            'bytes_total': total,
+            'percent': round(job.get('bytes_done', 0) * 100 / total, 1) if total else None,
+            'error': job.get('error') or None,
+        }
+        try:
+            self.ws_manager.emit_to_user(job['user_id'], self.PROGRESS_EVENT, payload)
+        except Exception as e:
+            logger.debug(f"Failed to emit progress for job {job_id}: {e}")
+
+    # ================= RECOVERY =================
+
+    def start(self, app) -> None:
+        """Resume jobs orphaned by dead processes, now and periodically"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run_recovery, name='tenant-job-recovery', daemon=True)
+        self._thread.start()
+
+    def _run_recovery(self) -> None:
+        while True:
+            try:
+                self.recover()
+                self.prune_staging()
+            except Exception as e:
+                logger.error(f"Tenant job recovery failed: {e}")
+            time.sleep(self.recovery_interval)
+
+    def prune_staging(self) -> None:
+        """Remove staged archives whose job expired (e.g. backups never downloaded)"""
+        cutoff = time.time() - self.JOB_TTL
+        for name in os.listdir(self.staging_folder):
+            path = os.path.join(self.staging_folder, name)
+            if os.path.getmtime(path) < cutoff and not self.redis_client.exists(self._job_key(name[:-4])):
+                self._remove_staged(path)
+
+    def recover(self) -> int:
+        """Take over active jobs whose lock expired; returns how many were resumed"""
+        resumed = 0
+        for raw_id in self.redis_client.smembers(self.ACTIVE_JOBS_KEY):
+            job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+            if not self.redis_client.set(self._lock_key(job_id), self._owner, nx=True, ex=self.LOCK_TTL):
+                continue
+            job = self.get_job(job_id)
+            if not job:
+                self.redis_client.srem(self.ACTIVE_JOBS_KEY, job_id)
+                self.redis_client.delete(self._lock_key(job_id))
+                continue
+            if (job['kind'] == 'restore' and job.get('stage') != 'finalizing'
+                    and not os.path.exists(job['file_path'])):
+                self._finish(job_id, 'failed', error='Staged backup file is no longer available')
+                continue
+            logger.info(f"Resuming tenant {job['kind']} job {job_id} at stage {job.get('stage')}")
+            self._start_heartbeat(job_id)
+            self._executor.submit(self._execute, job_id)
+            resumed += 1
+        return resumed
@@ -0,0 +1,156 @@
+"""
+Tenant Limits Service
+
+Distributes plan limits (currently ``max_users``) to tenant databases by push
+instead of per-tenant XML-RPC writes and polling.
+
+Every change bumps a global version counter in Redis. Each affected tenant
+database gets an entry ``{max_users, plan, version}`` in the
+``tenant_limits:limits`` hash, and the change is broadcast on the
+``tenant_limits:changes`` pub/sub channel. A plan edit goes out as a few batch
+messages, not one round trip per tenant. The ``saas_user_limit`` addon listens
+on the channel and applies entries newer than the version it stored. Its
+periodic fallback poll of ``/api/tenant/<sub>/user-limit`` sends the ETag built
+from the same version, so an unchanged limit costs a 304.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import SubscriptionPlan, Tenant
+
+logger = logging.getLogger(__name__)
+
+
+class TenantLimitsPublisher:
+    """Versioned tenant limits in Redis, pushed to tenants over pub/sub"""
+
+    LIMITS_KEY = "tenant_limits:limits"
+    VERSION_KEY = "tenant_limits:version"
+    CHANNEL = "tenant_limits:changes"
+    STATS_KEY = "tenant_limits:stats"
+
+    # Tenants per broadcast message (keeps messages well below a few hundred KB)
+    BATCH_SIZE = 1000
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+
+    # ================= LIMITS =================
+
+    @staticmethod
+    def effective_max_users(tenant: Tenant, plan: Optional[SubscriptionPlan] = None) -> int:
+        """The limit a tenant is held to: its plan's, else its own"""
+        return plan.max_users if plan else tenant.max_users
+
+    def limits_for(self, tenants: Iterable[Tenant]) -> Dict[str, Dict[str, Any]]:
+        """database_name -> limits for the given tenants, loading each plan once"""
+        tenants = list(tenants)
+        plan_names = {tenant.plan for tenant in tenants if tenant.plan}
+        plans = {
+            plan.name: plan
+            for plan in SubscriptionPlan.query.filter(SubscriptionPlan.name.in_(plan_names)).all()
+        } if plan_names else {}
+        return {
+            tenant.database_name: {
+                'max_users': self.effective_max_users(tenant, plans.get(tenant.plan)),
+                'plan': tenant.plan,
+            }
+            for tenant in tenants
+        }
+
+    def version_of(self, database_name: str) -> Optional[int]:
+        """Version of the limits last published for a database, if any"""
+        if not self.redis_client:
+            return None
+        try:
+            raw = self.redis_client.hget(self.LIMITS_KEY, database_name)
+            return json.loads(raw).get('version') if raw else None
+        except Exception as e:
+            logger.debug(f"Could not read limits version for {database_name}: {e}")
+            return None
+
+    def etag(self, database_name: str, limits: Dict[str, Any]) -> str:
+        """Entity tag of a tenant's limits: the published version plus the content"""
+        payload = json.dumps(
+            {'version': self.version_of(database_name), **limits}, sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    # ================= PUBLISHING =================
+
+    def publish(self, tenants: Iterable[Tenant]) -> Optional[int]:
+        """
+        Store and broadcast the current limits of ``tenants`` under one new version.
+
+        Returns the version, or None when Redis is unavailable (tenants then
+        pick the change up on their next poll).
+        """
+        limits = self.limits_for(tenants)
+        if not limits:
+            return None
+        if not self.redis_client:
+            logger.warning("Redis unavailable, tenant limits will only propagate by polling")
+            return None
+
+        started = time.time()
+        try:
+            version = int(self.redis_client.incr(self.VERSION_KEY))
+            items = list(limits.items())
+            for start in range(0, len(items), self.BATCH_SIZE):
+                batch = dict(items[start:start + self.BATCH_SIZE])
+                pipe = self.redis_client.pipeline()
+                for database_name, entry in batch.items():
+                    pipe.hset(self.LIMITS_KEY, database_name, json.dumps({**entry, 'version': version}))
+                pipe.publish(self.CHANNEL, json.dumps({'version': version, 'limits': batch}))
+                pipe.execute()
+            self._record(len(limits), time.time() - started)
+            logger.info(f"Published tenant limits v{version} to {len(limits)} tenant(s)")
+            return version
+        except Exception as e:
+            logger.error(f"Failed to publish tenant limits: {e}")
+            return None
+
+    def publish_plan(self, plan_name: str) -> Optional[int]:
+        """Push a plan's limits to every tenant on it"""
+        return self.publish(Tenant.query.filter_by(plan=plan_name).all())
+
+    def forget(self, database_names: List[str]) -> None:
+        """Drop published limits of deleted tenant databases"""
+        if self.redis_client and database_names:
+            try:
+                self.redis_client.hdel(self.LIMITS_KEY, *database_names)
+            except Exception as e:
+                logger.debug(f"Failed to drop tenant limits: {e}")
+
+    # ================= STATS =================
+
+    def _record(self, tenant_count: int, seconds: float) -> None:
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hincrby(self.STATS_KEY, 'publishes', 1)
+            pipe.hincrby(self.STATS_KEY, 'tenants_pushed', tenant_count)
+            pipe.hset(self.STATS_KEY, 'last_publish_seconds', round(seconds, 3))
+            pipe.hset(self.STATS_KEY, 'last_publish_at', int(time.time()))
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record tenant limits stat: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.redis_client:
+            return {}
+        try:
+            raw = self.redis_client.hgetall(self.STATS_KEY)
+            stats = {
+                (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in raw.items()
+            }
+            stats['version'] = int(self.redis_client.get(self.VERSION_KEY) or 0)
+            stats['tenants'] = self.redis_client.hlen(self.LIMITS_KEY)
+            return stats
+        except Exception as e:
+            logger.debug(f"Failed to read tenant limits stats: {e}")
+            return {}
@@ -0,0 +1,283 @@
+"""
+Tenant Metrics Service
+
+Collects the per-tenant figures shown on the manage tenant page (active flag,
+installed apps, storage usage, uptime, user count). Every probe runs on a shared
+thread pool and is cached in Redis with its own TTL, so the page can render from
+the last snapshot while stale metrics are refreshed in the background.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TenantProbeTarget:
+    """Everything a probe needs to talk to a tenant database"""
+    db_name: str
+    admin_username: Optional[str] = None
+    admin_password: Optional[str] = None
+
+
+@dataclass
+class MetricSpec:
+    """Definition of a single cached tenant metric"""
+    name: str
+    ttl: int
+    collect: Callable[[TenantProbeTarget], Any]
+    default: Any = None
+    # Only collected when asked for by name (not part of the manage page snapshot)
+    on_demand: bool = False
+
+
+class TenantMetricsCollector:
+    """Concurrent, Redis-cached collector for tenant metrics"""
+
+    KEY_PREFIX = "tenant_metrics"
+    LOCK_PREFIX = "tenant_metrics_lock"
+
+    # Stale values are kept this many TTLs before Redis expires them
+    STALE_FACTOR = 12
+    REFRESH_LOCK_TTL = 120
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, odoo_manager, redis_client=None, max_workers: int = 8, wait_timeout: float = 3.0):
+        self.odoo = odoo_manager
+        self.redis_client = redis_client
+        self.max_workers = max_workers
+        self.wait_timeout = wait_timeout
+
+        # Per-process guard so the same metric is never refreshed twice concurrently
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+        self.metrics: Dict[str, MetricSpec] = {
+            spec.name: spec for spec in (
+                MetricSpec('is_active', 30, self._collect_is_active, default=None),
+                MetricSpec('modules', 600, self._collect_modules, default=0),
+                MetricSpec('storage_usage', 900, self._collect_storage, default='N/A'),
+                MetricSpec('uptime', 120, self._collect_uptime, default='N/A'),
+                MetricSpec('odoo_user', 300, self._collect_users, default=0),
+                MetricSpec('storage_bytes', 900, self._collect_storage_bytes, default=None, on_demand=True),
+                MetricSpec('active_users', 300, self._collect_active_users, default=None, on_demand=True),
+            )
+        }
+        self.default_metrics = [name for name, spec in self.metrics.items() if not spec.on_demand]
+
+    # ================= PROBES =================
+
+    def _collect_is_active(self, target: TenantProbeTarget) -> bool:
+        return self.odoo.is_active(target.db_name)
+
+    def _collect_modules(self, target: TenantProbeTarget) -> int:
+        return self.odoo.get_installed_applications_count(
+            target.db_name, target.admin_username, target.admin_password
+        )
+
+    def _collect_storage(self, target: TenantProbeTarget) -> str:
+        return self.odoo.get_database_storage_usage(target.db_name)['total_size_human']
+
+    def _collect_storage_bytes(self, target: TenantProbeTarget) -> int:
+        return self.odoo.get_database_storage_usage(target.db_name)['total_size_bytes']
+
+    def _collect_active_users(self, target: TenantProbeTarget) -> int:
+        return self.odoo.get_active_users_count(target.db_name, target.admin_username, target.admin_password)
+
+    def _collect_uptime(self, target: TenantProbeTarget) -> str:
+        return self.odoo.get_tenant_uptime(target.db_name)['uptime_human']
+
+    def _collect_users(self, target: TenantProbeTarget) -> int:
+        result = self.odoo.get_users_count(target.db_name, target.admin_username, target.admin_password)
+        # The count excludes id=1 but still includes the tenant admin account
+        return max(result.get('total_users', 0) - 1, 0)
+
+    # ================= CACHE HELPERS =================
+
+    def _metric_key(self, db_name: str, metric: str) -> str:
+        return f"{self.KEY_PREFIX}:{db_name}:{metric}"
+
+    def _lock_key(self, db_name: str, metric: str) -> str:
+        return f"{self.LOCK_PREFIX}:{db_name}:{metric}"
+
+    @classmethod
+    def _get_executor(cls, max_workers: int) -> ThreadPoolExecutor:
+        """Return the process-wide probe pool, creating it on first use"""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=max_workers,
+                        thread_name_prefix='tenant-metrics'
+                    )
+        return cls._executor
+
+    def _read_cached(self, db_name: str) -> Dict[str, Dict[str, Any]]:
+        """Fetch every cached metric for a tenant in a single MGET"""
+        if not self.redis_client:
+            return {}
+
+        names = list(self.metrics)
+        try:
+            raw_values = self.redis_client.mget([self._metric_key(db_name, name) for name in names])
+        except Exception as e:
+            logger.warning(f"Failed to read cached metrics for {db_name}: {e}")
+            return {}
+
+        cached = {}
+        for name, raw in zip(names, raw_values):
+            if not raw:
+                continue
+            try:
+                cached[name] = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+        return cached
+
+    def _store(self, db_name: str, metric: str, value: Any) -> None:
+        if not self.redis_client:
+            return
+
+        spec = self.metrics[metric]
+        payload = json.dumps({'value': value, 'collected_at': time.time()})
+        try:
+            self.redis_client.setex(self._metric_key(db_name, metric), spec.ttl * self.STALE_FACTOR, payload)
+        except Exception as e:
+            logger.warning(f"Failed to cache metric {metric} for {db_name}: {e}")
+
+    def _acquire_refresh(self, db_name: str, metric: str) -> bool:
+        """Claim the right to refresh a metric, locally and across processes"""
+        inflight_key = (db_name, metric)
+        with self._inflight_lock:
+            if inflight_key in self._inflight:
+                return False
+            self._inflight.add(inflight_key)
+
+        if self.redis_client:
+            try:
+                acquired = self.redis_client.set(
+                    self._lock_key(db_name, metric), '1', nx=True, ex=self.REFRESH_LOCK_TTL
+                )
+                if not acquired:
+                    self._release_refresh(db_name, metric, release_lock=False)
+                    return False
+            except Exception as e:
+                logger.debug(f"Refresh lock unavailable for {db_name}/{metric}: {e}")
+        return True
+
+    def _release_refresh(self, db_name: str, metric: str, release_lock: bool = True) -> None:
+        with self._inflight_lock:
+            self._inflight.discard((db_name, metric))
+
+        if release_lock and self.redis_client:
+            try:
+                self.redis_client.delete(self._lock_key(db_name, metric))
+            except Exception:
+                pass
+
+    def _run_probe(self, target: TenantProbeTarget, metric: str) -> Any:
+        """Execute one probe, cache its value and release the refresh claim"""
+        spec = self.metrics[metric]
+        started = time.monotonic()
+        try:
+            value = spec.collect(target)
+            self._store(target.db_name, metric, value)
+            logger.debug(f"Collected {metric} for {target.db_name} in {time.monotonic() - started:.2f}s")
+            return value
+        except Exception as e:
+            logger.warning(f"Metric probe {metric} failed for {target.db_name}: {e}")
+            raise
+        finally:
+            self._release_refresh(target.db_name, metric)
+
+    def _submit(self, target: TenantProbeTarget, metric: str):
+        if not self._acquire_refresh(target.db_name, metric):
+            return None
+        return self._get_executor(self.max_workers).submit(self._run_probe, target, metric)
+
+    # ================= PUBLIC API =================
+
+    def get_snapshot(self, target: TenantProbeTarget, metrics: Optional[List[str]] = None,
+                     wait_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Return the current metric snapshot for a tenant.
+
+        Fresh cached values are returned as-is, stale ones are returned and
+        refreshed in the background, and missing ones are probed concurrently
+        for at most ``wait_timeout`` seconds before falling back to defaults.
+
+        Args:
+            target: Tenant database and credentials to probe
+            metrics: Subset of metric names to return (default: all but on-demand ones)
+            wait_timeout: Seconds to wait for metrics that have never been collected
+
+        Returns:
+            dict: Metric values plus ``stale``/``pending`` name lists and ``collected_at``
+        """
+        names = metrics or self.default_metrics
+        timeout = self.wait_timeout if wait_timeout is None else wait_timeout
+        now = time.time()
+
+        cached = self._read_cached(target.db_name)
+        snapshot = {'stale': [], 'pending': [], 'collected_at': None}
+        missing = {}
+
+        for name in names:
+            spec = self.metrics[name]
+            entry = cached.get(name)
+            if entry is not None:
+                snapshot[name] = entry.get('value')
+                collected_at = entry.get('collected_at') or 0
+                if snapshot['collected_at'] is None or collected_at < snapshot['collected_at']:
+                    snapshot['collected_at'] = collected_at
+                if now - collected_at > spec.ttl:
+                    snapshot['stale'].append(name)
+                    self._submit(target, name)
+                continue
+
+            future = self._submit(target, name)
+            if future is not None:
+                missing[name] = future
+            else:
+                # Another worker is already collecting it
+                snapshot[name] = spec.default
+                snapshot['pending'].append(name)
+
+        if missing:
+            done, _ = wait(list(missing.values()), timeout=timeout)
+            for name, future in missing.items():
+                if future in done and future.exception() is None:
+                    snapshot[name] = future.result()
+                else:
+                    snapshot[name] = self.metrics[name].default
+                    if future not in done:
+                        snapshot['pending'].append(name)
+
+        if snapshot['collected_at'] is None:
+            snapshot['collected_at'] = now
+
+        return snapshot
+
+    def refresh(self, target: TenantProbeTarget, metrics: Optional[List[str]] = None) -> None:
+        """Schedule a background refresh of the given metrics"""
+        for name in metrics or self.default_metrics:
+            self._submit(target, name)
+
+    def invalidate(self, db_name: str, metrics: Optional[List[str]] = None) -> None:
+        """Drop cached metrics so the next snapshot re-probes them"""
+        if not self.redis_client:
+            return
+
+        keys = [self._metric_key(db_name, name) for name in (metrics or list(self.metrics))]
+        try:
+            self.redis_client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate metrics for {db_name}: {e}")
@@ -0,0 +1,400 @@
+"""
+Tenant Pool Service
+
+Keeps a warm pool of ready-to-assign tenant databases per subscription plan.
+Pool databases are cloned from the plan's golden template in the background, so
+claiming one for a new tenant only costs a rename (ALTER DATABASE ... RENAME plus
+the filestore move, both done by Odoo) and the per-tenant credential reset.
+
+Pool membership lives in PostgreSQL itself: pool databases are named
+``saas_pool_<template digest>_<token>`` and carry a ready marker comment once
+their clone finished, so every process sees the same pool without extra state.
+"""
+
+import logging
+import secrets
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import SubscriptionPlan, SystemSetting
+from services.provisioning_service import PartialProvisionError
+
+logger = logging.getLogger(__name__)
+
+
+class TenantPoolService:
+    """Maintains and hands out pre-provisioned tenant databases"""
+
+    POOL_PREFIX = "saas_pool_"
+    READY_MARKER = "saas-pool:ready"
+
+    # SystemSetting keys: global default and per-plan override ("tenant_pool_size:<plan>")
+    SIZE_SETTING = "tenant_pool_size"
+    DEFAULT_POOL_SIZE = 1
+
+    REFILL_LOCK_KEY = "tenant_pool:refill_lock"
+    REFILL_LOCK_TTL = 3600
+    CLAIM_LOCK_PREFIX = "tenant_pool:claim_lock"
+    CLAIM_LOCK_TTL = 300
+    STATS_KEY = "tenant_pool:stats"
+
+    def __init__(self, provisioner, redis_client=None, refill_interval: int = 300, startup_delay: int = 30):
+        self.provisioner = provisioner
+        self.odoo = provisioner.odoo
+        self.redis_client = redis_client
+        self.refill_interval = refill_interval
+        self.startup_delay = startup_delay
+
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._app = None
+
+    # ================= POOL NAMING =================
+
+    def _pool_prefix(self, template_name: str) -> str:
+        digest = template_name[len(self.provisioner.TEMPLATE_PREFIX):]
+        return f"{self.POOL_PREFIX}{digest}_"
+
+    def _new_pool_name(self, template_name: str) -> str:
+        return f"{self._pool_prefix(template_name)}{secrets.token_hex(4)}"
+
+    # ================= POOL INVENTORY =================
+
+    def list_pool(self, template_name: Optional[str] = None) -> List[Tuple[str, bool]]:
+        """Pool databases (oldest first) with their ready flag, optionally for one template"""
+        prefix = self._pool_prefix(template_name) if template_name else self.POOL_PREFIX
+        conn = self.provisioner._pg_connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT datname, shobj_description(oid, 'pg_database') FROM pg_database "
+                "WHERE left(datname, length(%s)) = %s ORDER BY oid",
+                (prefix, prefix)
+            )
+            return [(name, comment == self.READY_MARKER) for name, comment in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def _set_marker(self, db_name: str, marker: Optional[str]) -> None:
+        conn = self.provisioner._pg_connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(f'COMMENT ON DATABASE "{db_name}" IS %s', (marker,))
+        finally:
+            conn.close()
+
+    # ================= TARGET SIZES =================
+
+    def desired_sizes(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Target pool depth per template, summed over the active plans sharing it.
+
+        Must run inside an application context.
+        """
+        settings = {
+            setting.key: setting.get_typed_value()
+            for setting in SystemSetting.query.filter(SystemSetting.key.like(f"{self.SIZE_SETTING}%")).all()
+        }
+        default_size = self._as_size(settings.get(self.SIZE_SETTING), self.DEFAULT_POOL_SIZE)
+
+        targets = {}
+        for plan in SubscriptionPlan.query.filter_by(is_active=True).all():
+            size = self._as_size(settings.get(f"{self.SIZE_SETTING}:{plan.name}"), default_size)
+            template = self.provisioner.template_name(plan.modules)
+            entry = targets.setdefault(template, {'modules': plan.modules, 'plans': {}, 'size': 0})
+            entry['plans'][plan.name] = size
+            entry['size'] += size
+        return targets
+
+    @staticmethod
+    def _as_size(value, default: int) -> int:
+        try:
+            return max(int(value), 0)
+        except (TypeError, ValueError):
+            return default
+
+    # ================= CLAIM =================
+
+    def claim(self, db_name: str, modules, deltas) -> Optional[Dict[str, Any]]:
+        """
+        Turn a ready pool database into the tenant database ``db_name``.
+
+        Args:
+            db_name: Final tenant database name
+            modules: Plan modules, used to pick the matching template pool
+            deltas: TenantDeltas applied once the database is renamed
+
+        Returns:
+            dict: Pool database used and timings, or None when the pool is empty
+        """
+        template = self.provisioner.template_name(modules)
+        started = time.monotonic()
+
+        for pooled, ready in self.list_pool(template):
+            if not ready or not self._acquire_claim(pooled):
+                continue
+            try:
+                try:
+                    self.odoo.rename(pooled, db_name)
+                except Exception as e:
+                    logger.warning(f"Failed to claim pool database {pooled}: {e}")
+                    continue
+                if not self.odoo.exists(db_name):
+                    logger.warning(f"Rename of {pooled} to {db_name} did not produce a database")
+                    continue
+            finally:
+                self._release_claim(pooled)
+
+            rename_seconds = round(time.monotonic() - started, 2)
+            try:
+                self._set_marker(db_name, None)
+                self.provisioner.apply_deltas(db_name, template, deltas)
+            except Exception as e:
+                raise PartialProvisionError(f"Claimed {pooled} as {db_name} but applying tenant settings failed: {e}") from e
+
+            timings = {
+                'rename_seconds': rename_seconds,
+                'total_seconds': round(time.monotonic() - started, 2)
+            }
+            self._record('claims', timings['total_seconds'])
+            logger.info(f"Claimed pool database {pooled} as {db_name}: {timings}")
+            self.request_refill()
+            return {'pooled_database': pooled, 'template': template, 'timings': timings}
+
+        self._record('misses')
+        logger.info(f"No ready pool database for template {template}")
+        self.request_refill()
+        return None
+
+    def _claim_key(self, pooled: str) -> str:
+        return f"{self.CLAIM_LOCK_PREFIX}:{pooled}"
+
+    def _acquire_claim(self, pooled: str) -> bool:
+        if not self.redis_client:
+            return True
+        try:
+            return bool(self.redis_client.set(self._claim_key(pooled), '1', nx=True, ex=self.CLAIM_LOCK_TTL))
+        except Exception as e:
+            # The rename itself is atomic, so a missing lock only risks a failed attempt
+            logger.debug(f"Claim lock unavailable for {pooled}: {e}")
+            return True
+
+    def _release_claim(self, pooled: str) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.delete(self._claim_key(pooled))
+        except Exception:
+            pass
+
+    # ================= REFILL =================
+
+    def refill(self, targets: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Bring every template pool to its target depth.
+
+        Only one process refills at a time; unfinished clones left by an
+        interrupted refill, surplus databases and pools of retired templates are
+        dropped. Must run inside an application context when ``targets`` is omitted.
+
+        Returns:
+            dict: Databases created and dropped per template
+        """
+        if not self._acquire_refill_lock():
+            logger.debug("Tenant pool refill already running elsewhere")
+            return {}
+
+        results = {}
+        started = time.monotonic()
+        try:
+            targets = self.desired_sizes() if targets is None else targets
+            by_template = {}
+            for name, ready in self.list_pool():
+                by_template.setdefault(name[:name.rfind('_') + 1], []).append((name, ready))
+
+            for template, target in targets.items():
+                pooled = by_template.pop(self._pool_prefix(template), [])
+                results[template] = self._refill_template(template, target, pooled)
+
+            # Pools whose template no longer belongs to an active plan
+            for prefix, pooled in by_template.items():
+                dropped = sum(1 for name, _ in pooled if self._drop(name))
+                results[prefix] = {'created': 0, 'dropped': dropped}
+
+            self._set_stat('last_refill_at', time.time())
+            self._set_stat('last_refill_seconds', round(time.monotonic() - started, 2))
+        finally:
+            self._release_refill_lock()
+
+        return results
+
+    def _refill_template(self, template: str, target: Dict[str, Any],
+                         pooled: List[Tuple[str, bool]]) -> Dict[str, int]:
+        created = dropped = 0
+
+        ready = []
+        for name, is_ready in pooled:
+            if is_ready:
+                ready.append(name)
+            elif self._drop(name):
+                logger.warning(f"Dropped unfinished pool database {name}")
+                dropped += 1
+
+        # Shrink from the newest end when the target was lowered
+        for name in reversed(ready[target['size']:]):
+            if self._drop(name):
+                dropped += 1
+
+        for _ in range(max(target['size'] - len(ready), 0)):
+            try:
+                self._build_pooled(template, target['modules'])
+                created += 1
+            except Exception as e:
+                self._record('refill_failures')
+                logger.error(f"Failed to add database to pool {template}: {e}")
+                break
+
+        return {'created': created, 'dropped': dropped}
+
+    def _build_pooled(self, template: str, modules) -> str:
+        self.provisioner.ensure_template(modules)
+
+        name = self._new_pool_name(template)
+        started = time.monotonic()
+        self.odoo.duplicate(template, name)
+        if not self.odoo.exists(name):
+            raise RuntimeError(f"Clone of {template} into {name} did not produce a database")
+        self._set_marker(name, self.READY_MARKER)
+
+        elapsed = round(time.monotonic() - started, 2)
+        self._set_stat('last_clone_seconds', elapsed)
+        logger.info(f"Added {name} to pool {template} in {elapsed}s")
+        return name
+
+    def _drop(self, pooled: str) -> bool:
+        """Drop a pool database unless a claim is renaming it right now"""
+        if not self._acquire_claim(pooled):
+            return False
+        try:
+            self.odoo.delete(pooled)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to drop pool database {pooled}: {e}")
+            return False
+        finally:
+            self._release_claim(pooled)
+
+    def _acquire_refill_lock(self) -> bool:
+        if not self.redis_client:
+            return True
+        try:
+            return bool(self.redis_client.set(self.REFILL_LOCK_KEY, '1', nx=True, ex=self.REFILL_LOCK_TTL))
+        except Exception as e:
+            logger.warning(f"Tenant pool refill lock unavailable: {e}")
+            return True
+
+    def _release_refill_lock(self) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.delete(self.REFILL_LOCK_KEY)
+        except Exception:
+            pass
+
+    # ================= BACKGROUND REFILL =================
+
+    def start(self, app) -> None:
+        """Start the background refill loop for this process"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, name='tenant-pool-refill', daemon=True)
+        self._thread.start()
+        logger.info("Tenant pool refill loop started")
+
+    def request_refill(self) -> None:
+        """Wake the refill loop early, e.g. after a claim emptied a slot"""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        time.sleep(self.startup_delay)
+        while True:
+            self._wakeup.clear()
+            try:
+                with self._app.app_context():
+                    self.refill()
+            except Exception as e:
+                logger.error(f"Tenant pool refill failed: {e}")
+            self._wakeup.wait(self.refill_interval)
+
+    # ================= METRICS =================
+
+    def _record(self, counter: str, seconds: Optional[float] = None) -> None:
+        if not self.redis_client:
+            return
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hincrby(self.STATS_KEY, counter, 1)
+            if seconds is not None:
+                pipe.hset(self.STATS_KEY, f"last_{counter}_seconds", seconds)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to record tenant pool stat {counter}: {e}")
+
+    def _set_stat(self, name: str, value) -> None:
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.hset(self.STATS_KEY, name, value)
+        except Exception as e:
+            logger.debug(f"Failed to record tenant pool stat {name}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Pool depth per template plus claim/refill counters.
+
+        Must run inside an application context.
+        """
+        targets = self.desired_sizes()
+        depth = {}
+        for name, ready in self.list_pool():
+            entry = depth.setdefault(name[:name.rfind('_') + 1], {'ready': 0, 'pending': 0})
+            entry['ready' if ready else 'pending'] += 1
+
+        pools = []
+        for template, target in targets.items():
+            current = depth.pop(self._pool_prefix(template), {'ready': 0, 'pending': 0})
+            pools.append({
+                'template': template,
+                'plans': target['plans'],
+                'target': target['size'],
+                'ready': current['ready'],
+                'pending': current['pending']
+            })
+
+        counters = {}
+        if self.redis_client:
+            try:
+                raw = self.redis_client.hgetall(self.STATS_KEY) or {}
+                counters = {
+                    (k.decode() if isinstance(k, bytes) else k): float(v)
+                    for k, v in raw.items()
+                }
+            except Exception as e:
+                logger.debug(f"Failed to read tenant pool stats: {e}")
+
+        return {
+            'pools': pools,
+            'orphaned': {prefix: current['ready'] + current['pending'] for prefix, current in depth.items()},
+            'counters': counters,
+            'refilling': self._refill_running()
+        }
+
+    def _refill_running(self) -> bool:
+        if not self.redis_client:
+            return False
+        try:
+            return bool(self.redis_client.exists(self.REFILL_LOCK_KEY))
+        except Exception:
+            return False
@@ -0,0 +1,355 @@
+"""
+Worker Health Service
+
+Active health checking of the tenant upstream. Every PROBE_INTERVAL seconds
+each server of the tenant upstream is probed concurrently on ``/web/health``.
+Latencies over a sliding window give p50/p95/p99 per worker, and the checker
+moves workers between three states written into the generated upstream
+config:
+
+- healthy: the peer weight
+- degraded: p95 above SLOW_P95, weight divided by DEGRADED_WEIGHT_DIVISOR so
+  the consistent hash moves part of its tenants elsewhere
+- down: FAILURES_TO_DOWN probes in a row failed, ``down`` in nginx (its bus
+  server follows)
+
+Workers come back on their own: down after RECOVERY_SUCCESSES good probes,
+degraded once p95 drops under RECOVERED_P95. At most MAX_DOWN_FRACTION of
+the servers are taken down; past that, failing workers stay in rotation.
+nginx's ``max_fails``/``fail_timeout`` still handles passive ejection between
+probes.
+
+One process, elected through Redis, probes and rewrites the config; the
+state is shared in Redis so every process can report it.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from db import db
+from models import WorkerInstance
+from services.nginx_service import NginxLoadBalancerService
+from services.placement_service import TenantPlacementService
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+DOWN = 'down'
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100) of values, None if empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+@dataclass
+class WorkerHealth:
+    """Probe history and current state of one tenant upstream server"""
+    address: str
+    base_weight: int
+    state: str = HEALTHY
+    weight: Optional[int] = None
+    samples: deque = field(default_factory=deque)  # latency in seconds, None for a failed probe
+    consecutive_failures: int = 0
+    consecutive_successes: int = 0
+    last_error: Optional[str] = None
+    changed_at: Optional[str] = None
+    checked_at: Optional[str] = None
+
+    def latencies(self) -> List[float]:
+        return [sample for sample in self.samples if sample is not None]
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = self.latencies()
+        failed = len(self.samples) - len(latencies)
+        return {
+            'address': self.address,
+            'state': self.state,
+            'weight': self.weight if self.weight is not None else self.base_weight,
+            'base_weight': self.base_weight,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'samples': len(self.samples),
+            'failure_rate': round(failed / len(self.samples), 3) if self.samples else None,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'changed_at': self.changed_at,
+            'checked_at': self.checked_at,
+        }
+
+
+class WorkerHealthChecker:
+    """Concurrent /web/health probes driving the weight and down flag of tenant servers"""
+
+    LEADER_KEY = "worker_health:leader"
+    LEADER_TTL = 30
+    STATE_KEY = "worker_health:state"
+
+    PROBE_INTERVAL = 5
+    PROBE_TIMEOUT = 3
+    WINDOW = 24  # samples kept per worker (two minutes at the default interval)
+    MIN_SAMPLES = 6  # before latency alone can degrade a worker
+
+    FAILURES_TO_DOWN = 3
+    RECOVERY_SUCCESSES = 3
+    SLOW_P95 = 1.0
+    RECOVERED_P95 = 0.6
+    DEGRADED_WEIGHT_DIVISOR = 4
+    MAX_DOWN_FRACTION = 0.5
+
+    def __init__(self, redis_client=None, nginx_service_factory=NginxLoadBalancerService,
+                 probe_fn=None, max_workers: int = 16, interval: Optional[float] = None):
+        self.redis_client = redis_client
+        self.nginx_service_factory = nginx_service_factory
+        self.probe_fn = probe_fn or self._probe
+        self.max_workers = max_workers
+        self.interval = interval or self.PROBE_INTERVAL
+
+        self._workers: Dict[str, WorkerHealth] = {}
+        self._session = requests.Session()
+        self._owner = uuid.uuid4().hex
+        self._thread = None
+        self._app = None
+
+    # ================= LEADERSHIP =================
+
+    def _hold_leadership(self) -> bool:
+        if not self.redis_client:
+            return True
+        try:
+            if self.redis_client.set(self.LEADER_KEY, self._owner, nx=True, ex=self.LEADER_TTL):
+                logger.info("Became worker health check leader")
+                return True
+            holder = self.redis_client.get(self.LEADER_KEY)
+            holder = holder.decode() if isinstance(holder, bytes) else holder
+            if holder == self._owner:
+                self.redis_client.expire(self.LEADER_KEY, self.LEADER_TTL)
+                return True
+        except Exception as e:
+            logger.warning(f"Worker health leader election failed: {e}")
+        return False
+
+    # ================= PROBES =================
+
+    def _probe(self, address: str) -> Dict[str, Any]:
+        """One /web/health request: latency on success, error otherwise"""
+        started = time.perf_counter()
+        try:
+            response = self._session.get(f"http://{address}/web/health", timeout=self.PROBE_TIMEOUT)
+            latency = time.perf_counter() - started
+            if response.status_code == 200:
+                return {'ok': True, 'latency': latency}
+            return {'ok': False, 'error': f'HTTP {response.status_code}'}
+        except requests.Timeout:
+            return {'ok': False, 'error': f'timeout after {self.PROBE_TIMEOUT}s'}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def _probe_all(self, addresses: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not addresses:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(addresses))) as executor:
+            return dict(zip(addresses, executor.map(self.probe_fn, addresses)))
+
+    # ================= STATE MACHINE =================
+
+    def _record(self, health: WorkerHealth, result: Dict[str, Any]) -> None:
+        health.checked_at = datetime.utcnow().isoformat()
+        health.samples.append(result['latency'] if result['ok'] else None)
+        while len(health.samples) > self.WINDOW:
+            health.samples.popleft()
+        if result['ok']:
+            health.consecutive_failures = 0
+            health.consecutive_successes += 1
+            health.last_error = None
+        else:
+            health.consecutive_successes = 0
+            health.consecutive_failures += 1
+            health.last_error = result.get('error')
+
+    def _target_state(self, health: WorkerHealth) -> str:
+        """State a worker should be in from its probe history (before the down budget)"""
+        if health.state == DOWN:
+            return HEALTHY if health.consecutive_successes >= self.RECOVERY_SUCCESSES else DOWN
+        if health.consecutive_failures >= self.FAILURES_TO_DOWN:
+            return DOWN
+
+        latencies = health.latencies()
+        if len(latencies) < self.MIN_SAMPLES:
+            return health.state
+        p95 = percentile(latencies, 95)
+        if health.state == DEGRADED:
+            return HEALTHY if p95 < self.RECOVERED_P95 else DEGRADED
+        return DEGRADED if p95 > self.SLOW_P95 else HEALTHY
+
+    def _degraded_weight(self, health: WorkerHealth) -> int:
+        return max(1, health.base_weight // self.DEGRADED_WEIGHT_DIVISOR)
+
+    def _transition(self, health: WorkerHealth, state: str) -> None:
+        logger.warning(f"Worker {health.address}: {health.state} -> {state} "
+                       f"(p95={percentile(health.latencies(), 95)}, failures={health.consecutive_failures}, "
+                       f"error={health.last_error})")
+        if health.state == DOWN:
+            # Judge a recovered worker on its latency since it came back
+            samples = list(health.samples)
+            health.samples = deque(samples[len(samples) - health.consecutive_successes:])
+        health.state = state
+        health.weight = self._degraded_weight(health) if state == DEGRADED else None
+        health.changed_at = datetime.utcnow().isoformat()
+
+    # ================= CHECK ROUND =================
+
+    def _sync_servers(self, servers: List[Dict[str, Any]]) -> None:
+        """Track the servers of the tenant upstream, adopting states already in the config"""
+        known = {server['address'] for server in servers}
+        for address in list(self._workers):
+            if address not in known:
+                del self._workers[address]
+        stored = self._load_state()
+        for server in servers:
+            if server['address'] in self._workers:
+                continue
+            previous = stored.get(server['address'], {})
+            health = WorkerHealth(address=server['address'],
+                                  base_weight=previous.get('base_weight') or server['weight'])
+            if server['down']:
+                health.state = DOWN
+            elif server['weight'] < health.base_weight:
+                health.state, health.weight = DEGRADED, server['weight']
+            self._workers[server['address']] = health
+
+    def check(self) -> Dict[str, Any]:
+        """
+        Probe every tenant server once and apply state changes to nginx.
+
+        Must run inside an application context.
+        """
+        nginx = self.nginx_service_factory()
+        servers = nginx.tenant_servers()
+        self._sync_servers(servers)
+        results = self._probe_all([server['address'] for server in servers])
+
+        changes = []
+        max_down = int(len(self._workers) * self.MAX_DOWN_FRACTION)
+        for address, result in results.items():
+            health = self._workers[address]
+            self._record(health, result)
+            state = self._target_state(health)
+            if state == health.state:
+                continue
+            down_now = sum(1 for other in self._workers.values() if other.state == DOWN)
+            if state == DOWN and down_now >= max_down:
+                logger.error(f"Worker {address} is failing but {down_now} of {len(self._workers)} "
+                             f"workers are already down; keeping it in rotation")
+                continue
+            self._transition(health, state)
+            nginx.set_server_health(address, down=state == DOWN,
+                                    weight=health.weight if health.weight is not None else health.base_weight,
+                                    reason=f'worker {address} {state}')
+            changes.append({'address': address, 'state': state, 'weight': health.weight})
+
+        self._update_worker_rows(results)
+        self._save_state()
+        return {'success': True, 'checked': len(results), 'changes': changes}
+
+    def _update_worker_rows(self, results: Dict[str, Dict[str, Any]]) -> None:
+        """Stamp last_health_check on the WorkerInstance rows that answered"""
+        healthy = [address for address, result in results.items() if result['ok']]
+        if not healthy:
+            return
+        try:
+            workers = WorkerInstance.query.all()
+            matched = TenantPlacementService.match_worker_addresses(workers, healthy)
+            now = datetime.utcnow()
+            for worker in workers:
+                if worker.id in matched:
+                    worker.last_health_check = now
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.debug(f"Failed to stamp worker health checks: {e}")
+
+    # ================= SHARED STATE =================
+
+    def _save_state(self) -> None:
+        if not self.redis_client:
+            return
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.delete(self.STATE_KEY)
+            for address, health in self._workers.items():
+                pipe.hset(self.STATE_KEY, address, json.dumps(health.to_dict()))
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to store worker health state: {e}")
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not self.redis_client:
+            return {}
+        try:
+            raw = self.redis_client.hgetall(self.STATE_KEY)
+        except Exception as e:
+            logger.debug(f"Failed to read worker health state: {e}")
+            return {}
+        return {
+            (key.decode() if isinstance(key, bytes) else key): json.loads(value)
+            for key, value in raw.items()
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """Health state, weight and latency percentiles of every tenant server"""
+        workers = self._load_state() if self.redis_client else {
+            address: health.to_dict() for address, health in self._workers.items()
+        }
+        return {
+            'workers': sorted(workers.values(), key=lambda worker: worker['address']),
+            'thresholds': {
+                'interval': self.interval,
+                'timeout': self.PROBE_TIMEOUT,
+                'slow_p95': self.SLOW_P95,
+                'recovered_p95': self.RECOVERED_P95,
+                'failures_to_down': self.FAILURES_TO_DOWN,
+                'recovery_successes': self.RECOVERY_SUCCESSES,
+            }
+        }
+
+    # ================= BACKGROUND LOOP =================
+
+    def start(self, app) -> None:
+        """Start the probe loop for this process (only the elected leader probes)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, name='worker-health-check', daemon=True)
+        self._thread.start()
+        logger.info("Worker health check loop started")
+
+    def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                if self._hold_leadership():
+                    with self._app.app_context():
+                        self.check()
+                else:
+                    # Another process probes; start from its state if it goes away
+                    self._workers.clear()
+            except Exception as e:
+                logger.error(f"Worker health check failed: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
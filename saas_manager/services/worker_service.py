@@ -6,18 +6,72 @@ and provide a consistent interface for both local and remote worker operations.
 """
 
 import logging
+import math
 import requests
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 from db import db
 from models import WorkerInstance, InfrastructureServer, DeploymentTask, AuditLog
+from services.nginx_service import DEFAULT_GEVENT_PORT
 from shared_utils import get_docker_client, log_error_with_context
 from utils import error_tracker
 
 logger = logging.getLogger(__name__)
 
+# Odoo process sizing (see size_odoo_processes): Odoo's rule of thumb of
+# 2 workers per CPU + 1, capped by what the container memory can hold
+DEFAULT_CPU_CORES = 2
+DEFAULT_MEMORY_MB = 2048
+WORKER_MEMORY_MB = 320  # average worker footprint: 80% light (~150MB), 20% heavy (~1GB) requests
+RESERVED_MEMORY_MB = 256  # master process and the gevent (bus) process
+MIN_MEMORY_SOFT_MB = 256
+MAX_MEMORY_SOFT_MB = 2048
+MAX_MEMORY_HARD_MB = 2560
+
+
+@dataclass
+class OdooProcessSizing:
+    """Odoo prefork settings for a container of a given size"""
+    workers: int
+    max_cron_threads: int
+    limit_memory_soft: int
+    limit_memory_hard: int
+
+
+def size_odoo_processes(cpu_cores: Optional[float] = None,
+                        memory_mb: Optional[int] = None) -> OdooProcessSizing:
+    """
+    Size the HTTP workers and cron threads of an Odoo container.
+    
+    Args:
+        cpu_cores: CPUs available to the container (fractions allowed)
+        memory_mb: Memory available to the container in MB
+        
+    Returns:
+        OdooProcessSizing with memory limits in bytes
+    """
+    cpu_cores = cpu_cores or DEFAULT_CPU_CORES
+    memory_mb = memory_mb or DEFAULT_MEMORY_MB
+    
+    by_cpu = 2 * max(1, math.floor(cpu_cores)) + 1
+    by_memory = max(1, (memory_mb - RESERVED_MEMORY_MB) // WORKER_MEMORY_MB)
+    max_cron_threads = 2 if by_cpu >= 8 and by_memory >= 10 else 1
+    workers = max(1, min(by_cpu, by_memory - max_cron_threads))
+    
+    # Memory left per process; the hard limit leaves room for one heavy request
+    share_mb = (memory_mb - RESERVED_MEMORY_MB) / (workers + max_cron_threads)
+    soft_mb = int(min(max(share_mb, MIN_MEMORY_SOFT_MB), MAX_MEMORY_SOFT_MB))
+    hard_mb = int(min(max(share_mb * 2, soft_mb * 1.25), MAX_MEMORY_HARD_MB))
+    
+    return OdooProcessSizing(
+        workers=workers,
+        max_cron_threads=max_cron_threads,
+        limit_memory_soft=soft_mb * 1024 * 1024,
+        limit_memory_hard=hard_mb * 1024 * 1024
+    )
+
 
 @dataclass
 class WorkerConfig:
@@ -30,6 +84,9 @@ class WorkerConfig:
     postgres_database: str = 'postgres'
     postgres_user: str = 'odoo_master'
     postgres_password: str = 'secure_password_123'
+    gevent_port: int = DEFAULT_GEVENT_PORT  # websocket/longpolling (bus) port
+    cpu_cores: Optional[float] = None  # container CPU limit, None = whole host
+    memory_mb: Optional[int] = None  # container memory limit, None = whole host
     
     def __post_init__(self):
         """Generate default worker name if not provided"""
@@ -69,13 +126,25 @@ class WorkerValidationService:
                 postgres_port=int(data.get('postgres_port', 5432)),
                 postgres_database=data.get('postgres_database', 'postgres'),
                 postgres_user=data.get('postgres_user', 'odoo_master'),
-                postgres_password=data.get('postgres_password', 'secure_password_123')
+                postgres_password=data.get('postgres_password', 'secure_password_123'),
+                gevent_port=int(data.get('gevent_port', DEFAULT_GEVENT_PORT)),
+                cpu_cores=float(data['cpu']) if data.get('cpu') else None,
+                memory_mb=int(float(data['memory']) * 1024) if data.get('memory') else None
             )
             
             # Validation rules
             if config.port < 1024 or config.port > 65535:
                 raise ValueError("Port must be between 1024 and 65535")
                 
+            if config.gevent_port < 1024 or config.gevent_port > 65535 or config.gevent_port == config.port:
+                raise ValueError("Gevent port must be between 1024 and 65535 and differ from the HTTP port")
+                
+            if config.cpu_cores is not None and config.cpu_cores <= 0:
+                raise ValueError("CPU limit must be positive")
+                
+            if config.memory_mb is not None and config.memory_mb < 512:
+                raise ValueError("Memory limit must be at least 0.5 GB")
+                
             if config.max_tenants < 1 or config.max_tenants > 100:
                 raise ValueError("Max tenants must be between 1 and 100")
                 
@@ -121,6 +190,9 @@ class WorkerValidationService:
             postgres_database=config.postgres_database,
             postgres_user=config.postgres_user,
             postgres_password=config.postgres_password,
+            gevent_port=config.gevent_port,
+            cpu_cores=config.cpu_cores,
+            memory_mb=config.memory_mb,
             server_id=server_id
         )
 
@@ -229,18 +301,69 @@ class DockerConfigurationService:
             'odoomulti-tenantsystem_odoo_worker_logs': {'bind': '/var/log/odoo', 'mode': 'rw'}
         }
     
+    @staticmethod
+    def resolve_resources(config: WorkerConfig, docker_client=None) -> WorkerConfig:
+        """
+        Fill in the CPU and memory a worker without explicit limits can use
+        
+        Args:
+            config: Worker configuration (updated in place)
+            docker_client: Docker client, to read the host's CPUs and memory
+            
+        Returns:
+            The same configuration
+        """
+        if (config.cpu_cores is None or config.memory_mb is None) and docker_client:
+            try:
+                info = docker_client.info()
+                if config.cpu_cores is None and info.get('NCPU'):
+                    config.cpu_cores = float(info['NCPU'])
+                if config.memory_mb is None and info.get('MemTotal'):
+                    config.memory_mb = int(info['MemTotal']) // (1024 * 1024)
+            except Exception as e:
+                logger.warning(f"Could not read Docker host resources: {e}")
+        return config
+    
+    @staticmethod
+    def get_docker_resources(config: WorkerConfig) -> Dict[str, Any]:
+        """
+        Generate Docker resource limits for explicitly sized workers
+        
+        Args:
+            config: Worker configuration
+            
+        Returns:
+            Dict of docker create keyword arguments
+        """
+        resources = {}
+        if config.cpu_cores:
+            resources['nano_cpus'] = int(config.cpu_cores * 1e9)
+        if config.memory_mb:
+            resources['mem_limit'] = f"{config.memory_mb}m"
+        return resources
+    
     @staticmethod
     def get_docker_command(config: WorkerConfig) -> str:
         """
         Generate Docker container command
         
+        The prefork settings are sized to the container and the gevent port is
+        opened so websocket/longpolling traffic is served by its own process
+        instead of tying up HTTP workers.
+        
         Args:
             config: Worker configuration
             
         Returns:
             Docker command string
         """
-        return f'odoo -c /etc/odoo/odoo.conf --logfile=/var/log/odoo/{config.name}.log'
+        sizing = size_odoo_processes(config.cpu_cores, config.memory_mb)
+        return (
+            f'odoo -c /etc/odoo/odoo.conf --logfile=/var/log/odoo/{config.name}.log'
+            f' --workers={sizing.workers} --max-cron-threads={sizing.max_cron_threads}'
+            f' --limit-memory-soft={sizing.limit_memory_soft} --limit-memory-hard={sizing.limit_memory_hard}'
+            f' --gevent-port={config.gevent_port} --proxy-mode'
+        )
     
     @staticmethod
     def generate_odoo_config(config: WorkerConfig) -> str:
@@ -253,6 +376,7 @@ class DockerConfigurationService:
         Returns:
             String containing Odoo configuration
         """
+        sizing = size_odoo_processes(config.cpu_cores, config.memory_mb)
         return f"""[options]
 ; Database settings
 db_host = {config.postgres_host}
@@ -264,10 +388,14 @@ db_maxconn = 64
 
 ; Server settings
 http_port = 8069
-workers = 2
-max_cron_threads = 1
-limit_memory_hard = 2684354560
-limit_memory_soft = 2147483648
+proxy_mode = True
+; Websocket/longpolling is served by the gevent process on its own port
+gevent_port = {config.gevent_port}
+; Sized for {config.cpu_cores or DEFAULT_CPU_CORES} CPU(s) and {config.memory_mb or DEFAULT_MEMORY_MB} MB
+workers = {sizing.workers}
+max_cron_threads = {sizing.max_cron_threads}
+limit_memory_hard = {sizing.limit_memory_hard}
+limit_memory_soft = {sizing.limit_memory_soft}
 limit_request = 8192
 limit_time_cpu = 600
 limit_time_real = 1200
@@ -424,7 +552,9 @@ class UnifiedWorkerService:
                 'worker_details': {
                     'name': config.name,
                     'port': config.port,
-                    'max_tenants': config.max_tenants
+                    'gevent_port': config.gevent_port,
+                    'max_tenants': config.max_tenants,
+                    'sizing': asdict(size_odoo_processes(config.cpu_cores, config.memory_mb))
                 }
             }
             
@@ -504,6 +634,10 @@ class UnifiedWorkerService:
             Docker container instance
         """
         try:
+            # Limits requested for the container, before sizing falls back to the host
+            resources = self.docker_service.get_docker_resources(config)
+            self.docker_service.resolve_resources(config, docker_client)
+            
             # Create container
             container = docker_client.containers.create(
                 'odoo:17.0',
@@ -511,7 +645,8 @@ class UnifiedWorkerService:
                 environment=self.docker_service.get_docker_environment(config),
                 volumes=self.docker_service.get_docker_volumes(),
                 command=self.docker_service.get_docker_command(config),
-                restart_policy={'Name': 'unless-stopped'}
+                restart_policy={'Name': 'unless-stopped'},
+                **resources
             )
             
             # Connect to network if available
@@ -155,6 +155,7 @@ let filteredLogs = [];
 let currentServiceFilter = "all";
 let currentLevelFilter = "all";
 let searchQuery = "";
+let currentStats = {};
 let socket;
 
 async function fetchLogs(tenantId) {
@@ -168,7 +169,8 @@ async function fetchLogs(tenantId) {
       }
     );
     filteredLogs = data.logs;
-    updateStats(data.stats);
+    currentStats = data.stats || {};
+    updateStats(currentStats);
     return data.logs;
   } catch (error) {
     console.error("Error fetching logs:", error);
@@ -184,32 +186,33 @@ function initSocketIO(tenantId) {
 
   try {
     socket = io.connect(window.location.origin, {
-      transports: ["polling", "websocket"],
-      upgrade: true,
-      rememberUpgrade: false,
+      // Websocket only: the server runs several workers without sticky sessions
+      transports: ["websocket"],
       timeout: 20000,
       forceNew: true,
     });
 
     socket.on("connect", () => {
       console.log("Connected to SocketIO");
-      socket.emit("join", `tenant_${tenantId}`);
+      socket.emit("watch_tenant_logs", { tenant_id: tenantId });
     });
 
     socket.on("connect_error", (error) => {
       console.warn("Socket.io connection error:", error);
-      // Fallback to polling only
-      socket.io.opts.transports = ["polling"];
     });
 
-    socket.on("new_log", (log) => {
-      filteredLogs.unshift(log);
-      filteredLogs = filteredLogs.slice(0, 1000);
+    // Live lines arrive in batches (newest first) with per-level counts
+    socket.on("log_batch", (batch) => {
+      filteredLogs = batch.logs.concat(filteredLogs).slice(0, 1000);
+      Object.entries(batch.counts || {}).forEach(([level, count]) => {
+        currentStats[level] = (currentStats[level] || 0) + count;
+      });
+      currentStats.last_update = batch.timestamp;
+      updateStats(currentStats);
       filterLogs();
-    });
-
-    socket.on("stats_update", (stats) => {
-      updateStats(stats);
+      if (batch.dropped) {
+        console.warn(`${batch.dropped} live log lines skipped (viewer too slow)`);
+      }
     });
   } catch (error) {
     console.error("Failed to initialize Socket.io:", error);
@@ -293,7 +293,8 @@ def create_worker_container():
             nginx_result = nginx_service.add_worker(
                 worker_ip=worker_details['name'],  # Use container name
                 worker_port=8069,  # Internal Odoo port
-                worker_name=worker_details['name']
+                worker_name=worker_details['name'],
+                gevent_port=worker_details.get('gevent_port')
             )
             
             if nginx_result['success']:
@@ -400,7 +401,8 @@ def create_remote_worker():
             nginx_result = nginx_service.add_worker(
                 worker_ip=server_ip,
                 worker_port=worker_port,
-                worker_name=worker_details['name']
+                worker_name=worker_details['name'],
+                gevent_port=worker_details.get('gevent_port')
             )
             
             if nginx_result['success']:
@@ -13,6 +13,7 @@ import re
 from db import db
 from models import SaasUser, Tenant, TenantUser
 from utils import track_errors
+from cache_manager import invalidate_user_cache
 try:
     from user_notifications import NotificationService, NotificationType, NotificationPriority
 except ImportError:
@@ -74,6 +75,13 @@ def generate_database_name(subdomain):
     # Fallback to random string
     return f"{base_name}_{secrets.token_hex(4)}"
 
+def invalidate_member_cache(user_id):
+    """Drop the cached tenant list of a user whose memberships changed"""
+    try:
+        invalidate_user_cache([user_id])
+    except Exception as e:
+        logger.warning(f"Failed to invalidate tenant cache of user {user_id}: {e}")
+
 # ================= TENANT CREATION =================
 
 @tenant_api_bp.route('/api/tenant/create', methods=['POST'])
@@ -145,6 +153,7 @@ def create_tenant():
         # For now, we'll mark it as 'created' immediately
         tenant.status = 'created'
         db.session.commit()
+        invalidate_member_cache(current_user.id)
         
         # Send notification if available
         if NotificationService:
@@ -481,6 +490,7 @@ def invite_tenant_user(tenant_id):
         
         db.session.add(new_tenant_user)
         db.session.commit()
+        invalidate_member_cache(invited_user.id)
         
         # Send notification to invited user
         notification_service = NotificationService()
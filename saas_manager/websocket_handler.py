@@ -3,6 +3,7 @@
 # Standard library imports
 import json
 import logging
+import os
 import threading
 from datetime import datetime
 
@@ -10,19 +11,40 @@ from datetime import datetime
 import redis
 from flask import request
 from flask_login import current_user
-from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
+from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect, rooms
 
 logger = logging.getLogger(__name__)
 
 class WebSocketManager:
     """Manages WebSocket connections and real-time updates"""
     
-    def __init__(self, socketio: SocketIO, redis_client: redis.Redis):
+    # Session tracking keys shared by every app process. Each session has its
+    # own key with a TTL, so sessions of a process that died without running
+    # its disconnect handlers expire instead of piling up.
+    USER_SESSIONS_PREFIX = "ws:user_sessions"
+    SESSION_USER_PREFIX = "ws:session_user"
+    SESSION_TTL = 86400
+    
+    # An open websocket holds one gunicorn thread; connections beyond this budget
+    # are refused so the remaining threads stay free for ordinary requests
+    # (see GUNICORN_WEBSOCKET_THREADS in gunicorn.conf.py)
+    MAX_LOCAL_CONNECTIONS = int(os.environ.get('GUNICORN_WEBSOCKET_THREADS', 64))
+    
+    def __init__(self, socketio: SocketIO, redis_client: redis.Redis, use_message_queue: bool = False):
         self.socketio = socketio
         self.redis_client = redis_client
+        # With a message queue every process receives realtime_updates itself,
+        # so those emits must only reach this process's own clients
+        self.use_message_queue = use_message_queue
+        
+        # Fallback tracking when Redis is unavailable (single process only)
         self.connected_users = {}  # {user_id: [session_ids]}
         self.session_users = {}    # {session_id: user_id}
         
+        # Connections held by this process
+        self._local_sessions = set()
+        self._local_lock = threading.Lock()
+        
         # Start Redis subscriber thread
         if redis_client:
             self.start_redis_subscriber()
@@ -58,19 +80,53 @@ class WebSocketManager:
         if user_ids:
             # Send to specific users
             for user_id in user_ids:
-                self.emit_to_user(user_id, event_type, event_data)
+                self.emit_to_user(user_id, event_type, event_data, local_only=True)
         else:
             # Broadcast to all connected users
-            self.socketio.emit(event_type, event_data)
+            self.socketio.emit(event_type, event_data, **self._emit_options(local_only=True))
+    
+    def _emit_options(self, local_only=False):
+        if local_only and self.use_message_queue:
+            return {'ignore_queue': True}
+        return {}
+    
+    def emit_to_user(self, user_id, event, data, local_only=False):
+        """Emit event to every session of a user, whichever process holds them"""
+        self.socketio.emit(event, data, to=f"user_{user_id}", **self._emit_options(local_only))
+    
+    def _user_sessions_key(self, user_id):
+        return f"{self.USER_SESSIONS_PREFIX}:{user_id}"
+    
+    def _session_user_key(self, session_id):
+        return f"{self.SESSION_USER_PREFIX}:{session_id}"
     
-    def emit_to_user(self, user_id, event, data):
-        """Emit event to specific user's sessions"""
-        if user_id in self.connected_users:
-            for session_id in self.connected_users[user_id]:
-                self.socketio.emit(event, data, room=session_id)
+    def reserve_local_connection(self, session_id):
+        """Claim one of this process's websocket slots; False when they are all taken"""
+        with self._local_lock:
+            if session_id not in self._local_sessions and len(self._local_sessions) >= self.MAX_LOCAL_CONNECTIONS:
+                return False
+            self._local_sessions.add(session_id)
+            return True
+    
+    def release_local_connection(self, session_id):
+        with self._local_lock:
+            self._local_sessions.discard(session_id)
     
     def add_user_session(self, user_id, session_id):
         """Add user session to tracking"""
+        if self.redis_client:
+            try:
+                key = self._user_sessions_key(user_id)
+                pipe = self.redis_client.pipeline()
+                pipe.sadd(key, session_id)
+                pipe.expire(key, self.SESSION_TTL)
+                pipe.set(self._session_user_key(session_id), user_id, ex=self.SESSION_TTL)
+                pipe.execute()
+                logger.debug(f"Added session {session_id} for user {user_id}")
+                return
+            except Exception as e:
+                logger.warning(f"Failed to track session {session_id} in Redis: {e}")
+        
         if user_id not in self.connected_users:
             self.connected_users[user_id] = []
         
@@ -82,6 +138,19 @@ class WebSocketManager:
     
     def remove_user_session(self, session_id):
         """Remove user session from tracking"""
+        if self.redis_client:
+            try:
+                user_id = self.redis_client.get(self._session_user_key(session_id))
+                pipe = self.redis_client.pipeline()
+                pipe.delete(self._session_user_key(session_id))
+                if user_id is not None:
+                    user_id = int(user_id)
+                    pipe.srem(self._user_sessions_key(user_id), session_id)
+                pipe.execute()
+                logger.debug(f"Removed session {session_id} for user {user_id}")
+            except Exception as e:
+                logger.warning(f"Failed to untrack session {session_id} in Redis: {e}")
+        
         if session_id in self.session_users:
             user_id = self.session_users[session_id]
             
@@ -95,9 +164,25 @@ class WebSocketManager:
             
             del self.session_users[session_id]
             logger.debug(f"Removed session {session_id} for user {user_id}")
+    
+    def get_user_sessions(self, user_id):
+        """Session ids of a user across all processes"""
+        if self.redis_client:
+            try:
+                return [
+                    sid.decode() if isinstance(sid, bytes) else sid
+                    for sid in self.redis_client.smembers(self._user_sessions_key(user_id))
+                ]
+            except Exception as e:
+                logger.warning(f"Failed to read sessions for user {user_id}: {e}")
+        return list(self.connected_users.get(user_id, []))
+    
+    def is_user_online(self, user_id):
+        """Whether the user has at least one open WebSocket session"""
+        return bool(self.get_user_sessions(user_id))
 
 # WebSocket event handlers
-def setup_websocket_handlers(socketio, ws_manager):
+def setup_websocket_handlers(socketio, ws_manager, log_fanout=None):
     """Setup WebSocket event handlers"""
     
     @socketio.on('connect')
@@ -111,6 +196,11 @@ def setup_websocket_handlers(socketio, ws_manager):
         session_id = request.sid
         user_id = current_user.id
         
+        if not ws_manager.reserve_local_connection(session_id):
+            logger.warning(f"Refusing WebSocket session {session_id}: all "
+                           f"{ws_manager.MAX_LOCAL_CONNECTIONS} websocket slots of this worker are in use")
+            return False
+        
         # Join user-specific room
         join_room(f"user_{user_id}")
         ws_manager.add_user_session(user_id, session_id)
@@ -128,7 +218,10 @@ def setup_websocket_handlers(socketio, ws_manager):
     def handle_disconnect(reason=None):
         """Handle client disconnection"""
         session_id = request.sid
+        ws_manager.release_local_connection(session_id)
         ws_manager.remove_user_session(session_id)
+        if log_fanout:
+            log_fanout.unwatch(session_id)
         logger.info(f"WebSocket session disconnected: {session_id}, reason: {reason}")
     
     @socketio.on('subscribe_tenant_updates')
@@ -159,6 +252,40 @@ def setup_websocket_handlers(socketio, ws_manager):
                 'message': f'Unsubscribed from tenant {tenant_id} updates'
             })
     
+    @socketio.on('watch_tenant_logs')
+    def handle_watch_tenant_logs(data):
+        """Stream a tenant's live log lines (batched ``log_batch`` events)"""
+        if not current_user.is_authenticated or not log_fanout:
+            return
+        
+        from models import Tenant, TenantUser
+        tenant_id = (data or {}).get('tenant_id')
+        tenant = Tenant.query.get(tenant_id) if tenant_id else None
+        if not tenant:
+            return
+        if not current_user.is_admin and not TenantUser.query.filter_by(
+                tenant_id=tenant.id, user_id=current_user.id).first():
+            emit('error', {'message': 'Access denied'})
+            return
+        
+        # One tenant per session: leave the room of the previously watched tenant
+        for room in rooms():
+            if room.startswith(log_fanout.ROOM_PREFIX):
+                leave_room(room)
+        join_room(log_fanout.room(tenant.database_name))
+        log_fanout.watch(tenant.database_name, request.sid)
+        emit('watching_tenant_logs', {'tenant_id': tenant.id})
+    
+    @socketio.on('unwatch_tenant_logs')
+    def handle_unwatch_tenant_logs(data=None):
+        """Stop streaming live log lines to this session"""
+        if not log_fanout:
+            return
+        for room in rooms():
+            if room.startswith(log_fanout.ROOM_PREFIX):
+                leave_room(room)
+        log_fanout.unwatch(request.sid)
+    
     @socketio.on('request_data_refresh')
     def handle_data_refresh(data):
         """Handle request for data refresh"""
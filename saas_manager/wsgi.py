@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each gunicorn worker imports the application separately; Socket.IO emits are
+shared between workers through the Redis message queue configured in app.py.
+"""
+
+from app import app, socketio  # noqa: F401
+
+application = app
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Benchmark the admin tenants/users tables: per-row queries vs page aggregates
+
+Seeds a throwaway database with tenants, users, memberships and credential
+accesses, then builds the same pages with the original per-row loop and with
+the aggregated builders from master_admin, checking that both return the same
+rows. Run inside the saas_manager container:
+
+    python scripts/benchmark_admin_lists.py --tenants 10000 --per-page 50
+
+Exits non-zero if the outputs differ or if the aggregated path's query count
+grows with the page size.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add the saas_manager directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'saas_manager'))
+
+from flask import Flask
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+
+from db import db
+from models import SaasUser, Tenant, TenantUser, SubscriptionPlan, CredentialAccess
+from master_admin import (
+    TENANT_LIST, USER_LIST, build_tenant_rows, build_user_rows, calculate_tenant_health
+)
+
+PLANS = [('basic', 29.0, 5, 1000), ('premium', 99.0, 25, 5000), ('enterprise', 299.0, 100, 20000)]
+TABLES = [t.__table__ for t in (SaasUser, Tenant, TenantUser, SubscriptionPlan, CredentialAccess)]
+
+
+def legacy_tenant_rows(tenants):
+    """Mirror of the original api_tenants_list loop: three to six queries per tenant"""
+    tenants_data = []
+    for tenant in tenants:
+        user_count = TenantUser.query.filter_by(tenant_id=tenant.id).count()
+        plan = SubscriptionPlan.query.filter_by(name=tenant.plan).first()
+
+        storage_used = user_count * 50
+        storage_limit = plan.storage_limit if plan else 1000
+        storage_percentage = min((storage_used / storage_limit) * 100, 100) if storage_limit > 0 else 0
+
+        tenants_data.append({
+            'id': tenant.id,
+            'name': tenant.name,
+            'subdomain': tenant.subdomain,
+            'status': tenant.status,
+            'plan': tenant.plan,
+            'health': calculate_tenant_health(tenant),
+            'storage_usage': f"{storage_used}MB / {storage_limit}MB",
+            'storage_percentage': round(storage_percentage, 1),
+            'user_count': user_count,
+            'monthly_revenue': float(plan.price) if plan else 0,
+            'created_at': tenant.created_at.isoformat() if tenant.created_at else ''
+        })
+    return tenants_data
+
+
+def legacy_user_rows(users):
+    """Mirror of the original api_users_list loop: two queries per user"""
+    users_data = []
+    for user in users:
+        tenant_count = TenantUser.query.filter_by(user_id=user.id).count()
+        recent_activity = CredentialAccess.query.filter_by(user_id=user.id)\
+            .order_by(CredentialAccess.accessed_at.desc()).first()
+        users_data.append({
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'is_admin': user.is_admin,
+            'is_active': user.is_active,
+            'tenant_count': tenant_count,
+            'last_login': user.last_login.isoformat() if user.last_login else 'Never',
+            'last_activity': recent_activity.accessed_at.isoformat() if recent_activity else 'No activity',
+            'created_at': user.created_at.isoformat() if user.created_at else '',
+            'status_badge': 'success' if user.is_active else 'danger',
+            'role_badge': 'primary' if user.is_admin else 'secondary'
+        })
+    return users_data
+
+
+def seed(tenant_count, rng):
+    """Bulk insert plans, tenants, users (one per two tenants), memberships and accesses"""
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(SubscriptionPlan, [
+        {'name': name, 'price': price, 'max_users': max_users, 'storage_limit': storage}
+        for name, price, max_users, storage in PLANS
+    ])
+    plan_names = [p[0] for p in PLANS] + ['legacy']  # a plan name without a row
+    db.session.bulk_insert_mappings(Tenant, [
+        {
+            'id': i, 'name': f'Tenant {i}', 'subdomain': f't{i}', 'database_name': f'kdoo_t{i}',
+            'status': rng.choice(['active', 'active', 'active', 'suspended', 'pending']),
+            'plan': rng.choice(plan_names), 'admin_username': 'admin', 'admin_password': 'x',
+            'created_at': now - timedelta(days=rng.randint(0, 900)),
+        }
+        for i in range(1, tenant_count + 1)
+    ])
+    user_count = max(1, tenant_count // 2)
+    db.session.bulk_insert_mappings(SaasUser, [
+        {
+            'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+            'is_admin': i % 50 == 0, 'is_active': i % 7 != 0,
+            'created_at': now - timedelta(days=rng.randint(0, 900)),
+            'last_login': now - timedelta(hours=rng.randint(1, 5000)) if i % 3 else None,
+        }
+        for i in range(1, user_count + 1)
+    ])
+    memberships, accesses = [], []
+    for tenant_id in range(1, tenant_count + 1):
+        for _ in range(rng.choice([0, 1, 2, 3, 8, 30])):
+            memberships.append({'tenant_id': tenant_id, 'user_id': rng.randint(1, user_count)})
+        for _ in range(rng.choice([0, 0, 2, 6, 12])):
+            # Whole days apart from the 7 day window so both paths agree on "recent"
+            days = rng.choice([1, 2, 3, 5, 10, 20, 40])
+            accesses.append({
+                'tenant_id': tenant_id, 'user_id': rng.randint(1, user_count),
+                'accessed_at': now - timedelta(days=days, seconds=rng.randint(0, 3600)),
+            })
+    db.session.bulk_insert_mappings(TenantUser, memberships)
+    db.session.bulk_insert_mappings(CredentialAccess, accesses)
+    db.session.commit()
+    print(f"Seeded {tenant_count} tenants, {user_count} users, "
+          f"{len(memberships)} memberships, {len(accesses)} credential accesses")
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def walk_pages(listing, per_page, pages):
+    """Rows of the first ``pages`` keyset pages of a listing"""
+    result, cursor = [], None
+    for _ in range(pages):
+        args = MultiDict({'limit': per_page, **({'cursor': cursor} if cursor else {})})
+        page = listing.page(args, with_total=False)
+        result.append(page.items)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+    return result
+
+
+def measure(label, builder, pages, counter):
+    samples, queries, rows = [], 0, []
+    for items in pages:
+        before = counter.count
+        started = time.perf_counter()
+        rows.extend(builder(items))
+        samples.append(time.perf_counter() - started)
+        queries += counter.count - before
+    print(f"{label:<22} pages={len(samples)} "
+          f"mean={statistics.mean(samples) * 1000:8.1f}ms max={max(samples) * 1000:8.1f}ms "
+          f"queries/page={queries / len(samples):7.1f}")
+    return rows, queries / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite://'),
+                        help='Throwaway database (its tables are created and dropped)')
+    parser.add_argument('--tenants', type=int, default=10000)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        db.metadata.create_all(engine, tables=TABLES)
+        try:
+            seed(args.tenants, random.Random(args.seed))
+            counter = QueryCounter(engine)
+            failures = []
+
+            for name, listing, legacy, aggregated in (
+                ('tenants', TENANT_LIST, legacy_tenant_rows, build_tenant_rows),
+                ('users', USER_LIST, legacy_user_rows, build_user_rows),
+            ):
+                print(f"\n{name} (per_page={args.per_page})")
+                pages = walk_pages(listing, args.per_page, args.pages)
+                legacy_rows, _ = measure('per-row (legacy)', legacy, pages, counter)
+                new_rows, queries = measure('aggregated', aggregated, pages, counter)
+                if legacy_rows != new_rows:
+                    failures.append(f"{name}: aggregated rows differ from the per-row rows")
+
+                # The aggregated cost must not depend on the number of rows
+                small = walk_pages(listing, max(1, args.per_page // 10), 1)
+                _, small_queries = measure('aggregated (small)', aggregated, small, counter)
+                if queries > small_queries:
+                    failures.append(f"{name}: {queries:.0f} queries per page vs {small_queries:.0f} for a small page")
+
+            for failure in failures:
+                print(f"FAIL {failure}")
+            return 1 if failures else 0
+        finally:
+            db.session.remove()
+            db.metadata.drop_all(engine, tables=TABLES)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark cache invalidation: KEYS pattern scans vs tag sets and SCAN
+
+Fills an empty Redis database with --keys unrelated keys (sessions, limiter
+counters, ...) plus tagged cache entries for --users users and --tenants
+tenants written through CacheManager, then times:
+
+- invalidating one user's tenant list: KEYS user_tenants:<id>:* vs its tag set
+- invalidating one tenant: the old per-member KEYS loop vs its tag set
+- clearing all caches: KEYS per pattern vs batched SCAN
+
+A second client PINGs Redis throughout; the slowest PING of each phase shows
+how long that approach blocked every other client. Run it against a
+throwaway database (it must be empty and is flushed afterwards):
+
+    python scripts/benchmark_cache_invalidation.py --redis-url redis://localhost:6379/15 --keys 1000000
+
+Exits non-zero if the tag/SCAN paths leave cache keys behind or touch other keys.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+# Add the saas_manager directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'saas_manager'))
+
+import redis
+
+from cache_manager import CacheManager
+
+FILLER_PREFIXES = ('session:', 'LIMITER/', 'odoo_session:', 'list_total:')
+LEGACY_PATTERNS = ("user_tenants:*", "admin_stats*", "tenant_details:*", "tenant_status:*")
+
+
+def legacy_invalidate_user(client, user_id):
+    """Original _invalidate_user_cache"""
+    keys = client.keys(f"user_tenants:{user_id}:*")
+    if keys:
+        client.delete(*keys)
+
+
+def legacy_invalidate_tenant(client, tenant_id, member_ids):
+    """Original invalidate_tenant_cache after its TenantUser query"""
+    for user_id in member_ids:
+        legacy_invalidate_user(client, user_id)
+    client.delete(f"tenant_details:{tenant_id}:v0")
+
+
+def legacy_clear_all(client):
+    """Original clear_all_cache pattern deletes"""
+    for pattern in LEGACY_PATTERNS:
+        keys = client.keys(pattern)
+        if keys:
+            client.delete(*keys)
+
+
+class PingMonitor:
+    """Background client measuring how long Redis takes to answer a PING"""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.max_latency = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            self.client.ping()
+            self.max_latency = max(self.max_latency, time.perf_counter() - started)
+            time.sleep(0.001)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def reset(self):
+        self.max_latency = 0.0
+
+
+def seed_fillers(client, count, batch=10000):
+    for start in range(0, count, batch):
+        client.mset({
+            f"{FILLER_PREFIXES[i % len(FILLER_PREFIXES)]}{i}": 'x'
+            for i in range(start, min(count, start + batch))
+        })
+    print(f"Seeded {count} unrelated keys")
+
+
+def seed_caches(cache, memberships, tenant_count, users=None):
+    """Tagged cache entries as CacheManager writes them (version 0)"""
+    for user_id, tenant_ids in memberships.items():
+        if users is not None and user_id not in users:
+            continue
+        payload = json.dumps([{'id': tenant_id, 'name': f'Tenant {tenant_id}'} for tenant_id in tenant_ids])
+        cache._cache_set(f"user_tenants:{user_id}:v0", 3600, payload,
+                         [cache._user_tag(user_id)] + [cache._tenant_tag(t) for t in tenant_ids])
+    if users is None:
+        for tenant_id in range(1, tenant_count + 1):
+            cache._cache_set(f"tenant_details:{tenant_id}:v0", 3600, json.dumps({'id': tenant_id}),
+                             [cache._tenant_tag(tenant_id)])
+
+
+def measure(label, calls, monitor):
+    monitor.reset()
+    samples = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    print(f"{label:<26} calls={len(samples):<4} mean={statistics.mean(samples) * 1000:9.2f}ms "
+          f"max={max(samples) * 1000:9.2f}ms  slowest PING={monitor.max_latency * 1000:9.2f}ms")
+
+
+def cache_key_count(client):
+    return sum(1 for pattern in CacheManager.CACHE_PATTERNS for _ in client.scan_iter(match=pattern, count=1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default=os.environ.get('BENCHMARK_REDIS_URL', 'redis://localhost:6379/15'),
+                        help='Empty throwaway Redis database (flushed afterwards)')
+    parser.add_argument('--keys', type=int, default=1000000, help='Unrelated keys sharing the database')
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--tenants', type=int, default=10000)
+    parser.add_argument('--samples', type=int, default=20, help='Users/tenants invalidated per phase')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url)
+    if client.dbsize():
+        print(f"{args.redis_url} is not empty; use a throwaway database")
+        return 2
+
+    rng = random.Random(args.seed)
+    cache = CacheManager(client)
+    memberships = {
+        user_id: sorted(rng.sample(range(1, args.tenants + 1), rng.choice([1, 1, 2, 3, 5])))
+        for user_id in range(1, args.users + 1)
+    }
+    members_of = {}
+    for user_id, tenant_ids in memberships.items():
+        for tenant_id in tenant_ids:
+            members_of.setdefault(tenant_id, []).append(user_id)
+
+    monitor = PingMonitor(args.redis_url)
+    failures = []
+    try:
+        seed_fillers(client, args.keys)
+        seed_caches(cache, memberships, args.tenants)
+        cache_keys = cache_key_count(client)
+        print(f"Seeded {cache_keys} cache and tag keys for {args.users} users / {args.tenants} tenants\n")
+        monitor.start()
+
+        users = rng.sample(sorted(memberships), args.samples)
+        measure('user: KEYS (legacy)', [lambda u=u: legacy_invalidate_user(client, u) for u in users], monitor)
+        seed_caches(cache, memberships, args.tenants, users=set(users))
+        measure('user: tag set', [lambda u=u: cache._invalidate_user_cache(u) for u in users], monitor)
+        if any(client.exists(f"user_tenants:{u}:v0") for u in users):
+            failures.append("user invalidation left cached lists behind")
+
+        tenants = rng.sample(sorted(members_of), min(args.samples, len(members_of)))
+        seed_caches(cache, memberships, args.tenants)
+        measure('tenant: KEYS loop (legacy)',
+                [lambda t=t: legacy_invalidate_tenant(client, t, members_of[t]) for t in tenants], monitor)
+        seed_caches(cache, memberships, args.tenants)
+        measure('tenant: tag set', [lambda t=t: cache.invalidate_tenant_cache(t) for t in tenants], monitor)
+        stale = [u for t in tenants for u in members_of[t] if client.exists(f"user_tenants:{u}:v0")]
+        if stale:
+            failures.append(f"tenant invalidation left {len(stale)} member lists behind")
+
+        seed_caches(cache, memberships, args.tenants)
+        measure('clear all: KEYS (legacy)', [lambda: legacy_clear_all(client)], monitor)
+        seed_caches(cache, memberships, args.tenants)
+        measure('clear all: SCAN batches', [cache.clear_all_cache], monitor)
+        if cache_key_count(client):
+            failures.append("clear_all_cache left cache keys behind")
+        version_keys = sum(1 for _ in client.scan_iter(match='cache_version:*'))
+        if client.dbsize() != args.keys + version_keys:
+            failures.append(f"{args.keys + version_keys - client.dbsize()} unrelated keys were deleted")
+
+        for failure in failures:
+            print(f"FAIL {failure}")
+        return 1 if failures else 0
+    finally:
+        monitor.stop()
+        client.flushdb()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark tenant provisioning: legacy create-and-install vs template cloning
+
+Run inside the saas_manager container (it needs the Odoo master and PostgreSQL):
+
+    python scripts/benchmark_provisioning.py --runs 3 --modules sale,crm
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import xmlrpc.client
+
+# Add the saas_manager directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'saas_manager'))
+
+from OdooDatabaseManager import OdooDatabaseManager
+from services.provisioning_service import TemplateProvisioningService, TenantDeltas
+
+
+def legacy_provision(odoo, db_name, login, password, modules):
+    """Mirror of the original create_database path: create with demo data, install modules one by one"""
+    odoo.create(db_name, login, password, demo=True)
+
+    common = xmlrpc.client.ServerProxy(f"{odoo.odoo_url}/xmlrpc/2/common")
+    uid = common.authenticate(db_name, login, password, {})
+    if not uid:
+        raise RuntimeError(f"Authentication failed for {db_name}")
+    models = xmlrpc.client.ServerProxy(f"{odoo.odoo_url}/xmlrpc/2/object")
+
+    for module in modules:
+        module_ids = models.execute_kw(
+            db_name, uid, password,
+            'ir.module.module', 'search',
+            [[['name', '=', module], ['state', '!=', 'installed']]]
+        )
+        if module_ids:
+            models.execute_kw(db_name, uid, password, 'ir.module.module', 'button_immediate_install', [module_ids])
+
+
+def timed(fn, *args):
+    started = time.monotonic()
+    fn(*args)
+    return time.monotonic() - started
+
+
+def summarize(label, samples):
+    if not samples:
+        print(f"{label:<22} no successful runs")
+        return
+    print(f"{label:<22} runs={len(samples)} "
+          f"mean={statistics.mean(samples):7.1f}s "
+          f"min={min(samples):7.1f}s max={max(samples):7.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--odoo-url', default=os.environ.get('ODOO_URL', 'http://odoo_master:8069'))
+    parser.add_argument('--master-password', default=os.environ.get('ODOO_MASTER_PASSWORD', 'admin123'))
+    parser.add_argument('--modules', default='', help='Comma separated plan modules')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--keep', action='store_true', help='Do not drop the benchmark databases')
+    args = parser.parse_args()
+
+    plan_modules = [m.strip() for m in args.modules.split(',') if m.strip()]
+    odoo = OdooDatabaseManager(odoo_url=args.odoo_url, master_pwd=args.master_password)
+    provisioner = TemplateProvisioningService(odoo)
+    modules = provisioner.normalize_modules(plan_modules)
+
+    print(f"Modules: {', '.join(modules)}")
+    print(f"Template: {provisioner.template_name(plan_modules)}")
+
+    template_build = 0.0
+    if not provisioner.template_exists(plan_modules):
+        print("Building template (one-off cost, excluded from per-tenant timings)...")
+        template_build = timed(provisioner.ensure_template, plan_modules)
+
+    legacy_samples, template_samples, created = [], [], []
+    stamp = time.strftime('%Y%m%d%H%M%S')
+
+    for run in range(args.runs):
+        legacy_db = f"bench_legacy_{stamp}_{run}"
+        clone_db = f"bench_clone_{stamp}_{run}"
+        try:
+            legacy_samples.append(timed(legacy_provision, odoo, legacy_db, 'admin', 'admin', modules))
+            created.append(legacy_db)
+        except Exception as e:
+            print(f"[!] Legacy run {run} failed: {e}")
+        try:
+            deltas = TenantDeltas(admin_login=f"admin_{run}", admin_password='bench-password')
+            template_samples.append(timed(provisioner.provision, clone_db, plan_modules, deltas))
+            created.append(clone_db)
+        except Exception as e:
+            print(f"[!] Template run {run} failed: {e}")
+
+    print()
+    if template_build:
+        print(f"{'template build':<22} {template_build:7.1f}s")
+    summarize('legacy create+install', legacy_samples)
+    summarize('template clone', template_samples)
+    if legacy_samples and template_samples:
+        print(f"speedup: {statistics.mean(legacy_samples) / statistics.mean(template_samples):.1f}x")
+
+    if not args.keep:
+        for db_name in created:
+            try:
+                odoo.delete(db_name)
+            except Exception as e:
+                print(f"[!] Failed to drop {db_name}: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,3 @@
 from . import hide_setting_config
+from . import ir_http
 from . import res_config_settings
\ No newline at end of file
@@ -1,4 +1,4 @@
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 from odoo.exceptions import AccessError
 
 
@@ -59,8 +59,9 @@ class HideSettingConfig(models.Model):
         }
     
     @api.model
+    @tools.ormcache()
     def is_settings_hidden(self):
-        """Check if settings should be hidden - used by frontend"""
+        """Check if settings should be hidden - cached, shipped to the web client in session_info"""
         config = self.sudo().search([], limit=1)
         return config.is_active if config else False
 
@@ -70,7 +71,9 @@ class HideSettingConfig(models.Model):
         existing = self.sudo().search([])
         if existing:
             existing.unlink()
-        return super().create(vals_list)
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
     
     def write(self, vals):
         # Update activation info
@@ -79,4 +82,12 @@ class HideSettingConfig(models.Model):
                 'activated_by': self.env.user.id,
                 'activation_date': fields.Datetime.now(),
             })
-        return super().write(vals)
\ No newline at end of file
+        result = super().write(vals)
+        if 'is_active' in vals:
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
\ No newline at end of file
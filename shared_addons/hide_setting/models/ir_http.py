@@ -0,0 +1,11 @@
+from odoo import models
+
+
+class IrHttp(models.AbstractModel):
+    _inherit = 'ir.http'
+
+    def session_info(self):
+        result = super().session_info()
+        # Read once per page load instead of an RPC per menu item
+        result['hide_settings'] = self.env['hide.setting.config'].is_settings_hidden()
+        return result
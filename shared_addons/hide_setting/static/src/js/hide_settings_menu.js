@@ -1,98 +1,53 @@
 /** @odoo-module **/
 
 import { registry } from "@web/core/registry";
-import { MenuItem } from "@web/webclient/navbar/navbar";
+import { session } from "@web/session";
+import { NavBar } from "@web/webclient/navbar/navbar";
 import { patch } from "@web/core/utils/patch";
-import { useService } from "@web/core/utils/hooks";
 
-// Patch the MenuItem component to hide settings menu
-patch(MenuItem.prototype, "hide_setting.MenuItem", {
-    setup() {
-        this._super();
-        this.orm = useService("orm");
-        this.hideSettings = false;
-        this.checkHideSettings();
-    },
+// The flag is computed (and cached) server-side and shipped in session_info,
+// so no RPC is needed per menu item or per navbar render
+const settingsIndicators = [
+    'settings',
+    'configuration',
+    'config',
+    'base.menu_administration',
+    '/web/settings'
+];
 
-    async checkHideSettings() {
-        try {
-            const result = await this.orm.call(
-                'hide.setting.config',
-                'is_settings_hidden',
-                []
-            );
-            this.hideSettings = result;
-        } catch (error) {
-            console.warn('Could not check hide settings status:', error);
-            this.hideSettings = false;
-        }
-    },
+function isSettingsMenu(item) {
+    // Check if this menu item is related to settings
+    if (!item) return false;
 
-    get isVisible() {
-        const originalVisible = this._super();
-        
-        // If this is a settings-related menu item and hide settings is active
-        if (this.hideSettings && this.isSettingsMenu()) {
-            return false;
+    const itemName = (item.name || '').toLowerCase();
+    const itemXmlId = item.xmlid || '';
+    const itemAction = String(item.actionID || item.action || '');
+
+    return settingsIndicators.some(indicator =>
+        itemName.includes(indicator) ||
+        itemXmlId.includes(indicator) ||
+        itemAction.includes(indicator)
+    );
+}
+
+// Patch the NavBar to drop settings-related sections
+patch(NavBar.prototype, {
+    get currentAppSections() {
+        const sections = super.currentAppSections;
+        if (!session.hide_settings) {
+            return sections;
         }
-        
-        return originalVisible;
+        return sections.filter((section) => !isSettingsMenu(section));
     },
-
-    isSettingsMenu() {
-        // Check if this menu item is related to settings
-        const item = this.props.item;
-        if (!item) return false;
-        
-        // Check various ways settings might be identified
-        const settingsIndicators = [
-            'settings',
-            'configuration',
-            'config',
-            'base.menu_administration',
-            '/web/settings'
-        ];
-        
-        const itemName = (item.name || '').toLowerCase();
-        const itemXmlId = item.xmlid || '';
-        const itemAction = item.action || '';
-        
-        return settingsIndicators.some(indicator => 
-            itemName.includes(indicator) || 
-            itemXmlId.includes(indicator) || 
-            itemAction.includes(indicator)
-        );
-    }
 });
 
-// Alternative approach: CSS-based hiding
+// CSS-based hiding for the app switcher and dropdowns
 const hideSettingsService = {
-    dependencies: ["orm"],
-    
-    start(env, { orm }) {
-        this.checkAndHideSettings(orm);
-        
-        // Recheck periodically
-        setInterval(() => {
-            this.checkAndHideSettings(orm);
-        }, 30000); // Check every 30 seconds
-    },
-
-    async checkAndHideSettings(orm) {
-        try {
-            const isHidden = await orm.call(
-                'hide.setting.config',
-                'is_settings_hidden',
-                []
-            );
-            
-            if (isHidden) {
-                this.hideSettingsWithCSS();
-            } else {
-                this.showSettingsWithCSS();
-            }
-        } catch (error) {
-            console.warn('Could not check hide settings status:', error);
+    start() {
+        if (session.hide_settings) {
+            this.hideSettingsWithCSS();
+        } else {
+            this.showSettingsWithCSS();
         }
     },
 
@@ -32,6 +32,7 @@ Features:
         'security/ir.model.access.csv',
         'views/saas_config_views.xml',
         'views/res_users_views.xml',
+        'data/ir_cron.xml',
     ],
     'installable': True,
     'application': False,
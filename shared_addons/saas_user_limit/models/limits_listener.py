@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import quote
+
+import odoo
+from odoo import tools
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Published by the SaaS Manager (services/tenant_limits_service.py)
+LIMITS_CHANNEL = 'tenant_limits:changes'
+RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 300
+
+
+def apply_pushed_limit(db_name, max_users, version):
+    """Store a pushed limit unless this database already has the same or a newer version"""
+    registry = Registry(db_name)
+    with registry.cursor() as cr:
+        # Every Odoo process receives the broadcast: the version guard makes
+        # the update idempotent and race free
+        cr.execute("""
+            UPDATE saas_config
+               SET max_users = %s, limits_version = %s, limits_etag = NULL,
+                   last_sync = (now() at time zone 'UTC')
+             WHERE database_name = %s AND COALESCE(limits_version, 0) < %s
+        """, (max_users, version, db_name, version))
+        updated = cr.rowcount
+        if updated:
+            registry.clear_cache()
+    if updated:
+        # Let the other workers drop their cached limit
+        registry.signal_changes()
+        _logger.info(f"Applied pushed user limit for {db_name}: {max_users} (v{version})")
+    return bool(updated)
+
+
+class LimitsListener:
+    """One Redis subscriber per Odoo process applying pushed plan limits"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, url):
+        self.url = url
+        self.pid = os.getpid()
+
+    @staticmethod
+    def redis_url():
+        url = tools.config.get('saas_limits_redis_url')
+        if url:
+            return url
+        host = tools.config.get('redis_host')
+        if not host:
+            return None
+        # Same credentials as the Redis session store
+        password = tools.config.get('redis_pass') or tools.config.get('redis_password')
+        auth = f":{quote(str(password), safe='')}@" if password else ''
+        return f"redis://{auth}{host}:{int(tools.config.get('redis_port', 6379))}/0"
+
+    @classmethod
+    def ensure_started(cls):
+        """Start the subscriber of this process (a forked worker starts its own)"""
+        if redis is None or odoo.evented:
+            return None
+        with cls._lock:
+            if cls._instance and cls._instance.pid == os.getpid():
+                return cls._instance
+            url = cls.redis_url()
+            if not url:
+                return None
+            cls._instance = cls(url)
+            threading.Thread(
+                target=cls._instance.run, name='saas-user-limit-listener', daemon=True
+            ).start()
+            return cls._instance
+
+    def run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                client = redis.Redis.from_url(self.url, socket_keepalive=True)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(LIMITS_CHANNEL)
+                delay = RECONNECT_DELAY
+                for message in pubsub.listen():
+                    self.handle(message.get('data'))
+            except Exception as e:
+                _logger.warning(f"User limit listener disconnected ({e}), retrying in {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def handle(self, data):
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        version = payload.get('version')
+        # Only databases loaded in this process; the others catch up on their
+        # next poll (cron_sync_user_limits)
+        for db_name, entry in (payload.get('limits') or {}).items():
+            if db_name not in Registry.registries:
+                continue
+            try:
+                apply_pushed_limit(db_name, int(entry['max_users']), int(version))
+            except Exception as e:
+                _logger.error(f"Failed to apply pushed user limit for {db_name}: {e}")
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from odoo import models, api, exceptions, _
+from odoo import models, api, _
 
 _logger = logging.getLogger(__name__)
 
@@ -12,84 +12,45 @@ class ResUsers(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         """Override user creation to enforce user limits"""
-        # Get SaaS configuration
-        saas_config = self.env['saas.config'].get_or_create_config()
-        
         # Count how many internal users will be created
-        internal_users_to_create = 0
-        for vals in vals_list:
-            # Check if this will be an internal user
-            if not vals.get('share', False):  # Internal user
-                internal_users_to_create += 1
-        
+        internal_users_to_create = sum(
+            1 for vals in vals_list if not vals.get('share', False)
+        )
+
         if internal_users_to_create > 0:
-            # Check current user limit
-            saas_config._compute_current_users()
-            remaining_slots = saas_config.get_remaining_users()
-            
-            if internal_users_to_create > remaining_slots:
-                # Try to sync with SaaS Manager to get latest limits
-                saas_config.sync_with_saas_manager()
-                remaining_slots = saas_config.get_remaining_users()
-                
-                if internal_users_to_create > remaining_slots:
-                    if remaining_slots == 0:
-                        raise exceptions.ValidationError(
-                            _("User limit reached! This tenant is limited to %d users. "
-                              "Please upgrade your plan to add more users.") % saas_config.max_users
-                        )
-                    else:
-                        raise exceptions.ValidationError(
-                            _("User limit exceeded! You can only create %d more user(s). "
-                              "This tenant is limited to %d users total. "
-                              "Please upgrade your plan to add more users.") % (remaining_slots, saas_config.max_users)
-                        )
-        
+            # Cached limit and a single user count per batch
+            self.env['saas.config'].check_users_available(internal_users_to_create)
+
         # Proceed with user creation if limit check passes
         return super(ResUsers, self).create(vals_list)
 
     def write(self, vals):
         """Override user write to check if making users internal exceeds limit"""
         if 'share' in vals and not vals['share']:
-            # User is being converted from portal/public to internal
-            saas_config = self.env['saas.config'].get_or_create_config()
-            
             # Count how many users will become internal
             users_becoming_internal = len(self.filtered(lambda u: u.share))
-            
+
             if users_becoming_internal > 0:
-                remaining_slots = saas_config.get_remaining_users()
-                
-                if users_becoming_internal > remaining_slots:
-                    # Try to sync with SaaS Manager
-                    saas_config.sync_with_saas_manager()
-                    remaining_slots = saas_config.get_remaining_users()
-                    
-                    if users_becoming_internal > remaining_slots:
-                        if remaining_slots == 0:
-                            raise exceptions.ValidationError(
-                                _("User limit reached! This tenant is limited to %d users. "
-                                  "Please upgrade your plan to add more users.") % saas_config.max_users
-                            )
-                        else:
-                            raise exceptions.ValidationError(
-                                _("User limit exceeded! You can only convert %d more user(s) to internal users. "
-                                  "This tenant is limited to %d users total.") % (remaining_slots, saas_config.max_users)
-                            )
-        
+                self.env['saas.config'].check_users_available(
+                    users_becoming_internal,
+                    message=_("User limit exceeded! You can only convert %d more user(s) to internal users. "
+                              "This tenant is limited to %d users total."),
+                )
+
         return super(ResUsers, self).write(vals)
 
     @api.model
     def get_user_limit_info(self):
         """Get user limit information for display"""
-        saas_config = self.env['saas.config'].get_or_create_config()
-        saas_config._compute_current_users()
-        
+        saas_config = self.env['saas.config']
+        max_users = saas_config.get_max_users()
+        current_users = saas_config._count_internal_users()
+
         return {
-            'max_users': saas_config.max_users,
-            'current_users': saas_config.current_users,
-            'remaining_users': saas_config.get_remaining_users(),
-            'percentage_used': round((saas_config.current_users / saas_config.max_users) * 100, 1) if saas_config.max_users > 0 else 0,
+            'max_users': max_users,
+            'current_users': current_users,
+            'remaining_users': max(0, max_users - current_users),
+            'percentage_used': round((current_users / max_users) * 100, 1) if max_users > 0 else 0,
         }
 
     def action_show_user_limit_info(self):
@@ -1,11 +1,120 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import threading
+import time
 import requests
-from odoo import models, fields, api, exceptions, _
+from odoo import models, fields, api, exceptions, tools, SUPERUSER_ID, _
+from odoo.modules.registry import Registry
+
+from .limits_listener import LimitsListener
 
 _logger = logging.getLogger(__name__)
 
+# Circuit breaker around the SaaS Manager: after BREAKER_THRESHOLD consecutive
+# failures further syncs are skipped for BREAKER_COOLDOWN seconds
+SYNC_TIMEOUT = 5
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 300
+
+# Returned by fetch_manager_limit when the ETag still matches
+NOT_MODIFIED = object()
+
+_breaker = {}
+_pending_syncs = set()
+_sync_lock = threading.Lock()
+
+
+def _breaker_open(url):
+    with _sync_lock:
+        state = _breaker.get(url)
+        return bool(state and state['open_until'] > time.time())
+
+
+def _breaker_record(url, success):
+    with _sync_lock:
+        if success:
+            _breaker.pop(url, None)
+            return
+        state = _breaker.setdefault(url, {'failures': 0, 'open_until': 0})
+        state['failures'] += 1
+        if state['failures'] >= BREAKER_THRESHOLD:
+            state['open_until'] = time.time() + BREAKER_COOLDOWN
+            _logger.warning(f"SaaS Manager unreachable {state['failures']} times, "
+                            f"pausing user limit syncs for {BREAKER_COOLDOWN}s")
+
+
+def fetch_manager_limit(saas_manager_url, db_name, etag=None):
+    """
+    Limits the SaaS Manager reports for a tenant: a dict with ``max_users``,
+    ``version`` and ``etag``, NOT_MODIFIED when ``etag`` still matches, or None
+    """
+    # Get database name (remove kdoo_ prefix if present)
+    tenant_subdomain = db_name[5:] if db_name.startswith('kdoo_') else db_name
+    url = f"{saas_manager_url}/api/tenant/{tenant_subdomain}/user-limit"
+    if _breaker_open(saas_manager_url):
+        _logger.debug(f"Skipping user limit sync for {db_name}: circuit open")
+        return None
+    try:
+        headers = {'If-None-Match': f'"{etag}"'} if etag else {}
+        response = requests.get(url, headers=headers, timeout=SYNC_TIMEOUT)
+        if response.status_code == 304:
+            _breaker_record(saas_manager_url, True)
+            return NOT_MODIFIED
+        if response.status_code == 200:
+            data = response.json()
+            _breaker_record(saas_manager_url, True)
+            if data.get('success') and data.get('max_users') is not None:
+                return {
+                    'max_users': data['max_users'],
+                    'version': data.get('version'),
+                    'etag': (response.headers.get('ETag') or '').strip('"') or False,
+                }
+            return None
+        _logger.warning(f"Failed to sync with SaaS Manager: {response.status_code}")
+    except Exception as e:
+        _logger.error(f"Error syncing with SaaS Manager: {e}")
+    _breaker_record(saas_manager_url, False)
+    return None
+
+
+def _background_sync(db_name, saas_manager_url):
+    """Fetch the limit outside any transaction, then store it with a fresh cursor"""
+    try:
+        limits = fetch_manager_limit(saas_manager_url, db_name)
+        if not isinstance(limits, dict):
+            return
+        registry = Registry(db_name)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            config = env['saas.config'].search([('database_name', '=', db_name)], limit=1)
+            if config:
+                config._apply_manager_limit(limits)
+        # Let the other workers drop their cached limit
+        registry.signal_changes()
+    except Exception as e:
+        _logger.error(f"Background user limit sync failed for {db_name}: {e}")
+    finally:
+        with _sync_lock:
+            _pending_syncs.discard(db_name)
+
+
+def start_background_sync(db_name, saas_manager_url):
+    """Sync a database's limit in a background thread (at most one per database)"""
+    if _breaker_open(saas_manager_url):
+        return False
+    with _sync_lock:
+        if db_name in _pending_syncs:
+            return False
+        _pending_syncs.add(db_name)
+    threading.Thread(
+        target=_background_sync,
+        args=(db_name, saas_manager_url),
+        name=f'saas-user-limit-sync-{db_name}',
+        daemon=True,
+    ).start()
+    return True
+
 
 class SaasConfig(models.Model):
     _name = 'saas.config'
@@ -18,44 +127,117 @@ class SaasConfig(models.Model):
     saas_manager_url = fields.Char('SaaS Manager URL', default='http://saas_manager:8000')
     last_sync = fields.Datetime('Last Sync', readonly=True)
     is_active = fields.Boolean('Active', default=True)
-    
+    limits_version = fields.Integer('Limits Version', readonly=True,
+                                    help="Version of the limits last pushed by the SaaS Manager")
+    limits_etag = fields.Char('Limits ETag', readonly=True, copy=False)
+
+    def _register_hook(self):
+        super()._register_hook()
+        # Plan changes are pushed by the SaaS Manager over Redis pub/sub
+        LimitsListener.ensure_started()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if {'max_users', 'database_name'} & set(vals):
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    @api.model
+    def _count_internal_users(self):
+        """Active internal users, the number the limit applies to"""
+        return self.env['res.users'].sudo().search_count([
+            ('active', '=', True),
+            ('share', '=', False),  # Internal users only
+            ('id', '!=', 1),  # Exclude admin user from count
+        ])
+
     @api.depends()
     def _compute_current_users(self):
         """Compute current active user count"""
+        user_count = self._count_internal_users()
         for record in self:
-            # Count active internal users (excluding portal, public users)
-            user_count = self.env['res.users'].search_count([
-                ('active', '=', True),
-                ('share', '=', False),  # Internal users only
-                ('id', '!=', 1),  # Exclude admin user from count
-            ])
             record.current_users = user_count
 
+    @api.model
+    @tools.ormcache('self.env.cr.dbname')
+    def _cached_max_users(self):
+        config = self.sudo().search([('database_name', '=', self.env.cr.dbname)], limit=1)
+        return config.max_users if config else None
+
+    @api.model
+    def get_max_users(self):
+        """User limit of this database, cached until the configuration changes"""
+        max_users = self._cached_max_users()
+        if max_users is None:
+            max_users = self.get_or_create_config().max_users
+        return max_users
+
+    @api.model
+    def check_users_available(self, requested, message=None):
+        """
+        Raise if ``requested`` more internal users would exceed the limit.
+
+        Counts users once. When the limit is hit, a background sync with the
+        SaaS Manager is requested so a plan upgrade applies on the next try,
+        instead of blocking this transaction on an HTTP call.
+        """
+        max_users = self.get_max_users()
+        remaining_slots = max(0, max_users - self._count_internal_users())
+        if requested <= remaining_slots:
+            return remaining_slots
+
+        self.sudo().get_or_create_config().request_sync()
+        if remaining_slots == 0:
+            raise exceptions.ValidationError(
+                _("User limit reached! This tenant is limited to %d users. "
+                  "Please upgrade your plan to add more users.") % max_users
+            )
+        raise exceptions.ValidationError(
+            (message or _("User limit exceeded! You can only create %d more user(s). "
+                          "This tenant is limited to %d users total. "
+                          "Please upgrade your plan to add more users.")) % (remaining_slots, max_users)
+        )
+
+    def _apply_manager_limit(self, limits):
+        self.ensure_one()
+        max_users = limits['max_users']
+        vals = {'last_sync': fields.Datetime.now(), 'limits_etag': limits.get('etag') or False}
+        if limits.get('version'):
+            vals['limits_version'] = max(limits['version'], self.limits_version or 0)
+        if max_users != self.max_users:
+            vals['max_users'] = max_users
+        self.write(vals)
+        _logger.info(f"Synced user limit for {self.database_name}: {self.max_users}")
+
     def sync_with_saas_manager(self):
         """Sync user limits with SaaS Manager"""
-        try:
-            # Get database name (remove kdoo_ prefix if present)
-            db_name = self.database_name
-            if db_name.startswith('kdoo_'):
-                tenant_subdomain = db_name[5:]  # Remove 'kdoo_' prefix
-            else:
-                tenant_subdomain = db_name
-            
-            url = f"{self.saas_manager_url}/api/tenant/{tenant_subdomain}/user-limit"
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    self.max_users = data.get('max_users', self.max_users)
-                    self.last_sync = fields.Datetime.now()
-                    _logger.info(f"Synced user limit for {db_name}: {self.max_users}")
-                    return True
-            else:
-                _logger.warning(f"Failed to sync with SaaS Manager: {response.status_code}")
-        except Exception as e:
-            _logger.error(f"Error syncing with SaaS Manager: {e}")
-        return False
+        self.ensure_one()
+        limits = fetch_manager_limit(self.saas_manager_url, self.database_name, etag=self.limits_etag)
+        if limits is None:
+            return False
+        if limits is NOT_MODIFIED:
+            self.last_sync = fields.Datetime.now()
+            return True
+        self._apply_manager_limit(limits)
+        return True
+
+    def request_sync(self):
+        """Sync with the SaaS Manager without blocking the current transaction"""
+        self.ensure_one()
+        if self.database_name != self.env.cr.dbname:
+            return False
+        return start_background_sync(self.database_name, self.saas_manager_url)
 
     @api.model
     def get_or_create_config(self):
@@ -66,8 +248,9 @@ class SaasConfig(models.Model):
                 'database_name': self.env.cr.dbname,
                 'max_users': 10,  # Default limit
             })
-            # Try to sync with SaaS Manager on first creation
-            config.sync_with_saas_manager()
+            # Fetch the real limit from the SaaS Manager once this is committed
+            db_name, saas_manager_url = config.database_name, config.saas_manager_url
+            self.env.cr.postcommit.add(lambda: start_background_sync(db_name, saas_manager_url))
         return config
 
     def check_user_limit(self):
@@ -79,12 +262,11 @@ class SaasConfig(models.Model):
 
     def get_remaining_users(self):
         """Get number of remaining user slots"""
-        self._compute_current_users()
-        return max(0, self.max_users - self.current_users)
+        return max(0, self.max_users - self._count_internal_users())
 
     @api.model
     def cron_sync_user_limits(self):
-        """Cron job to sync user limits periodically"""
+        """Cron job to sync user limits periodically (fallback for missed pushes; 304 when unchanged)"""
         configs = self.search([('is_active', '=', True)])
         for config in configs:
             config.sync_with_saas_manager()